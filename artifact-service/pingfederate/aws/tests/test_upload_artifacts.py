@@ -0,0 +1,156 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from upload_artifacts import SOURCE_CHECKSUM_KEY, ArtifactIngester  # noqa: E402
+
+# Entries of a PingFederate kit, of which only the runtime components end up in the runtime zip
+KIT_ENTRIES = {
+    "pingfederate/Legal.pdf": b"legal",
+    "pingfederate/config/run.properties": b"pf.admin.https.port=9999",
+    "pingfederate/dist/pingfederate/server/default/deploy/pf-app.jar": b"app",
+    "pingfederate/dist/pingfederate/server/default/lib/pf-lib.jar": b"lib",
+    "pingfederate/docs/index.html": b"docs",
+    "pingfederate/dist/readme.txt": b"readme",
+}
+
+
+def client_error(code: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class StubS3Client:
+    """Keeps the objects of a single bucket in memory. head_bucket raises bucket_error, if any."""
+
+    def __init__(self, bucket_error: str = None):
+        self.bucket_error = bucket_error
+        self.created_buckets = []
+        self.objects = {}
+        self.uploads = []
+
+    def head_bucket(self, Bucket: str):
+        if self.bucket_error:
+            raise client_error(self.bucket_error, "HeadBucket")
+
+    def create_bucket(self, Bucket: str):
+        self.created_buckets.append(Bucket)
+        self.bucket_error = None
+
+    def head_object(self, Bucket: str, Key: str):
+        if Key not in self.objects:
+            raise client_error("404", "HeadObject")
+        return {"Metadata": self.objects[Key]["Metadata"]}
+
+    def upload_fileobj(self, file_obj, bucket: str, key: str, ExtraArgs: {} = None, Config=None):
+        self.uploads.append(key)
+        self.objects[key] = dict(ExtraArgs or {}, Body=file_obj.read())
+
+
+class TestArtifactIngester(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.client = StubS3Client()
+        self.ingester = ArtifactIngester("s3://artifacts", client=self.client)
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def kit_url(self, entries: {}, file_name: str = "pingfederate-11.2.0.zip") -> str:
+        path = os.path.join(self.work_dir.name, file_name)
+        with zipfile.ZipFile(path, "w") as kit:
+            for name, content in entries.items():
+                kit.writestr(name, content)
+        return f"file://{path}"
+
+    def runtime_zip(self, key: str) -> {}:
+        with zipfile.ZipFile(io.BytesIO(self.client.objects[key]["Body"])) as runtime_zip:
+            return {name: runtime_zip.read(name) for name in runtime_zip.namelist()}
+
+    def test_runtime_zip_contents(self):
+        result = self.ingester.ingest(self.kit_url(KIT_ENTRIES))
+
+        key = "pingfederate/pingfederate/11.2.0/pingfederate-11.2.0-runtime.zip"
+        self.assertTrue(result.uploaded)
+        self.assertEqual(key, result.key)
+        self.assertEqual({
+            "Legal.pdf": b"legal",
+            "config/run.properties": b"pf.admin.https.port=9999",
+            "dist/pingfederate/server/default/deploy/pf-app.jar": b"app",
+            "dist/pingfederate/server/default/lib/pf-lib.jar": b"lib",
+        }, self.runtime_zip(key))
+        self.assertEqual({SOURCE_CHECKSUM_KEY: result.checksum}, self.client.objects[key]["Metadata"])
+        self.assertEqual("public-read", self.client.objects[key]["ACL"])
+
+    def test_private_artifacts_have_no_acl(self):
+        ingester = ArtifactIngester("s3://artifacts/private", visibility="private", client=self.client)
+        result = ingester.ingest(self.kit_url(KIT_ENTRIES))
+
+        self.assertEqual("private/pingfederate/pingfederate/11.2.0/pingfederate-11.2.0-runtime.zip", result.key)
+        self.assertNotIn("ACL", self.client.objects[result.key])
+
+    def test_unchanged_artifact_is_not_uploaded_again(self):
+        url = self.kit_url(KIT_ENTRIES)
+        first = self.ingester.ingest(url)
+        second = self.ingester.ingest(url)
+
+        self.assertFalse(second.uploaded)
+        self.assertEqual(first.checksum, second.checksum)
+        self.assertEqual([first.key], self.client.uploads)
+
+    def test_changed_or_forced_artifact_is_uploaded_again(self):
+        first = self.ingester.ingest(self.kit_url(KIT_ENTRIES))
+        changed = self.ingester.ingest(self.kit_url(dict(KIT_ENTRIES, **{
+            "pingfederate/config/run.properties": b"pf.admin.https.port=9443"})))
+        forced = self.ingester.ingest(self.kit_url(KIT_ENTRIES), force=True)
+
+        self.assertTrue(changed.uploaded)
+        self.assertNotEqual(first.checksum, changed.checksum)
+        self.assertTrue(forced.uploaded)
+        self.assertEqual([first.key] * 3, self.client.uploads)
+        self.assertEqual(b"pf.admin.https.port=9999", self.runtime_zip(first.key)["config/run.properties"])
+
+    def test_failures_are_reported_per_artifact(self):
+        valid_url = self.kit_url(KIT_ENTRIES)
+        not_a_zip_url = self.kit_url({}, "pingfederate-11.3.0.zip")
+        with open(not_a_zip_url[len("file://"):], "wb") as not_a_zip:
+            not_a_zip.write(b"not a zip")
+        no_components_url = self.kit_url({"pingfederate/docs/index.html": b"docs"}, "pingfederate-11.4.0.zip")
+        missing_url = f"file://{self.work_dir.name}/pingfederate-11.5.0.zip"
+
+        results, failures = self.ingester.ingest_all([valid_url, not_a_zip_url, no_components_url, missing_url],
+                                                     workers=2)
+
+        self.assertEqual([valid_url], [result.artifact.source_url for result in results])
+        self.assertEqual({not_a_zip_url, no_components_url, missing_url}, set(failures))
+        self.assertIn("could not be unzipped", str(failures[not_a_zip_url]))
+        self.assertIn("No runtime components", str(failures[no_components_url]))
+        self.assertEqual(["pingfederate/pingfederate/11.2.0/pingfederate-11.2.0-runtime.zip"], self.client.uploads)
+
+
+class TestEnsureBucket(unittest.TestCase):
+    def test_missing_bucket_is_created(self):
+        client = StubS3Client(bucket_error="404")
+        ArtifactIngester("s3://artifacts", client=client).ensure_bucket()
+        self.assertEqual(["artifacts"], client.created_buckets)
+
+    def test_existing_bucket_is_not_created(self):
+        client = StubS3Client()
+        ArtifactIngester("s3://artifacts", client=client).ensure_bucket()
+        self.assertEqual([], client.created_buckets)
+
+    def test_other_errors_are_raised(self):
+        client = StubS3Client(bucket_error="403")
+        with self.assertRaises(ClientError):
+            ArtifactIngester("s3://artifacts", client=client).ensure_bucket()
+        self.assertEqual([], client.created_buckets)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -25,3 +25,6 @@ export ARTIFACT_VISIBILITY=${ARTIFACT_VISIBILITY}
 # Add code below to execute upload-artifact.sh script to upload Standard IKs
 # Example to upload an artifact
 #./upload-artifact.sh ${ARTIFACT_SOURCE_URL}/products/plugins/integration-kits/<name-of-the-integration-kit>/<name-of-the-integration-kit>/<version>/<name-of-the-integration-kit-version.zip>
+#
+# To upload many artifacts in one process, skipping those that are already in the bucket
+#python3 upload_artifacts.py --bucket ${ARTIFACT_REPO_BUCKET} --visibility ${ARTIFACT_VISIBILITY} ${ARTIFACT_SOURCE_URL}/<path-to-integration-kit-1.zip> ${ARTIFACT_SOURCE_URL}/<path-to-integration-kit-2.zip>
@@ -0,0 +1,313 @@
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+# Metadata key used to record the checksum of the source artifact on the uploaded runtime zip
+SOURCE_CHECKSUM_KEY = "source-sha256"
+
+# Headers that artifact repositories use to advertise a SHA-256 checksum of the artifact
+SOURCE_CHECKSUM_HEADERS = ["X-Checksum-Sha256", "X-Amz-Meta-Sha256"]
+
+# Paths within the artifact, relative to its location, that make up the runtime zip
+RUNTIME_FILES = ["Legal.pdf"]
+RUNTIME_DIRS = [
+    "config",
+    "dist/pingfederate/server/default/conf/language-packs",
+    "dist/pingfederate/server/default/deploy",
+    "dist/pingfederate/server/default/lib",
+    "sample",
+    "metadata",
+]
+
+CHUNK_SIZE = 1024 * 1024
+
+# Artifacts and runtime zips smaller than this are kept in memory instead of being written to disk
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
+logger = logging.getLogger("upload_artifacts")
+
+
+@dataclass
+class Artifact:
+    """Names derived from an artifact URL, mirroring the variables in upload-artifact.sh"""
+
+    source_url: str
+    file_name: str
+    name: str
+    name_with_version: str
+    version: str
+
+    @classmethod
+    def from_url(cls, source_url):
+        file_name = source_url.rsplit("/", 1)[-1]
+        name_with_version = file_name.rsplit(".", 1)[0]
+        return cls(
+            source_url=source_url,
+            file_name=file_name,
+            name=file_name.rsplit("-", 1)[0],
+            name_with_version=name_with_version,
+            version=name_with_version.rsplit("-", 1)[-1],
+        )
+
+    @property
+    def runtime_zip(self):
+        return f"{self.name_with_version}-runtime.zip"
+
+
+@dataclass
+class IngestResult:
+    artifact: Artifact
+    key: str
+    checksum: str
+    uploaded: bool
+
+
+class ArtifactIngester:
+    """Download PingFederate artifacts, repackage them as runtime zips and upload them to S3"""
+
+    def __init__(self, bucket_url, visibility="public", client=None, transfer_config=None):
+        """
+            Arguments
+            ----------
+            bucket_url: string
+                S3 URL of the artifact repo, e.g. s3://<BUCKET_NAME>
+            visibility: string
+                Either "public" or "private". Public artifacts are given a public-read ACL.
+            client: boto3 S3 client
+                Client to use, defaults to one built from the environment. Pass a client with a custom
+                endpoint_url to run against an S3-compatible stand-in.
+            transfer_config: boto3 TransferConfig
+                Multipart upload settings, defaults to 8MB parts uploaded by 10 threads.
+        """
+        if not bucket_url.startswith("s3://"):
+            raise ValueError(f"Upload location is not S3: {bucket_url}")
+
+        bucket_url_no_protocol = bucket_url[len("s3://"):].rstrip("/")
+        self.bucket_name, _, prefix = bucket_url_no_protocol.partition("/")
+
+        # Add /pingfederate to base repo URL
+        self.prefix = prefix if "pingfederate" in prefix else "/".join(filter(None, [prefix, "pingfederate"]))
+
+        self.visibility = visibility
+        self.client = client or boto3.session.Session().client("s3")
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=10,
+        )
+
+    def ensure_bucket(self):
+        """Create the bucket if it doesn't exist, and raise any other error, e.g. access denied"""
+        try:
+            self.client.head_bucket(Bucket=self.bucket_name)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ["404", "NoSuchBucket", "NotFound"]:
+                raise
+            logger.info(f"Creating bucket {self.bucket_name}")
+            self.client.create_bucket(Bucket=self.bucket_name)
+
+    def object_key(self, artifact):
+        return f"{self.prefix}/{artifact.name}/{artifact.version}/{artifact.runtime_zip}"
+
+    def uploaded_checksum(self, key):
+        """Return the source checksum recorded on an uploaded runtime zip, or None if it doesn't exist"""
+        try:
+            response = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ["404", "NoSuchKey", "NotFound"]:
+                return None
+            raise
+        return response.get("Metadata", {}).get(SOURCE_CHECKSUM_KEY)
+
+    def ingest(self, source_url, force=False):
+        """
+            Ingest a single artifact. The download is hashed while it streams, and the repackage and upload are
+            skipped when the bucket already holds a runtime zip built from the same source checksum. When the
+            source advertises its checksum, the download itself is skipped as well.
+        """
+        artifact = Artifact.from_url(source_url)
+        key = self.object_key(artifact)
+        existing_checksum = None if force else self.uploaded_checksum(key)
+
+        if existing_checksum:
+            advertised_checksum = source_checksum(source_url)
+            if advertised_checksum == existing_checksum:
+                logger.info(f"{artifact.file_name}: s3://{self.bucket_name}/{key} is up to date, skipping download")
+                return IngestResult(artifact, key, existing_checksum, uploaded=False)
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as download:
+            checksum = download_artifact(source_url, download)
+            logger.info(f"{artifact.file_name}: downloaded with sha256 {checksum}")
+
+            if checksum == existing_checksum:
+                logger.info(f"{artifact.file_name}: s3://{self.bucket_name}/{key} is up to date, skipping upload")
+                return IngestResult(artifact, key, checksum, uploaded=False)
+
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as runtime_zip:
+                build_runtime_zip(artifact, download, runtime_zip)
+                runtime_zip.seek(0)
+                self.upload(key, runtime_zip, checksum)
+
+        return IngestResult(artifact, key, checksum, uploaded=True)
+
+    def upload(self, key, file_obj, checksum):
+        extra_args = {"Metadata": {SOURCE_CHECKSUM_KEY: checksum}}
+        if self.visibility == "public":
+            # Give public read privilege to the uploaded artifact
+            extra_args["ACL"] = "public-read"
+
+        logger.info(f"Uploading s3://{self.bucket_name}/{key}")
+        self.client.upload_fileobj(
+            file_obj, self.bucket_name, key, ExtraArgs=extra_args, Config=self.transfer_config
+        )
+
+    def ingest_all(self, source_urls, workers=4, force=False):
+        """Ingest several artifacts concurrently. Returns the results and a map of failed URLs to their errors."""
+        self.ensure_bucket()
+
+        results = []
+        failures = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.ingest, url, force): url for url in source_urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Could not upload artifact {url}: {e}")
+                    failures[url] = e
+
+        return results, failures
+
+
+def source_checksum(source_url):
+    """Return the SHA-256 checksum the artifact repository advertises for the URL, if any"""
+    request = urllib.request.Request(source_url, method="HEAD")
+    try:
+        with urllib.request.urlopen(request) as response:
+            for header in SOURCE_CHECKSUM_HEADERS:
+                if response.headers.get(header):
+                    return response.headers[header].lower()
+    except OSError as e:
+        logger.debug(f"HEAD {source_url} failed: {e}")
+    return None
+
+
+def download_artifact(source_url, file_obj):
+    """Stream the artifact into file_obj and return its SHA-256 checksum"""
+    sha256 = hashlib.sha256()
+    with urllib.request.urlopen(source_url) as response:
+        while True:
+            chunk = response.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            file_obj.write(chunk)
+    file_obj.seek(0)
+    return sha256.hexdigest()
+
+
+def artifact_location(artifact, names):
+    """
+        Retrieve the path of the components within the artifact zip. It is a sub folder named after the artifact,
+        with or without its version, or else the only sub folder that does not start with '_' or '.'.
+    """
+    top_level_dirs = {name.split("/", 1)[0] for name in names if "/" in name}
+    for candidate in [artifact.name, artifact.name_with_version]:
+        if candidate in top_level_dirs:
+            return f"{candidate}/"
+
+    sub_folders = sorted(d for d in top_level_dirs if not d.startswith(("_", ".")))
+    if not sub_folders:
+        return ""
+    return f"{sub_folders[0]}/"
+
+
+def build_runtime_zip(artifact, source, target):
+    """
+        Copy the runtime components of the artifact zip into a new runtime zip, entry by entry, without extracting
+        the artifact to disk.
+    """
+    try:
+        source_zip = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        raise ValueError(f"Artifact {artifact.file_name} could not be unzipped")
+
+    with source_zip, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as runtime_zip:
+        location = artifact_location(artifact, source_zip.namelist())
+        count = 0
+        for info in source_zip.infolist():
+            if info.is_dir() or not info.filename.startswith(location):
+                continue
+
+            relative_name = info.filename[len(location):]
+            if relative_name in RUNTIME_FILES or any(relative_name.startswith(f"{d}/") for d in RUNTIME_DIRS):
+                with source_zip.open(info) as src, runtime_zip.open(relative_name, "w") as dst:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                count += 1
+
+    if count == 0:
+        raise ValueError(f"No runtime components found in {artifact.file_name}")
+
+
+def read_url_list(path):
+    with open(path) as url_file:
+        return [line.strip() for line in url_file if line.strip() and not line.startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload PingFederate artifacts as runtime zips to an S3 bucket")
+    parser.add_argument("urls", nargs="*", help="URLs of the source artifact zips")
+    parser.add_argument("-f", "--url-file", help="File with one artifact URL per line")
+    parser.add_argument("-b", "--bucket", default=os.environ.get("ARTIFACT_REPO_BUCKET"),
+                        help="S3 URL of the artifact repo, defaults to ARTIFACT_REPO_BUCKET")
+    parser.add_argument("-v", "--visibility", default=os.environ.get("ARTIFACT_VISIBILITY", "public"),
+                        choices=["public", "private"])
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Number of artifacts ingested concurrently")
+    parser.add_argument("--endpoint-url", default=os.environ.get("AWS_ENDPOINT_URL"),
+                        help="Custom S3 endpoint, e.g. a local S3-compatible server")
+    parser.add_argument("--force", action="store_true", help="Upload even if the artifact is already in the bucket")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s | %(name)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S%z",
+        stream=sys.stdout,
+        level=logging.INFO,
+    )
+
+    if not args.bucket:
+        parser.error("ARTIFACT_REPO_BUCKET needs to be specified as an environment variable or with --bucket")
+
+    source_urls = args.urls + (read_url_list(args.url_file) if args.url_file else [])
+    if not source_urls:
+        parser.error("At least one artifact URL is required")
+
+    client = boto3.session.Session().client("s3", endpoint_url=args.endpoint_url)
+    ingester = ArtifactIngester(args.bucket, args.visibility, client=client)
+    results, failures = ingester.ingest_all(source_urls, workers=args.workers, force=args.force)
+
+    for result in sorted(results, key=lambda r: r.key):
+        status = "uploaded" if result.uploaded else "unchanged"
+        print(f"{status}: s3://{ingester.bucket_name}/{result.key}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
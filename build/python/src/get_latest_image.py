@@ -1,8 +1,8 @@
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from botocore.config import Config
 import utils
 import re as regex
-from pkg_resources import parse_version
 
 # Constants
 SEMANTIC_VERSION_REGEX = "([0-9]+)\.([0-9]+)\.([0-9]+)\.([0-9]+)(_RC[0-9]+)?"
@@ -65,18 +65,19 @@ class LatestImageManager:
         # Return integers: infrastructure version | beluga major version | pcb patch num
         return [gitlab_infrastructure_version_num, gitlab_major_version_num, gitlab_pcb_patch_num]
 
-    def get_all_images_in_detail(self):
+    def get_all_images_in_detail(self, repository_name=None):
         """
-          Get all images within ECR.
+          Get all images within ECR. Defaults to the repository the manager was created for.
 
           API Resource:
             https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecr-public.html#ECRPublic.Client.describe_image_tags
         """
         all_images = []
+        repository_name = repository_name or self.repository_name
 
         # Make initial API call to get first 1000 images
         response = self.client.describe_image_tags(
-            repositoryName=self.repository_name,
+            repositoryName=repository_name,
             maxResults=1000
         )
         all_images += response.get('imageTagDetails')
@@ -84,7 +85,7 @@ class LatestImageManager:
         # If there are more than 1000 images, paginate and retrieve the others
         while "nextToken" in response:
             response = self.client.describe_image_tags(
-                repositoryName=self.repository_name,
+                repositoryName=repository_name,
                 maxResults=1000,
                 nextToken=response["nextToken"]
             )
@@ -92,14 +93,14 @@ class LatestImageManager:
 
         return all_images
 
-    def get_latest_image(self):
+    def get_latest_image(self, repository_name=None):
         """
           Filter out all images that are in the same release (infrastructure_version and beluga_major_version).
           and pcb_patch_num if RC tag
           Return the most recent image for the given product.
         """
         all_images_within_release = []
-        for image in self.get_all_images_in_detail():
+        for image in self.get_all_images_in_detail(repository_name):
             orig_image_tag_name = image.get('imageTag')
 
             if orig_image_tag_name is not None:
@@ -112,12 +113,37 @@ class LatestImageManager:
             raise Exception(
                 f"No image was found within {self.infrastructure_version_num}.{self.beluga_major_version_num}.{self.pcb_patch_num} release")
 
+        # pkg_resources is slow to import, so it is only imported once there are candidates to sort
+        from pkg_resources import parse_version
+
         # Sort candidates by highest to lowest. The highest is considered as the most recent.
         sorted_images = sorted(all_images_within_release, key=parse_version, reverse=True)
 
         # Return the first item from the list. This is the latest candidate within the release.
         return sorted_images[0]
 
+    def get_latest_images(self, repository_names, workers=8):
+        """
+          Resolve the latest image within the release for several repositories concurrently, sharing one ECR client.
+
+          Arguments
+          ----------
+          repository_names: list
+              Locations of the images
+          workers: int
+              Number of repositories resolved concurrently
+
+          Return a dict of repository name to its latest image tag, or to the exception raised while resolving it.
+        """
+        def latest_or_error(repository_name):
+            try:
+                return self.get_latest_image(repository_name)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(repository_names, executor.map(latest_or_error, repository_names)))
+
 
 if __name__ == '__main__':
     repo_name = sys.argv[1]
@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import re as regex
+import ssl
+import sys
+import urllib.request
+from dataclasses import dataclass, field
+
+# Constants
+ECR_REGISTRY = "public.ecr.aws/r2h3l6e4/"
+IMAGE_TAG_VAR_REGEX = regex.compile(r"^([A-Z0-9_]+)_IMAGE_TAG=(.*)$")
+K8S_IMAGE_REGEX = regex.compile(r"image:\s*[\"']?" + regex.escape(ECR_REGISTRY) + r"([^\s\"':@]+)")
+NOT_AVAILABLE = "N/A"
+
+
+def parse_image(image):
+    """
+        Split an image reference into its product, ECR repository and tag. The product is the last path segment of
+        the image, skipping the trailing /dev segment of development images.
+
+        Arguments
+        ----------
+        image: string
+            Image reference, e.g. public.ecr.aws/r2h3l6e4/pingcloud-apps/pingfederate/dev:v1.18-release-branch-latest
+
+        Return a (product, repository, tag) tuple. The repository and tag are None if they cannot be determined.
+    """
+    image = image.split("@", 1)[0]
+    path, tag = image, None
+    if ":" in image.rsplit("/", 1)[-1]:
+        path, tag = image.rsplit(":", 1)
+
+    repository = path[len(ECR_REGISTRY):] if path.startswith(ECR_REGISTRY) else None
+    segments = path.split("/")
+    if segments[-1] == "dev" and len(segments) > 1:
+        segments = segments[:-1]
+        repository = repository[:-len("/dev")] if repository else None
+    return segments[-1], repository, tag
+
+
+def product_for_var(var_prefix):
+    """Map the prefix of an *_IMAGE_TAG variable to its product, e.g. PINGACCESS_WAS to pingaccess-was"""
+    return var_prefix.lower().replace("_", "-")
+
+
+def read_default_tags(env_vars_file):
+    """
+        Read the default image tags of every product from an env_vars file in one pass.
+
+        Return a dict of product to its default tag.
+    """
+    defaults = {}
+    with open(env_vars_file) as env_vars:
+        for line in env_vars:
+            match = IMAGE_TAG_VAR_REGEX.match(line.strip())
+            if match:
+                defaults[product_for_var(match.group(1))] = match.group(2).strip("\"'")
+    return defaults
+
+
+def find_image_repos(k8s_configs_dir):
+    """
+        Find the ECR repository of every product referenced by the yaml files under a k8s-configs directory, in one
+        pass over the files.
+
+        Return a dict of product to its ECR repository.
+    """
+    repos = {}
+    for root, dirs, files in os.walk(k8s_configs_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for file_name in files:
+            if not file_name.endswith((".yaml", ".yml")):
+                continue
+            with open(os.path.join(root, file_name), errors="replace") as yaml_file:
+                for repository_path in K8S_IMAGE_REGEX.findall(yaml_file.read()):
+                    product, repository, _ = parse_image(ECR_REGISTRY + repository_path)
+                    repos.setdefault(product, repository)
+    return repos
+
+
+def metadata_images(metadata):
+    """
+        Extract every deployed image from a PINGCLOUD_METADATA_API response.
+
+        Return a list of (name, image) tuples.
+    """
+    images = []
+    for name, details in (metadata.get("version") or {}).items():
+        image = details.get("image") if isinstance(details, dict) else None
+        if image and image != NOT_AVAILABLE:
+            images.append((name, image))
+    return images
+
+
+def fetch_metadata(url, timeout=5, insecure=False):
+    context = ssl._create_unverified_context() if insecure else None
+    with urllib.request.urlopen(url, timeout=timeout, context=context) as response:
+        return json.load(response)
+
+
+def live_pod_images(namespaces):
+    """
+        List the images of the containers of every pod in the namespaces with one API call per namespace.
+
+        Return a list of (pod/container, image) tuples.
+    """
+    import kubernetes as k8s
+
+    k8s.config.load_kube_config()
+    core_client = k8s.client.CoreV1Api()
+    images = []
+    for namespace in namespaces:
+        for pod in core_client.list_namespaced_pod(namespace).items:
+            for container in pod.spec.containers:
+                images.append((f"{pod.metadata.name}/{container.name}", container.image))
+    return images
+
+
+def latest_ecr_tags(release_tag, repos):
+    """
+        Resolve the newest ECR tag within the release of every repository.
+
+        Return a dict of repository to its latest tag, or to the exception raised while resolving it.
+    """
+    from get_latest_image import LatestImageManager
+
+    if not repos:
+        return {}
+    manager = LatestImageManager(release_tag, repos[0])
+    return manager.get_latest_images(repos)
+
+
+@dataclass
+class ProductDrift:
+    """The image tags of one product as seen by every source"""
+
+    product: str
+    default: str = None
+    repository: str = None
+    metadata: dict = field(default_factory=dict)
+    live: dict = field(default_factory=dict)
+    ecr_latest: str = None
+    ecr_error: str = None
+
+    @property
+    def problems(self):
+        problems = []
+        if self.default is None:
+            problems.append("missing from env_vars")
+        for source, tags in [("metadata", self.metadata), ("live", self.live)]:
+            if len(tags) > 1:
+                problems.append(f"{source}: multiple versions deployed")
+            if self.default is not None and any(tag != self.default for tag in tags):
+                problems.append(f"{source}: does not match the default tag")
+        if self.ecr_error:
+            problems.append(f"ecr: {self.ecr_error}")
+        elif self.ecr_latest and self.default is not None and self.ecr_latest != self.default:
+            problems.append("ecr: default tag is not the latest in the release")
+        return problems
+
+    def to_dict(self):
+        return {
+            "default": self.default,
+            "repository": self.repository,
+            "metadata": sorted(self.metadata),
+            "live": sorted(self.live),
+            "ecr_latest": self.ecr_latest,
+            "problems": self.problems,
+        }
+
+
+class ImageDriftReport:
+    """Join the image tags of every source by product, so each source is read only once"""
+
+    def __init__(self, defaults, repos=None):
+        """
+            Arguments
+            ----------
+            defaults: dict
+                Product to its default tag in env_vars. Only these products are reported on.
+            repos: dict
+                Product to its ECR repository
+        """
+        self.products = {product: ProductDrift(product, default=tag) for product, tag in defaults.items()}
+        for product, repository in (repos or {}).items():
+            if product in self.products:
+                self.products[product].repository = repository
+
+    def add_images(self, source, images):
+        """
+            Record deployed images of a source.
+
+            Arguments
+            ----------
+            source: string
+                Either "metadata" or "live"
+            images: list
+                (name, image) tuples, where the name is the pod or service running the image
+        """
+        for name, image in images:
+            product, _, tag = parse_image(image)
+            if product in self.products and tag:
+                getattr(self.products[product], source).setdefault(tag, []).append(name)
+
+    def add_ecr_latest(self, latest_by_repo):
+        for drift in self.products.values():
+            latest = latest_by_repo.get(drift.repository)
+            if isinstance(latest, Exception):
+                drift.ecr_error = str(latest)
+            elif latest:
+                drift.ecr_latest = latest
+
+    def rows(self, products=None):
+        return [self.products[p] for p in sorted(self.products) if not products or p in products]
+
+    def to_dict(self, products=None):
+        return {drift.product: drift.to_dict() for drift in self.rows(products)}
+
+
+def format_table(rows, sources):
+    columns = ["PRODUCT", "DEFAULT"]
+    columns += [{"metadata": "METADATA", "live": "LIVE", "ecr": "ECR LATEST"}[source] for source in sources]
+    columns.append("PROBLEMS")
+
+    table = []
+    for drift in rows:
+        row = [drift.product, drift.default or "-"]
+        for source in sources:
+            if source == "ecr":
+                row.append(drift.ecr_latest or "-")
+            else:
+                row.append(",".join(sorted(getattr(drift, source))) or "-")
+        row.append("; ".join(drift.problems) or "ok")
+        table.append(row)
+
+    widths = [max(len(str(row[i])) for row in [columns] + table) for i in range(len(columns))]
+    lines = ["  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip()
+             for row in [columns] + table]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report image tag drift between the env_vars defaults, the metadata API, the live pods and the "
+                    "latest ECR images of the release")
+    parser.add_argument("--env-vars", required=True, help="env_vars file with the default *_IMAGE_TAG variables")
+    parser.add_argument("--metadata-url", help="PINGCLOUD_METADATA_API URL")
+    parser.add_argument("--insecure", action="store_true", help="Do not verify the metadata API certificate")
+    parser.add_argument("--namespace", action="append", default=[], help="Namespace of the live pods to compare")
+    parser.add_argument("--release", help="Release tag, e.g. v1.18.0.0; compares the defaults to the latest ECR tags")
+    parser.add_argument("--k8s-configs", help="k8s-configs directory used to find the ECR repository of products")
+    parser.add_argument("--product", action="append", default=[], help="Only report on this product")
+    parser.add_argument("--json", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.release and not args.k8s_configs:
+        parser.error("--k8s-configs is required with --release")
+
+    report = ImageDriftReport(
+        read_default_tags(args.env_vars),
+        find_image_repos(args.k8s_configs) if args.k8s_configs else None,
+    )
+
+    sources = []
+    if args.metadata_url:
+        sources.append("metadata")
+        report.add_images("metadata", metadata_images(fetch_metadata(args.metadata_url, insecure=args.insecure)))
+    if args.namespace:
+        sources.append("live")
+        report.add_images("live", live_pod_images(args.namespace))
+    if args.release:
+        sources.append("ecr")
+        repos = sorted({drift.repository for drift in report.rows(args.product) if drift.repository})
+        report.add_ecr_latest(latest_ecr_tags(args.release, repos))
+
+    rows = report.rows(args.product)
+    print(format_table(rows, sources))
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report.to_dict(args.product), json_file, indent=2)
+
+    sys.exit(1 if any(drift.problems for drift in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
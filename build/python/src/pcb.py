@@ -0,0 +1,506 @@
+import os
+import sys
+
+# Only os and sys are imported up front. The tools, their dependencies (boto3, kubernetes, PyYAML...) and even
+# argparse and socket are imported when a subcommand needs them, so that starting the CLI stays cheap.
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+BUILD_DIR = os.path.join(ROOT, "build", "python", "src")
+VALIDATION_DIR = os.path.join(ROOT, "k8s-configs", "cluster-tools", "base", "git-ops", "validation")
+PYTHON_UTILS_DIR = os.path.join(ROOT, "ci-scripts", "test", "python-utils")
+PROMETHEUS_DIR = os.path.join(ROOT, "k8s-configs", "cluster-tools", "base", "monitoring", "prometheus")
+TOOL_DIRS = [BUILD_DIR, VALIDATION_DIR, PYTHON_UTILS_DIR, PROMETHEUS_DIR]
+
+DEFAULT_IDLE_TIMEOUT = 900
+
+USAGE = """usage: pcb [--no-daemon] COMMAND [ARGS...]
+       pcb daemon {{start,stop,status,serve}} [--idle-timeout SECONDS]
+
+Run the ping-cloud-base python tools from a single entry point. Each command takes the arguments of the tool it runs,
+see 'pcb COMMAND --help'.
+
+When the daemon is running, commands run in it instead of in a new interpreter, so that imports, parsed files and AWS
+sessions stay warm between calls. The daemon runs one command at a time, with the working directory, environment and
+standard streams of the caller. Without a daemon, or with --no-daemon or PCB_NO_DAEMON set, commands run in-process.
+The daemon listens on PCB_SOCKET, by default $XDG_RUNTIME_DIR/pcb/pcb.sock or /tmp/pcb-$UID/pcb.sock, and exits after
+being idle for --idle-timeout seconds (default {idle_timeout}, 0 to never exit).
+
+commands:
+{commands}"""
+
+
+class Command:
+    """
+    A tool run by pcb. By default the main function of the module runs with the arguments of the command. An entry
+    function runs instead of main when given, with the module and the arguments.
+    """
+
+    def __init__(self, module: str, description: str, entry=None):
+        self.module = module
+        self.description = description
+        self.entry = entry
+
+
+# Files parsed by commands, keyed on their path, modification time and size, which only the daemon ever reuses
+_parsed_files = {}
+
+# LatestImageManager instances, keyed on the release tag and the AWS credentials variables
+_image_managers = {}
+
+
+def parsed_file(path: str, parse):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _parsed_files:
+        for stale_key in [k for k in _parsed_files if k[0] == key[0]]:
+            del _parsed_files[stale_key]
+        _parsed_files[key] = parse(path)
+    return _parsed_files[key]
+
+
+def verify_descriptor(module, args: [str]):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="pcb verify-descriptor",
+                                     description=COMMANDS["verify-descriptor"].description)
+    parser.add_argument("descriptor", help="Path of descriptor.json")
+    args = parser.parse_args(args)
+    try:
+        module.verify_descriptor(parsed_file(args.descriptor, module.get_json))
+    except ValueError as e:
+        parser.exit(1, f"{args.descriptor}: {e}\n")
+
+
+def latest_image(module, args: [str]):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="pcb latest-image", description=COMMANDS["latest-image"].description)
+    parser.add_argument("repository", help="ECR repository, e.g. pingcloud-apps/pingfederate")
+    parser.add_argument("tag", help="Release tag, e.g. v1.18.0.0")
+    args = parser.parse_args(args)
+
+    key = (args.tag, tuple(os.environ.get(name) for name in module.utils.AWS_CREDENTIALS_VARS))
+    if key not in _image_managers:
+        _image_managers[key] = module.LatestImageManager(args.tag, args.repository)
+    print(_image_managers[key].get_latest_image(args.repository))
+
+
+def imports_any(module, module_ids: {int}, module_names: {str}) -> bool:
+    """Whether the module holds one of the modules, e.g. 'import health_common', or a name defined in one of them, e.g.
+    'from health_common import Client'"""
+    import types
+
+    for value in list(getattr(module, "__dict__", {}).values()):
+        try:
+            if isinstance(value, types.ModuleType):
+                if id(value) in module_ids:
+                    return True
+            elif getattr(value, "__module__", None) in module_names:
+                return True
+        except Exception:
+            continue
+    return False
+
+
+def unload_modules(names: [str]) -> [str]:
+    """
+    Forget the modules, and every module that imports one of them, directly or through other modules, so that they are
+    all imported again instead of keeping references to the forgotten ones
+    :return: The names of all the modules forgotten
+    """
+    unloaded = {}
+    pending = [name for name in names if name in sys.modules]
+    while pending:
+        for name in pending:
+            unloaded[name] = sys.modules.pop(name)
+        unloaded_ids = {id(module) for module in unloaded.values()}
+        pending = [name for name, module in list(sys.modules.items()) if imports_any(module, unloaded_ids, unloaded)]
+    return list(unloaded)
+
+
+def run_unittests(module, args: [str]):
+    """Run the unittest suites of a directory, e.g. the health checks, like 'python -m unittest' from within it"""
+    argv = sys.argv
+    # The test modules, and the tool modules they import, are loaded again on every run, since test helpers such as
+    # health_common and pingone read the environment when they are imported. So are the modules loaded earlier that
+    # import them. Third-party modules stay loaded.
+    loaded = set(sys.modules)
+    sys.argv = ["pcb unittest", *args]
+    try:
+        module.main(module=None)
+    finally:
+        sys.argv = argv
+        reloaded_dirs = tuple(directory + os.sep for directory in [os.getcwd(), *TOOL_DIRS])
+        reloaded = [name for name in set(sys.modules) - loaded
+                    if os.path.abspath(getattr(sys.modules[name], "__file__", None) or "").startswith(reloaded_dirs)]
+        unload_modules(reloaded)
+
+
+COMMANDS = {
+    "verify-descriptor": Command("verify_descriptor_json", "Verify the regions of a multi-region descriptor.json",
+                                 verify_descriptor),
+    "feature-flags": Command("feature_flags", "Manage the feature flag markers of the kustomizations"),
+    "render-workspace": Command("render_workspace", "Build the workspace of a git-ops-command.sh render"),
+    "validate-cluster-state": Command("validate_cluster_state", "Validate the cluster state repo before a render"),
+    "secrets": Command("secrets_index", "Look up decoded secret values from the secrets.yaml files"),
+    "manifests": Command("k8s_manifests", "Index, query and split a rendered YAML stream"),
+    "manifest-diff": Command("manifest_diff", "Compare two renders of the cluster state resource by resource"),
+    "incremental-apply": Command("incremental_apply", "Apply only the resources that changed since the last apply"),
+    "latest-image": Command("get_latest_image", "Print the latest ECR image tag of a release", latest_image),
+    "image-drift": Command("image_drift", "Report image tag drift between the defaults, the cluster and ECR"),
+    "job-exporter": Command("prometheus_job_exporter", "Run the prometheus-job-exporter jobs and serve their metrics"),
+    "release-rewrite": Command("release_rewriter", "Rewrite the version references of a release"),
+    "wait": Command("k8s_waiter", "Wait for several Kubernetes conditions at once"),
+    "scan-logs": Command("log_secret_scanner", "Scan pod logs for the values of secret environment variables"),
+    "verify-csd-upload": Command("csd_upload_verifier", "Verify the CSD support-data files uploaded to S3"),
+    "unittest": Command("unittest", "Run the unittest suites of the current directory, e.g. the health checks",
+                        run_unittests),
+}
+
+
+def usage() -> str:
+    commands = "\n".join(f"  {name:<20}{command.description}" for name, command in COMMANDS.items())
+    return USAGE.format(idle_timeout=DEFAULT_IDLE_TIMEOUT, commands=commands)
+
+
+def add_tool_dirs():
+    for directory in reversed(TOOL_DIRS):
+        if directory not in sys.path and os.path.isdir(directory):
+            sys.path.insert(0, directory)
+
+
+def run(name: str, args: [str]) -> int:
+    """
+    Run a command in this process
+    :return: The exit code of the command
+    """
+    import importlib
+
+    add_tool_dirs()
+    command = COMMANDS[name]
+    argv = sys.argv
+    try:
+        module = importlib.import_module(command.module)
+        if command.entry:
+            command.entry(module, args)
+        else:
+            sys.argv = [f"pcb {name}", *args]
+            module.main()
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception:
+        import traceback
+
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.argv = argv
+        sys.stdout.flush()
+        sys.stderr.flush()
+    return 0
+
+
+def runtime_dir() -> str:
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "pcb")
+    return os.path.join(os.environ.get("TMPDIR") or "/tmp", f"pcb-{os.getuid()}")
+
+
+def socket_path() -> str:
+    return os.environ.get("PCB_SOCKET") or os.path.join(runtime_dir(), "pcb.sock")
+
+
+def request(message: {}, fds: [int] = (), path: str = None):
+    """
+    Send a request to the daemon and wait for its response. The client side sticks to builtin modules, _socket and
+    marshal, as importing socket, array or json takes longer than the rest of a warm call.
+    :return: The response, or None if no daemon is listening
+    """
+    import _socket
+    import marshal
+
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return None
+    connection = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(path)
+        except OSError:
+            return None
+        # The standard streams of the caller are passed along with the first byte of the request, as C ints
+        ancillary = [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS,
+                      b"".join(fd.to_bytes(4, sys.byteorder, signed=True) for fd in fds))] if fds else []
+        connection.sendmsg([b"\0"], ancillary)
+        connection.sendall(marshal.dumps(message))
+        connection.shutdown(_socket.SHUT_WR)
+        response = b""
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            response += data
+    finally:
+        connection.close()
+    return marshal.loads(response) if response else None
+
+
+def run_in_daemon(name: str, args: [str]):
+    """
+    Run a command in the daemon
+    :return: The exit code of the command, or None if it has to run in this process
+    """
+    if os.environ.get("PCB_NO_DAEMON"):
+        return None
+    # Only the standard streams are passed to the daemon, so other file descriptors of the caller, e.g. from a process
+    # substitution, are only readable from this process
+    if any(arg.startswith(("/dev/fd/", "/proc/self/fd/")) for arg in args):
+        return None
+    sys.stdout.flush()
+    sys.stderr.flush()
+    response = request({"command": name, "args": args, "cwd": os.getcwd(), "env": dict(os.environ), "root": ROOT},
+                       [0, 1, 2])
+    if response is None or "code" not in response:
+        return None
+    return response["code"]
+
+
+class Daemon:
+    """
+    Serve commands over a Unix socket from one long-lived interpreter. Commands run one at a time, each with the
+    working directory, environment and standard streams of its caller, so they behave as if run from the caller.
+    Tool modules stay imported between commands, so they must read the environment when called, not at import time.
+    """
+
+    def __init__(self, path: str, idle_timeout: float):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.started = None
+        self.requests = 0
+        self.running = True
+        self.module_mtimes = {}
+
+    def preload(self):
+        """Import every tool ahead of the first call, skipping those whose dependencies are not installed"""
+        import importlib
+
+        add_tool_dirs()
+        with open(os.devnull, "w") as devnull:
+            for name, command in COMMANDS.items():
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    importlib.import_module(command.module)
+                except Exception as e:
+                    print(f"Not preloading {name}: {e}", file=sys.stderr)
+                finally:
+                    sys.stdout = stdout
+        self.module_mtimes = self.tool_module_mtimes()
+
+    def tool_module_mtimes(self) -> {}:
+        mtimes = {}
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None)
+            if path and any(path.startswith(directory + os.sep) for directory in TOOL_DIRS):
+                try:
+                    mtimes[name] = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtimes[name] = None
+        return mtimes
+
+    def unload_changed_modules(self):
+        """
+        Forget the tool modules whose source changed, e.g. after a checkout, and the modules that import them, so that
+        they are imported again
+        """
+        current = self.tool_module_mtimes()
+        changed = [name for name, mtime in current.items() if self.module_mtimes.get(name, mtime) != mtime]
+        for name in unload_modules(changed):
+            current.pop(name, None)
+        self.module_mtimes = current
+
+    def serve(self):
+        import marshal
+        import signal
+        import socket
+        import time
+
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if request({"control": "status"}, path=self.path) is not None:
+            raise RuntimeError(f"A daemon is already listening on {self.path}")
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.path)
+        finally:
+            os.umask(umask)
+        server.listen(64)
+        server.settimeout(self.idle_timeout or None)
+        self.started = time.time()
+        print(f"pcb daemon {os.getpid()} listening on {self.path}", flush=True)
+
+        try:
+            while self.running:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    print(f"Exiting after {self.idle_timeout}s without a request", flush=True)
+                    break
+                with connection:
+                    connection.settimeout(None)
+                    try:
+                        _, fds, _, _ = socket.recv_fds(connection, 1, 3)
+                        data = b""
+                        while True:
+                            chunk = connection.recv(65536)
+                            if not chunk:
+                                break
+                            data += chunk
+                        response = self.handle(marshal.loads(data), fds)
+                        connection.sendall(marshal.dumps(response))
+                    except (OSError, EOFError, TypeError, ValueError) as e:
+                        print(f"Failed to serve a request: {e}", file=sys.stderr, flush=True)
+        finally:
+            server.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def handle(self, message: {}, fds: [int]) -> {}:
+        import time
+
+        try:
+            if message.get("control") == "stop":
+                self.running = False
+                return {"stopped": os.getpid()}
+            if message.get("control") == "status":
+                return {"pid": os.getpid(), "root": ROOT, "uptime": round(time.time() - self.started),
+                        "requests": self.requests, "modules": sorted(self.module_mtimes)}
+            # A caller from another checkout runs its own copy of the tools
+            if message.get("root") != ROOT or message.get("command") not in COMMANDS or len(fds) != 3:
+                return {}
+            self.requests += 1
+            return {"code": self.run_as_caller(message, fds)}
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def run_as_caller(self, message: {}, fds: [int]) -> int:
+        self.unload_changed_modules()
+        saved_fds = [os.dup(fd) for fd in (0, 1, 2)]
+        saved_env, saved_cwd, saved_stdin = dict(os.environ), os.getcwd(), sys.stdin
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+            sys.stdin = open(0, closefd=False)
+            os.environ.clear()
+            os.environ.update(message["env"])
+            os.chdir(message["cwd"])
+            return run(message["command"], message["args"])
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            sys.stdin.close()
+            sys.stdin = saved_stdin
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            for target, fd in enumerate(saved_fds):
+                os.dup2(fd, target)
+                os.close(fd)
+            self.module_mtimes.update(
+                {name: mtime for name, mtime in self.tool_module_mtimes().items() if name not in self.module_mtimes})
+
+
+def start_daemon(idle_timeout: float) -> int:
+    import subprocess
+    import time
+
+    status = request({"control": "status"})
+    if status is not None:
+        print(f"pcb daemon {status['pid']} is already running on {socket_path()}")
+        return 0
+    os.makedirs(os.path.dirname(socket_path()), mode=0o700, exist_ok=True)
+    log_path = os.path.splitext(socket_path())[0] + ".log"
+    with open(log_path, "a") as log, open(os.devnull) as devnull:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "daemon", "serve", "--idle-timeout",
+                                    str(idle_timeout)], stdin=devnull, stdout=log, stderr=log, start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            print(f"pcb daemon exited with code {process.returncode}, see {log_path}", file=sys.stderr)
+            return 1
+        if request({"control": "status"}) is not None:
+            print(f"pcb daemon {process.pid} listening on {socket_path()}")
+            return 0
+        time.sleep(0.05)
+    print(f"pcb daemon did not start listening within 30s, see {log_path}", file=sys.stderr)
+    return 1
+
+
+def daemon(args: [str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="pcb daemon", description="Manage the pcb daemon")
+    parser.add_argument("action", choices=["start", "stop", "status", "serve"],
+                        help="serve runs the daemon in the foreground")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="Exit after this many seconds without a request, 0 to never exit")
+    args = parser.parse_args(args)
+    if sys.version_info < (3, 9):
+        parser.exit(1, "The pcb daemon requires python 3.9 or later\n")
+
+    if args.action == "start":
+        return start_daemon(args.idle_timeout)
+    if args.action == "serve":
+        server = Daemon(socket_path(), args.idle_timeout)
+        server.preload()
+        try:
+            server.serve()
+        except RuntimeError as e:
+            parser.exit(1, f"{e}\n")
+        return 0
+
+    response = request({"control": args.action})
+    if response is None:
+        print(f"No pcb daemon is listening on {socket_path()}")
+        return 0 if args.action == "stop" else 1
+    if args.action == "stop":
+        print(f"Stopped pcb daemon {response['stopped']}")
+    else:
+        print(f"pcb daemon {response['pid']} listening on {socket_path()} for {response['root']}, up "
+              f"{response['uptime']}s, served {response['requests']} requests, "
+              f"{len(response['modules'])} tool modules loaded")
+    return 0
+
+
+def main():
+    args = sys.argv[1:]
+    use_daemon = True
+    if args and args[0] == "--no-daemon":
+        use_daemon = False
+        args = args[1:]
+
+    if not args or args[0] in ("-h", "--help"):
+        print(usage())
+        sys.exit(0 if args else 2)
+    if args[0] == "daemon":
+        sys.exit(daemon(args[1:]))
+    if args[0] not in COMMANDS:
+        print(f"{usage()}\n\npcb: unknown command '{args[0]}'", file=sys.stderr)
+        sys.exit(2)
+
+    code = run_in_daemon(args[0], args[1:]) if use_daemon else None
+    sys.exit(run(args[0], args[1:]) if code is None else code)
+
+
+if __name__ == "__main__":
+    main()
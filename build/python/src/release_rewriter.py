@@ -0,0 +1,299 @@
+import argparse
+import os
+import re as regex
+import subprocess
+from collections import defaultdict
+from dataclasses import dataclass
+
+# Constants
+ECR_REGISTRY = "public.ecr.aws/r2h3l6e4/"
+K8S_CONFIGS_DIR = "k8s-configs/"
+
+# An ECR image reference split into its path up to the product, the product, an optional /dev segment and the tag
+IMAGE_REF_REGEX = regex.compile(
+    rb"(" + regex.escape(ECR_REGISTRY.encode()) + rb"(?:[^\s\"':@/]+/)*?)([^\s\"':@/]+)(/dev)?:([^\s\"'@]+)")
+
+# Assignments of the env vars that carry a release version
+VERSIONED_VAR_REGEX = regex.compile(
+    rb"^(SERVER_PROFILE_BRANCH|ECR_ENV|DASH_REPO_BRANCH|[A-Z0-9_]+_IMAGE_TAG)=([^\r\n]*)$", regex.MULTILINE)
+
+RELEASE_BRANCH_REGEX = regex.compile(r"^(v[0-9]+\.[0-9]+)-release-branch.*")
+RELEASE_TAG_REGEX = regex.compile(r"^(v[0-9]+\.[0-9]{2})(\..*)")
+
+
+@dataclass
+class Reference:
+    """A versioned reference found in a tracked file"""
+
+    path: str
+    line: int
+    start: int
+    end: int
+    kind: str
+    name: str
+    value: str
+    dev: bool = False
+    repository: str = None
+
+
+@dataclass
+class Change:
+    path: str
+    line: int
+    old: str
+    new: str
+    start: int
+    end: int
+    replacement: str
+
+
+def image_tag_var(image):
+    """The env var holding the default tag of an image, e.g. PINGACCESS_WAS_IMAGE_TAG for pingaccess-was"""
+    return image.replace("-", "_").upper() + "_IMAGE_TAG"
+
+
+def dash_branch(ref):
+    """
+        The dashboards repo branch of a ping-cloud-base ref. A release branch maps to the dev branch of the release,
+        e.g. v1.17-release-branch to v1.17-dev-branch, and a tag to the release branch, e.g. v1.17.0.0 to
+        v1.17-release-branch. This holds as long as release branches are named v#.##-release-branch and tags v#.##.*
+    """
+    branch = RELEASE_BRANCH_REGEX.sub(r"\1-dev-branch", ref)
+    return RELEASE_TAG_REGEX.sub(r"\1-release-branch", branch)
+
+
+def tracked_files(root):
+    output = subprocess.run(["git", "ls-files", "-z"], cwd=root, check=True, stdout=subprocess.PIPE).stdout
+    return [path.decode() for path in output.split(b"\0") if path]
+
+
+def scan_file(path, content):
+    """
+        Find every ECR image reference and versioned env var assignment in a file.
+
+        Arguments
+        ----------
+        path: string
+            Path of the file relative to the repository root
+        content: bytes
+            Content of the file
+
+        Return a list of references. The span of an image reference covers its optional /dev segment and its tag.
+    """
+    references = []
+    line_starts = None
+
+    def line_of(offset):
+        nonlocal line_starts
+        if line_starts is None:
+            line_starts = [0] + [m.end() for m in regex.finditer(rb"\n", content)]
+        low, high = 0, len(line_starts)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if line_starts[middle] <= offset:
+                low = middle
+            else:
+                high = middle
+        return low + 1
+
+    if ECR_REGISTRY.encode() in content:
+        for match in IMAGE_REF_REGEX.finditer(content):
+            prefix, product = match.group(1).decode(), match.group(2).decode()
+            references.append(Reference(
+                path, line_of(match.start()), match.end(2), match.end(4), "image", product, match.group(4).decode(),
+                dev=match.group(3) is not None, repository=prefix[len(ECR_REGISTRY):] + product))
+
+    if b"=" in content:
+        for match in VERSIONED_VAR_REGEX.finditer(content):
+            references.append(Reference(path, line_of(match.start()), match.start(2), match.end(2), "var",
+                                        match.group(1).decode(), match.group(2).decode()))
+    return references
+
+
+def build_index(root, paths=None):
+    """
+        Read every tracked file once and index its versioned references.
+
+        Return a dict of path to the list of its references, for the files that have any.
+    """
+    index = {}
+    for path in paths if paths is not None else tracked_files(root):
+        full_path = os.path.join(root, path)
+        if not os.path.isfile(full_path) or os.path.islink(full_path):
+            continue
+        with open(full_path, "rb") as file:
+            content = file.read()
+        if b"\0" in content:
+            continue
+        references = scan_file(path, content)
+        if references:
+            index[path] = references
+    return index
+
+
+class ReleaseRewriter:
+    """Rewrite the version references of a source ref into those of a target ref, from an index of the tree"""
+
+    def __init__(self, index, source_ref, target_ref, ref_type, images):
+        """
+            Arguments
+            ----------
+            index: dict
+                Path to its references, as built by build_index
+            source_ref: string
+                Ref the tree is checked out at, e.g. v1.14-release-branch
+            target_ref: string
+                Ref to create, e.g. v1.15-release-branch or v1.14.0.0_RC1
+            ref_type: string
+                Either "branch" or "tag"
+            images: list
+                Products whose image tags are rewritten, e.g. pingaccess
+        """
+        self.index = index
+        self.source_ref = source_ref
+        self.target_ref = target_ref
+        self.ref_type = ref_type
+        self.images = list(images)
+
+    def image_repositories(self):
+        """Return a dict of product to the ECR repository of its first reference under k8s-configs"""
+        repos = {}
+        for path, references in sorted(self.index.items()):
+            if not path.startswith(K8S_CONFIGS_DIR):
+                continue
+            for reference in references:
+                if reference.kind == "image" and reference.name in self.images:
+                    repos.setdefault(reference.name, reference.repository)
+        return repos
+
+    def resolve_target_tags(self, latest_tags=None):
+        """
+            The target tag of every image. A branch uses its own latest tag. A tag uses the latest image of the
+            release in ECR, unless given in latest_tags.
+
+            Return a dict of product to its target tag.
+        """
+        if self.ref_type == "branch":
+            return {image: f"{self.target_ref}-latest" for image in self.images}
+
+        targets = dict(latest_tags or {})
+        repos = self.image_repositories()
+        missing = {image: repos[image] for image in self.images if image not in targets and image in repos}
+        if missing:
+            from get_latest_image import LatestImageManager
+
+            repositories = sorted(set(missing.values()))
+            latest = LatestImageManager(self.target_ref, repositories[0]).get_latest_images(repositories)
+            for image, repository in missing.items():
+                if isinstance(latest[repository], Exception):
+                    raise Exception(f"Unable to find the latest image of {repository}: {latest[repository]}")
+                targets[image] = latest[repository]
+        unresolved = [image for image in self.images if image not in targets]
+        if unresolved:
+            raise Exception(f"No ECR repository found under {K8S_CONFIGS_DIR} for: {', '.join(unresolved)}")
+        return targets
+
+    def var_rules(self, target_tags):
+        """Return a dict of env var to its (source value, target value)"""
+        source_tag = f"{self.source_ref}-latest"
+        rules = {image_tag_var(image): (source_tag, target_tags[image]) for image in self.images}
+        rules["SERVER_PROFILE_BRANCH"] = (self.source_ref, self.target_ref)
+        target_value = self.target_ref if self.ref_type == "tag" else f"{self.target_ref}-latest"
+        rules["DASH_REPO_BRANCH"] = (dash_branch(source_tag), dash_branch(target_value))
+        if self.ref_type == "tag":
+            rules["ECR_ENV"] = ("/dev", "")
+        return rules
+
+    def plan(self, target_tags):
+        """
+            Compute every replacement without touching the files.
+
+            Return a list of changes, ordered by path and position.
+        """
+        source_tag = f"{self.source_ref}-latest"
+        var_rules = self.var_rules(target_tags)
+        changes = []
+        for path in sorted(self.index):
+            for reference in self.index[path]:
+                if reference.kind == "var":
+                    source, target = var_rules.get(reference.name, (None, None))
+                    if source is not None and reference.value == source and source != target:
+                        changes.append(Change(path, reference.line, f"{reference.name}={source}",
+                                              f"{reference.name}={target}", reference.start, reference.end, target))
+                elif path.startswith(K8S_CONFIGS_DIR) and reference.name in target_tags and reference.dev:
+                    tag = target_tags[reference.name] if reference.value == source_tag else reference.value
+                    # A tag points at the production repository, which drops the /dev segment
+                    replacement = f"{'' if self.ref_type == 'tag' else '/dev'}:{tag}"
+                    if replacement != f"/dev:{reference.value}":
+                        changes.append(Change(path, reference.line, f"{reference.name}/dev:{reference.value}",
+                                              reference.name + replacement, reference.start, reference.end,
+                                              replacement))
+        changes.sort(key=lambda change: (change.path, change.start))
+        return changes
+
+
+def apply_changes(root, changes):
+    """Write all the changes of each file in a single pass over its content"""
+    by_path = defaultdict(list)
+    for change in changes:
+        by_path[change.path].append(change)
+
+    for path, file_changes in by_path.items():
+        full_path = os.path.join(root, path)
+        with open(full_path, "rb") as file:
+            content = file.read()
+        parts = []
+        position = 0
+        for change in sorted(file_changes, key=lambda c: c.start):
+            parts += [content[position:change.start], change.replacement.encode()]
+            position = change.end
+        parts.append(content[position:])
+        with open(full_path, "wb") as file:
+            file.write(b"".join(parts))
+
+
+def print_summary(changes, dry_run):
+    for change in changes:
+        print(f"{change.path}:{change.line}: {change.old} -> {change.new}")
+    files = len({change.path for change in changes})
+    print(f"{'Would make' if dry_run else 'Made'} {len(changes)} changes in {files} files")
+
+
+def parse_image_tags(values):
+    tags = {}
+    for value in values:
+        image, sep, tag = value.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected IMAGE=TAG: {value}")
+        tags[image] = tag
+    return tags
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rewrite the image tags, image repositories and versioned env vars of a source ref into those of "
+                    "a target ref, reading and writing every tracked file at most once")
+    parser.add_argument("source_ref", help="Source ref, e.g. v1.14-release-branch")
+    parser.add_argument("target_ref", help="Target ref, e.g. v1.15-release-branch or v1.14.0.0_RC1")
+    parser.add_argument("ref_type", choices=["branch", "tag"], help="Type of the target ref")
+    parser.add_argument("--root", default=".", help="Root of the ping-cloud-base repository")
+    parser.add_argument("--image", action="append", default=[], required=True, help="Product image to rewrite")
+    parser.add_argument("--image-tag", action="append", default=[],
+                        help="Target tag of a product as IMAGE=TAG, instead of looking it up in ECR")
+    parser.add_argument("--dry-run", action="store_true", help="Print the changes without writing them")
+    args = parser.parse_args()
+
+    try:
+        latest_tags = parse_image_tags(args.image_tag)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    rewriter = ReleaseRewriter(build_index(args.root), args.source_ref, args.target_ref, args.ref_type, args.image)
+    changes = rewriter.plan(rewriter.resolve_target_tags(latest_tags))
+    if not args.dry_run:
+        apply_changes(args.root, changes)
+    print_summary(changes, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,13 @@ def set_up_logger(name):
 
 logger = set_up_logger(__name__)
 
+# Variables that select the AWS credentials and the region of a session
+AWS_CREDENTIALS_VARS = ["AWS_PROFILE", "AWS_ACCESS_KEY_ID", "AWS_SESSION_TOKEN", "AWS_ROLE_ARN",
+                        "AWS_WEB_IDENTITY_TOKEN_FILE", "AWS_REGION", "AWS_DEFAULT_REGION"]
+
+# Validated sessions by the values of AWS_CREDENTIALS_VARS
+_boto_sessions = {}
+
 
 def get_branch(root_dir) -> str:
     """
@@ -37,13 +44,19 @@ def get_boto_session() -> boto3.session.Session:
     """
     Gets a boto3 session depending on whether we are running in a local
     environment or in Gitlab. Validates the session before returning it.
+    A session is validated once per process for the same credentials, so
+    that a long-lived process, e.g. the pcb daemon, does not call STS again
+    on every call.
 
     Returns:
         boto3 session: A valid boto3 session for the environment (gitlab or local)
     """
-    session = boto3.session.Session()
-    check_boto_session(session)
-    return session
+    key = tuple(os.environ.get(name) for name in AWS_CREDENTIALS_VARS)
+    if key not in _boto_sessions:
+        session = boto3.session.Session()
+        check_boto_session(session)
+        _boto_sessions[key] = session
+    return _boto_sessions[key]
 
 
 def check_boto_session(boto_session) -> None:
@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+from types import ModuleType
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pcb import unload_modules  # noqa: E402
+
+
+def fake_module(name: str, **attributes) -> ModuleType:
+    module = ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+class TestUnloadModules(unittest.TestCase):
+    def setUp(self):
+        class Client:
+            pass
+
+        Client.__module__ = "pcb_test_common"
+        self.common = fake_module("pcb_test_common", Client=Client)
+        # Imports the module: 'import pcb_test_common'
+        self.module_importer = fake_module("pcb_test_module_importer", pcb_test_common=self.common)
+        # Imports a name from it: 'from pcb_test_common import Client'
+        self.name_importer = fake_module("pcb_test_name_importer", Client=Client)
+        # Imports an importer: 'import pcb_test_name_importer'
+        self.indirect_importer = fake_module("pcb_test_indirect_importer", importer=self.name_importer)
+        self.unrelated = fake_module("pcb_test_unrelated", Client=object)
+
+    def tearDown(self):
+        for name in [name for name in sys.modules if name.startswith("pcb_test_")]:
+            del sys.modules[name]
+
+    def test_importers_are_unloaded(self):
+        unloaded = unload_modules(["pcb_test_common"])
+
+        self.assertEqual(["pcb_test_common", "pcb_test_indirect_importer", "pcb_test_module_importer",
+                          "pcb_test_name_importer"], sorted(unloaded))
+        for name in unloaded:
+            self.assertNotIn(name, sys.modules)
+        self.assertIs(self.unrelated, sys.modules["pcb_test_unrelated"])
+
+    def test_modules_that_are_not_loaded_are_ignored(self):
+        self.assertEqual([], unload_modules(["pcb_test_missing"]))
+        self.assertIn("pcb_test_common", sys.modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
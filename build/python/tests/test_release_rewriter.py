@@ -0,0 +1,200 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from types import ModuleType
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from release_rewriter import (  # noqa: E402
+    ReleaseRewriter, apply_changes, build_index, dash_branch, image_tag_var, main, parse_image_tags, print_summary,
+    scan_file,
+)
+
+ECR = "public.ecr.aws/r2h3l6e4/pingcloud-apps"
+
+FILES = {
+    "k8s-configs/ping-cloud/base/pingaccess/engine.yaml": "\n".join([
+        "spec:",
+        f"  - image: {ECR}/pingaccess/dev:v1.14-release-branch-latest",
+        f"  - image: {ECR}/enrichment-bootstrap/dev:v1.14-release-branch-latest",
+        f"  - image: {ECR}/pingaccess/dev:v1.13.0.0 # pinned",
+        "",
+    ]),
+    "code-gen/templates/env_vars": "\n".join([
+        "SERVER_PROFILE_BRANCH=v1.14-release-branch",
+        "ECR_ENV=/dev",
+        "DASH_REPO_BRANCH=v1.14-dev-branch",
+        "PINGACCESS_IMAGE_TAG=v1.14-release-branch-latest",
+        "OTHER_VAR=v1.14-release-branch",
+        "",
+    ]),
+    # Image references outside of k8s-configs are left alone
+    "docs/images.md": f"See {ECR}/pingaccess/dev:v1.14-release-branch-latest\n",
+}
+
+
+class RepoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.root = self.work_dir.name
+        for path, content in FILES.items():
+            os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+            with open(os.path.join(self.root, path), "w") as file:
+                file.write(content)
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def read(self, path: str) -> str:
+        with open(os.path.join(self.root, path)) as file:
+            return file.read()
+
+    def rewriter(self, target_ref: str, ref_type: str, images: [str] = ("pingaccess",)) -> ReleaseRewriter:
+        return ReleaseRewriter(build_index(self.root, list(FILES)), "v1.14-release-branch", target_ref, ref_type,
+                               images)
+
+
+class TestHelpers(unittest.TestCase):
+    def test_image_tag_var(self):
+        self.assertEqual("PINGACCESS_WAS_IMAGE_TAG", image_tag_var("pingaccess-was"))
+
+    def test_dash_branch(self):
+        self.assertEqual("v1.17-dev-branch", dash_branch("v1.17-release-branch-latest"))
+        self.assertEqual("v1.17-release-branch", dash_branch("v1.17.0.0"))
+        self.assertEqual("main", dash_branch("main"))
+
+    def test_parse_image_tags(self):
+        self.assertEqual({"pingaccess": "v1.14.0.0"}, parse_image_tags(["pingaccess=v1.14.0.0"]))
+        with self.assertRaises(Exception):
+            parse_image_tags(["pingaccess"])
+
+
+class TestScanFile(unittest.TestCase):
+    def test_image_references(self):
+        content = f"a: 1\nimage: {ECR}/pingaccess/dev:v1.14-latest\nimage: {ECR}/pingfederate:v1.14.0.0\n".encode()
+
+        references = scan_file("engine.yaml", content)
+
+        self.assertEqual([("pingaccess", "v1.14-latest", True, 2, "pingcloud-apps/pingaccess"),
+                          ("pingfederate", "v1.14.0.0", False, 3, "pingcloud-apps/pingfederate")],
+                         [(r.name, r.value, r.dev, r.line, r.repository) for r in references])
+        # The span covers the /dev segment and the tag
+        self.assertEqual(b"/dev:v1.14-latest", content[references[0].start:references[0].end])
+
+    def test_versioned_vars(self):
+        references = scan_file("env_vars", b"ECR_ENV=/dev\nOTHER=1\nPINGACCESS_IMAGE_TAG=v1.14-latest\n")
+
+        self.assertEqual([("ECR_ENV", "/dev", 1), ("PINGACCESS_IMAGE_TAG", "v1.14-latest", 3)],
+                         [(r.name, r.value, r.line) for r in references])
+
+
+class TestReleaseRewriter(RepoTestCase):
+    def test_branch(self):
+        rewriter = self.rewriter("v1.15-release-branch", "branch")
+        changes = rewriter.plan(rewriter.resolve_target_tags())
+
+        self.assertEqual([
+            ("code-gen/templates/env_vars", 1, "SERVER_PROFILE_BRANCH=v1.15-release-branch"),
+            ("code-gen/templates/env_vars", 3, "DASH_REPO_BRANCH=v1.15-dev-branch"),
+            ("code-gen/templates/env_vars", 4, "PINGACCESS_IMAGE_TAG=v1.15-release-branch-latest"),
+            ("k8s-configs/ping-cloud/base/pingaccess/engine.yaml", 2, "pingaccess/dev:v1.15-release-branch-latest"),
+        ], [(change.path, change.line, change.new) for change in changes])
+
+    def test_tag(self):
+        rewriter = self.rewriter("v1.14.0.0", "tag")
+        changes = rewriter.plan(rewriter.resolve_target_tags({"pingaccess": "v1.14.0.0_RC2"}))
+        apply_changes(self.root, changes)
+
+        self.assertEqual("\n".join([
+            "SERVER_PROFILE_BRANCH=v1.14.0.0",
+            "ECR_ENV=",
+            "DASH_REPO_BRANCH=v1.14-release-branch",
+            "PINGACCESS_IMAGE_TAG=v1.14.0.0_RC2",
+            "OTHER_VAR=v1.14-release-branch",
+            "",
+        ]), self.read("code-gen/templates/env_vars"))
+        # A tag drops the /dev segment of every image, and keeps the tags that are not the source's latest
+        self.assertEqual("\n".join([
+            "spec:",
+            f"  - image: {ECR}/pingaccess:v1.14.0.0_RC2",
+            f"  - image: {ECR}/enrichment-bootstrap/dev:v1.14-release-branch-latest",
+            f"  - image: {ECR}/pingaccess:v1.13.0.0 # pinned",
+            "",
+        ]), self.read("k8s-configs/ping-cloud/base/pingaccess/engine.yaml"))
+        self.assertEqual(FILES["docs/images.md"], self.read("docs/images.md"))
+
+    def test_tag_looks_up_the_latest_images_once(self):
+        calls = []
+
+        class FakeLatestImageManager:
+            def __init__(self, tag: str, repository: str):
+                calls.append(("init", tag, repository))
+
+            def get_latest_images(self, repositories: [str]) -> {}:
+                calls.append(("get_latest_images", repositories))
+                return {"pingcloud-apps/pingaccess": "v1.14.0.0_RC3"}
+
+        fake_module = ModuleType("get_latest_image")
+        fake_module.LatestImageManager = FakeLatestImageManager
+        with mock.patch.dict(sys.modules, {"get_latest_image": fake_module}):
+            target_tags = self.rewriter("v1.14.0.0", "tag").resolve_target_tags()
+
+        self.assertEqual({"pingaccess": "v1.14.0.0_RC3"}, target_tags)
+        self.assertEqual([("init", "v1.14.0.0", "pingcloud-apps/pingaccess"),
+                          ("get_latest_images", ["pingcloud-apps/pingaccess"])], calls)
+
+    def test_image_without_a_repository(self):
+        with self.assertRaisesRegex(Exception, "No ECR repository found under k8s-configs/ for: pingfederate"):
+            self.rewriter("v1.14.0.0", "tag", ["pingfederate"]).resolve_target_tags()
+
+    def test_print_summary(self):
+        rewriter = self.rewriter("v1.15-release-branch", "branch")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            print_summary(rewriter.plan(rewriter.resolve_target_tags()), dry_run=True)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual("code-gen/templates/env_vars:1: SERVER_PROFILE_BRANCH=v1.14-release-branch -> "
+                         "SERVER_PROFILE_BRANCH=v1.15-release-branch", lines[0])
+        self.assertEqual("Would make 4 changes in 2 files", lines[-1])
+
+
+class TestMain(RepoTestCase):
+    def setUp(self):
+        super().setUp()
+        subprocess.run(["git", "init", "-q", self.root], check=True)
+        subprocess.run(["git", "-C", self.root, "add", "code-gen", "k8s-configs"], check=True)
+
+    def main(self, *args: str) -> str:
+        output = io.StringIO()
+        with mock.patch.object(sys, "argv", ["release_rewriter.py", *args]), redirect_stdout(output):
+            main()
+        return output.getvalue()
+
+    def test_dry_run_writes_nothing(self):
+        output = self.main("v1.14-release-branch", "v1.15-release-branch", "branch", "--root", self.root,
+                           "--image", "pingaccess", "--dry-run")
+
+        self.assertTrue(output.endswith("Would make 4 changes in 2 files\n"))
+        for path, content in FILES.items():
+            self.assertEqual(content, self.read(path))
+
+    def test_only_tracked_files_are_rewritten(self):
+        with open(os.path.join(self.root, "k8s-configs", "untracked.yaml"), "w") as file:
+            file.write(f"image: {ECR}/pingaccess/dev:v1.14-release-branch-latest\n")
+
+        output = self.main("v1.14-release-branch", "v1.14.0.0", "tag", "--root", self.root, "--image", "pingaccess",
+                           "--image-tag", "pingaccess=v1.14.0.0_RC2")
+
+        self.assertTrue(output.endswith("Made 6 changes in 2 files\n"))
+        self.assertIn("/dev:", self.read("k8s-configs/untracked.yaml"))
+        self.assertIn("/dev:", self.read("docs/images.md"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,21 +11,6 @@ usage() {
   echo "    REF_TYPE => the target ref type - tag or branch"
 }
 
-########################################################################################################################
-# Gets a product image's repo
-# Arguments:
-#   ${1} -> the product to search for (Ex: "pingaccess")
-########################################################################################################################
-get_image_repo() {
-  local image=${1}
-
-  repo=$(git grep -h "image: public.ecr.aws/r2h3l6e4/.*/${image}" | head -n 1)
-  repo=$(echo "${repo}" | sed "s|image: public.ecr.aws/r2h3l6e4/||g")
-  repo="${repo%"/${image}"*}"
-
-  echo "${repo}"
-}
-
 ########################################################################################################################
 # Replaces the current version references in the source ref with the target ref in all the necessary places. Then,
 # commits the changes into the target ref(branch or tag). Must be in the ping-cloud-base directory for it to work
@@ -37,11 +22,9 @@ get_image_repo() {
 #   ${3} -> The ref type- tag or branch
 ########################################################################################################################
 replace_and_commit() {
-  local source_value=${1}
-  local target_value=${2}
+  local source_ref=${1}
+  local target_ref=${2}
   local ref_value=${3}
-  local source_dash_branch
-  local target_dash_branch
 
   local image_map=(
     "pingaccess"
@@ -68,79 +51,23 @@ replace_and_commit() {
     "sigsci-agent"
   )
 
-  for image in ${image_map[@]}; do
-    image_tag_var="$(echo "${image}" | tr '-' '_' | tr '[:lower:]' '[:upper:]')_IMAGE_TAG"
-    image_repo=$(get_image_repo ${image} | xargs)
-
-    echo ---
-    echo "Changing values for ${image_repo}/${image} in expected files"
-
-    if test "${ref_value}" = 'tag'; then
-      # If tag, search registry for latest image version
-      target_image=$(python3 "${PWD_DIR}"/python/src/get_latest_image.py "${image_repo}/${image}" ${target_value})
-    else
-      # If branch, use target value
-      target_image="${target_value}"
-    fi
-
-    # update base env vars
-    grep_var "${image_tag_var}" "${source_value}" "${target_image}"
-
-    # update k8s yaml files
-    grep_yaml "${image}" "${source_value}" "${target_image}" "${ref_value}"
+  local image_args=()
+  for image in "${image_map[@]}"; do
+    image_args+=(--image "${image}")
   done
 
-# Getting source and tagret branch for dashboards repo. Current development release branch becomes $release-dev-branch
-# and current tag becomes $release-release-branch. E.g. v1.17-release-branch becomes v1.17-dev-branch and v1.17.0 becomes
-# v1.17-release-branch for dashboard repo
-# Regex will work until release branch will be v#.##-release-branch and tag will be v#.##.* since it replaces one of two
-# expressions:
-# 1) ^(v[[:digit:]]+\.[[:digit:]]+)-release-branch.*
-# 2) ^(v[[:digit:]]+\.[[:digit:]]{2})(\..*)
-# Round brackets here used for grouping, so sed can replace only needed group.
-# At perl regex these expressions should be:
-# 1) ^(v\d+\.\d+)-release-branch.*
-# 2) ^(v\d+\.\d{2})(\..*)
-  source_dash_branch=$(echo "${source_value}"|sed -r 's/^(v[[:digit:]]+\.[[:digit:]]+)-release-branch.*/\1-dev-branch/;s/^(v[[:digit:]]+\.[[:digit:]]{2})(\..*)/\1-release-branch/g')
-  target_dash_branch=$(echo "${target_value}"|sed -r 's/^(v[[:digit:]]+\.[[:digit:]]+)-release-branch.*/\1-dev-branch/;s/^(v[[:digit:]]+\.[[:digit:]]{2})(\..*)/\1-release-branch/g')
-
-  grep_var "DASH_REPO_BRANCH" "${source_dash_branch}" "${target_dash_branch}"
+  # Index every versioned reference of the tracked files in one pass and rewrite each file at most once. This updates
+  # SERVER_PROFILE_BRANCH, DASH_REPO_BRANCH, the *_IMAGE_TAG variables and the k8s yaml image tags. For a tag, it also
+  # looks up the latest image of the release in ECR, removes the /dev suffix from ECR_ENV and points the k8s yaml
+  # images at the prod ECR paths.
+  echo ---
+  echo "Changing ${source_ref} -> ${target_ref} references"
+  python3 "${PWD_DIR}"/python/src/release_rewriter.py "${source_ref}" "${target_ref}" "${ref_value}" "${image_args[@]}"
 
   echo ---
-  echo "Committing changes for new ${ref_value} ${target_value}"
+  echo "Committing changes for new ${ref_value} ${target_ref}"
   git add .
-  git commit -m "[skip pipeline] - creating new ${ref_value} ${target_value}"
-}
-
-grep_var() {
-  local var=${1}
-  local source_value=${2}
-  local target_value=${3}
-
-  echo "Changing ${var}=${source_value} -> ${var}=${target_value} in base env vars"
-
-  git grep -l "^${var}=${source_value}" | xargs sed -i.bak "s/^\(${var}=\)${source_value}$/\1${target_value}/g"
-}
-
-grep_yaml() {
-  local var=${1}
-  local source_value=${2}
-  local target_value=${3}
-  local ref_value=${4}
-
-  local dev_ecr_path="image: public.ecr.aws/r2h3l6e4/.*/${var}/dev"
-
-  echo "Changing ${var}:${source_value} -> ${var}:${target_value} in k8s yaml files"
-
-  cd "${SANDBOX}"/ping-cloud-base/k8s-configs
-  git grep -l "${dev_ecr_path}:${source_value}" | xargs sed -i.bak "s/${var}\/dev:${source_value}/${var}\/dev:${target_value}/g"
-
-  if test "${ref_value}" = 'tag'; then
-    # update the ecr path to prod from dev
-    git grep -l "${dev_ecr_path}" | xargs sed -i.bak "s/${var}\/dev:/${var}:/g"
-  fi
-
-  cd "${SANDBOX}"/ping-cloud-base/
+  git commit -m "[skip pipeline] - creating new ${ref_value} ${target_ref}"
 }
 
 ########################################################################################################################
@@ -213,25 +140,13 @@ if test "${REF_TYPE}" = 'branch'; then
   # Create and checkout to target branch
   git checkout -b "${TARGET_REF}"
 
-  # Update 'SERVER_PROFILE_BRANCH' variable
-  echo "Changing ${SOURCE_REF} -> ${TARGET_REF} in SERVER_PROFILE_BRANCH variable"
-  git grep -l "^SERVER_PROFILE_BRANCH=${SOURCE_REF}" | xargs sed -i.bak "s/^\(SERVER_PROFILE_BRANCH=\)${SOURCE_REF}$/\1${TARGET_REF}/g"
-
-  # Update 'base/env_vars' image tags and yaml files
-  replace_and_commit "${SOURCE_REF}-latest" "${TARGET_REF}-latest" "${REF_TYPE}"
+  # Update 'SERVER_PROFILE_BRANCH' variable, 'base/env_vars' image tags and yaml files
+  replace_and_commit "${SOURCE_REF}" "${TARGET_REF}" "${REF_TYPE}"
 
 elif test "${REF_TYPE}" = 'tag'; then
-  # Update 'SERVER_PROFILE_BRANCH' variable
-  echo "Changing ${SOURCE_REF} -> ${TARGET_REF} in SERVER_PROFILE_BRANCH variable"
-  git grep -l "^SERVER_PROFILE_BRANCH=${SOURCE_REF}" | xargs sed -i.bak "s/^\(SERVER_PROFILE_BRANCH=\)${SOURCE_REF}$/\1${TARGET_REF}/g"
-
-  # Update 'ECR_ENV' variable
-  echo "Changing ECR_ENV variable "
-  git grep -l "^ECR_ENV=/dev" | xargs sed -i.bak "s/\/dev//g"
-
-  # Update 'base/env_vars' image tags and yaml files
+  # Update 'SERVER_PROFILE_BRANCH' and 'ECR_ENV' variables, 'base/env_vars' image tags and yaml files
   pip3 install -r "${PWD_DIR}"/python/requirements.txt > /dev/null
-  replace_and_commit "${SOURCE_REF}-latest" "${TARGET_REF}" "${REF_TYPE}"
+  replace_and_commit "${SOURCE_REF}" "${TARGET_REF}" "${REF_TYPE}"
 
   # Verify no dev image paths in repo
   verify_k8s_image_repositories
@@ -30,6 +30,8 @@ fi
 if test "${CI_COMMIT_REF_SLUG}" = 'master' || test "${DELETE_ENV_AFTER_PIPELINE}" = 'false'; then
   log "Not deleting environment ${PING_CLOUD_NAMESPACE}"
   log "Not deleting PingCentral database ${MYSQL_DATABASE} from host ${MYSQL_SERVICE_HOST}"
+  # Hold the cluster for as long as the cluster-in-use-lock namespace exists, instead of until the lease expires
+  keep_cluster_lock
   exit 0
 fi
 
@@ -51,4 +53,7 @@ if kubectl get ns cluster-in-use-lock > /dev/null 2>&1; then
   # Finally, delete the cluster-in-use-lock namespace. Do this last so that the cluster is clear for use by the next branch
   log "cluster-in-use-lock namespace synchronously deleting (will exit when done)"
   kubectl delete ns cluster-in-use-lock
-fi
\ No newline at end of file
+fi
+
+# Then release the lease with which find_cluster.sh claimed the cluster, which notifies the pipelines waiting for one
+release_cluster_lock
\ No newline at end of file
@@ -238,16 +238,94 @@ configure_kube() {
 
   log "Configuring KUBE"
 
+  add_kube_context "${SELECTED_KUBE_NAME}"
+  kubectl config use-context "${SELECTED_KUBE_NAME}"
+
+  # Keep the cluster claimed by find_cluster.sh for as long as the jobs of the pipeline use it
+  renew_cluster_lock
+}
+
+########################################################################################################################
+# Adds a kube config context for a ci-cd cluster, named like the cluster, without switching to it.
+#
+# Arguments
+#   ${1} -> The cluster name
+########################################################################################################################
+add_kube_context() {
   # Use AWS profile 'default' because this is the profile the AWS Access Key/Secret key go under in the 'configure_aws'
   # function. This profile then assumes the role specified by $AWS_ACCOUNT_ROLE_ARN, within the kube config.
   aws eks update-kubeconfig \
     --profile "default" \
     --role-arn "${AWS_ACCOUNT_ROLE_ARN}" \
-    --alias "${SELECTED_KUBE_NAME}" \
-    --name "${SELECTED_KUBE_NAME}" \
+    --alias "${1}" \
+    --name "${1}" \
     --region us-west-2
+}
 
-  kubectl config use-context "${SELECTED_KUBE_NAME}"
+########################################################################################################################
+# Renews the Lease default/cluster-in-use-lock with which find_cluster.sh claimed the current cluster, if it is still
+# held by ${CLUSTER_LOCK_HOLDER}, so that it does not expire while the pipeline uses the cluster. Does nothing if
+# CLUSTER_LOCK_HOLDER is not set, e.g. for a cluster claimed with the cluster-in-use-lock namespace only.
+########################################################################################################################
+renew_cluster_lock() {
+  test -z "${CLUSTER_LOCK_HOLDER}" && return 0
+
+  if ! patch_cluster_lock "${CLUSTER_LOCK_HOLDER}"; then
+    log "WARN: Could not renew the cluster-in-use-lock lease of ${CLUSTER_LOCK_HOLDER} on ${SELECTED_KUBE_NAME}"
+  fi
+  return 0
+}
+
+########################################################################################################################
+# Releases the Lease default/cluster-in-use-lock of the current cluster, if it is still held by ${CLUSTER_LOCK_HOLDER},
+# by clearing its holder. The pipelines waiting in find_cluster.sh are notified of the release right away.
+########################################################################################################################
+release_cluster_lock() {
+  test -z "${CLUSTER_LOCK_HOLDER}" && return 0
+
+  if patch_cluster_lock ""; then
+    log "Released the cluster-in-use-lock lease of ${CLUSTER_LOCK_HOLDER} on ${SELECTED_KUBE_NAME}"
+  else
+    log "The cluster-in-use-lock lease on ${SELECTED_KUBE_NAME} is not held by ${CLUSTER_LOCK_HOLDER}"
+  fi
+  return 0
+}
+
+########################################################################################################################
+# Marks the Lease default/cluster-in-use-lock of the current cluster as kept, if it is still held by
+# ${CLUSTER_LOCK_HOLDER}, for a pipeline that does not delete its environment. find_cluster.sh does not reclaim a kept
+# lease when it expires, only once the cluster-in-use-lock namespace has been deleted.
+########################################################################################################################
+keep_cluster_lock() {
+  test -z "${CLUSTER_LOCK_HOLDER}" && return 0
+
+  if kubectl patch lease cluster-in-use-lock -n default --type=json -p "[
+    {\"op\": \"test\", \"path\": \"/spec/holderIdentity\", \"value\": \"${CLUSTER_LOCK_HOLDER}\"},
+    {\"op\": \"add\", \"path\": \"/metadata/annotations\", \"value\": {\"cluster-in-use-lock/kept\": \"true\"}}
+  ]" > /dev/null 2>&1; then
+    log "Kept the cluster-in-use-lock lease of ${CLUSTER_LOCK_HOLDER} on ${SELECTED_KUBE_NAME} until the namespace is deleted"
+  else
+    log "WARN: Could not keep the cluster-in-use-lock lease of ${CLUSTER_LOCK_HOLDER} on ${SELECTED_KUBE_NAME}"
+  fi
+  return 0
+}
+
+########################################################################################################################
+# Sets the holder and the renew time of the cluster-in-use-lock lease, only if ${CLUSTER_LOCK_HOLDER} still holds it.
+# The holder is checked and updated in one JSON patch, so a lease that expired and was claimed by another pipeline is
+# left alone.
+#
+# Arguments
+#   ${1} -> The new holder, empty to release the lease
+########################################################################################################################
+patch_cluster_lock() {
+  local now=$(date -u +%Y-%m-%dT%H:%M:%S.000000Z)
+
+  kubectl patch lease cluster-in-use-lock -n default --type=json -p "[
+    {\"op\": \"test\", \"path\": \"/spec/holderIdentity\", \"value\": \"${CLUSTER_LOCK_HOLDER}\"},
+    {\"op\": \"replace\", \"path\": \"/spec/holderIdentity\", \"value\": \"${1}\"},
+    {\"op\": \"replace\", \"path\": \"/spec/renewTime\", \"value\": \"${now}\"}
+  ]" > /dev/null 2>&1
 }
 
 ########################################################################################################################
@@ -397,51 +475,20 @@ skipTest() {
 }
 
 ########################################################################################################################
-# Search for password regex pattern within log file.
+# Search the last 60min of logs of servers for the values of their password environment variables. The logs of all
+# servers are streamed and scanned concurrently, and each line containing a password is reported with the password
+# redacted.
 #
 # Arguments
-#   ${1} -> Name of server
-#   ${2} -> Regex pattern of all passwords used within server
-#   ${3} -> Temp file used to store logs
+#   ${@} -> Options of ci-scripts/test/python-utils/log_secret_scanner.py: the servers to scan, with --pod,
+#           --statefulset or --selector, and the password environment variables, with --secret-env
 #
 # Returns
-#   0 -> If product password is not found in logs; 1 -> If password was found in logs
+#   0 -> If no password is found in logs; 1 -> If a password was found in logs or a server could not be scanned
 ########################################################################################################################
-check_for_password_in_logs() {
-  set +x
-  local server="${1}"
-  local pattern="${2}"
-  local log_file=${3}
-
-  # Search for password within logs
-  local result=$( cat ${log_file} | grep "${pattern}" )
-
-  test -z "${result}" && return 0
-  set -x
-
-  # Password found
-  log "${server}: password(s) found in log file.
-    1) You must resolve this issue. 
-    2) Change all existing passwords. 
-    3) Rerun test"
-  return 1
-}
-
-########################################################################################################################
-# Get last 60min logs from server and write its output to temp file.
-#
-# Arguments
-#   ${1} -> Name of server
-#   ${2} -> Name of pod container
-#   ${3} -> Temp file used to store logs
-#
-########################################################################################################################
-set_log_file() {
-  local server="${1}"
-  local container="${2}"
-  local log_file=${3}
-
-  kubectl logs -n "${PING_CLOUD_NAMESPACE}" "${server}" -c "${container}" --since=60m > ${log_file}
+check_for_passwords_in_logs() {
+  python3 "${PROJECT_DIR}"/ci-scripts/test/python-utils/log_secret_scanner.py \
+    --namespace "${PING_CLOUD_NAMESPACE}" --since 3600 "$@"
 }
 
 function find_shunit_dir() {
@@ -515,80 +562,133 @@ function prepareShunit() {
 }
 
 ########################################################################################################################
-# Verifies that the files listed in the expected.txt file are uploaded to S3 in the ${1} directory. Retries up to the
-# timeout specified in the UPLOAD_TIMEOUT_SECONDS variable.
+# Verifies that the CSD support-data files logged by the CSD upload job are uploaded to S3 in the ${2} directory. Waits
+# with backoff up to the timeout specified in the UPLOAD_TIMEOUT_SECONDS variable and prints how long after the start of
+# the job each file was uploaded. S3 is listed incrementally and the job pod logs are tailed, so each retry only fetches
+# what changed.
 #
 # Arguments
-#   ${1} -> Name of the product directory within S3
+#   ${1} -> The upload CSD job name
+#   ${2} -> Name of the product directory within S3
 ########################################################################################################################
-verify_upload_with_timeout() {
-  local directory_name="${1}"
-  local expected_files=/tmp/expected.txt
-  local actual_files=/tmp/actual.txt
+verify_csd_upload() {
+  local upload_csd_job_name="${1}"
+  local directory_name="${2}"
+
+  python3 "${PROJECT_DIR}"/ci-scripts/test/python-utils/csd_upload_verifier.py \
+    "${upload_csd_job_name}" "${directory_name}" \
+    --namespace "${PING_CLOUD_NAMESPACE}" \
+    --bucket-url "${LOG_ARCHIVE_URL}" \
+    --timeout "${UPLOAD_TIMEOUT_SECONDS}"
+}
 
-  local iteration=0
-  while true; do
-    # sleep for 2 seconds before verifying the upload
-    sleep 2
+########################################################################################################################
+# Run the artifact deployment cases of a plan in all pods of a product at once, with one exec per pod, and write a JSON
+# report of the failures of each case and the differences between the pods. See
+# ci-scripts/test/python-utils/artifact_verifier.py for the plan format.
+#
+# Arguments
+#   ${1} -> The plan file.
+#   ${2} -> The report file.
+#   ${@:3} -> The pods to verify, with --pod, --statefulset or --selector.
+########################################################################################################################
+verify_artifacts() {
+  local plan_file="${1}"
+  local report_file="${2}"
+  shift 2
 
-    # update iteration count
-    iteration=$((iteration + 1))
+  python3 "${PROJECT_DIR}"/ci-scripts/test/python-utils/artifact_verifier.py \
+    --namespace "${PING_CLOUD_NAMESPACE}" --plan "${plan_file}" --json "${report_file}" "$@"
+}
 
-    log "Actual files in iteration ${iteration}:"
-    actual_files "${directory_name}" | tee "${actual_files}"
+########################################################################################################################
+# Print the failures of a case of a verify_artifacts report, one per line. Prints nothing if the case passed.
+#
+# Arguments
+#   ${1} -> The report file.
+#   ${2} -> The case name.
+########################################################################################################################
+artifact_case_failures() {
+  local report_file="${1}"
+  local case_name="${2}"
 
-    log "Verifying that the expected files were uploaded in iteration ${iteration}:"
-    local not_uploaded=$(comm -23 "${expected_files}" "${actual_files}")
+  if ! test -s "${report_file}"; then
+    echo "There is no artifact verification report in ${report_file}"
+    return
+  fi
+  jq -r --arg case "${case_name}" '(.cases[$case].failures // ["The case is missing from the report"])[]' \
+    "${report_file}"
+}
 
-    # success
-    test -z "${not_uploaded}" && return 0
+########################################################################################################################
+# Verify that the containers of many products run as the expected user. The Running pods are listed once and the
+# identity of every matching container is gathered with one exec per pod, all pods at once. See
+# ci-scripts/test/python-utils/user_verifier.py for the target syntax.
+#
+# Arguments
+#   ${1} -> The file to write the JSON report to.
+#   ${@:2} -> The targets, e.g. role=pingaccess-engine@pingaccess:2 role=pingcentral@pingcentral:0
+########################################################################################################################
+verify_pod_users() {
+  local report_file="${1}"
+  shift
 
-    # timeout
-    local waited_seconds=$((iteration * 2))
-    if test "${waited_seconds}" -ge "${UPLOAD_TIMEOUT_SECONDS}"; then
-      log "The following files were not uploaded: ${not_uploaded} after a timeout of ${UPLOAD_TIMEOUT_SECONDS} seconds"
-      return 1
-    fi
-  done
+  python3 "${PROJECT_DIR}"/ci-scripts/test/python-utils/user_verifier.py \
+    --namespace "${PING_CLOUD_NAMESPACE}" --json "${report_file}" "$@"
 }
 
 ########################################################################################################################
-# Searches AWS s3 bucket and returns CSD support-data files found
+# Print the failures of a target of a verify_pod_users report, one per line. Prints nothing if the target passed.
 #
 # Arguments
-#   ${1} -> Name of the product directory within S3
-########################################################################################################################
-actual_files() {
-  local directory_name="${1}"
-  local bucket_url_no_protocol=${LOG_ARCHIVE_URL#s3://}
-  local bucket_name=$(echo "${bucket_url_no_protocol}" | cut -d/ -f1)
-  local days_ago=1
-
-  aws s3api list-objects \
-    --bucket "${bucket_name}" \
-    --prefix "${directory_name}/" \
-    --query "reverse(sort_by(Contents[?LastModified>='${days_ago}'], &LastModified))[].Key" \
-    --profile "${AWS_PROFILE}" |
-  grep support-data |
-  tr -d '",[]' |
-  cut -d/ -f2 |
-  sort
+#   ${1} -> The report file.
+#   ${2} -> The target, as passed to verify_pod_users.
+########################################################################################################################
+pod_user_failures() {
+  local report_file="${1}"
+  local target="${2}"
+
+  if ! test -s "${report_file}"; then
+    echo "There is no user verification report in ${report_file}"
+    return
+  fi
+  jq -r --arg target "${target}" '(.[$target].failures // ["The target is missing from the report"])[]' \
+    "${report_file}"
 }
 
 ########################################################################################################################
-# Searches CSD upload job logs and returns CSD support-data files found
+# Activate the Python virtual environment of the CI scripts, creating it if needed, and install the requirements of
+# ci-scripts/test/python-utils into it. This is the one place the CI jobs install python dependencies, e.g. the
+# kubernetes client that wait_for_conditions uses.
+########################################################################################################################
+prepare_python_env() {
+  log "Activating Python virtual environment"
+  if [[ ! -d "${PROJECT_DIR}"/venv ]]; then
+    python -m venv "${PROJECT_DIR}"/venv
+  fi
+  source "${PROJECT_DIR}"/venv/bin/activate
+
+  log "Installing python requirements"
+  pip3.9 install -r "${PROJECT_DIR}"/ci-scripts/test/python-utils/requirements.txt
+}
+
+########################################################################################################################
+# Wait for several Kubernetes conditions at once. The conditions are evaluated from one watch per resource type instead
+# of polling, and the time at which each condition is met is printed. Returns non-zero as soon as a condition fails
+# terminally (e.g. a failed job) or times out. See ci-scripts/test/python-utils/k8s_waiter.py for the condition syntax.
 #
 # Arguments
-#   ${1} -> The upload CSD job name
+#   ${1} -> The namespace of the namespaced resources.
+#   ${2} -> Default timeout in seconds for conditions without an @TIMEOUT_SECONDS suffix.
+#   ${@:3} -> The conditions, e.g. rollout:statefulset/pingdirectory@900 pod-ready:pingfederate-admin-0 count:pod:3
 ########################################################################################################################
-expected_files() {
-  local upload_csd_job_pods=$(kubectl get pod -o name -n "${PING_CLOUD_NAMESPACE}" | grep "${1}" | cut -d/ -f2)
-  for upload_csd_job_pod in $upload_csd_job_pods; do
-    kubectl logs -n "${PING_CLOUD_NAMESPACE}" ${upload_csd_job_pod} |
-    tail -1 |
-    tr ' ' '\n' |
-    sort
-  done
+wait_for_conditions() {
+  local namespace="${1}"
+  local timeout_seconds="${2}"
+  shift 2
+
+  python3 "${PROJECT_DIR}"/ci-scripts/test/python-utils/k8s_waiter.py \
+    --namespace "${namespace}" --timeout "${timeout_seconds}" "$@"
 }
 
 ########################################################################################################################
@@ -602,10 +702,9 @@ expected_files() {
 #     2. PF engine -> PF admin -> PD
 #     3. PA WAS engine -> PA WAS admin
 #
-# So checking the rollout status of the end dependencies should be enough after PD is rolled out. We'll give each 2.5
-# minutes after PD is ready. This should be more than enough time because as soon as pingdirectory-0 is ready, the
-# rollout of the others will begin, and they don't take nearly as much time as a single PD server. So the entire Ping
-# stack must be rolled out in no more than (15 * num of PD replicas + 2.5 * number of end dependents) minutes.
+# So checking the rollout status of the end dependencies should be enough after PD is rolled out. We'll give each 5
+# minutes after PD is ready. All rollouts are waited on at the same time, so the wait ends as soon as the slowest of them
+# is rolled out. The entire Ping stack must be rolled out in no more than (15 * num of PD replicas + 5) minutes.
 #
 # Arguments:
 # $1 - the namespace to check
@@ -613,22 +712,23 @@ expected_files() {
 check_if_ready() {
   local ns_to_check=${1}
 
-  local pd_replica='statefulset.apps/pingdirectory'
-  local other_ping_app_replicas='statefulset.apps/pingfederate statefulset.apps/pingaccess statefulset.apps/pingaccess-was'
+  local pd_replica='statefulset/pingdirectory'
+  local other_ping_app_replicas='statefulset/pingfederate statefulset/pingaccess statefulset/pingaccess-was'
 
   local num_pd_replicas=$(kubectl get "${pd_replica}" -o jsonpath='{.spec.replicas}' -n "${ns_to_check}")
 
   local pd_timeout_seconds=$((num_pd_replicas * 900))
-  local dependent_timeout_seconds=300
-
-  echo "Waiting for rollout of ${pd_replica} with a timeout of ${pd_timeout_seconds} seconds"
-  wait_for_rollout "${pd_replica}" "${ns_to_check}" "${pd_timeout_seconds}"
+  local dependent_timeout_seconds=$((pd_timeout_seconds + 300))
 
+  local conditions="rollout:${pd_replica}@${pd_timeout_seconds}"
   for dependent_replica in ${other_ping_app_replicas}; do
-    echo "Waiting for rollout of ${dependent_replica} with a timeout of ${dependent_timeout_seconds} seconds"
-    wait_for_rollout "${dependent_replica}" "${ns_to_check}" "${dependent_timeout_seconds}"
+    conditions="${conditions} rollout:${dependent_replica}@${dependent_timeout_seconds}"
   done
 
+  echo "Waiting for rollout of ${pd_replica} with a timeout of ${pd_timeout_seconds} seconds"
+  echo "Waiting for rollout of ${other_ping_app_replicas} with a timeout of ${dependent_timeout_seconds} seconds"
+  time wait_for_conditions "${ns_to_check}" "${dependent_timeout_seconds}" ${conditions}
+
   # Print out the ingress objects for logs and the ping stack
   printf '\n--- Ingress URLs ---\n'
   kubectl get ingress -A
@@ -0,0 +1,17 @@
+#!/bin/bash
+
+SCRIPT_HOME=$(cd $(dirname ${0}); pwd)
+. ${SCRIPT_HOME}/../common.sh "${1}"
+
+# Verify that k8s-configs/feature-flags-index.json is up to date with the kustomization files, and that every feature
+# flag marker in them is declared in k8s-configs/feature-flags.json. git-ops-command.sh relies on the index to comment
+# out disabled features without searching the repository on every render.
+log "Checking the feature flag index of ${PROJECT_DIR}/k8s-configs"
+
+python3 "${PROJECT_DIR}/k8s-configs/cluster-tools/base/git-ops/validation/feature_flags.py" \
+    --repo "${PROJECT_DIR}" generate --check
+STATUS=${?}
+
+log "Feature flag index check result: ${STATUS}"
+
+exit ${STATUS}
@@ -32,6 +32,9 @@ build_dev_deploy_file "${deploy_file}"
 
 kubectl apply -f "${deploy_file}"
 
+# The readiness check watches the rollouts through the Kubernetes python client
+prepare_python_env
+
 check_if_ready "${PING_CLOUD_NAMESPACE}"
 
 popd  > /dev/null 2>&1
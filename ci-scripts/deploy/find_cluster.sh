@@ -7,10 +7,19 @@ test "${VERBOSE}" && set -x
 SCRIPT_HOME=$(cd $(dirname ${0}); pwd)
 . ${SCRIPT_HOME}/../common.sh
 
+CLUSTER_ALLOCATOR="${PROJECT_DIR}"/ci-scripts/test/python-utils/cluster_allocator.py
+
 ########################################################################################################################
 # Finds an available ci-cd cluster to run on:
 #
-# If no cluster is available it will try again every 5 minutes for 30 minutes before timing out.
+# All clusters are probed at once by ci-scripts/test/python-utils/cluster_allocator.py, which claims one with the Lease
+# default/cluster-in-use-lock held by this pipeline. If no cluster is available it waits for one to be released, for up
+# to 30 minutes. The lease is renewed by configure_kube and released by teardown.sh, or kept by it along with the
+# environment, and expires if the pipeline stops renewing it. The namespaces left by the previous holder of a reclaimed
+# cluster are logged, but not deleted. The queue time is written to cluster-allocation.json.
+#
+# If the python environment of the CI scripts cannot be prepared, the clusters are checked one at a time instead and
+# claimed with the cluster-in-use-lock namespace only.
 ########################################################################################################################
 
 find_cluster() {
@@ -23,6 +32,43 @@ find_cluster() {
 
   configure_aws
 
+  if prepare_python_env && python3 -c 'import kubernetes' > /dev/null 2>&1; then
+    allocate_cluster
+  else
+    log "WARN: The python kubernetes client is not available, checking the clusters one at a time"
+    find_cluster_sequentially
+  fi
+
+  set_deploy_type_env_vars
+  set_env_vars
+}
+
+allocate_cluster() {
+  local candidates=()
+  for postfix in ${CLUSTER_POSTFIXES}; do
+    local kube_name=$(echo "ci-cd$postfix" | tr '_' '-')
+    add_kube_context "${kube_name}"
+    candidates+=("${kube_name}=${postfix}")
+  done
+
+  export CLUSTER_LOCK_HOLDER="${CLUSTER_LOCK_HOLDER:-pipeline-${CI_PIPELINE_ID:-$(hostname)-$$}}"
+  if ! python3 "${CLUSTER_ALLOCATOR}" acquire "${candidates[@]}" \
+      --holder "${CLUSTER_LOCK_HOLDER}" \
+      --timeout 1800 \
+      --output cluster.env \
+      --metrics cluster-allocation.json; then
+    log "Could not find a cluster to run on - please check that the pipeline is not saturated and delete unused namespaces"
+    exit 1
+  fi
+
+  set -a
+  . ./cluster.env
+  set +a
+  kubectl config use-context "${SELECTED_KUBE_NAME}"
+  log "Found cluster $SELECTED_KUBE_NAME available to deploy to"
+}
+
+find_cluster_sequentially() {
   cluster_postfixes=($CLUSTER_POSTFIXES)
   found_cluster=false
   sleep_wait_seconds=300
@@ -65,8 +111,6 @@ find_cluster() {
         log "Found cluster $SELECTED_KUBE_NAME available to deploy to"
         echo "SELECTED_POSTFIX=$SELECTED_POSTFIX" > cluster.env
         echo "SELECTED_KUBE_NAME=$SELECTED_KUBE_NAME" >> cluster.env
-        set_deploy_type_env_vars
-        set_env_vars
         break
       fi
     done
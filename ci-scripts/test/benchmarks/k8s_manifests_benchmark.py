@@ -0,0 +1,190 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "k8s-configs",
+                                "cluster-tools", "base", "git-ops", "validation"))
+
+from k8s_manifests import ManifestIndex  # noqa: E402
+
+NAMESPACES = ["ping-cloud", "argo-cd", "cert-manager", "elastic-stack-logging", "prometheus", "newrelic", "kube-system"]
+
+DEPLOYMENT = """apiVersion: apps/v1
+kind: {kind}
+metadata:
+  annotations:
+    argocd.argoproj.io/sync-wave: "2"
+  labels:
+    app: ping-cloud
+    role: {name}
+  name: {name}
+  namespace: {namespace}
+spec:
+  replicas: 1
+  selector:
+    matchLabels:
+      role: {name}
+  template:
+    metadata:
+      labels:
+        role: {name}
+    spec:
+      containers:
+{containers}      serviceAccount: {name}
+"""
+
+CONTAINER = """      - env:
+        - name: OPERATIONAL_MODE
+          value: CLUSTERED_CONSOLE
+        - name: SERVER_PROFILE_PATH
+          value: {name}
+        envFrom:
+        - configMapRef:
+            name: {name}-environment-variables
+        image: public.ecr.aws/r2h3l6e4/pingcloud-apps/{name}/dev:v1.18-release-branch-latest
+        name: {name}-{n}
+        ports:
+        - containerPort: 9999
+          name: https
+        resources:
+          limits:
+            cpu: "2"
+            memory: 4Gi
+          requests:
+            cpu: "1"
+            memory: 2Gi
+        volumeMounts:
+        - mountPath: /opt/out
+          name: out-dir
+"""
+
+CONFIG_MAP = """apiVersion: v1
+data:
+{data}kind: ConfigMap
+metadata:
+  labels:
+    app: ping-cloud
+  name: {name}
+  namespace: {namespace}
+"""
+
+SECRET = """apiVersion: v1
+data:
+  password: {value}
+kind: Secret
+metadata:
+  annotations:
+    sealedsecrets.bitnami.com/managed: "true"
+  name: {name}
+  namespace: {namespace}
+type: Opaque
+"""
+
+SERVICE = """apiVersion: v1
+kind: Service
+metadata:
+  labels:
+    app: ping-cloud
+  name: {name}
+  namespace: {namespace}
+spec:
+  ports:
+  - name: https
+    port: 443
+    targetPort: 9999
+  selector:
+    role: {name}
+"""
+
+
+def synthetic_tenant(resources: int) -> bytes:
+    """A rendered tenant shaped like kustomize output, with a mix of workloads, config maps, secrets and services"""
+    documents = []
+    for i in range(resources):
+        name = f"resource-{i}"
+        namespace = NAMESPACES[i % len(NAMESPACES)]
+        choice = i % 10
+        if choice < 2:
+            containers = "".join(CONTAINER.format(name=name, n=n) for n in range(random.randint(1, 3)))
+            kind = "Deployment" if choice == 0 else "StatefulSet"
+            documents.append(DEPLOYMENT.format(kind=kind, name=name, namespace=namespace, containers=containers))
+        elif choice < 5:
+            data = "".join(f"  KEY_{n}: value-{n}-{random.randint(0, 10 ** 6)}\n" for n in range(random.randint(5, 40)))
+            documents.append(CONFIG_MAP.format(name=name, namespace=namespace, data=data))
+        elif choice < 7:
+            documents.append(SECRET.format(name=name, namespace=namespace, value="cGFzc3dvcmQ="))
+        else:
+            documents.append(SERVICE.format(name=name, namespace=namespace))
+    return "---\n".join(documents).encode()
+
+
+def measure(name: str, func, trace_memory: bool):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = ""
+    if trace_memory:
+        peak = f", peak traced memory {tracemalloc.get_traced_memory()[1] / 2 ** 20:.1f} MiB"
+        tracemalloc.stop()
+    print(f"{name:<40} {elapsed * 1000:9.1f} ms{peak}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark k8s_manifests on a synthetic rendered tenant")
+    parser.add_argument("--resources", type=int, default=5000, help="Number of resources in the rendered tenant")
+    parser.add_argument("--lookups", type=int, default=10000, help="Number of lookups by kind and name")
+    parser.add_argument("--baseline", action="store_true", help="Also load the whole stream with PyYAML")
+    parser.add_argument("--memory", action="store_true", help="Trace the peak memory of each step (slower)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "deploy.yaml")
+        with open(path, "wb") as deploy_file:
+            deploy_file.write(synthetic_tenant(args.resources))
+        size_mib = os.path.getsize(path) / 2 ** 20
+        print(f"Rendered tenant: {args.resources} resources, {size_mib:.1f} MiB\n")
+
+        index = measure("index file", lambda: ManifestIndex.from_file(path), args.memory)
+        with open(path, "rb") as stream:
+            measure("index non-seekable stream (spooled)", lambda: ManifestIndex.build(stream, seekable=False).close(),
+                    args.memory)
+
+        names = [f"resource-{random.randrange(args.resources)}" for _ in range(args.lookups)]
+        kinds = {manifest.id.name: manifest.id.kind for manifest in index}
+        measure(f"{args.lookups} lookups by kind and name",
+                lambda: [index.get(kinds[name], name) for name in names], False)
+        secrets = measure("select sealed secrets by annotation", lambda: index.select(
+            kind="Secret", annotations={"sealedsecrets.bitnami.com/managed": "true"}), False)
+        measure(f"write {len(secrets)} secrets as a stream", lambda: index.write(secrets, open(os.devnull, "wb")),
+                False)
+        measure(f"split {len(index)} documents into files",
+                lambda: index.split(list(index), os.path.join(work_dir, "split")), False)
+        index.close()
+
+        if args.baseline:
+            import yaml
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            print(f"\nBaseline with PyYAML ({loader.__name__}):")
+
+            def load_all():
+                with open(path, "rb") as stream:
+                    return list(yaml.load_all(stream, Loader=loader))
+
+            documents = measure("load all documents", load_all, args.memory)
+            linear_lookups = max(1, args.lookups // 100)
+            measure(f"{linear_lookups} linear lookups by kind and name", lambda: [
+                next(d for d in documents if d["kind"] == kinds[name] and d["metadata"]["name"] == name)
+                for name in names[:linear_lookups]
+            ], False)
+
+
+if __name__ == "__main__":
+    main()
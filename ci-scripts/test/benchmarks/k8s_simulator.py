@@ -0,0 +1,448 @@
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+USAGE = """
+Serves the subset of the Kubernetes API used by the python test tooling, filled with a synthetic cluster:
+
+  GET  /api/v1/namespaces                                   list namespaces
+  GET  /api/v1/pods, /api/v1/namespaces/NS/pods             list pods, or watch them with ?watch=true
+  GET  /api/v1/namespaces/NS/pods/NAME                      read a pod
+  GET  /api/v1/namespaces/NS/pods/NAME/log                  pod logs, with ?tailLines=N
+  GET  /apis/batch/v1/cronjobs, .../namespaces/NS/cronjobs  list cron jobs
+  POST /apis/batch/v1/namespaces/NS/jobs                    create a job, whose pod completes after --job-seconds
+  GET  /apis/networking.k8s.io/v1/ingresses                 list ingresses, one of which routes to /healthcheck
+  GET  /healthcheck                                         healthcheck results with --health-tests per category
+
+Pods can be filtered with labelSelector and fieldSelector equality requirements (k=v, k!=v) on labels,
+metadata.name, metadata.namespace and status.phase. The first line printed is the listening address, and --kubeconfig
+writes a kubeconfig for kubernetes.config.load_kube_config().
+
+Examples:
+  k8s_simulator.py --port 8001 --namespaces 50 --pods 200 --cronjobs 100 --kubeconfig /tmp/simulator.kubeconfig
+  KUBECONFIG=/tmp/simulator.kubeconfig kubectl get pods -n ping-cloud
+"""
+
+PING_CLOUD_NAMESPACE = "ping-cloud"
+
+# The servers of the ping-cloud namespace, by statefulset, and their number of replicas
+PING_CLOUD_SERVERS = {
+    "pingdirectory": 3,
+    "pingfederate": 2,
+    "pingfederate-admin": 1,
+    "pingaccess": 2,
+    "pingaccess-admin": 1,
+    "pingaccess-was": 1,
+    "pingaccess-was-admin": 1,
+}
+
+HEALTH_SUITES = ["pingAccess", "pingAccessWas", "pingFederate", "pingDirectory", "clusterHealth"]
+HEALTH_CATEGORIES = ["podStatus", "synthetic", "data", "connectivity", "clusterMembers"]
+
+LOG_LINE = ("2023-01-31 17:01:02,{ms:03d}  INFO [org.sourceid.oauth20.token.AccessTokenManager] "
+            "Issued token for client-{n}")
+
+
+def pod_object(namespace: str, name: str, role: str, phase: str = "Running", resource_version: int = 1) -> {}:
+    """A pod shaped like those of the ping-cloud workloads, so that deserializing it costs about the same"""
+    return {
+        "apiVersion": "v1",
+        "kind": "Pod",
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "uid": f"{abs(hash((namespace, name))):032x}",
+            "resourceVersion": str(resource_version),
+            "creationTimestamp": "2023-01-31T17:01:02Z",
+            "labels": {"app": "ping-cloud", "role": role, "statefulset.kubernetes.io/pod-name": name},
+            "annotations": {"kubectl.kubernetes.io/restartedAt": "2023-01-31T17:01:02Z"},
+        },
+        "spec": {
+            "containers": [{
+                "name": role,
+                "image": f"public.ecr.aws/r2h3l6e4/pingcloud-apps/{role}/dev:v1.18-release-branch-latest",
+                "env": [{"name": f"VARIABLE_{n}", "value": f"value-{n}"} for n in range(10)],
+                "ports": [{"containerPort": 9999, "name": "https", "protocol": "TCP"}],
+                "resources": {"limits": {"cpu": "2", "memory": "4Gi"}, "requests": {"cpu": "1", "memory": "2Gi"}},
+                "volumeMounts": [{"mountPath": "/opt/out", "name": "out-dir"}],
+            }],
+            "nodeName": f"ip-10-0-{random.randint(0, 255)}-{random.randint(0, 255)}.ec2.internal",
+            "serviceAccountName": role,
+            "volumes": [{"name": "out-dir", "emptyDir": {}}],
+        },
+        "status": {
+            "phase": phase,
+            "podIP": f"10.1.{random.randint(0, 255)}.{random.randint(0, 255)}",
+            "startTime": "2023-01-31T17:01:02Z",
+            "conditions": [{"type": condition, "status": "True", "lastTransitionTime": "2023-01-31T17:01:02Z"}
+                           for condition in ["Initialized", "Ready", "ContainersReady", "PodScheduled"]],
+            "containerStatuses": [{"name": role, "ready": phase == "Running", "restartCount": 0,
+                                   "image": role, "imageID": role, "state": {}}],
+        },
+    }
+
+
+def cron_job_object(namespace: str, name: str) -> {}:
+    return {
+        "apiVersion": "batch/v1",
+        "kind": "CronJob",
+        "metadata": {"name": name, "namespace": namespace, "resourceVersion": "1",
+                     "creationTimestamp": "2023-01-31T17:01:02Z", "labels": {"app": "ping-cloud"}},
+        "spec": {
+            "schedule": "*/5 * * * *",
+            "concurrencyPolicy": "Forbid",
+            "jobTemplate": {
+                "metadata": {"labels": {"app": "ping-cloud", "role": name}},
+                "spec": {"backoffLimit": 0, "template": {
+                    "metadata": {"labels": {"role": name}},
+                    "spec": {"restartPolicy": "Never", "containers": [{
+                        "name": name,
+                        "image": f"public.ecr.aws/r2h3l6e4/pingcloud-services/{name}:latest",
+                        "command": ["python3", "run.py"],
+                    }]},
+                }},
+            },
+        },
+    }
+
+
+def ingress_object(namespace: str, name: str, host: str) -> {}:
+    return {
+        "apiVersion": "networking.k8s.io/v1",
+        "kind": "Ingress",
+        "metadata": {"name": name, "namespace": namespace, "resourceVersion": "1"},
+        "spec": {"rules": [{"host": host, "http": {"paths": [{
+            "path": "/", "pathType": "Prefix",
+            "backend": {"service": {"name": name, "port": {"number": 443}}},
+        }]}}]},
+    }
+
+
+def parse_selector(selector: str) -> [(str, str, bool)]:
+    """:return: The key, value and whether the value must be equal, of each requirement"""
+    requirements = []
+    for requirement in filter(None, (selector or "").split(",")):
+        equal = "!=" not in requirement
+        key, value = re.split(r"!=|==|=", requirement, 1)
+        requirements.append((key.strip(), value.strip(), equal))
+    return requirements
+
+
+def field_value(pod: {}, key: str):
+    if key == "metadata.name":
+        return pod["metadata"]["name"]
+    if key == "metadata.namespace":
+        return pod["metadata"]["namespace"]
+    if key == "status.phase":
+        return pod["status"]["phase"]
+    raise ValueError(f"field selector '{key}' is not supported")
+
+
+def matches(pod: {}, label_selector: [], field_selector: []) -> bool:
+    labels = pod["metadata"]["labels"]
+    return (all((labels.get(key) == value) == equal for key, value, equal in label_selector) and
+            all((field_value(pod, key) == value) == equal for key, value, equal in field_selector))
+
+
+class SyntheticCluster:
+    """The objects of a synthetic cluster, and the pod events that watches are notified of"""
+
+    def __init__(self, namespaces: int, pods: int, cron_jobs: int, health_tests: int, log_lines: int,
+                 job_seconds: float, health_host: str, seed: int = 42):
+        """
+        :param namespaces: Number of namespaces besides ping-cloud
+        :param pods: Number of pods per namespace, including the servers in ping-cloud
+        :param cron_jobs: Number of cron jobs, spread over the namespaces, besides the healthcheck cron jobs
+        :param health_tests: Number of test results per category of each healthcheck suite
+        :param log_lines: Number of lines in the log of each pod
+        :param job_seconds: Seconds after which the pod of a created job succeeds
+        :param health_host: The host of the healthcheck ingress
+        """
+        random.seed(seed)
+        self.log_lines = log_lines
+        self.job_seconds = job_seconds
+        self.condition = threading.Condition()
+        self.resource_version = 1
+        # The pod events, in order, as (resource version, type, pod)
+        self.events = []
+        self.cache = {}
+
+        names = [PING_CLOUD_NAMESPACE] + [f"tenant-{n}" for n in range(namespaces)]
+        self.namespaces = {namespace: {} for namespace in names}
+        servers = [(f"{statefulset}-{n}", statefulset)
+                   for statefulset, replicas in PING_CLOUD_SERVERS.items() for n in range(replicas)]
+        for namespace, pods_by_name in self.namespaces.items():
+            members = list(servers) if namespace == PING_CLOUD_NAMESPACE else []
+            for n in range(max(pods - len(members), 0)):
+                role = f"app-{n % 10}"
+                members.append((f"{role}-{n // 10}-{n:05d}", role))
+            for name, role in members:
+                pods_by_name[name] = pod_object(namespace, name, role)
+
+        self.cron_jobs = [cron_job_object(names[n % len(names)], f"cronjob-{n}") for n in range(cron_jobs)]
+        # The healthcheck cron jobs come last, the worst case for a linear search
+        self.cron_jobs.extend(cron_job_object(PING_CLOUD_NAMESPACE, f"healthcheck-{suite}")
+                              for suite in ["cluster-health", "pingaccess", "pingaccess-was", "pingfederate",
+                                            "pingdirectory"])
+        self.ingresses = [ingress_object(namespace, f"ingress-{namespace}", f"{namespace}.ping-demo.com")
+                          for namespace in names]
+        self.ingresses.append(ingress_object(PING_CLOUD_NAMESPACE, "healthcheck", health_host))
+        self.health = {"health": {suite: {"tests": {category: {
+            f"{suite} {category} test {n}": "PASS" if n % 50 else "FAIL" for n in range(health_tests)
+        } for category in HEALTH_CATEGORIES}} for suite in HEALTH_SUITES}}
+
+    def list_response(self, kind: str, items: []) -> bytes:
+        return json.dumps({"apiVersion": "v1", "kind": kind, "items": items,
+                           "metadata": {"resourceVersion": str(self.resource_version)}}).encode()
+
+    def cached(self, key, build) -> bytes:
+        """Serialize a response once per resource version, so the simulator does not dominate the measurements"""
+        with self.condition:
+            key = (key, self.resource_version)
+            if key not in self.cache:
+                self.cache = {k: v for k, v in self.cache.items() if k[1] == self.resource_version}
+                self.cache[key] = build()
+            return self.cache[key]
+
+    def pods(self, namespace: str = None, label_selector: str = None, field_selector: str = None) -> [{}]:
+        labels, fields = parse_selector(label_selector), parse_selector(field_selector)
+        namespaces = [namespace] if namespace else list(self.namespaces)
+        with self.condition:
+            return [pod for ns in namespaces for pod in self.namespaces.get(ns, {}).values()
+                    if matches(pod, labels, fields)]
+
+    def put_pod(self, pod: {}):
+        with self.condition:
+            self.resource_version += 1
+            pod["metadata"]["resourceVersion"] = str(self.resource_version)
+            pods = self.namespaces.setdefault(pod["metadata"]["namespace"], {})
+            event_type = "MODIFIED" if pod["metadata"]["name"] in pods else "ADDED"
+            pods[pod["metadata"]["name"]] = pod
+            self.events.append((self.resource_version, event_type, pod))
+            self.condition.notify_all()
+
+    def create_job(self, namespace: str, job: {}) -> {}:
+        name = job.get("metadata", {}).get("name") or f"job-{self.resource_version}"
+        pod = pod_object(namespace, f"{name}-{random.randint(0, 16 ** 5):05x}", name,
+                         "Running" if self.job_seconds else "Succeeded")
+        self.put_pod(pod)
+        if self.job_seconds:
+            def succeed():
+                succeeded = json.loads(json.dumps(pod))
+                succeeded["status"]["phase"] = "Succeeded"
+                self.put_pod(succeeded)
+            threading.Timer(self.job_seconds, succeed).start()
+        return {"apiVersion": "batch/v1", "kind": "Job", **job,
+                "metadata": {**job.get("metadata", {}), "name": name, "namespace": namespace,
+                             "resourceVersion": str(self.resource_version)},
+                "status": {"active": 1}}
+
+    def watch_pods(self, namespace: str, label_selector: str, field_selector: str, timeout: float):
+        """Yield the current pods as ADDED events, then the changes until the timeout, like a watch without a
+        resourceVersion"""
+        labels, fields = parse_selector(label_selector), parse_selector(field_selector)
+        with self.condition:
+            seen = self.resource_version
+            initial = self.pods(namespace, label_selector, field_selector)
+        for pod in initial:
+            yield {"type": "ADDED", "object": pod}
+
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.condition:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if self.resource_version == seen:
+                    self.condition.wait(remaining)
+                events = [event for event in self.events if event[0] > seen]
+                seen = self.resource_version
+            for _, event_type, pod in events:
+                if (namespace in (None, pod["metadata"]["namespace"])) and matches(pod, labels, fields):
+                    yield {"type": event_type, "object": pod}
+
+    def pod_log(self, namespace: str, name: str, tail_lines: int = None) -> bytes:
+        count = self.log_lines if tail_lines is None else min(tail_lines, self.log_lines)
+        first = self.log_lines - count
+        return "".join(LOG_LINE.format(ms=n % 1000, n=n) + "\n" for n in range(first, self.log_lines)).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are written separately, which would otherwise wait for delayed acknowledgements
+    disable_nagle_algorithm = True
+    cluster: SyntheticCluster = None
+
+    routes = [
+        ("GET", r"/api/v1/namespaces", "list_namespaces"),
+        ("GET", r"/api/v1/pods", "list_pods"),
+        ("GET", r"/api/v1/namespaces/(?P<namespace>[^/]+)/pods", "list_pods"),
+        ("GET", r"/api/v1/namespaces/(?P<namespace>[^/]+)/pods/(?P<name>[^/]+)", "read_pod"),
+        ("GET", r"/api/v1/namespaces/(?P<namespace>[^/]+)/pods/(?P<name>[^/]+)/log", "read_pod_log"),
+        ("GET", r"/apis/batch/v1/cronjobs", "list_cron_jobs"),
+        ("GET", r"/apis/batch/v1/namespaces/(?P<namespace>[^/]+)/cronjobs", "list_cron_jobs"),
+        ("POST", r"/apis/batch/v1/namespaces/(?P<namespace>[^/]+)/jobs", "create_job"),
+        ("GET", r"/apis/networking.k8s.io/v1/ingresses", "list_ingresses"),
+        ("GET", r"/healthcheck/?", "health"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method: str):
+        url = urlparse(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        for route_method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if match and route_method == method:
+                try:
+                    getattr(self, handler)(**match.groupdict())
+                except ValueError as e:
+                    self.send_json(400, {"kind": "Status", "status": "Failure", "message": str(e), "code": 400})
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                return
+        self.send_json(404, {"kind": "Status", "status": "Failure", "message": f"{url.path} not found", "code": 404})
+
+    def send_body(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, document: {}):
+        self.send_body(status, json.dumps(document).encode())
+
+    def list_namespaces(self):
+        self.send_body(200, self.cluster.cached("namespaces", lambda: self.cluster.list_response("NamespaceList", [
+            {"metadata": {"name": namespace, "resourceVersion": "1"}, "status": {"phase": "Active"}}
+            for namespace in self.cluster.namespaces
+        ])))
+
+    def list_pods(self, namespace: str = None):
+        label_selector = self.query.get("labelSelector")
+        field_selector = self.query.get("fieldSelector")
+        if self.query.get("watch") in ("true", "1"):
+            self.watch_pods(namespace, label_selector, field_selector, float(self.query.get("timeoutSeconds", 60)))
+            return
+        self.send_body(200, self.cluster.cached(("pods", namespace, label_selector, field_selector), lambda: (
+            self.cluster.list_response("PodList", self.cluster.pods(namespace, label_selector, field_selector))
+        )))
+
+    def watch_pods(self, namespace: str, label_selector: str, field_selector: str, timeout: float):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in self.cluster.watch_pods(namespace, label_selector, field_selector, timeout):
+            line = json.dumps(event).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def read_pod(self, namespace: str, name: str):
+        pod = self.cluster.namespaces.get(namespace, {}).get(name)
+        if not pod:
+            self.send_json(404, {"kind": "Status", "status": "Failure", "message": f"pod {name} not found",
+                                 "code": 404})
+            return
+        self.send_json(200, pod)
+
+    def read_pod_log(self, namespace: str, name: str):
+        tail_lines = self.query.get("tailLines")
+        self.send_body(200, self.cluster.pod_log(namespace, name, int(tail_lines) if tail_lines else None),
+                       "text/plain")
+
+    def list_cron_jobs(self, namespace: str = None):
+        self.send_body(200, self.cluster.cached(("cronjobs", namespace), lambda: self.cluster.list_response(
+            "CronJobList", [job for job in self.cluster.cron_jobs if namespace in (None, job["metadata"]["namespace"])]
+        )))
+
+    def create_job(self, namespace: str):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.send_json(201, self.cluster.create_job(namespace, body))
+
+    def list_ingresses(self):
+        self.send_body(200, self.cluster.cached("ingresses", lambda: self.cluster.list_response(
+            "IngressList", self.cluster.ingresses)))
+
+    def health(self):
+        self.send_body(200, self.cluster.cached("health", lambda: json.dumps(self.cluster.health).encode()))
+
+
+def write_kubeconfig(path: str, url: str):
+    config = {
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [{"name": "simulator", "cluster": {"server": url}}],
+        "users": [{"name": "simulator", "user": {"token": "simulator"}}],
+        "contexts": [{"name": "simulator", "context": {"cluster": "simulator", "user": "simulator"}}],
+        "current-context": "simulator",
+    }
+    with open(path, "w") as kubeconfig_file:
+        json.dump(config, kubeconfig_file, indent=2)
+
+
+def serve(cluster_args: {}, host: str = "127.0.0.1", port: int = 0, kubeconfig: str = None) -> ThreadingHTTPServer:
+    """
+    Start a simulator in a background thread
+    :param cluster_args: The arguments of SyntheticCluster, except health_host
+    :return: The server, whose server_address is the listening address
+    """
+    server = ThreadingHTTPServer((host, port), type("SimulatorHandler", (Handler,), {}))
+    server.daemon_threads = True
+    address = f"{host}:{server.server_address[1]}"
+    # The healthcheck endpoint of the tooling is http://HOST of the ingress, so the path is part of the host
+    server.RequestHandlerClass.cluster = SyntheticCluster(health_host=f"{address}/healthcheck", **cluster_args)
+    if kubeconfig:
+        write_kubeconfig(kubeconfig, f"http://{address}")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a synthetic large cluster over a subset of the Kubernetes API",
+        epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on, any free port by default")
+    parser.add_argument("--namespaces", type=int, default=20, help="Number of namespaces besides ping-cloud")
+    parser.add_argument("--pods", type=int, default=100, help="Number of pods per namespace")
+    parser.add_argument("--cronjobs", type=int, default=50, help="Number of cron jobs besides the healthchecks")
+    parser.add_argument("--health-tests", type=int, default=100, help="Number of healthcheck results per category")
+    parser.add_argument("--log-lines", type=int, default=1000, help="Number of lines in the log of each pod")
+    parser.add_argument("--job-seconds", type=float, default=0, help="Seconds until the pod of a created job succeeds")
+    parser.add_argument("--kubeconfig", help="Write a kubeconfig for the simulator to this file")
+    args = parser.parse_args()
+
+    server = serve({
+        "namespaces": args.namespaces,
+        "pods": args.pods,
+        "cron_jobs": args.cronjobs,
+        "health_tests": args.health_tests,
+        "log_lines": args.log_lines,
+        "job_seconds": args.job_seconds,
+    }, args.host, args.port, args.kubeconfig)
+    print(f"http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "python-utils"))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "integration", "health"))
+
+# The exponent of the growth of an operation with the scale above which it is reported as superlinear
+SUPERLINEAR_EXPONENT = 1.5
+
+
+def start_simulator(scale: int, args, kubeconfig: str) -> subprocess.Popen:
+    """Run the simulator in another process, so that it is not part of the measured memory and CPU"""
+    simulator = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARKS_DIR, "k8s_simulator.py"),
+        "--namespaces", str(args.namespaces * scale),
+        "--pods", str(args.pods * scale),
+        "--cronjobs", str(args.cronjobs * scale),
+        "--health-tests", str(args.health_tests * scale),
+        "--log-lines", str(args.log_lines),
+        "--kubeconfig", kubeconfig,
+    ], stdout=subprocess.PIPE, text=True)
+    simulator.stdout.readline()
+    return simulator
+
+
+def measure(func, rounds: int, trace_memory: bool) -> {}:
+    """Run an operation several times and get its latency statistics, in the spirit of pytest-benchmark"""
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    result = {
+        "rounds": rounds,
+        "min_ms": min(durations) * 1000,
+        "median_ms": statistics.median(durations) * 1000,
+        "mean_ms": statistics.mean(durations) * 1000,
+        "max_ms": max(durations) * 1000,
+    }
+    if trace_memory:
+        # An extra round, since tracing slows the operation down
+        tracemalloc.start()
+        func()
+        result["peak_mib"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result
+
+
+def operations() -> [(str, object)]:
+    """The operations of the tooling to measure, in order"""
+    from health_common import TestHealthBase
+    from k8s_utils import K8sUtils
+    from test_pingaccess_health import TestPingAccessHealth
+
+    class TestPingAccessHealthBase(TestHealthBase):
+        job_name = "healthcheck-pingaccess"
+
+    utils = K8sUtils()
+    health = TestPingAccessHealthBase()
+    cron_job_check = TestPingAccessHealth("test_pingaccess_health_cron_job_exists")
+    return [
+        ("K8sUtils.setUpClass", K8sUtils.setUpClass),
+        ("get_namespace_names", utils.get_namespace_names),
+        ("get_namespaced_pod_names", lambda: utils.get_namespaced_pod_names("ping-cloud", r"pingdirectory-\d+")),
+        ("get_latest_pod_logs", lambda: utils.get_latest_pod_logs("pingdirectory-0", "pingdirectory", "ping-cloud",
+                                                                  100)),
+        ("cron job exists check", cron_job_check.test_pingaccess_health_cron_job_exists),
+        ("run_job", lambda: K8sUtils.run_job("healthcheck-pingaccess")),
+        ("TestHealthBase.setUpClass", TestPingAccessHealthBase.setUpClass),
+        ("get_test_results", lambda: health.get_test_results("pingAccess", "podStatus")),
+    ]
+
+
+def print_results(scale: int, args, results: {}):
+    print(f"\nScale {scale}: {args.namespaces * scale + 1} namespaces, {args.pods * scale} pods per namespace, "
+          f"{args.cronjobs * scale} cron jobs, {args.health_tests * scale} healthcheck results per category")
+    print(f"{'operation':<28} {'min ms':>9} {'median ms':>10} {'mean ms':>9} {'max ms':>9} {'peak MiB':>9}")
+    for name, result in results.items():
+        peak = f"{result['peak_mib']:9.1f}" if "peak_mib" in result else f"{'-':>9}"
+        print(f"{name:<28} {result['min_ms']:9.1f} {result['median_ms']:10.1f} {result['mean_ms']:9.1f} "
+              f"{result['max_ms']:9.1f} {peak}")
+
+
+def growth(results_by_scale: {}) -> {}:
+    """:return: The exponent of the growth of the median latency of each operation between the extreme scales"""
+    smallest, largest = min(results_by_scale), max(results_by_scale)
+    exponents = {}
+    for name, result in results_by_scale[largest].items():
+        ratio = result["median_ms"] / max(results_by_scale[smallest][name]["median_ms"], 1e-6)
+        exponents[name] = math.log(max(ratio, 1e-6)) / math.log(largest / smallest)
+    return exponents
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark K8sUtils, TestHealthBase and the health test helpers against a simulated large cluster")
+    parser.add_argument("--namespaces", type=int, default=20, help="Number of namespaces besides ping-cloud at scale 1")
+    parser.add_argument("--pods", type=int, default=100, help="Number of pods per namespace at scale 1")
+    parser.add_argument("--cronjobs", type=int, default=50, help="Number of cron jobs at scale 1")
+    parser.add_argument("--health-tests", type=int, default=100,
+                        help="Number of healthcheck results per category at scale 1")
+    parser.add_argument("--log-lines", type=int, default=1000, help="Number of lines in the log of each pod")
+    parser.add_argument("--scales", default="1,4",
+                        help="Comma-separated multipliers of the cluster size; with several, the growth of each "
+                             "operation between the smallest and the largest is reported")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of times each operation is measured")
+    parser.add_argument("--memory", action="store_true", help="Trace the peak memory of each operation")
+    parser.add_argument("--json", help="Write the results as JSON to this file, e.g. to compare between commits")
+    args = parser.parse_args()
+
+    scales = sorted({int(scale) for scale in args.scales.split(",")})
+    results_by_scale = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The kubernetes client reads $KUBECONFIG when it is imported
+        kubeconfig = os.path.join(work_dir, "kubeconfig")
+        os.environ["KUBECONFIG"] = kubeconfig
+        for scale in scales:
+            simulator = start_simulator(scale, args, kubeconfig)
+            try:
+                results_by_scale[scale] = {name: measure(func, args.rounds, args.memory)
+                                           for name, func in operations()}
+            finally:
+                simulator.terminate()
+                simulator.wait()
+            print_results(scale, args, results_by_scale[scale])
+
+    report = {"scales": results_by_scale}
+    if len(scales) > 1:
+        report["growth"] = growth(results_by_scale)
+        print(f"\nGrowth of the median latency from scale {scales[0]} to {scales[-1]} (1 is linear):")
+        for name, exponent in report["growth"].items():
+            warning = "  superlinear" if exponent > SUPERLINEAR_EXPONENT else ""
+            print(f"{name:<28} {exponent:5.2f}{warning}")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
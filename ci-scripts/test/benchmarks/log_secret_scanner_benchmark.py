@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import re
+import resource
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python-utils"))
+
+from log_secret_scanner import CHUNK_SIZE, SecretScanner  # noqa: E402
+
+LOG_LINE_TEMPLATES = [
+    "2023-01-31 17:01:02,123 DEBUG [org.sourceid.saml20.domain.mgmt.impl.ServiceManagerImpl] Loaded service {n}",
+    "2023-01-31 17:01:02,124  INFO [org.sourceid.oauth20.token.AccessTokenManager] Issued token for client-{n}",
+    "2023-01-31 17:01:02,125  WARN [com.pingidentity.pa.core.transport.http] Slow backend response in {n} ms",
+    "[31/Jan/2023:17:01:02.126 +0000] SEARCH RESULT instanceName=\"pingdirectory-0\" conn={n} op=2 resultCode=0",
+]
+
+
+def random_secret(length: int) -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits + "!@#$%", k=length))
+
+
+def synthetic_block(line_count: int, leak: str = None) -> bytes:
+    lines = [random.choice(LOG_LINE_TEMPLATES).format(n=random.randint(0, 10 ** 6)) for _ in range(line_count)]
+    if leak:
+        lines[line_count // 2] = f"2023-01-31 17:01:02,127 DEBUG [com.example.Plugin] bind with password {leak}"
+    return ("\n".join(lines) + "\n").encode()
+
+
+def synthetic_log(size_bytes: int, secrets: {}, leak_every_blocks: int):
+    """Yield CHUNK_SIZE chunks of synthetic log data, with a leaked secret every leak_every_blocks chunks"""
+    lines_per_block = CHUNK_SIZE // 110
+    clean_block = synthetic_block(lines_per_block)
+    leaked_values = list(secrets.values())
+    produced = 0
+    block_number = 0
+    while produced < size_bytes:
+        block_number += 1
+        if leak_every_blocks and block_number % leak_every_blocks == 0:
+            block = synthetic_block(lines_per_block, random.choice(leaked_values))
+        else:
+            block = clean_block
+        produced += len(block)
+        yield block
+
+
+def naive_scan(chunks, secrets: {}) -> int:
+    """Baseline similar to the previous shell test: one alternation regex applied line by line"""
+    regex = re.compile("|".join(re.escape(value) for value in secrets.values()).encode())
+    found = 0
+    carry = b""
+    for chunk in chunks:
+        lines = (carry + chunk).split(b"\n")
+        carry = lines.pop()
+        found += sum(1 for line in lines if regex.search(line))
+    return found
+
+
+def run(name: str, size_bytes: int, scan) -> None:
+    start = time.perf_counter()
+    found = scan()
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{name:<22} {size_bytes / 2 ** 30:6.2f} GiB in {elapsed:7.2f}s "
+          f"({size_bytes / 2 ** 20 / elapsed:8.1f} MiB/s), {found} leaked line(s), peak RSS {peak_rss_mb:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark log_secret_scanner on synthetic multi-GB logs")
+    parser.add_argument("--size-gb", type=float, default=2.0, help="Size of the synthetic log in GiB")
+    parser.add_argument("--secrets", type=int, default=5, help="Number of secrets to look for")
+    parser.add_argument("--leak-every", type=int, default=500, help="Leak a secret every N MiB of log")
+    parser.add_argument("--baseline", action="store_true", help="Also run a line-by-line regex baseline")
+    args = parser.parse_args()
+
+    random.seed(42)
+    secrets = {f"SECRET_{i}": random_secret(random.randint(12, 32)) for i in range(args.secrets)}
+    size_bytes = int(args.size_gb * 2 ** 30)
+
+    scanner = SecretScanner(secrets)
+    run("SecretScanner", size_bytes,
+        lambda: sum(1 for _ in scanner.scan(synthetic_log(size_bytes, secrets, args.leak_every))))
+    if args.baseline:
+        run("line-by-line baseline", size_bytes,
+            lambda: naive_scan(synthetic_log(size_bytes, secrets, args.leak_every), secrets))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+PCB = os.path.join(ROOT, "build", "python", "src", "pcb.py")
+VALIDATION_DIR = os.path.join(ROOT, "k8s-configs", "cluster-tools", "base", "git-ops", "validation")
+
+CONFIG_MAP = """apiVersion: v1
+data:
+  KEY: value-{value}
+kind: ConfigMap
+metadata:
+  name: config-{n}
+  namespace: ping-cloud
+"""
+
+
+def write_fixtures(work_dir: str) -> {}:
+    """Write the inputs of the benchmarked commands, and return the name of each input to its path"""
+    paths = {name: os.path.join(work_dir, name) for name in ["descriptor.json", "old.yaml", "new.yaml", "env_vars"]}
+    with open(paths["descriptor.json"], "w") as descriptor:
+        json.dump({region: {"hostname": f"pingfederate.{region}.ping-demo.com", "replicas": 2}
+                   for region in ["us-west-2", "us-east-2", "eu-west-1"]}, descriptor)
+    for name, changed in [("old.yaml", -1), ("new.yaml", 7)]:
+        with open(paths[name], "w") as render:
+            render.write("---\n".join(CONFIG_MAP.format(n=n, value=n + (n % 100 == changed)) for n in range(2000)))
+    with open(paths["env_vars"], "w") as env_vars:
+        env_vars.write("K8S_GIT_URL=https://github.com/pingidentity/ping-cloud-base\nREGION=us-west-2\n")
+    return paths
+
+
+def scenarios(paths: {}, aws: bool) -> [(str, [str], [str])]:
+    """The benchmarked calls, as (pcb command, arguments, the equivalent script and arguments or None)"""
+    calls = [
+        ("verify-descriptor", [paths["descriptor.json"]],
+         [os.path.join(VALIDATION_DIR, "verify_descriptor_json.py"), paths["descriptor.json"]]),
+        ("feature-flags", ["--repo", ROOT, "generate", "--check"], None),
+        ("manifests", ["-f", paths["new.yaml"], "count"], None),
+        ("manifest-diff", ["--old-file", paths["old.yaml"], "--new-file", paths["new.yaml"], "--summary"], None),
+        ("render-workspace", ["substitutable", "--env-file", paths["env_vars"], os.path.join(ROOT, "k8s-configs")],
+         None),
+        ("release-rewrite", ["v1.18-release-branch", "v1.19-release-branch", "branch", "--image", "pingfederate",
+                             "--root", ROOT, "--dry-run"], None),
+    ]
+    if aws:
+        calls.append(("latest-image", ["pingcloud-apps/pingfederate", "v1.18.0.0"],
+                      [os.path.join(ROOT, "build", "python", "src", "get_latest_image.py"),
+                       "pingcloud-apps/pingfederate", "v1.18.0.0"]))
+    return calls
+
+
+def time_call(command: [str], env: {}, runs: int) -> [float]:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name: str, durations: [float]):
+    print(f"  {name:<28} median {statistics.median(durations) * 1000:8.1f} ms, "
+          f"min {min(durations) * 1000:8.1f} ms, max {max(durations) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cold start of the python tools against warm calls to the pcb daemon")
+    parser.add_argument("--runs", type=int, default=10, help="Number of calls of each command and mode")
+    parser.add_argument("--aws", action="store_true", help="Also benchmark latest-image, which needs AWS credentials")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = write_fixtures(work_dir)
+        env = dict(os.environ, PCB_SOCKET=os.path.join(work_dir, "daemon", "pcb.sock"))
+        env.pop("PCB_NO_DAEMON", None)
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, PCB, "daemon", "start", "--idle-timeout", "0"], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        print(f"Daemon started and preloaded in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+        try:
+            for name, command_args, script in scenarios(paths, args.aws):
+                print(f"{name}:")
+                if script:
+                    report("python3 script (cold)", time_call([sys.executable, *script], env, args.runs))
+                report("pcb --no-daemon (cold)",
+                       time_call([sys.executable, PCB, "--no-daemon", name, *command_args], env, args.runs))
+                # The first warm call also imports what the preload could not, e.g. modules imported by main
+                warm = time_call([sys.executable, PCB, name, *command_args], env, args.runs + 1)
+                report("pcb with daemon (first)", warm[:1])
+                report("pcb with daemon (warm)", warm[1:])
+            print()
+            report("python3 -c pass", time_call([sys.executable, "-c", "pass"], env, args.runs))
+            report("pcb --help", time_call([sys.executable, PCB, "--help"], env, args.runs))
+        finally:
+            subprocess.run([sys.executable, PCB, "daemon", "stop"], env=env, stdout=subprocess.DEVNULL)
+
+
+if __name__ == "__main__":
+    main()
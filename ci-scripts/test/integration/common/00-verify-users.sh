@@ -7,124 +7,90 @@ if skipTest "${0}"; then
   exit 0
 fi
 
-# test ping access admin user
-test_ping_user_pa_admin() {
+# Targets of the form SELECTOR@CONTAINER:MIN_PODS. PingDelegator, PingCentral and PingDataSync are optional.
+PA_ADMIN=role=pingaccess-admin@pingaccess-admin:1
+PA_ENGINE=role=pingaccess-engine@pingaccess:2
+PA_WAS_ADMIN=role=pingaccess-was-admin@pingaccess-was-admin:1
+PA_WAS_ENGINE=role=pingaccess-was-engine@pingaccess-was:1
+PF_ADMIN=role=pingfederate-admin@pingfederate-admin:1
+PF_ENGINE=role=pingfederate-engine@pingfederate:2
+PD=role=pingdirectory@pingdirectory:2
+PDEL=role=pingdelegator@pingdelegator:0
+PC=role=pingcentral@pingcentral:0
+PDS=role=pingdatasync@pingdatasync:0
+
+oneTimeSetUp() {
+  REPORT_FILE=$(mktemp)
+
+  # Verify the users of all the products at once
+  verify_pod_users "${REPORT_FILE}" "${PA_ADMIN}" "${PA_ENGINE}" "${PA_WAS_ADMIN}" "${PA_WAS_ENGINE}" \
+    "${PF_ADMIN}" "${PF_ENGINE}" "${PD}" "${PDEL}" "${PC}" "${PDS}"
+}
 
-  verify_ping_user "pingaccess-admin-0" "pingaccess-admin"
+oneTimeTearDown() {
+  rm -f "${REPORT_FILE}"
+}
 
+# test ping access admin user
+test_ping_user_pa_admin() {
+  verify_ping_user "${PA_ADMIN}"
 }
 
 # test ping access engine user
 test_ping_user_pa_engine() {
-
-  # test pingaccess-0 server
-  verify_ping_user "pingaccess-0" "pingaccess"
-
-  # test pingaccess-1 server
-  verify_ping_user "pingaccess-1" "pingaccess"
-
+  verify_ping_user "${PA_ENGINE}"
 }
 
 # test ping access was admin user
 test_ping_user_pa_was_admin() {
-
-  verify_ping_user "pingaccess-was-admin-0" "pingaccess-was-admin"
-
+  verify_ping_user "${PA_WAS_ADMIN}"
 }
 
 # test ping access was engine user
 test_ping_user_pa_was_engine() {
- 
-  # test pingaccess-was-0 server
-  verify_ping_user "pingaccess-was-0" "pingaccess-was"
-
+  verify_ping_user "${PA_WAS_ENGINE}"
 }
 
 # test ping federate admin user
 test_ping_user_pf_admin() {
-
-  verify_ping_user "pingfederate-admin-0" "pingfederate-admin"
-
+  verify_ping_user "${PF_ADMIN}"
 }
 
 # test ping federate engine user
 test_ping_user_pf_engine() {
- 
-  # test pingfederate-0 server
-  verify_ping_user "pingfederate-0" "pingfederate"
-
-  # test pingfederate-1 server
-  verify_ping_user "pingfederate-1" "pingfederate"
-
+  verify_ping_user "${PF_ENGINE}"
 }
 
 # test ping directory user
 test_ping_user_pd() {
-  
-  # test pingdirectory-0 server
-  verify_ping_user "pingdirectory-0" "pingdirectory"
-
-  # test pingdirectory-1 server
-  verify_ping_user "pingdirectory-1" "pingdirectory"
-
+  verify_ping_user "${PD}"
 }
 
 # test ping delegator user
 test_ping_user_pdel() {
-  
-  # get pingdelegator pod name
-  pingdelegator_pods=$(kubectl get pod -n "${PING_CLOUD_NAMESPACE}" --field-selector=status.phase=Running --no-headers -o custom-columns=":metadata.name"  | grep pingdelegator)
-
-  # test pingdelegator server
-  for pingdelegator_pod in ${pingdelegator_pods}; do
-    verify_ping_user "${pingdelegator_pod}" "pingdelegator"
-  done
-
-  }
+  verify_ping_user "${PDEL}"
+}
 
 # test ping central user
 test_ping_user_pc() {
-  
-  # get pingcentral pod name
-  pingcentral_pods=$(kubectl get pod -n "${PING_CLOUD_NAMESPACE}" --field-selector=status.phase=Running --no-headers -o custom-columns=":metadata.name"  | grep pingcentral)
-
-  # test pingcentral server
-  for pingcentral_pod in ${pingcentral_pods}; do
-    verify_ping_user "${pingcentral_pod}" "pingcentral"
-  done
-
-  }
+  verify_ping_user "${PC}"
+}
 
-  # test ping datasync user
+# test ping datasync user
 test_ping_user_pds() {
-  
-  # get pingdatasync pod name
-  pingdatasync_pods=$(kubectl get pod -n "${PING_CLOUD_NAMESPACE}" --field-selector=status.phase=Running --no-headers -o custom-columns=":metadata.name"  | grep pingdatasync)
-
-  # test pingdatasync server
-  for pingdatasync_pod in ${pingdatasync_pods}; do
-    verify_ping_user "${pingdatasync_pod}" "pingdatasync"
-  done
-
-  }
+  verify_ping_user "${PDS}"
+}
 
 verify_ping_user() {
-  SERVER="${1}"
-  CONTAINER="${2}"
-
-  response=$(kubectl exec "${SERVER}" -c "${CONTAINER}" -n "${PING_CLOUD_NAMESPACE}" -- \
-    sh -c "whoami")
-
-  if test "${response}" = "ping"; then
-    log "${SERVER} : Running with ping user"
-    success=0
+  local failures=$(pod_user_failures "${REPORT_FILE}" "${1}")
 
+  if test -z "${failures}"; then
+    log "${1} : Running with ping user"
   else
-    log "${SERVER} Not Running with ping user"
-    success=1
+    log "${1} Not Running with ping user"
   fi
 
-  assertEquals 0 ${success}
+  assertEquals "${failures}" '' "${failures}"
 }
 
 # When arguments are passed to a script you must
@@ -134,4 +100,4 @@ verify_ping_user() {
 shift $#
 
 # load shunit
-. ${SHUNIT_PATH}
\ No newline at end of file
+. ${SHUNIT_PATH}
@@ -2,9 +2,6 @@
 
 . "${PROJECT_DIR}"/ci-scripts/common.sh "${1}"
 . "${PROJECT_DIR}"/ci-scripts/test/integration/pingaccess/util/pa-test-utils.sh
-. "${PROJECT_DIR}"/ci-scripts/test/integration/pingaccess/common-api/create-entity-operations.sh
-. "${PROJECT_DIR}"/ci-scripts/test/integration/pingaccess/common-api/delete-entity-operations.sh
-. "${PROJECT_DIR}"/ci-scripts/test/integration/pingaccess-was/common-api/get-entity-operations.sh
 
 
 if skipTest "${0}"; then
@@ -18,76 +15,58 @@ oneTimeSetUp() {
   # directory to avoid duplication.
   . ${PROJECT_DIR}/ci-scripts/test/integration/pingaccess/util/pa-test-utils.sh
 
-  SCRIPT_HOME=$(cd $(dirname ${0}); pwd)
-  . ${SCRIPT_HOME}/common-api/get-entity-operations.sh
-
   export PA_ADMIN_PASSWORD=2FederateM0re
   export templates_dir_path="${PROJECT_DIR}"/ci-scripts/test/integration/pingaccess/templates
 
+  # Get all the entities checked by the tests at once, instead of with a request per test
+  PA_WAS_ENTITIES=$(pa_admin_api "${PINGACCESS_WAS_API}" get webSessions/10 applications/reserved \
+    sites/10 sites/20 sites/21 sites/22 sites/23 sites/24 \
+    virtualhosts/10 virtualhosts/20 virtualhosts/21 virtualhosts/22 virtualhosts/23 virtualhosts/24 \
+    applications/10 applications/20 applications/21 applications/22 applications/23 applications/24)
 }
 
-testWebSession() {
-  response=$(get_web_session "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "10")
-  assertEquals "Response value was ${response}" 0 $?
+# Prints a field of an entity got by oneTimeSetUp, e.g. pa_was_value sites/10 name
+pa_was_value() {
+  entity_value "${PA_WAS_ENTITIES}" "${1}" "${2}"
+}
 
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'P14C Session' "$(strip_double_quotes "${name}")"
+testWebSession() {
+  name=$(pa_was_value webSessions/10 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'P14C Session' "${name}"
 }
 
 testPaSite() {
-  response=$(get_site "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "10")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'PingAccess Admin Console' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value sites/10 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'PingAccess Admin Console' "${name}"
 }
 
 testPfSite() {
-  response=$(get_site "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "20")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'PingFederate Admin Console' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value sites/20 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'PingFederate Admin Console' "${name}"
 }
 
 testKibanaSite() {
-  response=$(get_site "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "21")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Kibana' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value sites/21 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Kibana' "${name}"
 }
 
 testGrafanaSite() {
-  response=$(get_site "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "22")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Grafana' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value sites/22 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Grafana' "${name}"
 }
 
 testPrometheusSite() {
-  response=$(get_site "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "23")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Prometheus' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value sites/23 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Prometheus' "${name}"
 }
 
 testArgocdSite() {
-  response=$(get_site "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "24")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Argo CD' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value sites/24 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Argo CD' "${name}"
 }
 
 testPaVirtualHost() {
-  response=$(get_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "10")
-  assertEquals "Response value was ${response}" 0 $?
-
-  host=$(parse_value_from_response "${response}" 'host')
-  stripped_host=$(strip_double_quotes "${host}")
+  stripped_host=$(pa_was_value virtualhosts/10 host)
 
   if [[ ${stripped_host} =~ ^pingaccess-admin.* ]]; then
     assertContains "${stripped_host}" 'pingaccess-admin'
@@ -97,11 +76,7 @@ testPaVirtualHost() {
 }
 
 testPfVirtualHost() {
-  response=$(get_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "20")
-  assertEquals "Response value was ${response}" 0 $?
-
-  host=$(parse_value_from_response "${response}" 'host')
-  stripped_host=$(strip_double_quotes "${host}")
+  stripped_host=$(pa_was_value virtualhosts/20 host)
 
   if [[ ${stripped_host} =~ ^pingfederate-admin.* ]]; then
     assertContains "${stripped_host}" 'pingfederate-admin'
@@ -111,11 +86,7 @@ testPfVirtualHost() {
 }
 
 testKibanaVirtualHost() {
-  response=$(get_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "21")
-  assertEquals "Response value was ${response}" 0 $?
-
-  host=$(parse_value_from_response "${response}" 'host')
-  stripped_host=$(strip_double_quotes "${host}")
+  stripped_host=$(pa_was_value virtualhosts/21 host)
 
   if [[ ${stripped_host} =~ ^logs.* ]]; then
     assertContains "${stripped_host}" 'logs'
@@ -125,11 +96,7 @@ testKibanaVirtualHost() {
 }
 
 testGrafanaVirtualHost() {
-  response=$(get_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "22")
-  assertEquals "Response value was ${response}" 0 $?
-
-  host=$(parse_value_from_response "${response}" 'host')
-  stripped_host=$(strip_double_quotes "${host}")
+  stripped_host=$(pa_was_value virtualhosts/22 host)
 
   if [[ ${stripped_host} =~ ^monitoring.* ]]; then
     assertContains "${stripped_host}" 'monitoring'
@@ -139,11 +106,7 @@ testGrafanaVirtualHost() {
 }
 
 testPrometheusVirtualHost() {
-  response=$(get_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "23")
-  assertEquals "Response value was ${response}" 0 $?
-
-  host=$(parse_value_from_response "${response}" 'host')
-  stripped_host=$(strip_double_quotes "${host}")
+  stripped_host=$(pa_was_value virtualhosts/23 host)
 
   if [[ ${stripped_host} =~ ^prometheus.* ]]; then
     assertContains "${stripped_host}" 'prometheus'
@@ -153,11 +116,7 @@ testPrometheusVirtualHost() {
 }
 
 testArgocdVirtualHost() {
-  response=$(get_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "24")
-  assertEquals "Response value was ${response}" 0 $?
-
-  host=$(parse_value_from_response "${response}" 'host')
-  stripped_host=$(strip_double_quotes "${host}")
+  stripped_host=$(pa_was_value virtualhosts/24 host)
 
   if [[ ${stripped_host} =~ ^argocd.* ]]; then
     assertContains "${stripped_host}" 'argocd'
@@ -167,59 +126,38 @@ testArgocdVirtualHost() {
 }
 
 testPaApplication() {
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "10")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'PingAccess App' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value applications/10 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'PingAccess App' "${name}"
 }
 
 testPfApplication() {
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "20")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'PingFederate App' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value applications/20 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'PingFederate App' "${name}"
 }
 
 testKibanaApplication() {
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "21")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Kibana App' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value applications/21 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Kibana App' "${name}"
 }
 
 testGrafanaApplication() {
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "22")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Grafana App' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value applications/22 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Grafana App' "${name}"
 }
 
 testPrometheusApplication() {
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "23")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Prometheus App' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value applications/23 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Prometheus App' "${name}"
 }
 
 testArgocdApplication() {
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "24")
-  assertEquals "Response value was ${response}" 0 $?
-
-  name=$(parse_value_from_response "${response}" 'name')
-  assertEquals "Name value was ${name}" 'Argo CD App' "$(strip_double_quotes "${name}")"
+  name=$(pa_was_value applications/24 name)
+  assertEquals "Name value was ${name}, the entities were ${PA_WAS_ENTITIES}" 'Argo CD App' "${name}"
 }
 
 testUpdatedApplicationReservedPath() {
-  response=$(get_entity "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}/applications/reserved")
-  assertEquals "Response value was ${response}" 0 $?
-
-  context_root=$(parse_value_from_response "${response}" 'contextRoot')
-  assertEquals '/pa-was' "$(strip_double_quotes "${context_root}")"
+  context_root=$(pa_was_value applications/reserved contextRoot)
+  assertEquals "The entities were ${PA_WAS_ENTITIES}" '/pa-was' "${context_root}"
 }
 
 testPaWasIdempotent() {
@@ -230,19 +168,20 @@ testPaWasIdempotent() {
 
   # Cleanup from possible previous run failures
   log "Deleting app: ${APP_NAME} if it exists"
-  response=$(delete_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "${APP_ID}")
+  response=$(pa_admin_api "${PINGACCESS_WAS_API}" delete "applications/${APP_ID}" --missing-ok 2>&1)
 
   upload_job="${PROJECT_DIR}"/k8s-configs/ping-cloud/base/pingaccess-was/admin/aws/backup.yaml
   log "Deleting pa-was backup job if it exists"
   kubectl delete -f "${upload_job}" -n "${PING_CLOUD_NAMESPACE}"
 
   log "Creating new App: ${APP_NAME}"
-  response=$(create_site_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}")
+  response=$(pa_admin_api "${PINGACCESS_WAS_API}" create \
+    applications="${templates_dir_path}"/create-site-application-payload.json 2>&1)
   assertEquals "Response value was ${response}" 0 $?
 
   log "Deleting PingAccess App"
   pa_app_id=10
-  response=$(delete_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "${pa_app_id}")
+  response=$(pa_admin_api "${PINGACCESS_WAS_API}" delete "applications/${pa_app_id}" 2>&1)
   assertEquals "Response value was ${response}" 0 $?
 
   log "Backing up PA-WAS"
@@ -261,14 +200,12 @@ testPaWasIdempotent() {
   kubectl wait --for=condition=ready --timeout=300s pod -l role=pingaccess-was-admin -n "${PING_CLOUD_NAMESPACE}"
   sleep 3
 
-  log "Verifying the PingAccess App recreated on restart"
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "${pa_app_id}")
-  assertEquals "The PingAccess App not present after restart: ${response}"  0 $?
-
-  APP_ID=123 # Unset elsewhere
-  log "Verifying the new App: ${APP_NAME} still present"
-  response=$(get_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_WAS_API}" "${APP_ID}")
-  assertEquals "The new App: ${APP_NAME} should have been present after restart: ${response}" 0 $?
+  log "Verifying the PingAccess App recreated on restart and the new App: ${APP_NAME} still present"
+  response=$(pa_admin_api "${PINGACCESS_WAS_API}" get "applications/${pa_app_id}" "applications/${APP_ID}")
+  assertNotNull "The PingAccess App not present after restart: ${response}" \
+    "$(entity_value "${response}" "applications/${pa_app_id}" id)"
+  assertNotNull "The new App: ${APP_NAME} should have been present after restart: ${response}" \
+    "$(entity_value "${response}" "applications/${APP_ID}" id)"
 
 }
 
@@ -10,9 +10,7 @@ fi
 oneTimeSetUp() {
 
   SCRIPT_HOME=$(cd $(dirname ${0}); pwd)
-  . ${SCRIPT_HOME}/common-api/create-entity-operations.sh
-  . ${SCRIPT_HOME}/common-api/get-entity-operations.sh
-  . ${SCRIPT_HOME}/common-api/delete-entity-operations.sh
+  . ${SCRIPT_HOME}/util/pa-test-utils.sh
   . ${SCRIPT_HOME}/runtime/send-request-to-agent-port.sh
 
   export PA_ADMIN_PASSWORD=2FederateM0re
@@ -25,63 +23,62 @@ testAgentConfig() {
   pa_engine_host='pingaccess'
   agent_name='agent1'
 
-  # If the app exists, then delete it
-  get_application_response=$(get_application_by_name "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" 'app1')
-  application_id=$(parse_value_from_array_response "${get_application_response}" 'id')
+  # Get the entities left by a previous run at once
+  applications_query='applications?name=app1'
+  agents_query='agents?name=agent1'
+  virtual_hosts_query='virtualhosts?virtualHost=*%3A443'
+  existing_response=$(pa_admin_api "${PINGACCESS_API}" get "${applications_query}" "${agents_query}" "${virtual_hosts_query}")
+  assertEquals "Failed to get the existing entities: ${existing_response}" 0 $?
 
-  if [[ "${application_id}" != '' ]]; then
+  # If the app exists, then delete it first, because it uses the agent and the virtual host
+  existing_applications=$(item_ids "${existing_response}" "${applications_query}" | sed 's|^|applications/|')
+  if [[ "${existing_applications}" != '' ]]; then
     log "Found an existing application. Deleting it..."
-    delete_application_response=$(delete_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${application_id}")
+    delete_application_response=$(pa_admin_api "${PINGACCESS_API}" delete ${existing_applications} 2>&1)
     assertEquals "Failed to delete the application: ${delete_application_response}" 0 $?
   fi
 
-  # If the agent exists, then delete it 
-  get_agent_response=$(get_agent_by_name "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" 'agent1')
-  agent_id=$(parse_value_from_array_response "${get_agent_response}" 'id')
-
-  if [[ "${agent_id}" != '' ]]; then
-    log "Found an existing agent. Deleting it..."
-    # Remove the agent
-    delete_agent_response=$(delete_agent "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${agent_id}")
-    assertEquals "Failed to delete the agent: ${delete_agent_response}" 0 $?
-  fi
-
-  # If the virtual host exists, delete it 
-  get_virtual_host_response=$(get_virtual_host_by_host_port "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" '*%3A443')
-  virtual_host_id=$(parse_value_from_array_response "${get_virtual_host_response}" 'id')
-
-  if [[ "${virtual_host_id}" != '' ]]; then
-    log "Found an existing virtual host. Deleting it..."
-    delete_virtual_host_response=$(delete_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${virtual_host_id}")
-    assertEquals "Failed to remove the virtual host with the virtual_host_id: ${virtual_host_id}.  The response was: ${delete_virtual_host_response}" 0 $?
+  # If the agent or the virtual host exist, then delete them
+  existing_entities="$(item_ids "${existing_response}" "${agents_query}" | sed 's|^|agents/|')
+$(item_ids "${existing_response}" "${virtual_hosts_query}" | sed 's|^|virtualhosts/|')"
+  if [[ "$(echo ${existing_entities})" != '' ]]; then
+    log "Found an existing agent or virtual host. Deleting them..."
+    delete_entities_response=$(pa_admin_api "${PINGACCESS_API}" delete ${existing_entities} 2>&1)
+    assertEquals "Failed to delete the agent or virtual host: ${delete_entities_response}" 0 $?
   fi
 
-  # Always create a shared secret
-  create_shared_secret_response=$(create_shared_secret "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${agent_shared_secret}")
-  assertEquals "Failed to create a shared secret with POST request to: ${PINGACCESS_API} using admin password: ${PA_ADMIN_PASSWORD}.  The response was ${create_shared_secret_response}" 0 $?
-  
-  shared_secret_id=$(parse_value_from_response "${create_shared_secret_response}" 'id')
-  assertEquals "Failed to parse the id from the shared secret response: ${create_shared_secret_response}" 0 $?
-
-  # Create virtual host
-  create_virtual_host_response=$(create_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}")
-  assertEquals "Failed to create the virtual host with the response: ${create_virtual_host_response}" 0 $?
-
-  virtual_host_id=$(parse_value_from_response "${create_virtual_host_response}" 'id')
+  # Always create a shared secret, along with the virtual host
+  export AGENT_SHARED_SECRET="${agent_shared_secret}"
+  create_response=$(pa_admin_api "${PINGACCESS_API}" create \
+    sharedSecrets="${templates_dir_path}"/create-shared-secret-payload.json \
+    virtualhosts="${templates_dir_path}"/create-vhost-payload.json)
+  assertEquals "Failed to create a shared secret and the virtual host with POST requests to: ${PINGACCESS_API}.  The response was ${create_response}" 0 $?
+  unset AGENT_SHARED_SECRET
+
+  shared_secret_id=$(jq -r '.[0].id' <<< "${create_response}")
+  assertEquals "Failed to parse the id from the shared secret response: ${create_response}" 0 $?
+  virtual_host_id=$(jq -r '.[1].id' <<< "${create_response}")
   assertEquals "Failed to parse the id from the newly created virtual host" 0 $?
 
   # Create agent
-  create_agent_response=$(create_agent "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" ${shared_secret_id} "${pa_engine_host}")
+  export SHARED_SECRET_ID=${shared_secret_id}
+  export PA_ENGINE_HOST=${pa_engine_host}
+  create_agent_response=$(pa_admin_api "${PINGACCESS_API}" create agents="${templates_dir_path}"/create-agent-payload.json)
   assertEquals "Failed to create the agent with a shared secret id of ${shared_secret_id} with the response: ${create_agent_response}" 0 $?
+  unset SHARED_SECRET_ID PA_ENGINE_HOST
 
-  agent_id=$(parse_value_from_response "${create_agent_response}" 'id')
+  agent_id=$(jq -r '.[0].id' <<< "${create_agent_response}")
   assertEquals "Failed to parse the id from the agent response: ${create_agent_response}" 0 $?
 
   # Create application
-  create_application_response=$(create_agent_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${agent_id}" "${virtual_host_id}")
-  assertEquals "Failed to create the application with a password of ${PA_ADMIN_PASSWORD}, an agent_id of ${agent_id} and a virtual_host_id of ${virtual_host_id}.  The response was: ${create_application_response}" 0 $?
-
-  application_id=$(parse_value_from_response "${create_application_response}" 'id')
+  export AGENT_ID=${agent_id}
+  export VIRTUAL_HOST_ID=${virtual_host_id}
+  create_application_response=$(pa_admin_api "${PINGACCESS_API}" create \
+    applications="${templates_dir_path}"/create-agent-application-payload.json)
+  assertEquals "Failed to create the application with an agent_id of ${agent_id} and a virtual_host_id of ${virtual_host_id}.  The response was: ${create_application_response}" 0 $?
+  unset AGENT_ID VIRTUAL_HOST_ID
+
+  application_id=$(jq -r '.[0].id' <<< "${create_application_response}")
   assertEquals "Failed to parse the id from the application response" 0 $?
 
   # sleep 3 seconds to allow the config
@@ -95,17 +92,12 @@ testAgentConfig() {
 
   log "Request sent to the agent port on pingaccess-0 was successful"
 
-  # Remove the app
-  delete_application_response=$(delete_application "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${application_id}")
+  # Remove the app, then the agent and the virtual host it used
+  delete_application_response=$(pa_admin_api "${PINGACCESS_API}" delete "applications/${application_id}" 2>&1)
   assertEquals "Failed to remove the application app1 with the application_id: ${application_id}.  The response was: ${delete_application_response}" 0 $?
 
-  # Remove the agent
-  delete_agent_response=$(delete_agent "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${agent_id}")
-  assertEquals "Failed to remove the agent with the agent_id: ${agent_id}.  The response was: ${delete_agent_response}" 0 $?
-
-  # Remove the virtual host
-  delete_virtual_host_response=$(delete_virtual_host "${PA_ADMIN_PASSWORD}" "${PINGACCESS_API}" "${virtual_host_id}")
-  assertEquals "Failed to remove the virtual host with the virtual_host_id: ${virtual_host_id}.  The response was: ${delete_virtual_host_response}" 0 $?
+  delete_entities_response=$(pa_admin_api "${PINGACCESS_API}" delete "agents/${agent_id}" "virtualhosts/${virtual_host_id}" 2>&1)
+  assertEquals "Failed to remove the agent with the agent_id: ${agent_id} or the virtual host with the virtual_host_id: ${virtual_host_id}.  The response was: ${delete_entities_response}" 0 $?
 }
 
 tearDown() {
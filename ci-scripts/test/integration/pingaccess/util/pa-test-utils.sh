@@ -21,4 +21,27 @@ function strip_double_quotes() {
   temp="${1%\"}"
   temp="${temp#\"}"
   echo ${temp}
-}
\ No newline at end of file
+}
+
+# Calls the PingAccess admin API at ${1} with ci-scripts/test/python-utils/pa_admin_client.py, which sends all requests
+# of one call concurrently over keep-alive connections. The remaining arguments are the command and its entity refs,
+# e.g. pa_admin_api "${PINGACCESS_API}" get sites/10 'agents?name=agent1'. Uses the password in ${PA_ADMIN_PASSWORD}.
+function pa_admin_api() {
+  set +x
+  local endpoint="${1}"
+  shift
+
+  python3 "${PROJECT_DIR}"/ci-scripts/test/python-utils/pa_admin_client.py --url "${endpoint}" "$@"
+}
+
+# Prints a field of an entity in the output of pa_admin_api get, e.g. entity_value "${response}" sites/10 name
+function entity_value() {
+  set +x
+  jq -r --arg ref "${2}" --arg field "${3}" '.[$ref][$field] // empty' <<< "${1}"
+}
+
+# Prints the ids of the items of a query in the output of pa_admin_api get, one per line
+function item_ids() {
+  set +x
+  jq -r --arg ref "${2}" '.[$ref].items[]?.id' <<< "${1}"
+}
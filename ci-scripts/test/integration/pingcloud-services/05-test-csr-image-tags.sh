@@ -8,146 +8,75 @@ if skipTest "${0}"; then
 fi
 
 oneTimeSetUp() {
-  . "${PROJECT_DIR}"/code-gen/templates/common/base/env_vars
-
   log "Query endpoint: ${PINGCLOUD_METADATA_API}"
-  RETURN_VAL=$(curl -s -m 5 -k -L "${PINGCLOUD_METADATA_API}")
-  assertEquals "Failed to connect to: ${PINGCLOUD_METADATA_API}" 0 $?
 
-  TEMP_FILE_METADATA="$(mktemp)"
-  echo "${RETURN_VAL}" | jq -r '.version [].image' | grep -v 'N/A' > "${TEMP_FILE_METADATA}"
+  # Read the metadata API and the env_vars defaults once, and join them by product
+  DRIFT_REPORT="$(mktemp)"
+  python3 "${PROJECT_DIR}"/build/python/src/image_drift.py \
+      --env-vars "${PROJECT_DIR}"/code-gen/templates/common/base/env_vars \
+      --metadata-url "${PINGCLOUD_METADATA_API}" --insecure \
+      --json "${DRIFT_REPORT}"
+  assertTrue "Failed to build the image drift report from: ${PINGCLOUD_METADATA_API}" "test -s ${DRIFT_REPORT}"
 }
 
-getUniqueTagCount() {
-  pod_name="${1}"
-  echo $(cat "${TEMP_FILE_METADATA}" | grep ${pod_name} | sort -u | wc -l | awk '{ print $1 }')
+oneTimeTearDown() {
+  rm -f "${DRIFT_REPORT}"
 }
 
-getMatchedTagCount() {
-  image_tag_name="${1}"
-  pod_name="${2}"
-  echo $(cat "${TEMP_FILE_METADATA}" | grep ${pod_name} | sort -u \
-        | grep ${image_tag_name} | wc -l | awk '{ print $1 }')
+assertImageTag() {
+  product="${1}"
+  image_tag_var="${2}"
+  product_name="${3}"
+
+  default_tag=$(jq -r --arg p "${product}" '.[$p].default // empty' "${DRIFT_REPORT}")
+  assertNotNull "${image_tag_var} missing from env_vars file" "${default_tag}"
+
+  unique_count=$(jq -r --arg p "${product}" '.[$p].metadata | length' "${DRIFT_REPORT}")
+  assertEquals "${product_name} is using multiple image tag versions" 1 "${unique_count}"
+
+  matched_count=$(jq -r --arg p "${product}" --arg d "${default_tag}" \
+      '[.[$p].metadata[] | select(. == $d)] | length' "${DRIFT_REPORT}")
+  assertEquals "${product_name} CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
 }
 
 testPingAccessImageTag() {
-  $(test "${PINGACCESS_IMAGE_TAG}")
-  assertEquals "PINGACCESS_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(echo "${RETURN_VAL}" \
-                | jq '.version | with_entries( select(.key|contains("pingaccess") ) )' \
-                | jq '. | with_entries( select(.key|contains("pingaccess-was") | not) )| .[].image' \
-                | sort -u | grep "pingaccess" | wc -l | awk '{ print $1 }')
-  assertEquals "PingAccess is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(echo "${RETURN_VAL}" \
-                | jq '.version | with_entries( select(.key|contains("pingaccess") ) )' \
-                | jq '. | with_entries( select(.key|contains("pingaccess-was") | not) ) | .[].image' \
-                | sort -u | grep "pingaccess" | grep ${PINGACCESS_IMAGE_TAG} |  wc -l | awk '{ print $1 }')
-  assertEquals "PingAccess CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "pingaccess" "PINGACCESS_IMAGE_TAG" "PingAccess"
 }
 
 testPingAccessWASImageTag() {
-  $(test "${PINGACCESS_WAS_IMAGE_TAG}")
-  assertEquals "PINGACCESS_WAS_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(echo "${RETURN_VAL}" \
-                | jq '.version | with_entries( select( .key|contains("pingaccess-was") ) ) | .[].image' \
-                | sort -u | grep "pingaccess" | wc -l | awk '{ print $1 }')
-  assertEquals "PingAccess WAS is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(echo "${RETURN_VAL}" \
-                | jq '.version | with_entries( select( .key|contains("pingaccess-was") ) ) | .[].image' \
-                | sort -u | grep "pingaccess" | grep ${PINGACCESS_WAS_IMAGE_TAG} | wc -l | awk '{ print $1 }')
-  assertEquals "PingAccess WAS CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "pingaccess-was" "PINGACCESS_WAS_IMAGE_TAG" "PingAccess WAS"
 }
 
 testPingFederateImageTag() {
-  $(test "${PINGFEDERATE_IMAGE_TAG}")
-  assertEquals "PINGFEDERATE_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "pingfederate")
-  assertEquals "PingFederate is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${PINGFEDERATE_IMAGE_TAG}" "pingfederate")
-  assertEquals "PingFederate CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "pingfederate" "PINGFEDERATE_IMAGE_TAG" "PingFederate"
 }
 
 testPingDirectoryImageTag() {
-  $(test "${PINGDIRECTORY_IMAGE_TAG}")
-  assertEquals "PINGDIRECTORY_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "pingdirectory")
-  assertEquals "PingDirectory is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${PINGDIRECTORY_IMAGE_TAG}" "pingdirectory")
-  assertEquals "PingDirectory CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "pingdirectory" "PINGDIRECTORY_IMAGE_TAG" "PingDirectory"
 }
 
 testPingDelegatorImageTag() {
-  $(test "${PINGDELEGATOR_IMAGE_TAG}")
-  assertEquals "PINGDELEGATOR_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "pingdelegator")
-  assertEquals "PingDelegator is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${PINGDELEGATOR_IMAGE_TAG}" "pingdelegator")
-  assertEquals "PingDelegator CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "pingdelegator" "PINGDELEGATOR_IMAGE_TAG" "PingDelegator"
 }
 
 testPingCentralImageTag() {
-  $(test "${PINGCENTRAL_IMAGE_TAG}")
-  assertEquals "PINGCENTRAL_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "pingcentral")
-  assertEquals "PingCentral is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${PINGCENTRAL_IMAGE_TAG}" "pingcentral")
-  assertEquals "PingCentral CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "pingcentral" "PINGCENTRAL_IMAGE_TAG" "PingCentral"
 }
 
 testMetadataImageTag() {
-  $(test "${METADATA_IMAGE_TAG}")
-  assertEquals "METADATA_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "metadata")
-  assertEquals "PingCloud Metadata is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${METADATA_IMAGE_TAG}" "metadata")
-  assertEquals "PingCloud Metadata CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "metadata" "METADATA_IMAGE_TAG" "PingCloud Metadata"
 }
 
 testBootstrapImageTag() {
-  $(test "${BOOTSTRAP_IMAGE_TAG}")
-  assertEquals "BOOTSTRAP_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "bootstrap")
-  assertEquals "Bootstrap is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${BOOTSTRAP_IMAGE_TAG}" "bootstrap")
-  assertEquals "Bootstrap CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "bootstrap" "BOOTSTRAP_IMAGE_TAG" "Bootstrap"
 }
 
 testP14CIntegrationImageTag() {
-  $(test "${P14C_INTEGRATION_IMAGE_TAG}")
-  assertEquals "P14C_INTEGRATION_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "p14c-integration")
-  assertEquals "P14C Integration is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${P14C_INTEGRATION_IMAGE_TAG}" "p14c-integration")
-  assertEquals "P14C Integration CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "p14c-integration" "P14C_INTEGRATION_IMAGE_TAG" "P14C Integration"
 }
 
 testAnsibleBelugaImageTag() {
-  $(test "${ANSIBLE_BELUGA_IMAGE_TAG}")
-  assertEquals "ANSIBLE_BELUGA_IMAGE_TAG missing from env_vars file" 0 $?
-
-  unique_count=$(getUniqueTagCount "ansible-beluga")
-  assertEquals "Ansible Beluga is using multiple image tag versions" 1 "${unique_count}"
-
-  matched_count=$(getMatchedTagCount "${ANSIBLE_BELUGA_IMAGE_TAG}" "ansible-beluga")
-  assertEquals "Ansible Beluga CSR image tag doesn't match Beluga default image tag" 1 "${matched_count}"
+  assertImageTag "ansible-beluga" "ANSIBLE_BELUGA_IMAGE_TAG" "Ansible Beluga"
 }
 
 # When arguments are passed to a script you must
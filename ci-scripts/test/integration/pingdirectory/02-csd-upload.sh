@@ -18,12 +18,7 @@ testPingDirectoryCsdUpload() {
   log "Waiting for CSD upload job to complete"
   kubectl wait --for=condition=complete --timeout=900s job/pingdirectory-csd-upload -n "${PING_CLOUD_NAMESPACE}"
 
-  log "Expected CSD files:"
-  expected_files "${upload_csd_job_name}" | tee /tmp/expected.txt
-
-  sleep 5
-
-  verify_upload_with_timeout "pingdirectory"
+  verify_csd_upload "${upload_csd_job_name}" "pingdirectory"
   assertEquals 0 $?
 }
 
@@ -12,8 +12,6 @@ oneTimeSetUp() {
 
   NUM_REPLICAS=$(kubectl get statefulset "${PRODUCT_NAME}" -o jsonpath='{.spec.replicas}' -n "${PING_CLOUD_NAMESPACE}")
 
-  TEMP_FILE=$(mktemp)
-
   PINGDATA_EXT_ARTIFACT_NAME="pingdata-extensions"
   PINGDATA_EXT_ARTIFACT_VERSION="1.0.2"
   PINGDATA_EXT_ARTIFACT_FILENAME="${PINGDATA_EXT_ARTIFACT_NAME}-${PINGDATA_EXT_ARTIFACT_VERSION}.zip"
@@ -37,6 +35,71 @@ oneTimeSetUp() {
 
     REPLICA_INDEX=$((REPLICA_INDEX - 1))
   done
+
+  # The cases run in this order in every server, each after the previous one, like the tests below. Each case starts
+  # from an empty target directory.
+  PLAN_FILE=$(mktemp)
+  REPORT_FILE=$(mktemp)
+  cat > "${PLAN_FILE}" <<-EOF
+  {
+    "env": {
+      "ARTIFACT_REPO_URL": "${ARTIFACT_REPO_URL}"
+    },
+    "artifact_list_path": "${ARTIFACT_JSON}",
+    "inventory": ["${TARGET_DIR}/*"],
+    "cases": [
+      {
+        "name": "empty",
+        "remove": ["${TARGET_DIR}/*"],
+        "artifact_list": [],
+        "status": 0
+      },
+      {
+        "name": "invalid-json",
+        "remove": ["${TARGET_DIR}/*"],
+        "artifact_list": "[{\"name\" \"${PINGDATA_EXT_ARTIFACT_NAME}\"}]",
+        "status": 1
+      },
+      {
+        "name": "duplicate",
+        "remove": ["${TARGET_DIR}/*"],
+        "artifact_list": [
+          {"name": "${PINGDATA_EXT_ARTIFACT_NAME}", "version": "${PINGDATA_EXT_ARTIFACT_VERSION}"},
+          {"name": "${PINGDATA_EXT_ARTIFACT_NAME}", "version": "${PINGDATA_EXT_ARTIFACT_VERSION}"}
+        ],
+        "status": 1
+      },
+      {
+        "name": "missing-name",
+        "remove": ["${TARGET_DIR}/*"],
+        "artifact_list": [{"version": "${PINGDATA_EXT_ARTIFACT_VERSION}"}],
+        "status": 1
+      },
+      {
+        "name": "missing-version",
+        "remove": ["${TARGET_DIR}/*"],
+        "artifact_list": [{"name": "${PINGDATA_EXT_ARTIFACT_NAME}"}],
+        "status": 1
+      },
+      {
+        "name": "valid",
+        "remove": ["${TARGET_DIR}/*"],
+        "artifact_list": [
+          {
+            "name": "${PINGDATA_EXT_ARTIFACT_NAME}",
+            "version": "${PINGDATA_EXT_ARTIFACT_VERSION}",
+            "filename": "${PINGDATA_EXT_ARTIFACT_FILENAME}"
+          }
+        ],
+        "status": 0,
+        "present": ["${TARGET_DIR}/${PINGDATA_EXT_ARTIFACT_FILENAME}"]
+      }
+    ]
+  }
+EOF
+
+  # Run all the cases in the servers at once
+  verify_artifacts "${PLAN_FILE}" "${REPORT_FILE}" --statefulset "${PRODUCT_NAME}"
 }
 
 oneTimeTearDown() {
@@ -54,37 +117,13 @@ oneTimeTearDown() {
 
     REPLICA_INDEX=$((REPLICA_INDEX - 1))
   done
-}
-
-tearDown() {
-  [[ "${_shunit_name_}" = 'EXIT' ]] && return 0
-
-  # Set to clean testing state.
-  REPLICA_INDEX=$((NUM_REPLICAS - 1))
-  while test ${REPLICA_INDEX} -gt -1; do
-    SERVER="${PRODUCT_NAME}-${REPLICA_INDEX}"
-
-    kubectl exec ${SERVER} -n "${PING_CLOUD_NAMESPACE}" -c "${CONTAINER}" -- sh -c "cp ${ARTIFACT_JSON_BACKUP} ${ARTIFACT_JSON}"
-
-    kubectl exec ${SERVER} -n "${PING_CLOUD_NAMESPACE}" -c "${CONTAINER}" -- sh -c "rm -rf ${TARGET_DIR}/*"
-    
-    REPLICA_INDEX=$((REPLICA_INDEX - 1))
-  done
-}
 
-# Helper Methods
-set_artifact_list_json_file() {
-  kubectl cp ${TEMP_FILE} "${SERVER}":/opt/staging/artifacts/artifact-list.json  -c "${CONTAINER}" -n "${PING_CLOUD_NAMESPACE}"
-  kubectl exec "${SERVER}" -n "${PING_CLOUD_NAMESPACE}" -c "${CONTAINER}" -- sh -c "cat /opt/staging/artifacts/artifact-list.json"
+  rm -f "${PLAN_FILE}" "${REPORT_FILE}"
 }
 
-run_artifact_script() {
-  # Set ARTIFACT_REPO_URL to "s3://ci-cd-artifacts-bucket" before running artifact script.
-  # This bucket will always maintain the custom plugins to execute test.
-  kubectl exec ${SERVER} -n "${PING_CLOUD_NAMESPACE}" -c "${CONTAINER}" -- sh -c \
-    "ARTIFACT_REPO_URL=${ARTIFACT_REPO_URL}; \
-    /opt/staging/hooks/10-download-artifact.sh" > /dev/null 2>&1
-  return ${?}
+assert_case_passed() {
+  local failures=$(artifact_case_failures "${REPORT_FILE}" "${1}")
+  assertEquals "${2}: ${failures}" '' "${failures}"
 }
 
 # Test Methods
@@ -92,212 +131,42 @@ run_artifact_script() {
 # Validate when artifact JSON is an empty list.
 # Script is expected to ignore JSON and exit with the non-status code 0.
 testEmptyJson() {
-  local expected_status_code=0
-
-  REPLICA_INDEX=$((NUM_REPLICAS - 1))
-  while test ${REPLICA_INDEX} -gt -1; do
-    SERVER="${PRODUCT_NAME}-${REPLICA_INDEX}"
-
-    log "Observing logs: Server: ${SERVER}, Container: ${CONTAINER}"
-
-    cat > ${TEMP_FILE} <<-EOF
-    []
-EOF
-
-    # Set file to empty list.
-    set_artifact_list_json_file
-    
-    # Run artifact script and capture actual status code from script.
-    run_artifact_script
-    actual_status_code=${?}
-
-    assertEquals "empty_json_test test failed" ${expected_status_code} ${actual_status_code}
-
-    REPLICA_INDEX=$((REPLICA_INDEX - 1))
-  done
+  log "Test empty JSON list"
+  assert_case_passed empty "empty_json_test test failed"
 }
 
 # Script is expected to terminate and exit with the error code 1.
 testInvalidJson() {
-  local expected_status_code=1
-
-  REPLICA_INDEX=$((NUM_REPLICAS - 1))
-  while test ${REPLICA_INDEX} -gt -1; do
-    SERVER="${PRODUCT_NAME}-${REPLICA_INDEX}"
-
-    log "Observing logs: Server: ${SERVER}, Container: ${CONTAINER}"
-
-    cat > ${TEMP_FILE} <<-EOF
-    [{"name" "${PINGDATA_EXT_ARTIFACT_NAME}"}]
-EOF
-
-    # Set file to invalid JSON.
-    set_artifact_list_json_file
-
-    # Run artifact script and capture actual status code from script.
-    run_artifact_script
-    actual_status_code=${?}
-
-    # Return 0 if the actual status code from an invalid JSON is is equal to the expected.
-    assertEquals "invalid_json_test failed" ${expected_status_code} ${actual_status_code} 
-
-    REPLICA_INDEX=$((REPLICA_INDEX - 1))
-  done
+  log "Test invalid JSON"
+  assert_case_passed invalid-json "invalid_json_test failed"
 }
 
 # Validate when artifact JSON has duplicates.
 # Script is expected to terminate and exit with the error code 1.
 testDuplicateJson() {
-  local expected_status_code=1
-
   log "Test duplicate artifacts"
-  for SERVER in ${SERVERS}; do
-
-    # Set the container name.
-    test "${SERVER}" == "${PRODUCT_NAME}-admin-0" && CONTAINER="${PRODUCT_NAME}-admin" || CONTAINER="${PRODUCT_NAME}"
-
-    log "Observing logs: Server: ${SERVER}, Container: ${CONTAINER}"
-
-    cat > ${TEMP_FILE} <<-EOF
-    [
-      {
-        "name": "${PINGDATA_EXT_ARTIFACT_NAME}",
-        "version": "${PINGDATA_EXT_ARTIFACT_VERSION}"
-      },
-      {
-        "name": "${PINGDATA_EXT_ARTIFACT_NAME}",
-        "version": "${PINGDATA_EXT_ARTIFACT_VERSION}"
-      }
-    ]
-EOF
-
-    # Set file with duplicate artifacts.
-    set_artifact_list_json_file
-
-    # Run artifact script and capture actual status code from script.
-    run_artifact_script
-    actual_status_code=${?}
-
-    # Return 0 if the actual status code of duplicates in JSON is equal to the expected.
-    assertEquals "duplicate_json_test failed" ${expected_status_code} ${actual_status_code}
-
-  done
+  assert_case_passed duplicate "duplicate_json_test failed"
 }
 
 # Validate when artifact JSON is missing artifact name.
 # Script is expected to terminate and exit with the error code 1.
 testMissingNameJson() {
-  local expected_status_code=1
-
   log "Test missing artifact name in JSON"
-
-  REPLICA_INDEX=$((NUM_REPLICAS - 1))
-  while test ${REPLICA_INDEX} -gt -1; do
-    SERVER="${PRODUCT_NAME}-${REPLICA_INDEX}"
-
-    log "Observing logs: Server: ${SERVER}, Container: ${CONTAINER}"
-
-    cat > ${TEMP_FILE} <<-EOF
-    [
-      {
-        "version": "${PINGDATA_EXT_ARTIFACT_VERSION}"
-      }
-    ]
-EOF
-
-    # Set file without artifact name.
-    set_artifact_list_json_file
-
-    # Run artifact script and capture actual status code from script.
-    run_artifact_script
-    actual_status_code=${?}
-
-    # Return 0 if the actual status code of missing name in JSON is equal to the expected.
-    assertEquals "missing_name_json_test failed" ${expected_status_code} ${actual_status_code}
-
-    REPLICA_INDEX=$((REPLICA_INDEX - 1))
-  done
+  assert_case_passed missing-name "missing_name_json_test failed"
 }
 
 # Validate when artifact JSON is missing artifact version.
 # Script is expected to terminate and exit with the error code 1.
 testMissingVersionJson() {
-  local expected_status_code=1
-
   log "Test missing artifact version in JSON"
-
-  REPLICA_INDEX=$((NUM_REPLICAS - 1))
-  while test ${REPLICA_INDEX} -gt -1; do
-    SERVER="${PRODUCT_NAME}-${REPLICA_INDEX}"
-
-    # Set the container name.
-    test "${SERVER}" == "${PRODUCT_NAME}-admin-0" && CONTAINER="${PRODUCT_NAME}-admin" || CONTAINER="${PRODUCT_NAME}"
-
-    log "Observing logs: Server: ${SERVER}, Container: ${CONTAINER}"
-
-    cat > ${TEMP_FILE} <<-EOF
-    [
-      {
-        "name": "${PINGDATA_EXT_ARTIFACT_NAME}"
-      }
-    ]
-EOF
-
-    # Set file without artifact version.
-    set_artifact_list_json_file
-
-    # Run artifact script and capture actual status code from script.
-    run_artifact_script
-    actual_status_code=${?}
-
-    # Return 0 if the actual status code of missing version in JSON is equal to the expected.
-    assertEquals "missing_version_json_test failed" ${expected_status_code} ${actual_status_code}
-
-    REPLICA_INDEX=$((REPLICA_INDEX - 1))
-  done
+  assert_case_passed missing-version "missing_version_json_test failed"
 }
 
 # Deploy an artifact.
 # Script is expected to successfully deploy the artifact and exit with the non-status code 0.
 testDeployValidArtifact() {
-  local expected_status_code=0
-
   log "Test valid artifact deployment"
-  
-  REPLICA_INDEX=$((NUM_REPLICAS - 1))
-  while test ${REPLICA_INDEX} -gt -1; do
-    SERVER="${PRODUCT_NAME}-${REPLICA_INDEX}"
-
-    log "Observing logs: Server: ${SERVER}, Container: ${CONTAINER}"
-
-    cat > ${TEMP_FILE} <<-EOF
-    [
-      {
-        "name": "${PINGDATA_EXT_ARTIFACT_NAME}",
-        "version": "${PINGDATA_EXT_ARTIFACT_VERSION}",
-        "filename": "${PINGDATA_EXT_ARTIFACT_FILENAME}"
-      }
-    ]
-EOF
-
-    # Set file to valid artifact.
-    set_artifact_list_json_file
-
-    # Run artifact script and capture actual status code from script.
-    run_artifact_script
-    actual_status_code_script=${?}
-
-    # Search for artifact plugin in downloaded directory and capture status code.
-    kubectl exec ${SERVER} -n "${PING_CLOUD_NAMESPACE}" -c "${CONTAINER}" -- sh -c \
-      "test -f ${TARGET_DIR}/${PINGDATA_EXT_ARTIFACT_FILENAME}" > /dev/null 2>&1
-    actual_status_code_artifact_deploy=${?}
-
-    # Return 0 if the actual status code of deploying valid artifacts is equal to the expected.
-    assertEquals ${expected_status_code} ${actual_status_code_script}
-    assertEquals ${expected_status_code} ${actual_status_code_artifact_deploy}
-
-    REPLICA_INDEX=$((REPLICA_INDEX - 1))
-  done
+  assert_case_passed valid "valid_artifact_test failed"
 }
 
 # When arguments are passed to a script you must
@@ -35,12 +35,7 @@ csd_upload() {
   kubectl wait --for=condition=complete --timeout=900s job.batch/${upload_csd_job_name} -n "${PING_CLOUD_NAMESPACE}"
   assertEquals "The kubectl wait command for the job should have succeeded" 0 $?
 
-  sleep 5
-
-  log "Expected CSD files:"
-  expected_files "${upload_csd_job_name}" | tee /tmp/expected.txt
-
-  if ! verify_upload_with_timeout "pingfederate"; then
+  if ! verify_csd_upload "${upload_csd_job_name}" "pingfederate"; then
     return 1
   fi
   return 0
@@ -1,5 +1,6 @@
 #!/bin/bash
 
+# One or more space-separated test directories, e.g. "pingfederate pingaccess", or empty to run all of them except chaos
 TEST_DIR="${1}"
 ENV_VARS_FILE="${2}"
 
@@ -27,115 +28,30 @@ export SHUNIT_PATH="${PROJECT_DIR}/ci-scripts/test/shunit/shunit2-2.1.x/shunit2"
 # set PYTHONPATH
 export PYTHONPATH="${PROJECT_DIR}/ci-scripts/test/python-utils"
 
-execute_test_scripts() {
-
-  local test_directory="${1}"
-  local regex="${2}"
-  local test_file_failures=0
-
-  for SCRIPT in $(find ${test_directory} -print | grep -E ${regex} | sort); do
-    log "Running integration test: ${SCRIPT}"
-    "${SCRIPT}" "${ENV_VARS_FILE}"
-
-    test_result=$?
-    log "Test result: ${test_result}"
-    echo
-
-    # Calculate and track the combined results of all tests
-    test_file_failures=$((${test_file_failures} + ${test_result}))
-  done
-
-  python_files=(`find ${1} -maxdepth 1 -name "*.py"`)
-  if [ ${#python_files[@]} -gt 0 ]; then
-    log "Activating Python virtual environment"
-    if [[ ! -d venv ]]; then
-      python -m venv venv
-    fi
-    source venv/bin/activate
-
-    log "Installing python requirements"
-    REQUIREMENTS="${PROJECT_DIR}/ci-scripts/test/python-utils/requirements.txt"
-    pip3.9 install -r ${REQUIREMENTS}
-    log "Running python tests from: ${test_directory}"
-    START=$(pwd)
-    cd ${test_directory}
-    python3 -Wignore::ResourceWarning -m unittest -v
-
-    test_result=$?
-    cd "$START"
-    log "Test result: ${test_result}"
-    echo
-
-    # Calculate and track the combined results of all tests
-    test_file_failures=$((${test_file_failures} + ${test_result}))
-  fi
-
-  return ${test_file_failures}
-}
-
-log "Running prerequisite scripts..."
-
-# Pass in a regex to selectively execute
-# the shunit tests in the prerequisites subdirectory
-# and skip other support scripts, etc.
-# The prerequisites scripts/tests are meant to help
-# with issues like DNS propagation delay.
-# These tests must succeed before the other
-# integration tests can run.
-
-# To be found by the regex, sh scripts must be:
-# - under the ci-script-tests, common or ping-prefixed directories (no matter how deep)
-# - must be prefixed with at least a 2-digit number to be found and must end with .sh
-# All python test scripts in the directory will be executed
-execute_test_scripts "${SCRIPT_HOME}/${TEST_DIR}/prerequisites" '(common|chaos|ping[a-zA-Z-]*|monitoring)\/prerequisites\/[0-9][0-9]+.*\.sh'
-exit_code=$?
-
-NO_COLOR='\033[0m' # No Color
-if test ${exit_code} -eq 0; then
-  GREEN='\033[0;32m'
-  # Use printf to print in color
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-  printf "Prerequisite Test Summary: ${GREEN}All prerequisite tests in ${TEST_DIR} completed successfully ${NO_COLOR}\n"
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-else
-  RED='\033[0;31m'
-  # Use printf to print in color
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-  printf "Prerequisite Test Summary: ${RED} ${exit_code} Prerequisite test script files(s) failed under: ${TEST_DIR} ${NO_COLOR}\n"
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-
-  # Exit at this point.  If the prerequisites
-  # are not met, then the tests below will
-  # fail generating a lot of noise when
-  # the issue is likely more fundamental.
-  exit ${exit_code}
-fi
-
-# Pass in a regex to selectively execute
-# the tests in the designated subdirectory
-# and skip other support scripts, etc.
-log "Running test scripts..."
-
-# To be found by the regex, scripts must be:
-# - under the ci-script-tests, common or ping-prefixed directories (no matter how deep)
-# - must be prefixed with at least a 2-digit number to be found and must end with .sh
-# All python test scripts in the directory will be executed
-execute_test_scripts "${SCRIPT_HOME}/${TEST_DIR}" '(common|chaos|ping[a-zA-Z-]*|monitoring)\/[0-9][0-9]+.*\.sh'
+# Prepare the Python virtual environment once per run. The python tests and the shunit tests that call the python-utils
+# helpers (e.g. csd_upload_verifier.py) both run within it.
+prepare_python_env
+
+# Run the prerequisites of every test directory first, then the tests of every directory. Each directory's tests run in
+# numeric order, and independent directories run concurrently on up to TEST_WORKERS workers. The prerequisites scripts
+# are meant to help with issues like DNS propagation delay. They must succeed before the other integration tests can
+# run. The chaos tests disrupt the cluster, so they run last, with nothing else running.
+#
+# To be found, sh scripts must be under a test directory or its prerequisites subdirectory (no matter how deep), must be
+# prefixed with at least a 2-digit number and must end with .sh. All python test scripts directly in the test directory
+# will be executed.
+#
+# A junit.xml report and a test-durations.json history of the test durations are written to TEST_REPORT_DIR. The
+# history is used to start the slowest directories first.
+export TEST_REPORT_DIR="${TEST_REPORT_DIR:-${SCRIPT_HOME}/reports}"
+
+python3 "${PROJECT_DIR}"/ci-scripts/test/python-utils/integration_test_scheduler.py \
+  --integration-dir "${SCRIPT_HOME}" \
+  --env-vars-file "${ENV_VARS_FILE}" \
+  --workers "${TEST_WORKERS:-4}" \
+  --report-dir "${TEST_REPORT_DIR}" \
+  ${TEST_DIR}
 exit_code=$?
 
-if test ${exit_code} -eq 0; then
-  GREEN='\033[0;32m'
-  # Use printf to print in color
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-  printf "Test Summary: ${GREEN}All integration tests in ${TEST_DIR} completed successfully ${NO_COLOR}\n"
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-else
-  RED='\033[0;31m'
-  # Use printf to print in color
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-  printf "Test Summary: ${RED} ${exit_code} Integration test script file(s) failed under: ${TEST_DIR} ${NO_COLOR}\n"
-  printf '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n'
-fi
-
 echo
 exit ${exit_code}
@@ -0,0 +1,323 @@
+import argparse
+import fnmatch
+import json
+import os
+import re
+import shlex
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+USAGE = """
+The plan is a JSON file with the cases to run in order on every pod, and the files to inventory after each case:
+
+  {
+    "env": {"PING_ARTIFACT_REPO_URL": "s3://ci-cd-artifacts-bucket"},
+    "inventory": ["/opt/out/instance/server/default/deploy/*", "/opt/out/instance/server/default/lib/pf-authn*"],
+    "cases": [
+      {
+        "name": "valid",
+        "remove": ["/opt/out/instance/server/default/deploy/pf-google-quickconnection-3.1.1.jar"],
+        "artifact_list": [{"name": "pf-google-connector", "version": "3.1.1"}],
+        "status": 0,
+        "present": ["/opt/out/instance/server/default/deploy/pf-google-quickconnection-3.1.1.jar"],
+        "absent": [],
+        "count": {"/opt/out/instance/server/default/lib/pf-authn-api-sdk*": 1}
+      }
+    ]
+  }
+
+Each case removes the "remove" paths, writes "artifact_list" to the artifact-list.json of the pod (verbatim if it is a
+string, e.g. to test invalid JSON), runs the artifact download hook and records its exit status and the inventory: the
+sha256 checksum of every file matching the inventory patterns. All cases run in one exec per pod, and all pods at once.
+The "present", "absent" and "count" assertions are then evaluated against the inventories, so their paths must match an
+inventory pattern. The inventories of the pods of the same container are compared after each case, and the files that
+are missing or differ on some pods are reported.
+
+Examples:
+  artifact_verifier.py --plan plan.json --pod pingfederate-admin-0@pingfederate-admin \\
+      --selector role=pingfederate-engine@pingfederate --json artifact-report.json
+"""
+
+ARTIFACT_LIST = "/opt/staging/artifacts/artifact-list.json"
+DOWNLOAD_HOOK = "/opt/staging/hooks/10-download-artifact.sh"
+MARKER = "### artifact-verifier"
+
+# Paths and patterns are written unquoted in the exec script so that the shell expands their globs
+PATH_PATTERN_REGEX = re.compile(r"^/[\w./*?\[\]+-]+$")
+ENV_NAME_REGEX = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class PlanError(Exception):
+    """Raised when a plan is invalid"""
+
+
+def check_path(path: str) -> str:
+    if not PATH_PATTERN_REGEX.match(path):
+        raise PlanError(f"Invalid path '{path}', expected an absolute path or glob without spaces or quotes")
+    return path
+
+
+@dataclass
+class Case:
+    name: str
+    artifact_list: str
+    remove: [str] = field(default_factory=list)
+    status: int = None
+    present: [str] = field(default_factory=list)
+    absent: [str] = field(default_factory=list)
+    count: {} = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, spec: {}, inventory: [str]):
+        name = spec.get("name")
+        if not name or "artifact_list" not in spec:
+            raise PlanError(f"Every case needs a name and an artifact_list: {spec}")
+        artifact_list = spec["artifact_list"]
+        if not isinstance(artifact_list, str):
+            artifact_list = json.dumps(artifact_list, indent=2)
+        case = cls(name, artifact_list, [check_path(p) for p in spec.get("remove", [])], spec.get("status"),
+                   [check_path(p) for p in spec.get("present", [])], [check_path(p) for p in spec.get("absent", [])],
+                   {check_path(p): int(n) for p, n in spec.get("count", {}).items()})
+        for path in case.present + case.absent:
+            if not any(fnmatch.fnmatchcase(path, pattern) for pattern in inventory):
+                raise PlanError(f"Case {name}: {path} does not match any inventory pattern")
+        return case
+
+
+@dataclass
+class Plan:
+    cases: [Case]
+    inventory: [str]
+    env: {} = field(default_factory=dict)
+    artifact_list_path: str = ARTIFACT_LIST
+    hook: str = DOWNLOAD_HOOK
+
+    @classmethod
+    def from_dict(cls, spec: {}):
+        inventory = [check_path(p) for p in spec.get("inventory", [])]
+        env = spec.get("env", {})
+        for name in env:
+            if not ENV_NAME_REGEX.match(name):
+                raise PlanError(f"Invalid environment variable name '{name}'")
+        cases = [Case.from_dict(case, inventory) for case in spec.get("cases", [])]
+        names = [case.name for case in cases]
+        if not cases or len(set(names)) != len(names):
+            raise PlanError("A plan needs at least one case, and unique case names")
+        return cls(cases, inventory, env, check_path(spec.get("artifact_list_path", ARTIFACT_LIST)),
+                   check_path(spec.get("hook", DOWNLOAD_HOOK)))
+
+    def script(self) -> str:
+        """The shell script that runs every case in order and prints the status and inventory after each"""
+        exports = "".join(f"export {name}={shlex.quote(str(value))}; " for name, value in self.env.items())
+        lines = [
+            "inventory() {",
+            f"  for f in {' '.join(self.inventory)}; do",
+            '    if test -f "${f}"; then sha256sum "${f}" 2>/dev/null || echo "- ${f}"; fi',
+            "  done",
+            "}",
+        ]
+        for case in self.cases:
+            lines.append(f"echo {shlex.quote(f'{MARKER} case {case.name}')}")
+            if case.remove:
+                lines.append(f"rm -rf {' '.join(case.remove)} > /dev/null 2>&1")
+            lines.append(f"printf '%s\\n' {shlex.quote(case.artifact_list)} > {self.artifact_list_path}")
+            lines.append(f"({exports}{self.hook}) > /dev/null 2>&1")
+            lines.append(f'echo "{MARKER} status $?"')
+            lines.append("inventory")
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class CaseResult:
+    status: int = None
+    # The checksum of each inventoried file by path, or '-' if it could not be computed
+    inventory: {} = field(default_factory=dict)
+    failures: [str] = field(default_factory=list)
+
+
+def parse_output(output: str) -> {}:
+    """:return: The CaseResult of each case that ran, by case name"""
+    results = {}
+    result = None
+    for line in output.splitlines():
+        if line.startswith(f"{MARKER} case "):
+            result = results.setdefault(line[len(f"{MARKER} case "):], CaseResult())
+        elif result is None:
+            continue
+        elif line.startswith(f"{MARKER} status "):
+            result.status = int(line.split()[-1])
+        elif line.strip():
+            checksum, _, path = line.strip().partition(" ")
+            result.inventory[path.strip().lstrip("*")] = checksum
+    return results
+
+
+def evaluate(case: Case, result: CaseResult) -> [str]:
+    """:return: The failed assertions of a case"""
+    if result is None or result.status is None:
+        return ["the case did not run to completion"]
+    failures = []
+    if case.status is not None and result.status != case.status:
+        failures.append(f"the artifact hook exited with {result.status} instead of {case.status}")
+    failures.extend(f"{path} is missing" for path in case.present
+                    if not any(fnmatch.fnmatchcase(p, path) for p in result.inventory))
+    failures.extend(f"{path} exists" for path in case.absent
+                    if any(fnmatch.fnmatchcase(p, path) for p in result.inventory))
+    for pattern, expected in case.count.items():
+        actual = sum(1 for p in result.inventory if fnmatch.fnmatchcase(p, pattern))
+        if actual != expected:
+            failures.append(f"{actual} files match {pattern} instead of {expected}")
+    return failures
+
+
+def differences(inventories: {}) -> [str]:
+    """
+    :param inventories: The inventory of each pod, by pod
+    :return: The files that are missing on some of the pods or whose checksum differs between them
+    """
+    found = []
+    for path in sorted(set().union(*inventories.values())):
+        checksums = {pod: inventory.get(path) for pod, inventory in inventories.items()}
+        missing = sorted(pod for pod, checksum in checksums.items() if checksum is None)
+        present = {checksum for checksum in checksums.values() if checksum is not None}
+        if missing:
+            found.append(f"{path} is missing on {', '.join(missing)}")
+        elif len(present) > 1:
+            by_checksum = {}
+            for pod, checksum in checksums.items():
+                by_checksum.setdefault(checksum[:12], []).append(pod)
+            found.append(f"{path} differs: " + "; ".join(f"{c} on {', '.join(sorted(p))}"
+                                                         for c, p in sorted(by_checksum.items())))
+    return found
+
+
+class KubernetesExec:
+    def __init__(self, core_client, namespace: str):
+        self.core_client = core_client
+        self.namespace = namespace
+
+    def run(self, pod: str, container: str, script: str) -> str:
+        from kubernetes.stream import stream
+
+        return stream(
+            self.core_client.connect_get_namespaced_pod_exec,
+            pod,
+            self.namespace,
+            container=container,
+            command=["sh", "-c", script],
+            stderr=True, stdin=False, stdout=True, tty=False,
+        )
+
+
+class ArtifactVerifier:
+    """Runs the cases of a plan in all pods at once, with one exec per pod, and evaluates them on the inventories"""
+
+    def __init__(self, plan: Plan, backend, workers: int = 8):
+        """
+        :param backend: Runs a shell script in a pod container and returns its output, like KubernetesExec
+        """
+        self.plan = plan
+        self.backend = backend
+        self.workers = workers
+
+    def verify(self, targets: [(str, str)]) -> {}:
+        """
+        :param targets: The (pod, container) pairs to verify
+        :return: The report, with the failures and differences of each case and the pods that could not be verified
+        """
+        script = self.plan.script()
+        outputs = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.backend.run, pod, container, script): (pod, container)
+                       for pod, container in targets}
+            for future, target in futures.items():
+                try:
+                    outputs[target] = parse_output(future.result())
+                except Exception as e:
+                    errors[target] = str(e)
+
+        report = {"cases": {}, "errors": {f"{pod}/{container}": e for (pod, container), e in errors.items()}}
+        for case in self.plan.cases:
+            failures = [f"{pod}/{container}: could not be verified: {e}" for (pod, container), e in errors.items()]
+            by_container = {}
+            for (pod, container), results in outputs.items():
+                result = results.get(case.name)
+                failures.extend(f"{pod}/{container}: {failure}" for failure in evaluate(case, result))
+                if result and result.status is not None:
+                    by_container.setdefault(container, {})[pod] = result.inventory
+            report["cases"][case.name] = {
+                "statuses": {f"{pod}/{container}": results[case.name].status
+                             for (pod, container), results in outputs.items() if case.name in results},
+                "failures": failures,
+                "differences": [f"{container}: {difference}" for container, inventories in by_container.items()
+                                if len(inventories) > 1 for difference in differences(inventories)],
+            }
+        return report
+
+
+def print_report(report: {}, targets: [(str, str)]):
+    names = [f"{pod}/{container}" for pod, container in targets]
+    rows = [("case", *names)]
+    for case, result in report["cases"].items():
+        cells = []
+        for name in names:
+            failed = any(failure.startswith(f"{name}: ") for failure in result["failures"])
+            status = result["statuses"].get(name, "-")
+            cells.append(f"{'FAIL' if failed else 'ok'} ({status})")
+        rows.append((case, *cells))
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+    for case, result in report["cases"].items():
+        for failure in result["failures"]:
+            print(f"{case}: {failure}")
+        for difference in result["differences"]:
+            print(f"{case}: difference between pods: {difference}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run artifact deployment cases in many pods at once and verify the deployed files. Each target "
+                    "has the form NAME[@CONTAINER]; without a container every container of the pod is verified.",
+        epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--plan", required=True, help="JSON file with the cases and the inventory patterns")
+    parser.add_argument("--namespace", default=os.getenv("PING_CLOUD_NAMESPACE", "ping-cloud"))
+    parser.add_argument("--pod", action="append", default=[], help="Pod to verify")
+    parser.add_argument("--statefulset", action="append", default=[],
+                        help="StatefulSet whose pods are verified; the container defaults to the statefulset name")
+    parser.add_argument("--selector", action="append", default=[], help="Label selector of the pods to verify")
+    parser.add_argument("--workers", type=int, default=8, help="Number of pods verified concurrently")
+    parser.add_argument("--json", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        with open(args.plan) as plan_file:
+            plan = Plan.from_dict(json.load(plan_file))
+    except (OSError, ValueError, PlanError) as e:
+        parser.error(f"Invalid plan {args.plan}: {e}")
+
+    import kubernetes as k8s
+    from log_secret_scanner import resolve_targets
+
+    k8s.config.load_kube_config()
+    core_client = k8s.client.CoreV1Api()
+    targets = resolve_targets(core_client, k8s.client.AppsV1Api(), args.namespace, args)
+    if not targets:
+        print("No pods found to verify")
+        sys.exit(1)
+
+    verifier = ArtifactVerifier(plan, KubernetesExec(core_client, args.namespace), args.workers)
+    report = verifier.verify(targets)
+    print_report(report, targets)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+    sys.exit(1 if any(result["failures"] for result in report["cases"].values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+import argparse
+import json
+import math
+import os
+import queue
+import ssl
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field, asdict
+
+USAGE = """
+Each run deletes (or evicts) one pod of a product, and timestamps the recovery stages from the watch events of the
+pods and endpoints of the namespace, relative to the disruption:
+
+  deleted       the old pod is gone
+  created       the replacement pod exists
+  scheduled     the replacement pod is bound to a node
+  init:NAME     the init container NAME completed, e.g. the wait for services or the SSM parameter resolution
+  initialized   all init containers completed
+  ready         the pod is Ready
+  endpoint      the pod is a ready address of the service of the product
+  serving       the --serving-url of the product answers, if one is given
+
+Targets: pingdirectory, pingfederate-admin, pingfederate, pingaccess-admin, pingaccess, pingaccess-was-admin,
+pingaccess-was
+
+Examples:
+  chaos_mttr.py pingfederate pingaccess-admin --runs 5 --json mttr.json --record events.jsonl \\
+      --serving-url "pingaccess-admin=${PINGACCESS_API}/applications"
+  chaos_mttr.py --replay events.jsonl
+"""
+
+STAGES = ["deleted", "created", "scheduled", "initialized", "ready", "endpoint", "serving"]
+PERCENTILES = [50, 90, 99]
+# Seconds between the requests to the serving URL of a run once its pod is ready
+PROBE_INTERVAL_SECONDS = 0.5
+
+
+class ChaosError(Exception):
+    """Raised when a run cannot be started or the watches fail"""
+
+
+@dataclass
+class Target:
+    statefulset: str
+    # The service whose endpoints list the pod once it serves traffic
+    service: str
+    pod_index: int = 0
+
+    @property
+    def pod(self):
+        return f"{self.statefulset}-{self.pod_index}"
+
+
+TARGETS = {name: Target(name, name) for name in [
+    "pingdirectory", "pingfederate-admin", "pingfederate", "pingaccess-admin", "pingaccess", "pingaccess-was-admin",
+    "pingaccess-was"]}
+
+
+@dataclass
+class RecoveryRun:
+    target: str
+    pod: str
+    service: str
+    run: int
+    disruption: str
+    old_uid: str
+    started: float
+    serving_url: str = None
+    new_uid: str = None
+    # Seconds after the disruption at which each stage was first observed
+    stages: dict = field(default_factory=dict)
+    init_containers: dict = field(default_factory=dict)
+    error: str = None
+
+    def mark(self, stage: str, timestamp: float):
+        if stage not in self.stages:
+            self.stages[stage] = round(timestamp - self.started, 3)
+
+    @property
+    def complete(self) -> bool:
+        return "endpoint" in self.stages and (not self.serving_url or "serving" in self.stages)
+
+
+def slim(kind: str, obj: {}) -> {}:
+    """Keep only the fields of a serialized pod or endpoints object that the tracker reads"""
+    metadata = {"name": obj["metadata"]["name"], "uid": obj["metadata"].get("uid")}
+    if kind == "endpoints":
+        return {"metadata": metadata, "subsets": [
+            {"addresses": [{"targetRef": {key: (address.get("targetRef") or {}).get(key) for key in ["name", "uid"]}}
+                           for address in subset.get("addresses") or []]}
+            for subset in obj.get("subsets") or []]}
+    status = obj.get("status") or {}
+    return {"metadata": metadata, "status": {
+        "conditions": [{"type": c["type"], "status": c["status"]} for c in status.get("conditions") or []],
+        "initContainerStatuses": [{"name": s["name"], "terminated": bool((s.get("state") or {}).get("terminated"))}
+                                  for s in status.get("initContainerStatuses") or []],
+    }}
+
+
+def serialize(obj) -> {}:
+    """Serialize a kubernetes client model like the API server does, leaving the dicts of fake event streams as is"""
+    if isinstance(obj, dict):
+        return obj
+    from kubernetes.client import ApiClient
+
+    return ApiClient().sanitize_for_serialization(obj)
+
+
+def has_condition(pod: {}, condition_type: str) -> bool:
+    return any(c["type"] == condition_type and c["status"] == "True" for c in pod["status"]["conditions"])
+
+
+class RecoveryTracker:
+    """
+    Keep the pods and endpoints of the namespace from their watch events, and mark the stages of the current run. Events
+    are slimmed, serialized objects, so that recorded or fake event streams can be replayed without an API server.
+    """
+
+    def __init__(self):
+        self.objects = {"pod": {}, "endpoints": {}}
+        self.run = None
+
+    def handle(self, timestamp: float, kind: str, event_type: str, obj):
+        if event_type == "ERROR":
+            raise ChaosError(f"watch on {kind} failed: {obj}")
+        if event_type == "SYNC":
+            self.objects[kind] = {item["metadata"]["name"]: item for item in obj}
+            changed = obj
+        elif event_type == "DELETED":
+            self.objects[kind].pop(obj["metadata"]["name"], None)
+            changed = [obj]
+        else:
+            self.objects[kind][obj["metadata"]["name"]] = obj
+            changed = [obj]
+        if self.run:
+            for item in changed:
+                self.observe(timestamp, kind, event_type, item)
+
+    def observe(self, timestamp: float, kind: str, event_type: str, obj: {}):
+        run = self.run
+        if kind == "endpoints":
+            if obj["metadata"]["name"] == run.service and event_type != "DELETED" and run.new_uid in \
+                    self.ready_uids(obj):
+                run.mark("endpoint", timestamp)
+            return
+        if obj["metadata"]["name"] != run.pod:
+            return
+        uid = obj["metadata"]["uid"]
+        if uid == run.old_uid:
+            if event_type == "DELETED":
+                run.mark("deleted", timestamp)
+            return
+        if event_type == "DELETED":
+            return
+        if run.new_uid is None:
+            run.new_uid = uid
+            # The deletion of the old pod may be missed when the watch is re-listed
+            run.mark("deleted", timestamp)
+            run.mark("created", timestamp)
+        if uid != run.new_uid:
+            return
+        for status in obj["status"]["initContainerStatuses"]:
+            if status["terminated"] and status["name"] not in run.init_containers:
+                run.init_containers[status["name"]] = round(timestamp - run.started, 3)
+        for stage, condition in [("scheduled", "PodScheduled"), ("initialized", "Initialized"), ("ready", "Ready")]:
+            if has_condition(obj, condition):
+                run.mark(stage, timestamp)
+        # The endpoints may have listed the pod before its own update was seen
+        endpoints = self.objects["endpoints"].get(run.service)
+        if "ready" in run.stages and endpoints and uid in self.ready_uids(endpoints):
+            run.mark("endpoint", timestamp)
+
+    @staticmethod
+    def ready_uids(endpoints: {}) -> set:
+        return {address["targetRef"]["uid"] for subset in endpoints["subsets"] for address in subset["addresses"]}
+
+    def steady(self, target: Target) -> bool:
+        """Whether the pod of the target is Ready and serving, i.e. a new run can start"""
+        pod = self.objects["pod"].get(target.pod)
+        endpoints = self.objects["endpoints"].get(target.service)
+        return bool(pod and has_condition(pod, "Ready") and endpoints and
+                    pod["metadata"]["uid"] in self.ready_uids(endpoints))
+
+
+def probe(url: str, timeout: float = 5) -> bool:
+    """Whether the URL answers at all; authentication errors still mean the server is up"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout, context=ssl._create_unverified_context()):
+            return True
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+class EventQueue(queue.Queue):
+    """
+    The watch events of the runner, timestamped by the watcher threads as they put them, so that the time of an event
+    does not depend on how long it waits to be handled
+    """
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def put(self, item, block=True, timeout=None):
+        super().put((self.clock(), *item), block, timeout)
+
+
+class ChaosRunner:
+    """Disrupt the pod of each target in turn, for several rounds, and track the recovery of each with one watch"""
+
+    def __init__(self, namespace: str, targets: {}, runs: int, disruption: str, timeout: float, settle_timeout: float,
+                 pause: float, serving_urls: {}, record=None, watcher_class=None, disrupt=None, clock=time.monotonic):
+        self.namespace = namespace
+        self.targets = targets
+        self.runs = runs
+        self.disruption = disruption
+        self.timeout = timeout
+        self.settle_timeout = settle_timeout
+        self.pause = pause
+        self.serving_urls = serving_urls
+        self.record = record
+        self.watcher_class = watcher_class
+        self.disrupt = disrupt or self.disrupt_pod
+        self.clock = clock
+        self.tracker = RecoveryTracker()
+        self.events = EventQueue(clock)
+        self.results = []
+        self.start = clock()
+
+    def now(self, clock_time: float = None) -> float:
+        """Seconds since the start of the runner, which are also the timestamps of the recorded events"""
+        return round((self.clock() if clock_time is None else clock_time) - self.start, 3)
+
+    def write(self, entry: {}, timestamp: float):
+        if self.record:
+            self.record.write(json.dumps(dict(entry, t=timestamp)) + "\n")
+
+    def pump(self, timeout: float):
+        """Handle the watch events received within the timeout"""
+        try:
+            received, kind, event_type, obj = self.events.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            if event_type == "SYNC":
+                obj = [slim(kind, serialize(item)) for item in obj]
+            elif event_type != "ERROR":
+                obj = slim(kind, serialize(obj))
+            timestamp = self.now(received)
+            self.write({"kind": kind, "type": event_type, "object": obj if event_type != "ERROR" else str(obj)},
+                       timestamp)
+            self.tracker.handle(timestamp, kind, event_type, obj)
+            try:
+                received, kind, event_type, obj = self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def wait_until(self, predicate, timeout: float) -> bool:
+        deadline = self.clock() + timeout
+        while not predicate():
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return False
+            self.pump(min(remaining, 0.5))
+        return True
+
+    def probe_serving(self, run: RecoveryRun, stop: threading.Event):
+        """
+        Mark the serving stage of a run once its URL answers after the pod is ready. The probe blocks for up to its
+        timeout, so it runs in its own thread rather than between the watch events.
+        """
+        while not stop.wait(PROBE_INTERVAL_SECONDS):
+            if "ready" in run.stages and probe(run.serving_url):
+                if not stop.is_set():
+                    run.mark("serving", self.now())
+                return
+
+    def disrupt_pod(self, run: RecoveryRun):
+        import kubernetes as k8s
+
+        core_client = k8s.client.CoreV1Api()
+        if run.disruption == "evict":
+            body = k8s.client.V1Eviction(metadata=k8s.client.V1ObjectMeta(name=run.pod, namespace=self.namespace))
+            core_client.create_namespaced_pod_eviction(run.pod, self.namespace, body)
+        else:
+            core_client.delete_namespaced_pod(run.pod, self.namespace)
+
+    def run_once(self, name: str, target: Target, number: int) -> RecoveryRun:
+        if not self.wait_until(lambda: self.tracker.steady(target), self.settle_timeout):
+            raise ChaosError(f"{target.pod} is not ready and serving after {self.settle_timeout}s")
+        run = RecoveryRun(name, target.pod, target.service, number, self.disruption,
+                          self.tracker.objects["pod"][target.pod]["metadata"]["uid"], self.now(),
+                          self.serving_urls.get(name))
+        self.write({"type": "DISRUPT", "run": asdict(run)}, run.started)
+        self.tracker.run = run
+        print(f"Run {number} of {name}: {self.disruption} {target.pod}", flush=True)
+        stop_probe = threading.Event()
+        if run.serving_url:
+            threading.Thread(target=self.probe_serving, args=(run, stop_probe), daemon=True).start()
+        try:
+            self.disrupt(run)
+            if not self.wait_until(lambda: run.complete, self.timeout):
+                run.error = f"not recovered after {self.timeout}s"
+        except Exception as e:
+            run.error = str(e)
+        finally:
+            stop_probe.set()
+            self.tracker.run = None
+        self.write({"type": "RESULT", "run": asdict(run)}, self.now())
+        print(f"Run {number} of {name}: {run.error or 'recovered'} {run.stages}", flush=True)
+        return run
+
+    def run(self) -> [RecoveryRun]:
+        watcher_class = self.watcher_class
+        if watcher_class is None:
+            from k8s_waiter import ResourceWatcher as watcher_class
+        watchers = [watcher_class(kind, self.namespace, self.events) for kind in ["pod", "endpoints"]]
+        for watcher in watchers:
+            watcher.start()
+        try:
+            for number in range(1, self.runs + 1):
+                for name, target in self.targets.items():
+                    self.results.append(self.run_once(name, target, number))
+                    if self.pause:
+                        self.wait_until(lambda: False, self.pause)
+        finally:
+            for watcher in watchers:
+                watcher.stop()
+        return self.results
+
+
+def replay(path: str) -> [RecoveryRun]:
+    """Recompute the runs of a recorded, or fake, event stream"""
+    tracker = RecoveryTracker()
+    results = []
+    with open(path) as events:
+        for line in events:
+            entry = json.loads(line)
+            if entry["type"] == "DISRUPT":
+                run = dict(entry["run"], started=entry["t"], stages={}, init_containers={}, new_uid=None, error=None)
+                tracker.run = RecoveryRun(**run)
+            elif entry["type"] == "RESULT":
+                run = tracker.run
+                tracker.run = None
+                if run is None:
+                    continue
+                # Stages that are not watch events, e.g. serving, and errors come from the recording
+                for stage, seconds in entry["run"]["stages"].items():
+                    run.stages.setdefault(stage, seconds)
+                run.error = entry["run"]["error"] if not run.complete else None
+                results.append(run)
+            else:
+                tracker.handle(entry["t"], entry["kind"], entry["type"], entry["object"])
+    return results
+
+
+def distribution(values: [float]) -> {}:
+    values = sorted(values)
+    summary = {"count": len(values), "mean": round(statistics.mean(values), 3), "min": values[0], "max": values[-1]}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = values[max(math.ceil(percentile / 100 * len(values)) - 1, 0)]
+    return summary
+
+
+def build_report(results: [RecoveryRun]) -> {}:
+    """
+    Summarize the runs per target: the time after the disruption at which each stage was reached, and the time spent in
+    each stage since the previous one
+    """
+    report = {}
+    for name in dict.fromkeys(run.target for run in results):
+        runs = [run for run in results if run.target == name]
+        recovered = [run for run in runs if not run.error]
+        reached, spent, init_containers = {}, {}, {}
+        for run in recovered:
+            previous = 0
+            for stage in STAGES:
+                if stage in run.stages:
+                    reached.setdefault(stage, []).append(run.stages[stage])
+                    spent.setdefault(stage, []).append(round(max(run.stages[stage] - previous, 0), 3))
+                    previous = run.stages[stage]
+            for container, seconds in run.init_containers.items():
+                init_containers.setdefault(container, []).append(seconds)
+        report[name] = {
+            "runs": len(runs),
+            "recovered": len(recovered),
+            "errors": [f"run {run.run}: {run.error}" for run in runs if run.error],
+            "reached_seconds": {stage: distribution(values) for stage, values in reached.items()},
+            "stage_seconds": {stage: distribution(values) for stage, values in spent.items()},
+            "init_container_done_seconds": {name: distribution(values) for name, values in init_containers.items()},
+        }
+    return report
+
+
+def print_report(report: {}):
+    for name, target in report.items():
+        print(f"\n{name}: {target['recovered']}/{target['runs']} runs recovered")
+        print(f"  {'stage':<36} {'reached p50':>12} {'p90':>8} {'max':>8} {'in stage p50':>13} {'p90':>8}")
+        rows = [(stage, target["reached_seconds"][stage], target["stage_seconds"][stage])
+                for stage in STAGES if stage in target["reached_seconds"]]
+        rows += [(f"  init:{container}", summary, None)
+                 for container, summary in target["init_container_done_seconds"].items()]
+        for stage, reached, spent in rows:
+            print(f"  {stage:<36} {reached['p50']:>12} {reached['p90']:>8} {reached['max']:>8} " +
+                  (f"{spent['p50']:>13} {spent['p90']:>8}" if spent else ""))
+        for error in target["errors"]:
+            print(f"  error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the recovery of the Ping products from pod deletions, stage by stage",
+        epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("targets", nargs="*", help="Products to disrupt, defaults to all of them")
+    parser.add_argument("-n", "--namespace", default=os.getenv("PING_CLOUD_NAMESPACE", "ping-cloud"))
+    parser.add_argument("--runs", type=int, default=3, help="Number of disruptions of each target")
+    parser.add_argument("--disruption", choices=["delete", "evict"], default="delete",
+                        help="Delete the pod, or evict it through the eviction API, which honors disruption budgets")
+    parser.add_argument("--pod-index", type=int, default=0, help="Ordinal of the disrupted pod of each statefulset")
+    parser.add_argument("--timeout", type=float, default=1200, help="Seconds a run may take to recover")
+    parser.add_argument("--settle-timeout", type=float, default=600,
+                        help="Seconds to wait for a target to be ready and serving before disrupting it")
+    parser.add_argument("--pause", type=float, default=30, help="Seconds to wait between runs")
+    parser.add_argument("--serving-url", action="append", default=[], metavar="TARGET=URL",
+                        help="URL that answers once the target serves traffic, e.g. an admin API")
+    parser.add_argument("--record", help="Write the watch events and runs as JSON lines to this file")
+    parser.add_argument("--replay", help="Report on the runs of a recorded event stream instead of disrupting pods")
+    parser.add_argument("--json", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.replay:
+        results = replay(args.replay)
+    else:
+        unknown = [name for name in args.targets if name not in TARGETS]
+        if unknown:
+            parser.error(f"Unknown targets {', '.join(unknown)}, expected some of {', '.join(TARGETS)}")
+        targets = {name: Target(TARGETS[name].statefulset, TARGETS[name].service, args.pod_index)
+                   for name in args.targets or TARGETS}
+        serving_urls = dict(url.split("=", 1) for url in args.serving_url)
+
+        import kubernetes as k8s
+
+        k8s.config.load_kube_config()
+        record = open(args.record, "w") if args.record else None
+        try:
+            runner = ChaosRunner(args.namespace, targets, args.runs, args.disruption, args.timeout,
+                                 args.settle_timeout, args.pause, serving_urls, record)
+            try:
+                results = runner.run()
+            except (ChaosError, KeyboardInterrupt) as e:
+                print(f"Stopped: {e or 'interrupted'}")
+                results = runner.results
+        finally:
+            if record:
+                record.close()
+
+    report = build_report(results)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+    sys.exit(0 if results and all(not run.error for run in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
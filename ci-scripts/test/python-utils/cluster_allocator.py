@@ -0,0 +1,567 @@
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+USAGE = """
+A cluster is claimed with the Lease default/cluster-in-use-lock, whose holder is the pipeline. The lease expires
+leaseDurationSeconds after its renewTime unless the pipeline renews it (renew_cluster_lock in ci-scripts/common.sh),
+and is released by clearing its holder (release_cluster_lock). A pipeline that keeps its environment, e.g. on master,
+marks its lease as kept instead (keep_cluster_lock), which then never expires and holds the cluster until the
+cluster-in-use-lock namespace is deleted. The cluster-in-use-lock namespace of earlier versions of find_cluster.sh is
+still created on claim and honored, so that both versions can share the clusters.
+
+Each round probes all candidates concurrently, then claims the first one in order that is:
+
+  ours      already held by this holder, e.g. when the find-cluster job is retried
+  free      without a lease holder, and without a lock namespace created since the lease was released
+  expired   held by a lease that was not renewed in time, e.g. by a failed pipeline, or by a kept lease whose lock
+            namespace was deleted
+  orphaned  locked only by a lock namespace older than --legacy-lock-seconds, which is off by default
+
+and has at least --min-nodes Ready nodes. The namespaces that the previous holder of an expired or orphaned cluster
+created since its claim are listed, and only deleted with --delete-previous-namespaces. Those of a kept environment
+are never deleted. If none can be claimed, the lock objects of all candidates are watched and the next round starts as
+soon as one is released, when the first lease expires, or after --poll-seconds.
+
+Each candidate is NAME=POSTFIX, where NAME is both the cluster and its kube config context.
+
+Examples:
+  cluster_allocator.py acquire ci-cd-1=-1 ci-cd-2=-2 --holder pipeline-1234 --output cluster.env
+  cluster_allocator.py status ci-cd-1=-1 ci-cd-2=-2
+"""
+
+LOCK_NAME = "cluster-in-use-lock"
+LEASE_NAMESPACE = "default"
+# Annotation of a lease whose holder kept its environment, set by keep_cluster_lock in ci-scripts/common.sh
+KEPT_ANNOTATION = "cluster-in-use-lock/kept"
+# Namespaces never deleted when a cluster is reclaimed
+PROTECTED_NAMESPACES = {LOCK_NAME, "default", "kube-system", "kube-public", "kube-node-lease"}
+# Seconds to wait for the namespaces of the previous holder to be deleted
+NAMESPACE_DELETE_SECONDS = 600
+REQUEST_TIMEOUT = 15
+# Seconds after which a watch is restarted, and before a failed watch is retried
+WATCH_SECONDS = 300
+WATCH_RETRY_SECONDS = 10
+# Upper bound of the random delay before probing after a release, so that the waiting pipelines do not all race for it
+RELEASE_JITTER_SECONDS = 2
+
+CLAIM_ORDER = ["ours", "free", "expired", "orphaned"]
+
+
+class AllocationError(Exception):
+    """Raised when no cluster could be claimed before the timeout"""
+
+
+@dataclass
+class Lease:
+    holder: str
+    renewed: float
+    duration: int
+    resource_version: str = None
+    transitions: int = 0
+    acquired: float = None
+    kept: bool = False
+
+    @property
+    def expires(self) -> float:
+        return self.renewed + self.duration
+
+
+@dataclass
+class Probe:
+    cluster: str
+    postfix: str
+    ready_nodes: int = 0
+    lease: Lease = None
+    # Creation time of the lock namespace, None if there is none
+    lock_namespace: float = None
+    seconds: float = 0
+    error: str = None
+    state: str = None
+    # Time at which a held cluster may be reclaimed
+    held_until: float = None
+
+
+def timestamp(value) -> float:
+    return value.timestamp() if value else None
+
+
+def utc_time(seconds: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+
+
+def clock_time(seconds: float) -> str:
+    return utc_time(seconds).strftime("%H:%M:%SZ")
+
+
+class KubernetesCluster:
+    """The nodes and lock objects of a cluster, through the kube config context of the same name"""
+
+    def __init__(self, name: str):
+        import kubernetes as k8s
+
+        self.k8s = k8s
+        self.name = name
+        self.api_client = k8s.config.new_client_from_config(context=name)
+        self.core = k8s.client.CoreV1Api(self.api_client)
+        self.coordination = k8s.client.CoordinationV1Api(self.api_client)
+
+    def ready_nodes(self) -> int:
+        """Count the nodes that are Ready and schedulable, like the 'Ready' status of kubectl get nodes"""
+        nodes = self.core.list_node(_request_timeout=REQUEST_TIMEOUT).items
+        return sum(1 for node in nodes if not node.spec.unschedulable and any(
+            c.type == "Ready" and c.status == "True" for c in node.status.conditions or []))
+
+    def read_lease(self) -> Lease:
+        try:
+            lease = self.coordination.read_namespaced_lease(LOCK_NAME, LEASE_NAMESPACE,
+                                                            _request_timeout=REQUEST_TIMEOUT)
+        except self.k8s.client.ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        spec = lease.spec
+        renewed = spec.renew_time or spec.acquire_time or lease.metadata.creation_timestamp
+        kept = (lease.metadata.annotations or {}).get(KEPT_ANNOTATION) == "true"
+        return Lease(spec.holder_identity or "", timestamp(renewed), spec.lease_duration_seconds or 0,
+                     lease.metadata.resource_version, spec.lease_transitions or 0, timestamp(spec.acquire_time), kept)
+
+    def read_lock_namespace(self) -> float:
+        try:
+            namespace = self.core.read_namespace(LOCK_NAME, _request_timeout=REQUEST_TIMEOUT)
+        except self.k8s.client.ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        if namespace.metadata.deletion_timestamp:
+            return None
+        return timestamp(namespace.metadata.creation_timestamp)
+
+    def write_lease(self, lease: Lease, previous: Lease) -> Lease:
+        """
+        Create the lease, or replace the previous lease if it has not changed since it was read. Return the written
+        lease, or None if another holder wrote it first.
+        """
+        client = self.k8s.client
+        now = utc_time(lease.renewed)
+        body = client.V1Lease(
+            metadata=client.V1ObjectMeta(name=LOCK_NAME, namespace=LEASE_NAMESPACE,
+                                         resource_version=previous.resource_version if previous else None),
+            spec=client.V1LeaseSpec(holder_identity=lease.holder, lease_duration_seconds=lease.duration,
+                                    acquire_time=now, renew_time=now, lease_transitions=lease.transitions))
+        try:
+            if previous:
+                written = self.coordination.replace_namespaced_lease(LOCK_NAME, LEASE_NAMESPACE, body,
+                                                                     _request_timeout=REQUEST_TIMEOUT)
+            else:
+                written = self.coordination.create_namespaced_lease(LEASE_NAMESPACE, body,
+                                                                    _request_timeout=REQUEST_TIMEOUT)
+        except client.ApiException as e:
+            # AlreadyExists on create, or Conflict on replace because the resource version is stale
+            if e.status == 409:
+                return None
+            raise
+        lease.resource_version = written.metadata.resource_version
+        return lease
+
+    def delete_lease(self, lease: Lease):
+        client = self.k8s.client
+        options = client.V1DeleteOptions(preconditions=client.V1Preconditions(
+            resource_version=lease.resource_version))
+        self.coordination.delete_namespaced_lease(LOCK_NAME, LEASE_NAMESPACE, body=options,
+                                                  _request_timeout=REQUEST_TIMEOUT)
+
+    def create_lock_namespace(self) -> bool:
+        """Return whether the lock namespace was created, False if it already exists"""
+        client = self.k8s.client
+        try:
+            self.core.create_namespace(client.V1Namespace(metadata=client.V1ObjectMeta(name=LOCK_NAME)),
+                                       _request_timeout=REQUEST_TIMEOUT)
+        except client.ApiException as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    def namespaces_since(self, since: float) -> [str]:
+        """The namespaces created at or after a time, except the lock namespace and those of Kubernetes"""
+        namespaces = self.core.list_namespace(_request_timeout=REQUEST_TIMEOUT).items
+        return sorted(namespace.metadata.name for namespace in namespaces
+                      if namespace.metadata.name not in PROTECTED_NAMESPACES and
+                      timestamp(namespace.metadata.creation_timestamp) >= since)
+
+    def delete_namespaces(self, names: [str], timeout: float) -> [str]:
+        """Delete namespaces and wait until they are gone. Return those still there after the timeout."""
+        client = self.k8s.client
+        for name in names:
+            try:
+                self.core.delete_namespace(name, _request_timeout=REQUEST_TIMEOUT)
+            except client.ApiException as e:
+                if e.status != 404:
+                    raise
+        deadline = time.time() + timeout
+        while True:
+            existing = {namespace.metadata.name for namespace in
+                        self.core.list_namespace(_request_timeout=REQUEST_TIMEOUT).items}
+            remaining = [name for name in names if name in existing]
+            if not remaining or time.time() >= deadline:
+                return remaining
+            time.sleep(5)
+
+    def watch_releases(self, kind: str, notify, stop: threading.Event):
+        """
+        Call notify with the cluster name and a description whenever the lease of the kind 'lease' or the lock
+        namespace of the kind 'namespace' is released, until stop is set
+        """
+        api_client = self.k8s.config.new_client_from_config(context=self.name)
+        if kind == "lease":
+            function = self.k8s.client.CoordinationV1Api(api_client).list_namespaced_lease
+            args = [LEASE_NAMESPACE]
+        else:
+            function = self.k8s.client.CoreV1Api(api_client).list_namespace
+            args = []
+        while not stop.is_set():
+            watch = self.k8s.watch.Watch()
+            try:
+                for event in watch.stream(function, *args, field_selector=f"metadata.name={LOCK_NAME}",
+                                          timeout_seconds=WATCH_SECONDS):
+                    obj = event["object"]
+                    if event["type"] == "DELETED":
+                        notify(self.name, f"{kind} deleted")
+                    elif event["type"] == "MODIFIED" and kind == "lease" and not obj.spec.holder_identity:
+                        notify(self.name, "lease released")
+                    elif event["type"] == "MODIFIED" and kind == "namespace" and obj.metadata.deletion_timestamp:
+                        notify(self.name, "namespace terminating")
+                    if stop.is_set():
+                        break
+            except Exception as e:
+                print(f"{self.name}: watch of the {kind} failed, retrying: {e}", flush=True)
+                stop.wait(WATCH_RETRY_SECONDS)
+            finally:
+                watch.stop()
+
+
+class ClusterAllocator:
+    def __init__(self, candidates: {}, holder: str, lease_seconds: int, min_nodes: int,
+                 legacy_lock_seconds: float = 0, delete_previous_namespaces: bool = False,
+                 cluster_class=KubernetesCluster, clock=time.time, sleep=time.sleep):
+        """
+        :param candidates: The postfix of each cluster name, in the order of preference
+        :param holder: The identity of the pipeline that claims a cluster
+        :param lease_seconds: The duration of the claim unless it is renewed
+        :param min_nodes: The Ready nodes a cluster needs to be claimed
+        :param legacy_lock_seconds: The age after which a cluster locked only by a lock namespace is reclaimed, or 0
+                                    never to reclaim it
+        :param delete_previous_namespaces: Whether to delete the namespaces that the previous holder of a reclaimed
+                                           cluster left behind, except those of a kept environment
+        :param cluster_class: The class that talks to the API server of a cluster, given the cluster name
+        """
+        self.candidates = candidates
+        self.holder = holder
+        self.lease_seconds = lease_seconds
+        self.min_nodes = min_nodes
+        self.legacy_lock_seconds = legacy_lock_seconds
+        self.delete_previous_namespaces = delete_previous_namespaces
+        self.cluster_class = cluster_class
+        self.clock = clock
+        self.sleep = sleep
+        self.clusters = {}
+        self.clusters_lock = threading.Lock()
+        self.releases = queue.Queue()
+        self.stop = threading.Event()
+        self.watchers = []
+        self.metrics = {
+            "holder": holder,
+            "cluster": None,
+            "postfix": None,
+            "state": None,
+            "previous_holder": None,
+            "queue_seconds": None,
+            "rounds": 0,
+            "wakeups": {"release": 0, "expiry": 0, "poll": 0},
+            "claim_conflicts": 0,
+            "previous_namespaces": [],
+            "deleted_namespaces": [],
+            "candidates": {},
+        }
+
+    def cluster(self, name: str):
+        with self.clusters_lock:
+            if name not in self.clusters:
+                self.clusters[name] = self.cluster_class(name)
+            return self.clusters[name]
+
+    def probe(self, name: str) -> Probe:
+        probe = Probe(name, self.candidates[name])
+        start = self.clock()
+        try:
+            cluster = self.cluster(name)
+            probe.ready_nodes = cluster.ready_nodes()
+            probe.lease = cluster.read_lease()
+            probe.lock_namespace = cluster.read_lock_namespace()
+        except Exception as e:
+            probe.error = str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+        probe.seconds = round(self.clock() - start, 3)
+        self.classify(probe, self.clock())
+        return probe
+
+    def classify(self, probe: Probe, now: float):
+        lease = probe.lease
+        if probe.error:
+            probe.state = "error"
+        elif lease and lease.holder == self.holder:
+            probe.state = "ours"
+        elif lease and lease.holder and lease.kept:
+            # The environment of a finished pipeline is in use until its lock namespace is deleted
+            probe.state = "held" if probe.lock_namespace is not None else "expired"
+        elif lease and lease.holder and lease.expires > now:
+            probe.state, probe.held_until = "held", lease.expires
+        elif lease and lease.holder:
+            probe.state = "expired"
+        elif probe.lock_namespace is None or (lease and probe.lock_namespace <= lease.renewed):
+            # A lock namespace older than the release of the lease was left behind by the pipeline that released it,
+            # while a newer one was created by an earlier version of find_cluster.sh
+            probe.state = "free"
+        elif self.legacy_lock_seconds and now - probe.lock_namespace >= self.legacy_lock_seconds:
+            probe.state = "orphaned"
+        else:
+            probe.state = "held"
+            if self.legacy_lock_seconds:
+                probe.held_until = probe.lock_namespace + self.legacy_lock_seconds
+        if probe.state in CLAIM_ORDER and probe.ready_nodes < self.min_nodes:
+            probe.state = "not-ready"
+
+    def probe_all(self) -> [Probe]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.candidates)) as executor:
+            probes = list(executor.map(self.probe, self.candidates))
+        self.metrics["candidates"] = {probe.cluster: {"state": probe.state, "ready_nodes": probe.ready_nodes,
+                                                      "probe_seconds": probe.seconds, "error": probe.error}
+                                      for probe in probes}
+        for probe in probes:
+            print(f"{probe.cluster}: {self.describe(probe)}", flush=True)
+        return probes
+
+    def describe(self, probe: Probe) -> str:
+        if probe.state == "error":
+            return f"could not be probed: {probe.error}"
+        if probe.state == "not-ready":
+            return f"only {probe.ready_nodes} of the {self.min_nodes} required nodes are Ready"
+        if probe.state == "held":
+            holder = probe.lease.holder if probe.lease and probe.lease.holder else f"the {LOCK_NAME} namespace"
+            if probe.lease and probe.lease.kept:
+                return f"held by the kept environment of {holder} until the {LOCK_NAME} namespace is deleted"
+            until = f" until {clock_time(probe.held_until)}" if probe.held_until else ""
+            return f"held by {holder}{until}"
+        if probe.state == "expired" and probe.lease.kept:
+            return f"kept environment of {probe.lease.holder} without a {LOCK_NAME} namespace"
+        if probe.state == "expired":
+            return f"lease of {probe.lease.holder} expired at {clock_time(probe.lease.expires)}"
+        if probe.state == "orphaned":
+            return f"{LOCK_NAME} namespace without a lease since {clock_time(probe.lock_namespace)}"
+        return f"{probe.state}, {probe.ready_nodes} nodes Ready"
+
+    def claim(self, probe: Probe) -> bool:
+        cluster = self.cluster(probe.cluster)
+        previous = probe.lease
+        transitions = previous.transitions + (previous.holder != self.holder) if previous else 0
+        lease = cluster.write_lease(Lease(self.holder, self.clock(), self.lease_seconds, transitions=transitions),
+                                    previous)
+        if not lease:
+            print(f"{probe.cluster}: claimed by another pipeline first", flush=True)
+            return False
+        # Earlier versions of find_cluster.sh claim a cluster by creating the lock namespace, so lose to one that
+        # created it since the probe
+        if not cluster.create_lock_namespace() and probe.lock_namespace is None and probe.state == "free":
+            print(f"{probe.cluster}: claimed with the {LOCK_NAME} namespace by another pipeline first", flush=True)
+            cluster.delete_lease(lease)
+            return False
+        if probe.state in ("expired", "orphaned"):
+            self.clean_up_previous_holder(probe)
+        return True
+
+    def clean_up_previous_holder(self, probe: Probe):
+        """
+        List the namespaces that the previous holder of a reclaimed cluster created since it claimed it, and delete them
+        only if asked to. A failed pipeline leaves its namespaces behind, but so does one that kept its environment,
+        whose namespaces are never deleted.
+        """
+        since = probe.lease.acquired if probe.state == "expired" else probe.lock_namespace
+        if since is None:
+            print(f"{probe.cluster}: not looking for the namespaces of the previous holder, its claim time is unknown",
+                  flush=True)
+            return
+        cluster = self.cluster(probe.cluster)
+        try:
+            names = cluster.namespaces_since(since)
+        except Exception as e:
+            print(f"{probe.cluster}: could not list the namespaces of the previous holder: {e}", flush=True)
+            return
+        if not names:
+            return
+        self.metrics["previous_namespaces"] = names
+        kept = probe.state == "expired" and probe.lease.kept
+        if kept or not self.delete_previous_namespaces:
+            reason = "of a kept environment" if kept else "without --delete-previous-namespaces"
+            print(f"{probe.cluster}: not deleting the namespaces of the previous holder {reason}: {' '.join(names)}",
+                  flush=True)
+            return
+        print(f"{probe.cluster}: deleting the namespaces of the previous holder: {' '.join(names)}", flush=True)
+        try:
+            remaining = cluster.delete_namespaces(names, NAMESPACE_DELETE_SECONDS)
+        except Exception as e:
+            print(f"{probe.cluster}: could not delete the namespaces of the previous holder: {e}", flush=True)
+            return
+        self.metrics["deleted_namespaces"] = names
+        if remaining:
+            print(f"{probe.cluster}: namespaces still terminating after {NAMESPACE_DELETE_SECONDS}s: "
+                  f"{' '.join(remaining)}", flush=True)
+
+    def claim_order(self, probes: [Probe]) -> [Probe]:
+        claimable = [probe for probe in probes if probe.state in CLAIM_ORDER]
+        return sorted(claimable, key=lambda probe: CLAIM_ORDER.index(probe.state))
+
+    def acquire(self, timeout: float, poll_seconds: float) -> Probe:
+        start = self.clock()
+        deadline = start + timeout
+        try:
+            while True:
+                self.metrics["rounds"] += 1
+                probes = self.probe_all()
+                for probe in self.claim_order(probes):
+                    try:
+                        claimed = self.claim(probe)
+                    except Exception as e:
+                        print(f"{probe.cluster}: could not be claimed: {e}", flush=True)
+                        claimed = False
+                    if claimed:
+                        self.metrics.update(cluster=probe.cluster, postfix=probe.postfix, state=probe.state,
+                                            queue_seconds=round(self.clock() - start, 3),
+                                            previous_holder=probe.lease.holder or None if probe.lease else None)
+                        return probe
+                    self.metrics["claim_conflicts"] += 1
+
+                now = self.clock()
+                if now >= deadline:
+                    raise AllocationError(f"No cluster could be claimed in {timeout:.0f}s")
+                waits = {"poll": poll_seconds}
+                expiries = [probe.held_until - now for probe in probes if probe.held_until]
+                if expiries:
+                    waits["expiry"] = min(expiries)
+                reason = min(waits, key=waits.get)
+                wait = max(min(waits[reason], deadline - now), 1)
+                print(f"No cluster can be claimed, waiting up to {wait:.0f}s for a release", flush=True)
+                self.wait_for_release(wait, reason)
+        finally:
+            self.stop.set()
+
+    def wait_for_release(self, seconds: float, reason: str):
+        self.start_watches()
+        try:
+            cluster, description = self.releases.get(timeout=seconds)
+        except queue.Empty:
+            self.metrics["wakeups"][reason] += 1
+            return
+        self.metrics["wakeups"]["release"] += 1
+        print(f"{cluster}: {description}", flush=True)
+        self.sleep(random.uniform(0, RELEASE_JITTER_SECONDS))
+        while not self.releases.empty():
+            self.releases.get_nowait()
+
+    def start_watches(self):
+        if self.watchers:
+            return
+        for name in self.candidates:
+            for kind in ("lease", "namespace"):
+                watcher = threading.Thread(target=self.watch, args=(name, kind), daemon=True)
+                watcher.start()
+                self.watchers.append(watcher)
+
+    def watch(self, name: str, kind: str):
+        try:
+            self.cluster(name).watch_releases(kind, lambda *release: self.releases.put(release), self.stop)
+        except Exception as e:
+            print(f"{name}: could not watch the {kind}: {e}", flush=True)
+
+
+def parse_candidates(values: [str]) -> {}:
+    candidates = {}
+    for value in values:
+        name, separator, postfix = value.partition("=")
+        if not name or not separator:
+            raise ValueError(f"Invalid candidate '{value}', expected NAME=POSTFIX")
+        candidates[name] = postfix
+    return candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Claim one of several clusters with a Lease, probing them all at once and waiting for a release",
+        epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=["acquire", "status"])
+    parser.add_argument("candidates", nargs="+", metavar="NAME=POSTFIX", help="Clusters to claim from, in order")
+    parser.add_argument("--holder", default=os.getenv("CLUSTER_LOCK_HOLDER"),
+                        help="Identity of the claim, defaults to $CLUSTER_LOCK_HOLDER")
+    parser.add_argument("--lease-seconds", type=int, default=10800,
+                        help="Seconds the claim lasts unless it is renewed")
+    parser.add_argument("--min-nodes", type=int, default=2, help="Ready nodes a cluster needs to be claimed")
+    parser.add_argument("--legacy-lock-seconds", type=float, default=0,
+                        help="Age after which a cluster locked only by the lock namespace is reclaimed, 0 (the "
+                             "default) for never")
+    parser.add_argument("--delete-previous-namespaces", action="store_true",
+                        help="Delete the namespaces that the previous holder of a reclaimed cluster created, unless "
+                             "it kept its environment")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds to wait for a cluster")
+    parser.add_argument("--poll-seconds", type=float, default=300,
+                        help="Seconds after which the clusters are probed again without a release")
+    parser.add_argument("--output", help="Write SELECTED_POSTFIX, SELECTED_KUBE_NAME and CLUSTER_LOCK_HOLDER as a "
+                                         "dotenv file to this file")
+    parser.add_argument("--metrics", help="Write the queue time and probe results as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        candidates = parse_candidates(args.candidates)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "acquire" and not args.holder:
+        parser.error("--holder or $CLUSTER_LOCK_HOLDER is required to acquire a cluster")
+
+    allocator = ClusterAllocator(candidates, args.holder, args.lease_seconds, args.min_nodes,
+                                 args.legacy_lock_seconds, args.delete_previous_namespaces)
+    if args.command == "status":
+        allocator.probe_all()
+        return
+
+    try:
+        probe = allocator.acquire(args.timeout, args.poll_seconds)
+    except (AllocationError, KeyboardInterrupt) as e:
+        print(f"Could not find a cluster to run on: {e or 'interrupted'}", flush=True)
+        probe = None
+    finally:
+        if args.metrics:
+            with open(args.metrics, "w") as metrics_file:
+                json.dump(allocator.metrics, metrics_file, indent=2)
+
+    if not probe:
+        sys.exit(1)
+    metrics = allocator.metrics
+    print(f"Claimed {probe.cluster} ({probe.state}) for {args.holder} after {metrics['queue_seconds']:.0f}s in "
+          f"{metrics['rounds']} rounds", flush=True)
+    if args.output:
+        with open(args.output, "w") as env_file:
+            env_file.write(f"SELECTED_POSTFIX={probe.postfix}\n"
+                           f"SELECTED_KUBE_NAME={probe.cluster}\n"
+                           f"CLUSTER_LOCK_HOLDER={args.holder}\n")
+
+
+if __name__ == "__main__":
+    main()
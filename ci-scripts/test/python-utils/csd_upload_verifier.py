@@ -0,0 +1,262 @@
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import kubernetes as k8s
+
+CSD_FILE_MARKER = "support-data"
+
+
+def parse_log_timestamp(timestamp: str) -> datetime:
+    """
+    Parse the RFC3339 timestamp the Kubernetes API prefixes log lines with when timestamps=True
+    :param timestamp: Timestamp with nanosecond precision, e.g. 2023-01-31T17:01:02.123456789Z
+    :return: Timezone aware datetime
+    """
+    timestamp = timestamp.rstrip("Z")
+    seconds, _, fraction = timestamp.partition(".")
+    parsed = datetime.strptime(seconds, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    if fraction:
+        parsed += timedelta(microseconds=int(fraction[:6].ljust(6, "0")))
+    return parsed
+
+
+class S3KeyTracker:
+    """
+    Incrementally lists the CSD files under a prefix of the log archive bucket. Every key seen is remembered, and each
+    listing resumes after the keys already seen instead of re-listing the whole prefix.
+    """
+
+    def __init__(self, s3_client, bucket_name: str, directory_name: str):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = f"{directory_name}/"
+        self.seen = {}
+
+    def start_after(self, missing: set) -> str:
+        """
+        Listing is lexicographic, so resume after the last key seen below the smallest missing file. Files that have
+        not shown up yet cannot sort before that key.
+        """
+        if not missing:
+            return ""
+        smallest_missing = f"{self.prefix}{min(missing)}"
+        return max((key for key in self.seen if key < smallest_missing), default="")
+
+    def poll(self, missing: set) -> {}:
+        """
+        List the keys added since the previous poll
+        :param missing: File names that are expected but have not been seen yet
+        :return: Newly seen CSD file names mapped to their LastModified time
+        """
+        kwargs = {"Bucket": self.bucket_name, "Prefix": self.prefix}
+        start_after = self.start_after(missing)
+        if start_after:
+            kwargs["StartAfter"] = start_after
+
+        new_files = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**kwargs):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if key in self.seen:
+                    continue
+                self.seen[key] = obj["LastModified"]
+                if CSD_FILE_MARKER in key:
+                    new_files[key[len(self.prefix):].split("/", 1)[0]] = obj["LastModified"]
+        return new_files
+
+
+@dataclass
+class PodLogPosition:
+    last_timestamp: datetime = None
+    last_line: str = ""
+    last_line_time: datetime = None
+
+
+class CsdJobLogTailer:
+    """
+    Tails the logs of the CSD upload job pods. The position reached in each pod's log is saved, so every read only
+    transfers the lines logged since the previous read.
+    """
+
+    def __init__(self, core_client, namespace: str, job_name: str):
+        self.core_client = core_client
+        self.namespace = namespace
+        self.job_name = job_name
+        self.positions = {}
+
+    def job_pod_names(self) -> [str]:
+        pods = self.core_client.list_namespaced_pod(self.namespace, label_selector=f"job-name={self.job_name}")
+        return [pod.metadata.name for pod in pods.items]
+
+    def read_new_lines(self, pod_name: str) -> [(datetime, str)]:
+        position = self.positions.setdefault(pod_name, PodLogPosition())
+        read_up_to = position.last_timestamp
+
+        kwargs = {"name": pod_name, "namespace": self.namespace, "timestamps": True}
+        if read_up_to:
+            elapsed = datetime.now(timezone.utc) - read_up_to
+            kwargs["since_seconds"] = max(int(elapsed.total_seconds()) + 1, 1)
+
+        lines = []
+        for raw_line in self.core_client.read_namespaced_pod_log(**kwargs).splitlines():
+            timestamp, _, line = raw_line.partition(" ")
+            try:
+                logged_at = parse_log_timestamp(timestamp)
+            except ValueError:
+                continue
+            # since_seconds has a granularity of a second, so drop lines that were already read
+            if read_up_to and logged_at <= read_up_to:
+                continue
+            lines.append((logged_at, line))
+
+        if lines:
+            position.last_timestamp = lines[-1][0]
+
+        for logged_at, line in lines:
+            if line.strip():
+                position.last_line = line
+                position.last_line_time = logged_at
+        return lines
+
+    def expected_files(self) -> {}:
+        """
+        The last line logged by each CSD upload job pod is the space separated list of uploaded CSD files. Only the
+        lines logged since the previous call are read, so this is called on every poll to follow a job that is still
+        running; the list is final once the job has completed.
+        :return: Expected file names mapped to the time the job logged them
+        """
+        expected = {}
+        for pod_name in self.job_pod_names():
+            self.read_new_lines(pod_name)
+            position = self.positions[pod_name]
+            for file_name in position.last_line.split():
+                expected[file_name] = position.last_line_time
+        return expected
+
+
+def job_start_time(batch_client, namespace: str, job_name: str) -> datetime:
+    """:return: The time the CSD upload job started, or None if it has not started or does not exist"""
+    try:
+        return batch_client.read_namespaced_job(job_name, namespace).status.start_time
+    except k8s.client.exceptions.ApiException:
+        return None
+
+
+@dataclass
+class VerificationResult:
+    expected: {} = field(default_factory=dict)
+    # Every CSD file listed in S3, mapped to its LastModified time, including files the job has not logged yet
+    uploaded: {} = field(default_factory=dict)
+    polls: int = 0
+    job_started: datetime = None
+
+    @property
+    def missing(self) -> set:
+        return set(self.expected) - set(self.uploaded)
+
+    def upload_times(self) -> {}:
+        """Seconds between the start of the job and the LastModified time in S3 of each expected file"""
+        if not self.job_started:
+            return {}
+        return {
+            file_name: (self.uploaded[file_name] - self.job_started).total_seconds()
+            for file_name in self.expected
+            if file_name in self.uploaded
+        }
+
+
+class CsdUploadVerifier:
+    def __init__(self, key_tracker: S3KeyTracker, log_tailer: CsdJobLogTailer, sleep=time.sleep, clock=time.monotonic):
+        self.key_tracker = key_tracker
+        self.log_tailer = log_tailer
+        self.sleep = sleep
+        self.clock = clock
+
+    def verify(self, timeout_seconds: float, initial_delay: float = 0.5, max_delay: float = 5.0,
+               job_started: datetime = None) -> VerificationResult:
+        """
+        Wait with exponential backoff until every file logged by the CSD upload job is present in S3. The job logs are
+        re-read on every poll, in case the job is still running.
+        :param timeout_seconds: Time to wait for the upload before giving up
+        :param initial_delay: Delay before the first retry
+        :param max_delay: Upper bound of the delay between retries
+        :param job_started: The time the job started, to report when each file was uploaded
+        :return: Result of the verification; result.missing is empty on success
+        """
+        result = VerificationResult(job_started=job_started)
+        deadline = self.clock() + timeout_seconds
+        delay = initial_delay
+
+        while True:
+            result.expected = self.log_tailer.expected_files()
+            result.uploaded.update(self.key_tracker.poll(result.missing))
+            result.polls += 1
+
+            if not result.missing:
+                return result
+
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return result
+
+            self.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+
+def print_report(result: VerificationResult):
+    upload_times = result.upload_times()
+    print(f"Expected CSD files ({len(result.expected)}):")
+    for file_name in sorted(result.expected):
+        if file_name in result.uploaded:
+            upload_time = upload_times.get(file_name)
+            upload_time = f"{upload_time:.1f}s" if upload_time is not None else "unknown"
+            print(f"  uploaded     {file_name} ({upload_time} after the job started)")
+        else:
+            print(f"  not uploaded {file_name}")
+    print(f"S3 listed {result.polls} time(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify that the files uploaded by a CSD upload job are in S3")
+    parser.add_argument("job_name", help="Name of the CSD upload job")
+    parser.add_argument("directory_name", help="Name of the product directory within S3")
+    parser.add_argument("--namespace", default=os.getenv("PING_CLOUD_NAMESPACE", "ping-cloud"))
+    parser.add_argument("--bucket-url", default=os.getenv("LOG_ARCHIVE_URL"),
+                        help="S3 URL of the log archive bucket, defaults to LOG_ARCHIVE_URL")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("UPLOAD_TIMEOUT_SECONDS", "20")),
+                        help="Seconds to wait for the upload, defaults to UPLOAD_TIMEOUT_SECONDS")
+    args = parser.parse_args()
+
+    if not args.bucket_url:
+        parser.error("--bucket-url or LOG_ARCHIVE_URL is required")
+    bucket_name = args.bucket_url[len("s3://"):].split("/", 1)[0] if args.bucket_url.startswith("s3://") \
+        else args.bucket_url
+
+    k8s.config.load_kube_config()
+    s3_client = boto3.session.Session().client("s3")
+
+    verifier = CsdUploadVerifier(
+        S3KeyTracker(s3_client, bucket_name, args.directory_name),
+        CsdJobLogTailer(k8s.client.CoreV1Api(), args.namespace, args.job_name),
+    )
+    job_started = job_start_time(k8s.client.BatchV1Api(), args.namespace, args.job_name)
+    result = verifier.verify(args.timeout, job_started=job_started)
+    print_report(result)
+
+    if not result.expected:
+        print(f"No CSD files were logged by job {args.job_name}")
+        sys.exit(1)
+    if result.missing:
+        print(f"The following files were not uploaded after a timeout of {args.timeout:g} seconds: "
+              f"{' '.join(sorted(result.missing))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
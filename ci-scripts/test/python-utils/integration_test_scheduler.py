@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+# Shell test scripts must be prefixed with at least a 2-digit number and end with .sh
+TEST_SCRIPT_REGEX = re.compile(r"^(\d{2,}).*\.sh$")
+
+# Subdirectory of a test directory with the prerequisites, which run in a phase of their own before the tests
+PREREQUISITES_DIR = "prerequisites"
+
+# Directories that disrupt the cluster, e.g. by deleting pods. They are left out of the default set of directories, and
+# when requested they run after the other directories, one at a time with nothing else running.
+EXCLUSIVE_TEST_DIRS = ["chaos"]
+
+# Number of runs kept in the duration history
+HISTORY_LENGTH = 20
+
+NO_COLOR = "\033[0m"
+GREEN = "\033[0;32m"
+RED = "\033[0;31m"
+BANNER = "+" * 115
+
+
+@dataclass
+class TestResult:
+    name: str
+    directory: str
+    exit_code: int
+    duration: float
+    output: str
+
+
+@dataclass
+class TestDirectory:
+    """A directory of tests that runs in numeric order on one worker"""
+
+    name: str
+    path: str
+    scripts: [str] = field(default_factory=list)
+    has_python_tests: bool = False
+
+    @classmethod
+    def load(cls, name: str, path: str):
+        """
+        Find the shell test scripts at any depth below the path, except in prerequisites subdirectories. The scripts of
+        each subdirectory run in numeric order, after those of its parent. Python tests are only run from the path
+        itself.
+        """
+        test_dir = cls(name, path)
+        if not os.path.isdir(path):
+            return test_dir
+
+        scripts = []
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names[:] = [d for d in dir_names if d != PREREQUISITES_DIR and not d.startswith((".", "__"))]
+            relative_dir = os.path.relpath(dir_path, path)
+            for file_name in file_names:
+                match = TEST_SCRIPT_REGEX.match(file_name)
+                if match:
+                    sort_dir = "" if relative_dir == "." else relative_dir
+                    scripts.append((sort_dir, int(match.group(1)), file_name))
+        test_dir.scripts = [os.path.join(d, f) for d, _, f in sorted(scripts)]
+        test_dir.has_python_tests = any(f.endswith(".py") for f in os.listdir(path))
+        return test_dir
+
+    @property
+    def test_names(self) -> [str]:
+        names = [f"{self.name}/{script}" for script in self.scripts]
+        if self.has_python_tests:
+            names.append(f"{self.name}/python-unittests")
+        return names
+
+    @property
+    def empty(self) -> bool:
+        return not self.scripts and not self.has_python_tests
+
+
+class DurationHistory:
+    """Test durations of the previous runs, used to schedule the slowest directories first"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.runs = []
+        if path and os.path.isfile(path):
+            with open(path) as history_file:
+                self.runs = json.load(history_file).get("runs", [])
+
+    def estimate(self, test_dir: TestDirectory) -> float:
+        """Average duration of the directory over the runs that include it. Unknown directories sort first."""
+        totals = [
+            sum(run["durations"][name] for name in test_dir.test_names if name in run["durations"])
+            for run in self.runs
+            if any(name in run["durations"] for name in test_dir.test_names)
+        ]
+        return sum(totals) / len(totals) if totals else float("inf")
+
+    def save(self, started: datetime, results: [TestResult]):
+        self.runs.append({
+            "started": started.isoformat(),
+            "durations": {result.name: round(result.duration, 3) for result in results},
+        })
+        self.runs = self.runs[-HISTORY_LENGTH:]
+        with open(self.path, "w") as history_file:
+            json.dump({"runs": self.runs}, history_file, indent=2)
+
+
+class IntegrationTestScheduler:
+    def __init__(self, integration_dir: str, env_vars_file: str, workers: int, history: DurationHistory):
+        self.integration_dir = integration_dir
+        self.env_vars_file = env_vars_file
+        self.workers = workers
+        self.history = history
+        self.print_lock = threading.Lock()
+
+    def log(self, message: str):
+        with self.print_lock:
+            print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {message}", flush=True)
+
+    def run_command(self, name: str, directory: str, command: [str], cwd: str) -> TestResult:
+        self.log(f"Running integration test: {name}")
+        start = time.monotonic()
+        output = []
+        # Stream the output as it is written, prefixed with the test name since concurrent tests interleave, so that a
+        # hung test still shows how far it got
+        with subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                              errors="replace", bufsize=1) as process:
+            for line in process.stdout:
+                output.append(line)
+                with self.print_lock:
+                    print(f"[{name}] {line}", end="" if line.endswith("\n") else "\n", flush=True)
+        result = TestResult(name, directory, process.returncode, time.monotonic() - start, "".join(output))
+        self.log(f"Test result: {name}: {result.exit_code} ({result.duration:.1f}s)\n")
+        return result
+
+    def run_directory(self, test_dir: TestDirectory) -> [TestResult]:
+        results = []
+        for script in test_dir.scripts:
+            command = [os.path.join(test_dir.path, script)]
+            if self.env_vars_file:
+                command.append(self.env_vars_file)
+            results.append(self.run_command(f"{test_dir.name}/{script}", test_dir.name, command, test_dir.path))
+
+        if test_dir.has_python_tests:
+            self.log(f"Running python tests from: {test_dir.path}")
+            command = [sys.executable, "-Wignore::ResourceWarning", "-m", "unittest", "-v"]
+            results.append(self.run_command(f"{test_dir.name}/python-unittests", test_dir.name, command,
+                                            test_dir.path))
+        return results
+
+    def run_phase(self, test_dirs: [TestDirectory]) -> [TestResult]:
+        """Run the directories concurrently, longest first, each directory's tests in numeric order"""
+        test_dirs = sorted((d for d in test_dirs if not d.empty), key=self.history.estimate, reverse=True)
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for dir_results in executor.map(self.run_directory, test_dirs):
+                results.extend(dir_results)
+        return results
+
+    def run(self, test_dir_names: [str]) -> ([TestResult], bool):
+        """
+        Run the prerequisites of every directory, then the tests of every directory. The exclusive directories run
+        afterwards, each in a group of its own.
+        :return: All test results, and whether the prerequisites passed
+        """
+        groups = [[name for name in test_dir_names if name not in EXCLUSIVE_TEST_DIRS]]
+        groups += [[name] for name in test_dir_names if name in EXCLUSIVE_TEST_DIRS]
+
+        results = []
+        for group in groups:
+            if not group:
+                continue
+            group_results, prerequisites_passed = self.run_group(group)
+            results += group_results
+            if not prerequisites_passed:
+                return results, False
+        return results, True
+
+    def run_group(self, test_dir_names: [str]) -> ([TestResult], bool):
+        """
+        Run the prerequisites of every directory of the group, then the tests of every directory of the group
+        :return: The test results of the group, and whether the prerequisites passed
+        """
+        prerequisites = [
+            TestDirectory.load(f"{name}/{PREREQUISITES_DIR}", os.path.join(self.integration_dir, name,
+                                                                           PREREQUISITES_DIR))
+            for name in test_dir_names
+        ]
+        tests = [TestDirectory.load(name, os.path.join(self.integration_dir, name)) for name in test_dir_names]
+
+        self.log("Running prerequisite scripts...")
+        results = self.run_phase(prerequisites)
+        failures = count_failures(results)
+        print_summary("Prerequisite Test Summary", "prerequisite tests", "Prerequisite test script files(s)",
+                      failures, test_dir_names)
+        if failures:
+            # If the prerequisites are not met, then the tests below will fail generating a lot of noise when the
+            # issue is likely more fundamental.
+            return results, False
+
+        self.log("Running test scripts...")
+        results += self.run_phase(tests)
+        return results, True
+
+
+def count_failures(results: [TestResult]) -> int:
+    return len([result for result in results if result.exit_code != 0])
+
+
+def print_summary(title: str, what: str, failed_what: str, failures: int, test_dir_names: [str]):
+    dirs = " ".join(test_dir_names)
+    print(BANNER)
+    if failures == 0:
+        print(f"{title}: {GREEN}All {what} in {dirs} completed successfully {NO_COLOR}")
+    else:
+        print(f"{title}: {RED} {failures} {failed_what} failed under: {dirs} {NO_COLOR}")
+    print(BANNER, flush=True)
+
+
+def print_timings(results: [TestResult]):
+    print("Slowest tests:")
+    for result in sorted(results, key=lambda r: r.duration, reverse=True)[:10]:
+        print(f"  {result.duration:8.1f}s  {result.name}")
+    print(flush=True)
+
+
+def write_junit_report(path: str, results: [TestResult]):
+    testsuites = ET.Element("testsuites")
+    for directory in sorted({result.directory for result in results}):
+        dir_results = [result for result in results if result.directory == directory]
+        testsuite = ET.SubElement(testsuites, "testsuite", {
+            "name": directory,
+            "tests": str(len(dir_results)),
+            "failures": str(count_failures(dir_results)),
+            "time": f"{sum(result.duration for result in dir_results):.3f}",
+        })
+        for result in dir_results:
+            testcase = ET.SubElement(testsuite, "testcase", {
+                "classname": directory,
+                "name": result.name.rsplit("/", 1)[-1],
+                "time": f"{result.duration:.3f}",
+            })
+            if result.exit_code != 0:
+                ET.SubElement(testcase, "failure", {"message": f"exit code {result.exit_code}"})
+            ET.SubElement(testcase, "system-out").text = result.output
+
+    ET.ElementTree(testsuites).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def all_test_dirs(integration_dir: str) -> [str]:
+    """The test directories run when none is requested: all of them except the exclusive ones"""
+    return sorted(name for name in os.listdir(integration_dir)
+                  if os.path.isdir(os.path.join(integration_dir, name)) and not name.startswith((".", "__"))
+                  and name not in EXCLUSIVE_TEST_DIRS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run integration test directories concurrently")
+    parser.add_argument("test_dirs", nargs="*",
+                        help="Integration test directories, e.g. pingfederate pingaccess, defaults to all of them "
+                             f"except {', '.join(EXCLUSIVE_TEST_DIRS)}")
+    parser.add_argument("--env-vars-file", default="", help="Environment variables file passed to every test script")
+    parser.add_argument("--integration-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "integration"),
+                        help="Directory containing the integration test directories")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("TEST_WORKERS", "4")),
+                        help="Number of directories run concurrently, defaults to TEST_WORKERS or 4")
+    parser.add_argument("--report-dir", default=os.getenv("TEST_REPORT_DIR", "."),
+                        help="Directory for junit.xml and test-durations.json, defaults to TEST_REPORT_DIR")
+    args = parser.parse_args()
+
+    test_dirs = args.test_dirs or all_test_dirs(args.integration_dir)
+    os.makedirs(args.report_dir, exist_ok=True)
+    history = DurationHistory(os.path.join(args.report_dir, "test-durations.json"))
+    scheduler = IntegrationTestScheduler(args.integration_dir, args.env_vars_file, args.workers, history)
+
+    started = datetime.now(timezone.utc)
+    results, prerequisites_passed = scheduler.run(test_dirs)
+
+    write_junit_report(os.path.join(args.report_dir, "junit.xml"), results)
+    history.save(started, results)
+    print_timings(results)
+
+    failures = count_failures(results)
+    if prerequisites_passed:
+        print_summary("Test Summary", "integration tests", "Integration test script file(s)", failures,
+                      test_dirs)
+    sys.exit(min(failures, 255))
+
+
+if __name__ == "__main__":
+    main()
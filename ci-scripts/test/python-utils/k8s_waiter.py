@@ -0,0 +1,336 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import kubernetes as k8s
+
+USAGE = """
+Each condition has the form TYPE:ARGS[@TIMEOUT_SECONDS]:
+
+  count:KIND:N[:SELECTOR]          exactly N objects of KIND match the label selector
+  ready-count:KIND:N[:SELECTOR]    at least N pods or nodes of KIND matching the label selector are Ready
+  rollout:KIND/NAME                the statefulset or deployment rollout is complete
+  pod-ready:NAME                   the pod is Ready
+  job-complete:NAME                the job has completed
+
+KIND is one of: pod, node, namespace, statefulset, deployment, job
+
+Examples:
+  k8s_waiter.py -n ping-cloud rollout:statefulset/pingdirectory@1800 rollout:statefulset/pingfederate
+  k8s_waiter.py ready-count:node:2
+"""
+
+KINDS = ["pod", "node", "namespace", "statefulset", "deployment", "job"]
+
+# Container waiting reasons that will not resolve without a change to the spec
+TERMINAL_WAITING_REASONS = ["InvalidImageName", "ErrImageNeverPull", "CreateContainerConfigError"]
+
+
+class TerminalError(Exception):
+    """Raised by a condition that can never be met"""
+
+
+def list_function(kind: str, namespace: str):
+    """Return the list function to watch for a kind, and whether the kind is namespaced"""
+    core = k8s.client.CoreV1Api()
+    apps = k8s.client.AppsV1Api()
+    batch = k8s.client.BatchV1Api()
+    functions = {
+        "pod": (core.list_namespaced_pod, True),
+        "node": (core.list_node, False),
+        "namespace": (core.list_namespace, False),
+        "statefulset": (apps.list_namespaced_stateful_set, True),
+        "deployment": (apps.list_namespaced_deployment, True),
+        "job": (batch.list_namespaced_job, True),
+        # Not a condition kind, but watched by chaos_mttr.py to see when a pod serves traffic
+        "endpoints": (core.list_namespaced_endpoints, True),
+    }
+    if kind not in functions:
+        raise ValueError(f"Unsupported kind '{kind}'")
+    return functions[kind]
+
+
+def matches_selector(labels: {}, selector: str) -> bool:
+    """Match labels against an equality-based label selector, e.g. 'app=ping-cloud,role!=pingdirectory,tier'"""
+    labels = labels or {}
+    for requirement in filter(None, (r.strip() for r in selector.split(","))):
+        if "!=" in requirement:
+            key, value = requirement.split("!=", 1)
+            if labels.get(key.strip()) == value.strip():
+                return False
+        elif "=" in requirement:
+            key, value = requirement.replace("==", "=").split("=", 1)
+            if labels.get(key.strip()) != value.strip():
+                return False
+        elif requirement.startswith("!"):
+            if requirement[1:] in labels:
+                return False
+        elif requirement not in labels:
+            return False
+    return True
+
+
+def has_condition(obj, condition_type: str, status: str = "True") -> bool:
+    conditions = (obj.status.conditions if obj.status else None) or []
+    return any(c.type == condition_type and c.status == status for c in conditions)
+
+
+def check_pod_terminal(pod):
+    if pod.status and pod.status.phase == "Failed":
+        raise TerminalError(f"pod {pod.metadata.name} failed: {pod.status.reason or pod.status.message}")
+
+    statuses = (pod.status.init_container_statuses or []) + (pod.status.container_statuses or []) \
+        if pod.status else []
+    for status in statuses:
+        waiting = status.state.waiting if status.state else None
+        if waiting and waiting.reason in TERMINAL_WAITING_REASONS:
+            raise TerminalError(f"pod {pod.metadata.name} container {status.name}: {waiting.reason} {waiting.message}")
+
+
+def is_ready(obj) -> bool:
+    return has_condition(obj, "Ready")
+
+
+def statefulset_rolled_out(sts) -> bool:
+    """Same checks as 'kubectl rollout status' for a statefulset"""
+    spec, status = sts.spec, sts.status
+    if not status or (status.observed_generation or 0) < (sts.metadata.generation or 0):
+        return False
+    if not spec.update_strategy or spec.update_strategy.type != "RollingUpdate":
+        return True
+    replicas = spec.replicas if spec.replicas is not None else 1
+    if (status.ready_replicas or 0) < replicas:
+        return False
+    rolling_update = spec.update_strategy.rolling_update
+    if rolling_update and rolling_update.partition is not None:
+        return (status.updated_replicas or 0) >= replicas - rolling_update.partition
+    return status.update_revision == status.current_revision
+
+
+def deployment_rolled_out(deployment) -> bool:
+    """Same checks as 'kubectl rollout status' for a deployment"""
+    spec, status = deployment.spec, deployment.status
+    if not status or (status.observed_generation or 0) < (deployment.metadata.generation or 0):
+        return False
+    for condition in status.conditions or []:
+        if condition.type == "Progressing" and condition.reason == "ProgressDeadlineExceeded":
+            raise TerminalError(f"deployment {deployment.metadata.name} exceeded its progress deadline")
+    replicas = spec.replicas if spec.replicas is not None else 1
+    updated = status.updated_replicas or 0
+    return updated >= replicas and (status.replicas or 0) <= updated and (status.available_replicas or 0) >= updated
+
+
+class Condition:
+    def __init__(self, spec: str, kind: str, timeout: float):
+        self.spec = spec
+        self.kind = kind
+        self.timeout = timeout
+        self.met_after = None
+        self.error = None
+
+    def evaluate(self, objects: {}) -> bool:
+        raise NotImplementedError
+
+    @classmethod
+    def parse(cls, spec: str, default_timeout: float):
+        condition, _, timeout = spec.partition("@")
+        timeout = float(timeout) if timeout else default_timeout
+        condition_type, _, args = condition.partition(":")
+        kind = args.split(":", 1)[0].split("/", 1)[0]
+        if condition_type in ["count", "ready-count", "rollout"] and kind not in KINDS:
+            raise ValueError(f"Unsupported kind '{kind}' in condition '{spec}'")
+
+        if condition_type in ["count", "ready-count"]:
+            kind, _, rest = args.partition(":")
+            expected, _, selector = rest.partition(":")
+            return CountCondition(spec, kind, timeout, int(expected), selector, ready=condition_type == "ready-count")
+        if condition_type == "rollout":
+            kind, _, name = args.partition("/")
+            if kind not in ["statefulset", "deployment"]:
+                raise ValueError(f"Rollout status is only supported for statefulsets and deployments: {spec}")
+            return NamedCondition(spec, kind, timeout, name)
+        if condition_type == "pod-ready":
+            return NamedCondition(spec, "pod", timeout, args)
+        if condition_type == "job-complete":
+            return NamedCondition(spec, "job", timeout, args)
+        raise ValueError(f"Unknown condition '{spec}'")
+
+
+class CountCondition(Condition):
+    def __init__(self, spec: str, kind: str, timeout: float, expected: int, selector: str, ready: bool):
+        super().__init__(spec, kind, timeout)
+        self.expected = expected
+        self.selector = selector
+        self.ready = ready
+
+    def evaluate(self, objects: {}) -> bool:
+        matching = [obj for obj in objects.values() if matches_selector(obj.metadata.labels, self.selector)]
+        if self.ready:
+            return len([obj for obj in matching if is_ready(obj)]) >= self.expected
+        return len(matching) == self.expected
+
+
+class NamedCondition(Condition):
+    def __init__(self, spec: str, kind: str, timeout: float, name: str):
+        super().__init__(spec, kind, timeout)
+        self.name = name
+
+    def evaluate(self, objects: {}) -> bool:
+        obj = objects.get(self.name)
+        if obj is None:
+            return False
+        if self.kind == "pod":
+            check_pod_terminal(obj)
+            return is_ready(obj)
+        if self.kind == "job":
+            if has_condition(obj, "Failed"):
+                raise TerminalError(f"job {self.name} failed")
+            return has_condition(obj, "Complete")
+        if self.kind == "statefulset":
+            return statefulset_rolled_out(obj)
+        return deployment_rolled_out(obj)
+
+
+class ResourceWatcher(threading.Thread):
+    """Watches one resource type and forwards its events to the waiter"""
+
+    def __init__(self, kind: str, namespace: str, events: queue.Queue):
+        super().__init__(daemon=True)
+        self.kind = kind
+        self.events = events
+        self.func, namespaced = list_function(kind, namespace)
+        self.kwargs = {"namespace": namespace} if namespaced else {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            watch = k8s.watch.Watch()
+            try:
+                # List once, then watch for changes from the listing's resource version
+                listing = self.func(**self.kwargs)
+                self.events.put((self.kind, "SYNC", listing.items))
+                for event in watch.stream(self.func, resource_version=listing.metadata.resource_version,
+                                          timeout_seconds=60, **self.kwargs):
+                    self.events.put((self.kind, event["type"], event["object"]))
+                    if self.stopped.is_set():
+                        watch.stop()
+                        break
+            except k8s.client.exceptions.ApiException as e:
+                # 410 Gone means the resource version expired; re-list and watch again
+                if e.status != 410:
+                    self.events.put((self.kind, "ERROR", e))
+                    return
+            except Exception as e:
+                self.events.put((self.kind, "ERROR", e))
+                return
+
+    def stop(self):
+        self.stopped.set()
+
+
+class Waiter:
+    def __init__(self, conditions: [Condition], namespace: str, watcher_class=ResourceWatcher, clock=time.monotonic):
+        self.conditions = conditions
+        self.namespace = namespace
+        self.watcher_class = watcher_class
+        self.clock = clock
+        self.objects = {}
+
+    def elapsed(self, start: float) -> str:
+        return f"{self.clock() - start:7.1f}s"
+
+    def evaluate(self, kind: str, start: float):
+        for condition in self.conditions:
+            if condition.kind != kind or condition.met_after is not None or condition.error:
+                continue
+            try:
+                if condition.evaluate(self.objects[kind]):
+                    condition.met_after = self.clock() - start
+                    print(f"[{self.elapsed(start)}] met: {condition.spec}", flush=True)
+            except TerminalError as e:
+                condition.error = str(e)
+                print(f"[{self.elapsed(start)}] failed: {condition.spec}: {e}", flush=True)
+
+    def wait(self) -> bool:
+        """
+        Watch every resource type the conditions refer to and evaluate the conditions on each event, until all
+        conditions are met, one of them fails or times out
+        :return: True if all conditions were met
+        """
+        start = self.clock()
+        events = queue.Queue()
+        kinds = sorted({condition.kind for condition in self.conditions})
+        watchers = [self.watcher_class(kind, self.namespace, events) for kind in kinds]
+        for kind in kinds:
+            self.objects[kind] = {}
+        for watcher in watchers:
+            watcher.start()
+
+        try:
+            while True:
+                pending = [c for c in self.conditions if c.met_after is None]
+                if any(c.error for c in self.conditions):
+                    return False
+                if not pending:
+                    return True
+
+                remaining = min(c.timeout for c in pending) - (self.clock() - start)
+                if remaining <= 0:
+                    for condition in pending:
+                        if condition.timeout <= self.clock() - start:
+                            print(f"[{self.elapsed(start)}] timed out: {condition.spec}", flush=True)
+                    return False
+
+                try:
+                    kind, event_type, obj = events.get(timeout=min(remaining, 1))
+                except queue.Empty:
+                    continue
+                self.handle_event(kind, event_type, obj)
+                self.evaluate(kind, start)
+        finally:
+            for watcher in watchers:
+                watcher.stop()
+
+    def handle_event(self, kind: str, event_type: str, obj):
+        if event_type == "ERROR":
+            raise TerminalError(f"watch on {kind} failed: {obj}")
+        if event_type == "SYNC":
+            self.objects[kind] = {item.metadata.name: item for item in obj}
+        elif event_type == "DELETED":
+            self.objects[kind].pop(obj.metadata.name, None)
+        else:
+            self.objects[kind][obj.metadata.name] = obj
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Wait for several Kubernetes conditions at once, using one watch per resource type",
+        epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("conditions", nargs="+", help="Conditions to wait for")
+    parser.add_argument("-n", "--namespace", default=os.getenv("PING_CLOUD_NAMESPACE", "ping-cloud"))
+    parser.add_argument("-t", "--timeout", type=float, default=120,
+                        help="Default timeout in seconds for conditions without an @TIMEOUT_SECONDS suffix")
+    args = parser.parse_args()
+
+    try:
+        conditions = [Condition.parse(spec, args.timeout) for spec in args.conditions]
+    except ValueError as e:
+        parser.error(str(e))
+
+    k8s.config.load_kube_config()
+    try:
+        all_met = Waiter(conditions, args.namespace).wait()
+    except TerminalError as e:
+        print(f"Error: {e}")
+        all_met = False
+
+    sys.exit(0 if all_met else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,582 @@
+import argparse
+import asyncio
+import base64
+import csv
+import json
+import math
+import os
+import random
+import ssl
+import sys
+import time
+import urllib.parse
+from dataclasses import dataclass, field, asdict
+
+USAGE = """
+Scenarios are the built-in flows below, or the entries of a JSON --scenario-file list with the same fields as
+Scenario, e.g. [{"name": "anything", "url": "${PINGACCESS_RUNTIME}/anything", "weight": 2}].
+URLs are expanded with the environment, e.g. the endpoints set by ci-scripts/common.sh.
+
+Examples:
+  # 50 virtual users for a minute against the token endpoint and heartbeat of PingFederate
+  load_generator.py run pf-client-credentials pf-heartbeat --users 50 --duration 60 --json pf.json
+
+  # 200 requests per second through PingAccess to httpbin, compared with the report of the previous release
+  load_generator.py run pa-httpbin --rate 200 --duration 120 --json pa.json --compare pa-previous.json
+
+  # The same flows against a local stand-in for PingFederate, PingAccess and httpbin
+  load_generator.py serve-stub --port 8080 &
+  load_generator.py run pf-client-credentials pa-httpbin --base-url http://localhost:8080 --users 20 --duration 10
+"""
+
+PERCENTILES = [50, 90, 95, 99, 99.9]
+
+# The metrics compared between runs, and whether higher is better
+COMPARED_METRICS = {"throughput": True, "p50_ms": False, "p99_ms": False, "error_rate": False}
+
+
+@dataclass
+class Scenario:
+    name: str
+    url: str
+    method: str = "GET"
+    headers: dict = field(default_factory=dict)
+    body: str = None
+    # user:password for HTTP basic authentication
+    basic_auth: str = None
+    expect_status: list = field(default_factory=lambda: [200])
+    # A substring the response body must contain
+    expect_body: str = None
+    weight: float = 1
+
+
+SCENARIOS = {
+    "pf-client-credentials": Scenario(
+        "pf-client-credentials", "${PINGFEDERATE_AUTH_ENDPOINT}/as/token.oauth2?grant_type=client_credentials&scope=",
+        method="POST", basic_auth="${PF_CLIENT_CREDENTIALS:-PingDirectory:2FederateM0re}",
+        expect_body="access_token"),
+    "pf-heartbeat": Scenario("pf-heartbeat", "${PINGFEDERATE_AUTH_ENDPOINT}/pf/heartbeat.ping"),
+    "pa-heartbeat": Scenario("pa-heartbeat", "${PINGACCESS_RUNTIME}/pa/heartbeat.ping"),
+    "pa-httpbin": Scenario("pa-httpbin", "${HTTPBIN_PA_URL:-https://healthcheck-httpbin-pa${FQDN}}/anything",
+                           expect_body="\"method\""),
+}
+
+
+class LatencyHistogram:
+    """
+    A log-linear histogram of latencies in microseconds like an HDR histogram: each power of two is split into
+    2 ** precision_bits linear sub-buckets, so every recorded value is kept within a relative error of
+    1 / 2 ** (precision_bits - 1), with a fixed memory footprint whatever the number of values.
+    """
+
+    def __init__(self, precision_bits: int = 7):
+        self.precision_bits = precision_bits
+        self.sub_buckets = 1 << precision_bits
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def index(self, value: int) -> int:
+        if value < self.sub_buckets:
+            return value
+        exponent = value.bit_length() - self.precision_bits
+        return (exponent << self.precision_bits) + (value >> exponent)
+
+    def lower_bound(self, index: int) -> int:
+        exponent, sub_bucket = divmod(index, self.sub_buckets)
+        if exponent == 0:
+            return sub_bucket
+        return sub_bucket << exponent if sub_bucket >= self.sub_buckets // 2 else \
+            (sub_bucket + self.sub_buckets) << (exponent - 1)
+
+    def record(self, value_us: float):
+        value = max(int(value_us), 0)
+        index = self.index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        for value in filter(lambda v: v is not None, [other.min, other.max]):
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile: float) -> int:
+        """The lowest recorded value bucket under which the percentile of the values fall"""
+        if not self.total:
+            return 0
+        rank = max(math.ceil(percentile / 100 * self.total), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.lower_bound(index + 1) - 1, self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0
+
+    def to_dict(self) -> {}:
+        return {"precision_bits": self.precision_bits, "counts": {str(index): count for index, count in
+                                                                   sorted(self.counts.items())}}
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    requests: int = 0
+    errors: dict = field(default_factory=dict)
+
+    def add_error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+class HttpConnection:
+    """A keep-alive HTTP/1.1 connection to one host, enough for the request and response shapes of the scenarios"""
+
+    def __init__(self, url: urllib.parse.SplitResult, ssl_context: ssl.SSLContext):
+        self.host = url.hostname
+        self.host_header = url.netloc.rsplit("@", 1)[-1]
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl_context = ssl_context if url.scheme == "https" else None
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method: str, target: str, headers: {}, body: bytes) -> (int, bytes):
+        if self.writer is None:
+            await self.connect()
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host_header}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by the server")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            content = b"".join(chunks)
+        elif "content-length" in response_headers:
+            content = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif method == "HEAD" or status in (204, 304):
+            content = b""
+        else:
+            content = await self.reader.read()
+            self.close()
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, content
+
+
+class PreparedScenario:
+    """A scenario with its URL and credentials expanded once, before the run"""
+
+    def __init__(self, scenario: Scenario, base_url: str):
+        self.scenario = scenario
+        url = urllib.parse.urlsplit(expand(scenario.url))
+        if base_url:
+            base = urllib.parse.urlsplit(base_url)
+            url = url._replace(scheme=base.scheme, netloc=base.netloc)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise ValueError(f"Scenario {scenario.name} has no absolute http(s) URL: {url.geturl()}, set its "
+                             f"variables or --base-url")
+        self.url = url
+        self.target = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        self.headers = {"Accept": "*/*", "User-Agent": "ping-cloud-load-generator", **scenario.headers}
+        if scenario.basic_auth:
+            credentials = base64.b64encode(expand(scenario.basic_auth).encode()).decode()
+            self.headers["Authorization"] = f"Basic {credentials}"
+        self.body = (scenario.body or "").encode()
+        if scenario.method == "POST" and "Content-Type" not in self.headers:
+            self.headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+
+def expand(value: str) -> str:
+    """Expand ${VAR} and ${VAR:-default} references with the environment"""
+    result = ""
+    while "${" in value:
+        start = value.index("${")
+        end = value.index("}", start)
+        # Nested references are allowed in defaults, e.g. ${A:-https://x${B}}
+        while value.count("${", start + 2, end) > value.count("}", start + 2, end):
+            end = value.index("}", end + 1)
+        name, _, default = value[start + 2:end].partition(":-")
+        result += value[:start] + (os.environ.get(name) or expand(default))
+        value = value[end + 1:]
+    return result + value
+
+
+class LoadGenerator:
+    """
+    Send the requests of weighted scenarios either closed-loop, where each virtual user sends its next request when the
+    previous one completes, or open-loop, where requests start at a fixed rate whether or not earlier requests have
+    completed. Open-loop latencies are measured from the intended start of each request, so that queueing in the
+    generator or the servers is not hidden (coordinated omission).
+    """
+
+    def __init__(self, scenarios: [PreparedScenario], duration: float, warmup: float, timeout: float,
+                 users: int = None, rate: float = None, max_in_flight: int = 1000, think_time: float = 0,
+                 insecure: bool = False, seed: int = None):
+        self.scenarios = scenarios
+        self.duration = duration
+        self.warmup = warmup
+        self.timeout = timeout
+        self.users = users
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.think_time = think_time
+        self.ssl_context = ssl._create_unverified_context() if insecure else ssl.create_default_context()
+        self.random = random.Random(seed)
+        self.weights = [prepared.scenario.weight for prepared in scenarios]
+        self.results = {prepared.scenario.name: ScenarioResult(prepared.scenario.name) for prepared in scenarios}
+        self.measure_from = None
+        self.end = None
+
+    def pick(self) -> PreparedScenario:
+        return self.random.choices(self.scenarios, weights=self.weights)[0]
+
+    async def send(self, prepared: PreparedScenario, connections: {}, intended_start: float):
+        key = (prepared.url.scheme, prepared.url.netloc)
+        connection = connections.get(key) or HttpConnection(prepared.url, self.ssl_context)
+        connections[key] = connection
+        error = None
+        try:
+            status, content = await asyncio.wait_for(
+                connection.request(prepared.scenario.method, prepared.target, prepared.headers, prepared.body),
+                self.timeout)
+            if status not in prepared.scenario.expect_status:
+                error = f"status {status}"
+            elif prepared.scenario.expect_body and prepared.scenario.expect_body.encode() not in content:
+                error = "unexpected body"
+        except asyncio.TimeoutError:
+            error = "timeout"
+            connection.close()
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+            error = type(e).__name__
+            connection.close()
+
+        finished = time.monotonic()
+        if intended_start < self.measure_from:
+            return
+        result = self.results[prepared.scenario.name]
+        result.requests += 1
+        if error:
+            result.add_error(error)
+        else:
+            result.histogram.record((finished - intended_start) * 1e6)
+
+    async def virtual_user(self):
+        connections = {}
+        try:
+            while time.monotonic() < self.end:
+                await self.send(self.pick(), connections, time.monotonic())
+                if self.think_time:
+                    await asyncio.sleep(self.random.expovariate(1 / self.think_time))
+        finally:
+            for connection in connections.values():
+                connection.close()
+
+    async def open_loop(self):
+        idle = []
+        in_flight = set()
+        limit = asyncio.Semaphore(self.max_in_flight)
+
+        async def request(intended_start: float):
+            connections = idle.pop() if idle else {}
+            try:
+                await self.send(self.pick(), connections, intended_start)
+            finally:
+                idle.append(connections)
+                limit.release()
+
+        start = time.monotonic()
+        sent = 0
+        while True:
+            # Requests start at a constant rate from the start of the run
+            intended_start = start + sent / self.rate
+            if intended_start >= self.end:
+                break
+            delay = intended_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await limit.acquire()
+            task = asyncio.ensure_future(request(intended_start))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            sent += 1
+        if in_flight:
+            await asyncio.wait(in_flight)
+        for connections in idle:
+            for connection in connections.values():
+                connection.close()
+
+    async def run(self) -> float:
+        start = time.monotonic()
+        self.measure_from = start + self.warmup
+        self.end = self.measure_from + self.duration
+        if self.rate:
+            await self.open_loop()
+        else:
+            await asyncio.gather(*(self.virtual_user() for _ in range(self.users)))
+        return time.monotonic() - self.measure_from
+
+
+def summarize(result: ScenarioResult, elapsed: float) -> {}:
+    histogram = result.histogram
+    errors = sum(result.errors.values())
+    summary = {
+        "scenario": result.name,
+        "requests": result.requests,
+        "errors": errors,
+        "error_rate": round(errors / result.requests, 6) if result.requests else 0,
+        "throughput": round(histogram.total / elapsed, 3) if elapsed > 0 else 0,
+        "mean_ms": round(histogram.mean() / 1000, 3),
+        "min_ms": round((histogram.min or 0) / 1000, 3),
+        "max_ms": round((histogram.max or 0) / 1000, 3),
+    }
+    for percentile in PERCENTILES:
+        summary[f"p{percentile:g}_ms"] = round(histogram.percentile(percentile) / 1000, 3)
+    return summary
+
+
+def build_report(generator: LoadGenerator, elapsed: float, args) -> {}:
+    total = LatencyHistogram()
+    total_result = ScenarioResult("total", total)
+    for result in generator.results.values():
+        total.merge(result.histogram)
+        total_result.requests += result.requests
+        for kind, count in result.errors.items():
+            total_result.errors[kind] = total_result.errors.get(kind, 0) + count
+    results = list(generator.results.values()) + ([total_result] if len(generator.results) > 1 else [])
+    return {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(time.time() - elapsed)),
+        "label": args.label,
+        "size": args.size,
+        "mode": "open-loop" if args.rate else "closed-loop",
+        "users": None if args.rate else args.users,
+        "rate": args.rate,
+        "duration_seconds": round(elapsed, 3),
+        "scenarios": [asdict(prepared.scenario) for prepared in generator.scenarios],
+        "results": [dict(summarize(result, elapsed), error_kinds=result.errors) for result in results],
+        "histograms": {result.name: result.histogram.to_dict() for result in results},
+    }
+
+
+def write_csv(path: str, report: {}):
+    columns = ["scenario", "requests", "errors", "error_rate", "throughput", "mean_ms", "min_ms", "max_ms"] + \
+              [f"p{percentile:g}_ms" for percentile in PERCENTILES]
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=["label", "size", "mode"] + columns, extrasaction="ignore")
+        writer.writeheader()
+        for result in report["results"]:
+            writer.writerow(dict(result, label=report["label"], size=report["size"], mode=report["mode"]))
+
+
+def compare(report: {}, baseline: {}, max_regression: float) -> [str]:
+    """
+    Compare the results of a run with those of a baseline run
+    :return: The regressions beyond max_regression percent, as messages
+    """
+    regressions = []
+    metrics = dict(COMPARED_METRICS)
+    load = [(run["mode"], run["users"], run["rate"]) for run in (report, baseline)]
+    if load[0] != load[1]:
+        # The throughput of a run is set by its load, so only the latencies and errors of different loads are compared
+        print(f"  Not comparing throughput between different loads: {load[1]} -> {load[0]}")
+        metrics.pop("throughput")
+    baseline_results = {result["scenario"]: result for result in baseline["results"]}
+    for result in report["results"]:
+        previous = baseline_results.get(result["scenario"])
+        if not previous:
+            continue
+        for metric, higher_is_better in metrics.items():
+            old, new = previous[metric], result[metric]
+            change = (new - old) / old * 100 if old else (0 if new == old else math.inf)
+            print(f"  {result['scenario']:<24} {metric:<12} {old:>12} -> {new:<12} ({change:+.1f}%)")
+            worse = -change if higher_is_better else change
+            # The error rate regresses on any increase from zero errors
+            if worse > max_regression and not (metric == "error_rate" and new - old < 0.001):
+                regressions.append(f"{result['scenario']} {metric} regressed from {old} to {new} ({change:+.1f}%)")
+    return regressions
+
+
+def print_report(report: {}):
+    print(f"{report['mode']} run of {report['duration_seconds']}s" +
+          (f" with {report['users']} users" if report["users"] else f" at {report['rate']} requests/s"))
+    print(f"  {'scenario':<24} {'requests':>9} {'errors':>7} {'req/s':>9} {'mean':>9} {'p50':>9} {'p90':>9} "
+          f"{'p99':>9} {'p99.9':>9} {'max':>9} (ms)")
+    for result in report["results"]:
+        print(f"  {result['scenario']:<24} {result['requests']:>9} {result['errors']:>7} {result['throughput']:>9} "
+              f"{result['mean_ms']:>9} {result['p50_ms']:>9} {result['p90_ms']:>9} {result['p99_ms']:>9} "
+              f"{result['p99.9_ms']:>9} {result['max_ms']:>9}")
+        if result["error_kinds"]:
+            print(f"  {'':<24} errors: {', '.join(f'{k}={v}' for k, v in result['error_kinds'].items())}")
+
+
+async def handle_stub(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, latency: float):
+    """Answer like the PingFederate token and heartbeat endpoints, the PingAccess heartbeat and httpbin"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            if latency:
+                await asyncio.sleep(random.expovariate(1 / latency))
+
+            path = urllib.parse.urlsplit(target).path
+            status = 200
+            if path == "/as/token.oauth2":
+                if headers.get("authorization", "").startswith("Basic "):
+                    content = json.dumps({"access_token": base64.b64encode(os.urandom(24)).decode(),
+                                          "token_type": "Bearer", "expires_in": 7199})
+                else:
+                    status, content = 401, json.dumps({"error": "invalid_client"})
+            elif path in ("/pf/heartbeat.ping", "/pa/heartbeat.ping"):
+                content = "OK"
+            elif path.startswith(("/anything", "/get", "/post")):
+                content = json.dumps({"method": method, "url": target, "headers": headers,
+                                      "data": body.decode(errors="replace")})
+            else:
+                status, content = 404, "Not Found"
+            content = content.encode()
+            writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Length: {len(content)}"
+                         f"\r\nContent-Type: application/json\r\n\r\n".encode() + content)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_stub(port: int, latency: float):
+    server = await asyncio.start_server(lambda reader, writer: handle_stub(reader, writer, latency), "", port)
+    print(f"Serving the stub endpoints on port {port}")
+    async with server:
+        await server.serve_forever()
+
+
+def load_scenarios(names: [str], scenario_file: str) -> [Scenario]:
+    available = dict(SCENARIOS)
+    if scenario_file:
+        with open(scenario_file) as definitions:
+            for definition in json.load(definitions):
+                scenario = Scenario(**definition)
+                available[scenario.name] = scenario
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown scenarios {', '.join(unknown)}, expected one of {', '.join(available)}")
+    return [available[name] for name in names or available]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load on the Ping runtime endpoints and report latencies",
+                                     epilog=USAGE, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run scenarios and report their throughput and latencies")
+    run_parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run, defaults to all of "
+                                                         f"{', '.join(SCENARIOS)} and the scenario file")
+    run_parser.add_argument("--scenario-file", help="JSON list of additional scenarios")
+    run_parser.add_argument("--base-url", help="Send every scenario to this scheme and host instead, e.g. a stub")
+    mode = run_parser.add_mutually_exclusive_group()
+    mode.add_argument("--users", type=int, default=10, help="Closed loop: number of concurrent virtual users")
+    mode.add_argument("--rate", type=float, help="Open loop: requests started per second, whatever the latencies")
+    run_parser.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: cap on concurrent requests")
+    run_parser.add_argument("--think-time", type=float, default=0,
+                            help="Closed loop: mean seconds a user waits between requests")
+    run_parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before measuring")
+    run_parser.add_argument("--timeout", type=float, default=10, help="Seconds before a request is an error")
+    run_parser.add_argument("--insecure", action="store_true", help="Do not verify TLS certificates")
+    run_parser.add_argument("--seed", type=int, help="Seed of the scenario picks, for repeatable mixes")
+    run_parser.add_argument("--label", default="", help="Label of the run in the reports, e.g. the release")
+    run_parser.add_argument("--size", default="", help="Deployed size in the reports, e.g. x-small or large")
+    run_parser.add_argument("--json", help="Write the report with the histograms as JSON to this file")
+    run_parser.add_argument("--csv", help="Write the summary of each scenario as CSV to this file")
+    run_parser.add_argument("--compare", help="JSON report of a previous run to compare with")
+    run_parser.add_argument("--max-regression", type=float, default=10,
+                            help="Percent a compared metric may regress before the run fails")
+
+    stub_parser = subparsers.add_parser("serve-stub", help="Serve stand-ins for the token, heartbeat and httpbin "
+                                                           "endpoints")
+    stub_parser.add_argument("--port", type=int, default=8080)
+    stub_parser.add_argument("--latency", type=float, default=0, help="Mean added latency in seconds")
+    args = parser.parse_args()
+
+    if args.command == "serve-stub":
+        try:
+            asyncio.run(serve_stub(args.port, args.latency))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    try:
+        scenarios = [PreparedScenario(scenario, args.base_url)
+                     for scenario in load_scenarios(args.scenarios, args.scenario_file)]
+    except (ValueError, TypeError, OSError) as e:
+        parser.error(str(e))
+    generator = LoadGenerator(scenarios, args.duration, args.warmup, args.timeout, args.users, args.rate,
+                              args.max_in_flight, args.think_time, args.insecure, args.seed)
+    elapsed = asyncio.run(generator.run())
+    report = build_report(generator, elapsed, args)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+    if args.csv:
+        write_csv(args.csv, report)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"Compared with {args.compare}:")
+        regressions = compare(report, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import kubernetes as k8s
+from kubernetes.stream import stream
+
+CHUNK_SIZE = 1024 * 1024
+
+# Lines longer than this are scanned in pieces so memory stays bounded
+MAX_LINE_LENGTH = 4 * 1024 * 1024
+
+# Length of the redacted line printed in a finding
+MAX_REPORTED_LINE_LENGTH = 300
+
+
+@dataclass
+class Finding:
+    pod: str
+    container: str
+    line_number: int
+    secret_names: [str]
+    redacted_line: str
+
+
+class SecretScanner:
+    """
+    Matches the values of many secrets in one pass over a log stream, in constant memory. Each block of complete lines
+    is first checked for every value with a plain substring search, which runs at memory speed. Only the rare blocks
+    that contain a secret are searched with the combined regex of all values, and only the lines containing a match
+    are split out and reported. Python's regex engine tries every alternative at every position, so running the
+    combined regex over the whole stream would be several times slower.
+    """
+
+    def __init__(self, secrets: {}):
+        """
+        :param secrets: Secret names mapped to their values. Empty values are ignored.
+        """
+        self.names_by_value = {}
+        for name, value in secrets.items():
+            if value:
+                self.names_by_value.setdefault(value.encode(), []).append(name)
+
+        # Longest values first, so a secret that contains another one is reported by its own name
+        values = sorted(self.names_by_value, key=len, reverse=True)
+        self.values = values
+        self.regex = re.compile(b"|".join(re.escape(value) for value in values)) if values else None
+        self.max_value_length = max((len(value) for value in values), default=0)
+
+    def redact(self, line: bytes) -> (str, [str]):
+        names = []
+
+        def replace(match):
+            secret_names = self.names_by_value[match.group(0)]
+            names.extend(n for n in secret_names if n not in names)
+            return f"****({'|'.join(secret_names)})".encode()
+
+        redacted = self.regex.sub(replace, line).decode(errors="replace").rstrip("\r\n")
+        if len(redacted) > MAX_REPORTED_LINE_LENGTH:
+            redacted = redacted[:MAX_REPORTED_LINE_LENGTH] + "..."
+        return redacted, names
+
+    def scan_block(self, block: bytes, first_line_number: int) -> [(int, str, [str])]:
+        """Find the lines of a block of complete lines that contain a secret"""
+        matches = []
+        if not any(value in block for value in self.values):
+            return matches
+
+        position = 0
+        while True:
+            match = self.regex.search(block, position)
+            if not match:
+                return matches
+            line_start = block.rfind(b"\n", 0, match.start()) + 1
+            line_end = block.find(b"\n", match.end())
+            line_end = len(block) if line_end == -1 else line_end + 1
+            line_number = first_line_number + block.count(b"\n", 0, line_start)
+            redacted, names = self.redact(block[line_start:line_end])
+            matches.append((line_number, redacted, names))
+            position = line_end
+
+    def scan(self, chunks) -> [(int, str, [str])]:
+        """
+        Scan a stream of byte chunks in constant memory
+        :param chunks: Iterable of bytes, e.g. the chunks of a pod log response
+        :return: Generator of (line number, redacted line, secret names) for each line containing a secret
+        """
+        if not self.regex:
+            return
+
+        carry = b""
+        line_number = 1
+        for chunk in chunks:
+            buffer = carry + chunk
+            last_newline = buffer.rfind(b"\n")
+
+            if last_newline == -1 and len(buffer) > MAX_LINE_LENGTH:
+                # A very long line: scan what we have and keep just enough to catch a secret split across chunks
+                yield from self.scan_block(buffer, line_number)
+                carry = buffer[-(self.max_value_length - 1):] if self.max_value_length > 1 else b""
+                continue
+            if last_newline == -1:
+                carry = buffer
+                continue
+
+            block, carry = buffer[:last_newline + 1], buffer[last_newline + 1:]
+            yield from self.scan_block(block, line_number)
+            line_number += block.count(b"\n")
+
+        if carry:
+            yield from self.scan_block(carry, line_number)
+
+
+class LogSecretScanner:
+    """Streams the logs of many pods and containers concurrently and scans them for the secrets in their environment"""
+
+    def __init__(self, core_client, namespace: str, secret_env_names: [str], since_seconds: int, workers: int = 8):
+        self.core_client = core_client
+        self.namespace = namespace
+        self.secret_env_names = secret_env_names
+        self.since_seconds = since_seconds
+        self.workers = workers
+
+    def container_env(self, pod: str, container: str) -> {}:
+        output = stream(
+            self.core_client.connect_get_namespaced_pod_exec,
+            pod,
+            self.namespace,
+            container=container,
+            command=["sh", "-c", "printenv"],
+            stderr=True, stdin=False, stdout=True, tty=False,
+        )
+        env = {}
+        for line in output.splitlines():
+            name, separator, value = line.partition("=")
+            if separator:
+                env[name] = value
+        return env
+
+    def log_chunks(self, pod: str, container: str):
+        response = self.core_client.read_namespaced_pod_log(
+            name=pod,
+            namespace=self.namespace,
+            container=container,
+            since_seconds=self.since_seconds,
+            _preload_content=False,
+        )
+        try:
+            yield from response.stream(CHUNK_SIZE)
+        finally:
+            response.release_conn()
+
+    def scan_container(self, pod: str, container: str) -> [Finding]:
+        env = self.container_env(pod, container)
+        secrets = {name: env.get(name) for name in self.secret_env_names}
+        scanner = SecretScanner(secrets)
+        return [
+            Finding(pod, container, line_number, names, redacted)
+            for line_number, redacted, names in scanner.scan(self.log_chunks(pod, container))
+        ]
+
+    def scan(self, targets: [(str, str)]) -> ([Finding], {}):
+        """
+        Scan every (pod, container) target concurrently
+        :return: The findings, and the targets that could not be scanned mapped to the error
+        """
+        findings = []
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.scan_container, pod, container): (pod, container)
+                       for pod, container in targets}
+            for future, target in futures.items():
+                try:
+                    findings.extend(future.result())
+                except Exception as e:
+                    errors[target] = e
+        return findings, errors
+
+
+def split_target(spec: str) -> (str, str):
+    """Split NAME[@CONTAINER] into the name and the container, which is None if not specified"""
+    name, _, container = spec.partition("@")
+    return name, container or None
+
+
+def resolve_targets(core_client, apps_client, namespace: str, args) -> [(str, str)]:
+    targets = []
+    for spec in args.pod:
+        pod, container = split_target(spec)
+        targets.append((pod, container))
+
+    for spec in args.statefulset:
+        statefulset, container = split_target(spec)
+        replicas = apps_client.read_namespaced_stateful_set(statefulset, namespace).spec.replicas
+        targets.extend((f"{statefulset}-{ordinal}", container or statefulset) for ordinal in range(replicas))
+
+    for spec in args.selector:
+        selector, container = split_target(spec)
+        pods = core_client.list_namespaced_pod(namespace, label_selector=selector)
+        targets.extend((pod.metadata.name, container) for pod in pods.items)
+
+    # Without a container, scan every container of the pod
+    resolved = []
+    for pod, container in targets:
+        if container:
+            resolved.append((pod, container))
+        else:
+            spec = core_client.read_namespaced_pod(pod, namespace).spec
+            resolved.extend((pod, c.name) for c in spec.containers)
+    return sorted(set(resolved))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Scan the logs of pods for the values of secret environment variables. Each target has the form "
+                    "NAME[@CONTAINER]; without a container every container of the pod is scanned.")
+    parser.add_argument("--namespace", default=os.getenv("PING_CLOUD_NAMESPACE", "ping-cloud"))
+    parser.add_argument("--pod", action="append", default=[], help="Pod to scan")
+    parser.add_argument("--statefulset", action="append", default=[],
+                        help="StatefulSet whose pods are scanned; the container defaults to the statefulset name")
+    parser.add_argument("--selector", action="append", default=[], help="Label selector of the pods to scan")
+    parser.add_argument("--secret-env", action="append", default=[], required=True,
+                        help="Environment variable of the container whose value must not be logged")
+    parser.add_argument("--since", type=int, default=3600, help="Only scan logs newer than this many seconds")
+    parser.add_argument("--workers", type=int, default=8, help="Number of logs streamed concurrently")
+    args = parser.parse_args()
+
+    k8s.config.load_kube_config()
+    core_client = k8s.client.CoreV1Api()
+    targets = resolve_targets(core_client, k8s.client.AppsV1Api(), args.namespace, args)
+    if not targets:
+        print("No pods found to scan")
+        sys.exit(1)
+
+    scanner = LogSecretScanner(core_client, args.namespace, args.secret_env, args.since, args.workers)
+    findings, errors = scanner.scan(targets)
+
+    for pod, container in targets:
+        status = "error" if (pod, container) in errors else "scanned"
+        print(f"{status}: {pod}/{container}")
+    for (pod, container), error in errors.items():
+        print(f"Could not scan {pod}/{container}: {error}")
+    for finding in findings:
+        print(f"{finding.pod}/{finding.container} line {finding.line_number} "
+              f"({', '.join(finding.secret_names)}): {finding.redacted_line}")
+
+    if findings:
+        print("Password(s) found in logs.\n"
+              "    1) You must resolve this issue.\n"
+              "    2) Change all existing passwords.\n"
+              "    3) Rerun test")
+    sys.exit(1 if findings or errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+import urllib3
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+USAGE = """
+Each REF is an admin API path relative to --url, optionally with a query, e.g. sites/10 or 'agents?name=agent1'.
+The requests of a command are sent concurrently over one pool of keep-alive connections.
+
+  get REF...                 print a JSON object of each REF and its response body
+  create COLLECTION=FILE...  create entities from JSON template files, substituting ${VARIABLE} from the environment
+                             like envsubst, and print a JSON list of the created entities in order
+  delete REF...              delete entities, --missing-ok to ignore those that do not exist
+
+Examples:
+  pa_admin_client.py --url "${PINGACCESS_API}" get sites/10 sites/20 'virtualhosts?virtualHost=*%3A443'
+  pa_admin_client.py --url "${PINGACCESS_API}" create sharedSecrets=create-shared-secret-payload.json
+  pa_admin_client.py --url "${PINGACCESS_API}" delete applications/123 --missing-ok
+"""
+
+# The collections of the entity types, by entity type
+COLLECTIONS = {
+    "virtual_host": "virtualhosts",
+    "agent": "agents",
+    "shared_secret": "sharedSecrets",
+    "application": "applications",
+    "site": "sites",
+    "web_session": "webSessions",
+}
+
+ENVSUBST_REGEX = re.compile(r"\$(?:\{([A-Za-z_][A-Za-z0-9_]*)\}|([A-Za-z_][A-Za-z0-9_]*))")
+
+
+class PingAccessAdminError(Exception):
+    """Raised when the admin API answers with an error status, or cannot be reached"""
+
+    def __init__(self, method: str, path: str, status: int, body):
+        self.method = method
+        self.path = path
+        self.status = status
+        self.body = body
+        detail = f"HTTP {status}" if status else "no response"
+        super().__init__(f"{method} {path}: {detail}: {body}")
+
+
+@dataclass
+class Operation:
+    method: str
+    path: str
+    body: {} = None
+    # Whether a 404 response counts as success, e.g. to delete an entity that may not exist
+    missing_ok: bool = False
+
+
+@dataclass
+class Result:
+    operation: Operation
+    status: int = None
+    body: object = None
+    error: PingAccessAdminError = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class PingAccessAdminClient:
+    """
+    A PingAccess or PingAccess WAS admin API client. All requests share a session, so the connection, its TLS handshake
+    and the basic authentication are reused instead of being set up for every request like separate curl calls.
+    """
+
+    def __init__(self, base_url: str, password: str, user: str = "Administrator", max_workers: int = 8,
+                 cache: bool = False, timeout: float = 30, session: requests.Session = None):
+        """
+        :param base_url: The admin API URL, e.g. https://pingaccess-admin:9000/pa-admin-api/v3
+        :param password: The password of the admin user
+        :param user: The admin user
+        :param max_workers: The number of concurrent requests of the bulk operations, and of pooled connections
+        :param cache: Whether to keep the responses of GET requests until an entity of the same collection changes
+        :param timeout: Seconds to wait for each response
+        :param session: The session to send the requests with, instead of a new one
+        """
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.session.auth = (user, password)
+        self.session.verify = False
+        self.session.headers.update({"X-Xsrf-Header": "PingAccess", "Accept": "application/json"})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.cache = {} if cache else None
+        self.cache_lock = threading.Lock()
+
+    def request(self, method: str, path: str, body: {} = None):
+        """
+        :return: The parsed JSON body of the response, its text if it is not JSON, or None if it is empty
+        :raises PingAccessAdminError: If the response status is not 2xx, or there is no response
+        """
+        path = path.lstrip("/")
+        if method == "GET" and self.cache is not None:
+            with self.cache_lock:
+                if path in self.cache:
+                    return self.cache[path]
+        try:
+            response = self.session.request(method, f"{self.base_url}/{path}", json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise PingAccessAdminError(method, path, None, e) from e
+        try:
+            content = response.json() if response.content else None
+        except ValueError:
+            content = response.text
+        if not response.ok:
+            raise PingAccessAdminError(method, path, response.status_code, content)
+
+        if self.cache is not None:
+            with self.cache_lock:
+                if method == "GET":
+                    self.cache[path] = content
+                else:
+                    self.invalidate(path)
+        return content
+
+    def invalidate(self, path: str):
+        """Drop the cached responses of the collection of a path, which a write may have changed"""
+        collection = re.split(r"[/?]", path, 1)[0]
+        for cached in [p for p in self.cache if re.split(r"[/?]", p, 1)[0] == collection]:
+            del self.cache[cached]
+
+    def bulk(self, operations: [Operation]) -> [Result]:
+        """
+        Send independent requests concurrently, at most max_workers at a time
+        :return: The result of each operation, in order
+        """
+        def run(operation: Operation) -> Result:
+            result = Result(operation)
+            try:
+                result.body = self.request(operation.method, operation.path, operation.body)
+                result.status = 200
+            except PingAccessAdminError as e:
+                result.status = e.status
+                if not (operation.missing_ok and e.status == 404):
+                    result.error = e
+            return result
+
+        if len(operations) <= 1:
+            return [run(operation) for operation in operations]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(operations))) as executor:
+            return list(executor.map(run, operations))
+
+    def get_entity(self, entity_type: str, entity_id) -> {}:
+        return self.request("GET", f"{COLLECTIONS[entity_type]}/{entity_id}")
+
+    def find_entities(self, entity_type: str, **query) -> [{}]:
+        """Get the entities matching a query, e.g. find_entities("agent", name="agent1")"""
+        params = "&".join(f"{key}={requests.utils.quote(str(value), safe='')}" for key, value in query.items())
+        path = COLLECTIONS[entity_type] + (f"?{params}" if params else "")
+        return (self.request("GET", path) or {}).get("items", [])
+
+    def create_entity(self, entity_type: str, entity: {}) -> {}:
+        return self.request("POST", COLLECTIONS[entity_type], entity)
+
+    def delete_entity(self, entity_type: str, entity_id, missing_ok: bool = False):
+        try:
+            self.request("DELETE", f"{COLLECTIONS[entity_type]}/{entity_id}")
+        except PingAccessAdminError as e:
+            if not (missing_ok and e.status == 404):
+                raise
+
+    def bulk_get(self, entity_type: str, entity_ids: []) -> [Result]:
+        return self.bulk([Operation("GET", f"{COLLECTIONS[entity_type]}/{i}") for i in entity_ids])
+
+    def bulk_create(self, entity_type: str, entities: [{}]) -> [Result]:
+        return self.bulk([Operation("POST", COLLECTIONS[entity_type], entity) for entity in entities])
+
+    def bulk_delete(self, entity_type: str, entity_ids: [], missing_ok: bool = False) -> [Result]:
+        return self.bulk([Operation("DELETE", f"{COLLECTIONS[entity_type]}/{i}", missing_ok=missing_ok)
+                          for i in entity_ids])
+
+    def get_virtual_host(self, virtual_host_id) -> {}:
+        return self.get_entity("virtual_host", virtual_host_id)
+
+    def find_virtual_hosts(self, host: str, port: int) -> [{}]:
+        return self.find_entities("virtual_host", virtualHost=f"{host}:{port}")
+
+    def create_virtual_host(self, host: str, port: int, **fields) -> {}:
+        return self.create_entity("virtual_host", {"host": host, "port": str(port), **fields})
+
+    def delete_virtual_host(self, virtual_host_id, missing_ok: bool = False):
+        self.delete_entity("virtual_host", virtual_host_id, missing_ok)
+
+    def create_shared_secret(self, secret: str) -> {}:
+        return self.create_entity("shared_secret", {"secret": {"value": secret}})
+
+    def get_agent(self, agent_id) -> {}:
+        return self.get_entity("agent", agent_id)
+
+    def find_agents(self, name: str) -> [{}]:
+        return self.find_entities("agent", name=name)
+
+    def create_agent(self, name: str, hostname: str, port: int, shared_secret_ids: [int], **fields) -> {}:
+        return self.create_entity("agent", {"name": name, "hostname": hostname, "port": str(port),
+                                            "sharedSecretIds": shared_secret_ids, **fields})
+
+    def delete_agent(self, agent_id, missing_ok: bool = False):
+        self.delete_entity("agent", agent_id, missing_ok)
+
+    def get_application(self, application_id) -> {}:
+        return self.get_entity("application", application_id)
+
+    def find_applications(self, name: str) -> [{}]:
+        return self.find_entities("application", name=name)
+
+    def create_application(self, application: {}) -> {}:
+        return self.create_entity("application", application)
+
+    def delete_application(self, application_id, missing_ok: bool = False):
+        self.delete_entity("application", application_id, missing_ok)
+
+    def get_site(self, site_id) -> {}:
+        return self.get_entity("site", site_id)
+
+    def find_sites(self, name: str) -> [{}]:
+        return self.find_entities("site", name=name)
+
+
+def envsubst(template: str) -> str:
+    """Substitute $VARIABLE and ${VARIABLE} from the environment, with an empty string for unset ones like envsubst"""
+    return ENVSUBST_REGEX.sub(lambda match: os.getenv(match.group(1) or match.group(2), ""), template)
+
+
+def read_template(path: str) -> {}:
+    with open(path) as template_file:
+        return json.loads(envsubst(template_file.read()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Send PingAccess admin API requests concurrently over keep-alive connections",
+        epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--url", required=True, help="Admin API URL, e.g. ${PINGACCESS_API}")
+    parser.add_argument("--user", default="Administrator")
+    parser.add_argument("--password", default=os.getenv("PA_ADMIN_PASSWORD"),
+                        help="Admin password, defaults to $PA_ADMIN_PASSWORD")
+    parser.add_argument("--workers", type=int, default=8, help="Maximum concurrent requests")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for each response")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    get_parser = subparsers.add_parser("get", help="Get entities or queries")
+    get_parser.add_argument("refs", nargs="+", metavar="REF")
+    create_parser = subparsers.add_parser("create", help="Create entities from JSON templates")
+    create_parser.add_argument("templates", nargs="+", metavar="COLLECTION=FILE")
+    delete_parser = subparsers.add_parser("delete", help="Delete entities")
+    delete_parser.add_argument("refs", nargs="+", metavar="REF")
+    delete_parser.add_argument("--missing-ok", action="store_true", help="Ignore entities that do not exist")
+    args = parser.parse_args()
+
+    if not args.password:
+        parser.error("--password or $PA_ADMIN_PASSWORD is required")
+
+    if args.command == "get":
+        operations = [Operation("GET", ref) for ref in args.refs]
+    elif args.command == "create":
+        operations = []
+        for spec in args.templates:
+            collection, separator, path = spec.partition("=")
+            if not separator:
+                parser.error(f"Invalid template '{spec}', expected COLLECTION=FILE")
+            try:
+                operations.append(Operation("POST", collection, read_template(path)))
+            except (OSError, ValueError) as e:
+                parser.error(f"Invalid template {path}: {e}")
+    else:
+        operations = [Operation("DELETE", ref, missing_ok=args.missing_ok) for ref in args.refs]
+
+    client = PingAccessAdminClient(args.url, args.password, args.user, args.workers, timeout=args.timeout)
+    results = client.bulk(operations)
+    for result in results:
+        if not result.ok:
+            print(result.error, file=sys.stderr)
+
+    if args.command == "get":
+        print(json.dumps({ref: result.body for ref, result in zip(args.refs, results) if result.ok}, indent=2))
+    elif args.command == "create":
+        print(json.dumps([result.body for result in results], indent=2))
+    sys.exit(0 if all(result.ok for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from artifact_verifier import (  # noqa: E402
+    MARKER, ArtifactVerifier, Case, CaseResult, Plan, PlanError, differences, evaluate, parse_output, print_report,
+)
+
+# Stands in for the artifact download hook: fails on an invalid list, and deploys a jar for every artifact name
+HOOK = """#!/bin/sh
+list="$(cat {root}/artifact-list.json)"
+case "${{list}}" in
+  *invalid*) exit 3 ;;
+esac
+for name in $(echo "${{list}}" | sed -n 's/.*"name": "\\([^"]*\\)".*/\\1/p'); do
+  echo "${{name}} ${{ARTIFACT_CONTENT}}" > {root}/deploy/"${{name}}".jar
+done
+"""
+
+
+class LocalShell:
+    """
+    Runs the script of a pod with the local sh. Each pod has its own copy of the file tree of the plan: the root
+    directory that the plan refers to is replaced by the directory of the pod, in the script and back in its output.
+    """
+
+    def __init__(self, root: str, pod_roots: {}):
+        self.root = root
+        self.pod_roots = pod_roots
+
+    def run(self, pod: str, container: str, script: str) -> str:
+        if pod not in self.pod_roots:
+            raise RuntimeError(f"pods \"{pod}\" not found")
+        pod_root = self.pod_roots[pod]
+        completed = subprocess.run(["sh", "-c", script.replace(self.root, pod_root)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=30)
+        return completed.stdout.replace(pod_root, self.root)
+
+
+def plan_spec(root: str, **overrides) -> {}:
+    spec = {
+        "env": {"ARTIFACT_CONTENT": "v1"},
+        "inventory": [f"{root}/deploy/*"],
+        "artifact_list_path": f"{root}/artifact-list.json",
+        "hook": f"{root}/hook.sh",
+        "cases": [
+            {
+                "name": "valid",
+                "remove": [f"{root}/deploy/*"],
+                "artifact_list": [{"name": "pf-google", "version": "3.1.1"}, {"name": "pf-azure", "version": "1.0"}],
+                "status": 0,
+                "present": [f"{root}/deploy/pf-google.jar"],
+                "count": {f"{root}/deploy/*.jar": 2},
+            },
+            {
+                "name": "invalid",
+                "remove": [f"{root}/deploy/pf-azure.jar"],
+                "artifact_list": "{invalid json",
+                "status": 3,
+                "absent": [f"{root}/deploy/pf-azure.jar"],
+            },
+        ],
+    }
+    spec.update(overrides)
+    return spec
+
+
+class TestPlan(unittest.TestCase):
+    def test_from_dict(self):
+        plan = Plan.from_dict(plan_spec("/opt/test"))
+
+        self.assertEqual(["valid", "invalid"], [case.name for case in plan.cases])
+        self.assertEqual("/opt/test/hook.sh", plan.hook)
+        self.assertIn("\"name\": \"pf-google\"", plan.cases[0].artifact_list)
+        # A string is written verbatim, e.g. to test invalid JSON
+        self.assertEqual("{invalid json", plan.cases[1].artifact_list)
+        self.assertEqual({"/opt/test/deploy/*.jar": 2}, plan.cases[0].count)
+
+    def test_invalid_plans(self):
+        invalid = {
+            "a path with a space": plan_spec("/opt/test", inventory=["/opt/test/deploy dir/*"]),
+            "a relative path": plan_spec("/opt/test", hook="hook.sh"),
+            "an invalid variable name": plan_spec("/opt/test", env={"NOT-A-NAME": "x"}),
+            "no case": plan_spec("/opt/test", cases=[]),
+            "a duplicate case": plan_spec("/opt/test", cases=[{"name": "a", "artifact_list": []}] * 2),
+            "a case without a name": plan_spec("/opt/test", cases=[{"artifact_list": []}]),
+            "a case without an artifact list": plan_spec("/opt/test", cases=[{"name": "a"}]),
+            "an assertion outside the inventory": plan_spec("/opt/test", cases=[
+                {"name": "a", "artifact_list": [], "present": ["/opt/test/lib/pf.jar"]}]),
+        }
+        for description, spec in invalid.items():
+            with self.subTest(description), self.assertRaises(PlanError):
+                Plan.from_dict(spec)
+
+
+class TestParseOutput(unittest.TestCase):
+    def test_cases_status_and_inventory(self):
+        output = "\n".join([
+            "unrelated output before the first case",
+            f"{MARKER} case valid",
+            f"{MARKER} status 0",
+            "abc123  /opt/test/deploy/a.jar",
+            "def456 */opt/test/deploy/b.jar",
+            "- /opt/test/deploy/unreadable.jar",
+            f"{MARKER} case invalid",
+            f"{MARKER} status 3",
+            "",
+        ])
+
+        results = parse_output(output)
+
+        self.assertEqual(["valid", "invalid"], list(results))
+        self.assertEqual(0, results["valid"].status)
+        self.assertEqual({"/opt/test/deploy/a.jar": "abc123", "/opt/test/deploy/b.jar": "def456",
+                          "/opt/test/deploy/unreadable.jar": "-"}, results["valid"].inventory)
+        self.assertEqual(CaseResult(3, {}, []), results["invalid"])
+
+    def test_interrupted_case(self):
+        results = parse_output(f"{MARKER} case valid\nsh: killed\n")
+        self.assertIsNone(results["valid"].status)
+
+
+class TestEvaluate(unittest.TestCase):
+    def setUp(self):
+        self.case = Case("valid", "[]", status=0, present=["/d/a-*.jar"], absent=["/d/old.jar"],
+                         count={"/d/*.jar": 2})
+
+    def test_passing_case(self):
+        self.assertEqual([], evaluate(self.case, CaseResult(0, {"/d/a-1.jar": "1", "/d/b.jar": "2"})))
+
+    def test_failed_assertions(self):
+        self.assertEqual(["the artifact hook exited with 1 instead of 0", "/d/a-*.jar is missing", "/d/old.jar exists",
+                          "1 files match /d/*.jar instead of 2"],
+                         evaluate(self.case, CaseResult(1, {"/d/old.jar": "1"})))
+
+    def test_case_that_did_not_complete(self):
+        self.assertEqual(["the case did not run to completion"], evaluate(self.case, None))
+        self.assertEqual(["the case did not run to completion"], evaluate(self.case, CaseResult()))
+
+
+class TestDifferences(unittest.TestCase):
+    def test_identical_inventories(self):
+        self.assertEqual([], differences({"pod-0": {"/d/a.jar": "1"}, "pod-1": {"/d/a.jar": "1"}}))
+
+    def test_missing_and_different_files(self):
+        inventories = {
+            "pod-0": {"/d/a.jar": "1111", "/d/b.jar": "2222"},
+            "pod-1": {"/d/a.jar": "9999", "/d/b.jar": "2222"},
+            "pod-2": {"/d/a.jar": "1111"},
+        }
+        self.assertEqual(["/d/a.jar differs: 1111 on pod-0, pod-2; 9999 on pod-1", "/d/b.jar is missing on pod-2"],
+                         differences(inventories))
+
+
+class TestArtifactVerifier(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        # The root that the plan refers to, which each pod replaces with its own directory
+        self.root = os.path.join(self.work_dir.name, "root")
+        self.pod_roots = {}
+        for pod in ["pingfederate-0", "pingfederate-1"]:
+            pod_root = os.path.join(self.work_dir.name, pod)
+            os.makedirs(os.path.join(pod_root, "deploy"))
+            hook_path = os.path.join(pod_root, "hook.sh")
+            with open(hook_path, "w") as hook:
+                hook.write(HOOK.format(root=pod_root))
+            os.chmod(hook_path, 0o755)
+            self.pod_roots[pod] = pod_root
+        self.plan = Plan.from_dict(plan_spec(self.root))
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def verify(self, targets: [(str, str)]) -> {}:
+        return ArtifactVerifier(self.plan, LocalShell(self.root, self.pod_roots), workers=2).verify(targets)
+
+    def test_every_case_runs_in_every_pod(self):
+        report = self.verify([("pingfederate-0", "pingfederate"), ("pingfederate-1", "pingfederate")])
+
+        self.assertEqual({}, report["errors"])
+        for name, status in [("valid", 0), ("invalid", 3)]:
+            result = report["cases"][name]
+            self.assertEqual({"pingfederate-0/pingfederate": status, "pingfederate-1/pingfederate": status},
+                             result["statuses"])
+            self.assertEqual([], result["failures"])
+            self.assertEqual([], result["differences"])
+
+    def test_differences_between_pods(self):
+        with open(os.path.join(self.pod_roots["pingfederate-1"], "hook.sh"), "a") as hook:
+            hook.write(f"echo patched >> {self.pod_roots['pingfederate-1']}/deploy/pf-google.jar\n")
+
+        report = self.verify([("pingfederate-0", "pingfederate"), ("pingfederate-1", "pingfederate")])
+
+        self.assertEqual([], report["cases"]["valid"]["failures"])
+        differences_found = report["cases"]["valid"]["differences"]
+        self.assertEqual(1, len(differences_found))
+        self.assertTrue(differences_found[0].startswith(f"pingfederate: {self.root}/deploy/pf-google.jar differs: "))
+
+    def test_failed_assertions_and_exec_errors(self):
+        # The hook of pingfederate-0 deploys nothing
+        with open(os.path.join(self.pod_roots["pingfederate-0"], "hook.sh"), "w") as hook:
+            hook.write("#!/bin/sh\nexit 0\n")
+
+        report = self.verify([("pingfederate-0", "pingfederate"), ("pingfederate-9", "pingfederate")])
+
+        self.assertEqual({"pingfederate-9/pingfederate": "pods \"pingfederate-9\" not found"}, report["errors"])
+        failures = report["cases"]["valid"]["failures"]
+        self.assertIn("pingfederate-9/pingfederate: could not be verified: pods \"pingfederate-9\" not found",
+                      failures)
+        self.assertIn(f"pingfederate-0/pingfederate: {self.root}/deploy/pf-google.jar is missing", failures)
+        self.assertIn("pingfederate-0/pingfederate: the artifact hook exited with 0 instead of 3",
+                      report["cases"]["invalid"]["failures"])
+
+
+class TestPrintReport(unittest.TestCase):
+    def test_columns_are_aligned(self):
+        targets = [("pingfederate-admin-0", "pingfederate-admin"), ("pf-0", "pf")]
+        report = {"cases": {
+            "a-long-case-name": {"statuses": {"pingfederate-admin-0/pingfederate-admin": 0, "pf-0/pf": 12},
+                                 "failures": ["pf-0/pf: the artifact hook exited with 12 instead of 0"],
+                                 "differences": []},
+            "short": {"statuses": {}, "failures": [], "differences": []},
+        }}
+        output = io.StringIO()
+        with redirect_stdout(output):
+            print_report(report, targets)
+
+        table = output.getvalue().splitlines()[:3]
+        self.assertEqual(["case", "pingfederate-admin-0/pingfederate-admin", "pf-0/pf"], table[0].split())
+        self.assertEqual(["a-long-case-name", "ok", "(0)", "FAIL", "(12)"], table[1].split())
+        # Every column starts at the same offset on every row
+        header_offsets = [table[0].index("pingfederate-admin-0"), table[0].index("pf-0/pf")]
+        self.assertEqual(header_offsets, [table[1].index("ok (0)"), table[1].index("FAIL (12)")])
+        self.assertEqual(header_offsets, [table[2].index("ok (-)"), table[2].rindex("ok (-)")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,298 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from dataclasses import asdict
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chaos_mttr import ChaosRunner, RecoveryRun, Target, build_report, main, replay, slim  # noqa: E402
+
+POD = "pingfederate-0"
+SERVICE = "pingfederate"
+
+
+def pod(uid: str, *conditions: str, init_done: [str] = (), init_running: [str] = ()) -> {}:
+    """A pod as serialized by the API server, with the given conditions True"""
+    statuses = [{"name": name, "state": {"terminated": {"exitCode": 0, "reason": "Completed"}}} for name in init_done]
+    statuses += [{"name": name, "state": {"running": {"startedAt": "2023-01-31T17:00:00Z"}}} for name in init_running]
+    return {"metadata": {"name": POD, "namespace": "ping-cloud", "uid": uid, "labels": {"role": "pingfederate"}},
+            "status": {"phase": "Running", "initContainerStatuses": statuses,
+                       "conditions": [{"type": condition, "status": "True"} for condition in conditions] +
+                                     [{"type": "ContainersReady", "status": "False"}]}}
+
+
+def endpoints(*uids: str) -> {}:
+    return {"metadata": {"name": SERVICE, "namespace": "ping-cloud", "uid": "endpoints-uid"},
+            "subsets": [{"addresses": [{"ip": "10.0.0.1", "targetRef": {"kind": "Pod", "name": POD, "uid": uid}}
+                                       for uid in uids],
+                         "ports": [{"port": 9031}]}] if uids else []}
+
+
+READY = ("PodScheduled", "Initialized", "Ready")
+
+
+def new_run(old_uid: str = "old", serving_url: str = None, number: int = 1) -> RecoveryRun:
+    return RecoveryRun(SERVICE, POD, SERVICE, number, "delete", old_uid, 0, serving_url)
+
+
+class Recording:
+    """Writes an event stream in the format of --record"""
+
+    def __init__(self):
+        self.lines = []
+
+    def event(self, t: float, kind: str, event_type: str, obj):
+        if event_type == "SYNC":
+            obj = [slim(kind, item) for item in obj]
+        else:
+            obj = slim(kind, obj)
+        self.lines.append({"t": t, "kind": kind, "type": event_type, "object": obj})
+
+    def disrupt(self, t: float, run: RecoveryRun):
+        self.lines.append({"t": t, "type": "DISRUPT", "run": asdict(run)})
+
+    def result(self, t: float, run: RecoveryRun, stages: {}, error: str = None):
+        self.lines.append({"t": t, "type": "RESULT", "run": dict(asdict(run), stages=stages, error=error)})
+
+    def replay(self) -> [RecoveryRun]:
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as events:
+            events.write("".join(json.dumps(line) + "\n" for line in self.lines))
+        try:
+            return replay(events.name)
+        finally:
+            os.remove(events.name)
+
+
+def recovery(recording: Recording, start: float, old_uid: str, new_uid: str):
+    """The events of a pod replaced 1s after the disruption at start, and ready and listed 30s later"""
+    recording.event(start + 1, "pod", "DELETED", pod(old_uid, *READY))
+    recording.event(start + 2, "pod", "ADDED", pod(new_uid, init_running=["wait-for-services"]))
+    recording.event(start + 4, "pod", "MODIFIED", pod(new_uid, "PodScheduled", init_running=["wait-for-services"]))
+    recording.event(start + 20, "pod", "MODIFIED", pod(new_uid, "PodScheduled", init_done=["wait-for-services"]))
+    recording.event(start + 21, "pod", "MODIFIED", pod(new_uid, "PodScheduled", "Initialized",
+                                                       init_done=["wait-for-services"]))
+    recording.event(start + 30, "pod", "MODIFIED", pod(new_uid, *READY, init_done=["wait-for-services"]))
+    recording.event(start + 31, "endpoints", "MODIFIED", endpoints(new_uid))
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.recording = Recording()
+        self.recording.event(0.5, "pod", "SYNC", [pod("old", *READY)])
+        self.recording.event(0.5, "endpoints", "SYNC", [endpoints("old")])
+
+    def test_stages_are_relative_to_the_disruption(self):
+        run = new_run()
+        self.recording.disrupt(10, run)
+        recovery(self.recording, 10, "old", "new")
+        self.recording.result(41, run, {})
+
+        [result] = self.recording.replay()
+
+        self.assertEqual("new", result.new_uid)
+        self.assertEqual({"deleted": 1, "created": 2, "scheduled": 4, "initialized": 21, "ready": 30, "endpoint": 31},
+                         result.stages)
+        self.assertEqual({"wait-for-services": 20}, result.init_containers)
+        self.assertIsNone(result.error)
+
+    def test_events_of_other_pods_and_services_are_ignored(self):
+        run = new_run()
+        self.recording.disrupt(10, run)
+        other_pod = dict(pod("other", *READY), metadata={"name": "pingfederate-1", "uid": "other"})
+        self.recording.event(11, "pod", "ADDED", other_pod)
+        other_endpoints = dict(endpoints("new"), metadata={"name": "pingaccess", "uid": "x"})
+        self.recording.event(12, "endpoints", "MODIFIED", other_endpoints)
+        recovery(self.recording, 20, "old", "new")
+        self.recording.result(51, run, {})
+
+        [result] = self.recording.replay()
+
+        self.assertEqual({"deleted": 11, "created": 12, "scheduled": 14, "initialized": 31, "ready": 40,
+                          "endpoint": 41}, result.stages)
+
+    def test_deletion_missed_by_a_relist(self):
+        run = new_run()
+        self.recording.disrupt(10, run)
+        # The watch expired and was re-listed after the old pod was replaced
+        self.recording.event(15, "pod", "SYNC", [pod("new", "PodScheduled")])
+        self.recording.event(25, "pod", "MODIFIED", pod("new", *READY))
+        self.recording.event(26, "endpoints", "MODIFIED", endpoints("new"))
+        self.recording.result(26, run, {})
+
+        [result] = self.recording.replay()
+
+        self.assertEqual({"deleted": 5, "created": 5, "scheduled": 5, "initialized": 15, "ready": 15, "endpoint": 16},
+                         result.stages)
+
+    def test_endpoints_listed_before_the_pod_update(self):
+        run = new_run()
+        self.recording.disrupt(10, run)
+        self.recording.event(11, "pod", "DELETED", pod("old", *READY))
+        self.recording.event(12, "pod", "ADDED", pod("new"))
+        # The endpoints list the new pod before its Ready update is seen
+        self.recording.event(30, "endpoints", "MODIFIED", endpoints())
+        self.recording.event(31, "endpoints", "MODIFIED", endpoints("new"))
+        self.recording.event(32, "pod", "MODIFIED", pod("new", *READY))
+        self.recording.result(32, run, {})
+
+        [result] = self.recording.replay()
+
+        self.assertEqual(21, result.stages["endpoint"])
+        self.assertEqual(22, result.stages["ready"])
+
+    def test_serving_and_errors_come_from_the_recording(self):
+        served = new_run("old", serving_url="https://pingfederate-admin-api/pf-admin-api/v1/version")
+        self.recording.disrupt(10, served)
+        recovery(self.recording, 10, "old", "new")
+        self.recording.result(45, served, {"ready": 20, "serving": 35})
+
+        not_served = new_run("new", serving_url=served.serving_url, number=2)
+        self.recording.disrupt(100, not_served)
+        recovery(self.recording, 100, "new", "newer")
+        self.recording.result(1300, not_served, {"endpoint": 31}, error="not recovered after 1200s")
+
+        not_recovered = new_run("newer", number=3)
+        self.recording.disrupt(1400, not_recovered)
+        self.recording.event(1401, "pod", "DELETED", pod("newer", *READY))
+        self.recording.result(2600, not_recovered, {}, error="not recovered after 1200s")
+
+        results = self.recording.replay()
+
+        self.assertEqual([1, 2, 3], [result.run for result in results])
+        # The watch events take precedence over the recorded stages
+        self.assertEqual((30, 35, None), (results[0].stages["ready"], results[0].stages["serving"], results[0].error))
+        self.assertNotIn("serving", results[1].stages)
+        self.assertEqual("not recovered after 1200s", results[1].error)
+        self.assertEqual(({"deleted": 1}, "not recovered after 1200s"), (results[2].stages, results[2].error))
+
+    def test_run_recovered_on_replay_has_no_error(self):
+        run = new_run()
+        self.recording.disrupt(10, run)
+        recovery(self.recording, 10, "old", "new")
+        # e.g. the run timed out just before the endpoints event was handled
+        self.recording.result(41, run, {}, error="not recovered after 30s")
+
+        [result] = self.recording.replay()
+
+        self.assertIsNone(result.error)
+
+    def test_result_without_a_disruption_is_skipped(self):
+        self.recording.result(5, new_run(), {"deleted": 1})
+        self.assertEqual([], self.recording.replay())
+
+    def test_report(self):
+        for number, start in [(1, 10), (2, 100)]:
+            run = new_run("old" if number == 1 else "new", number=number)
+            self.recording.disrupt(start, run)
+            recovery(self.recording, start, run.old_uid, f"uid-{number}")
+            self.recording.result(start + 31, run, {})
+
+        report = build_report(self.recording.replay())[SERVICE]
+
+        self.assertEqual((2, 2, []), (report["runs"], report["recovered"], report["errors"]))
+        self.assertEqual(31, report["reached_seconds"]["endpoint"]["p99"])
+        self.assertEqual({"count": 2, "mean": 9, "min": 9, "max": 9, "p50": 9, "p90": 9, "p99": 9},
+                         report["stage_seconds"]["ready"])
+        self.assertEqual(20, report["init_container_done_seconds"]["wait-for-services"]["max"])
+
+
+class TestMainReplay(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+        self.events = os.path.join(self.work_dir.name, "events.jsonl")
+        self.report = os.path.join(self.work_dir.name, "report.json")
+
+    def main(self, recording: Recording) -> (int, str):
+        with open(self.events, "w") as events:
+            events.write("".join(json.dumps(line) + "\n" for line in recording.lines))
+        stdout = io.StringIO()
+        argv = ["chaos_mttr.py", "--replay", self.events, "--json", self.report]
+        with mock.patch.object(sys, "argv", argv), redirect_stdout(stdout), self.assertRaises(SystemExit) as exit:
+            main()
+        return exit.exception.code, stdout.getvalue()
+
+    def test_recovered_runs(self):
+        recording = Recording()
+        recording.event(0, "pod", "SYNC", [pod("old", *READY)])
+        run = new_run()
+        recording.disrupt(10, run)
+        recovery(recording, 10, "old", "new")
+        recording.result(41, run, {})
+
+        code, stdout = self.main(recording)
+
+        self.assertEqual(0, code)
+        self.assertIn("pingfederate: 1/1 runs recovered", stdout)
+        with open(self.report) as report:
+            self.assertEqual(31, json.load(report)[SERVICE]["reached_seconds"]["endpoint"]["max"])
+
+    def test_failed_run(self):
+        recording = Recording()
+        run = new_run()
+        recording.disrupt(10, run)
+        recording.result(20, run, {}, error="pods \"pingfederate-0\" is forbidden")
+
+        code, stdout = self.main(recording)
+
+        self.assertEqual(1, code)
+        self.assertIn("error: run 1: pods \"pingfederate-0\" is forbidden", stdout)
+
+    def test_empty_recording(self):
+        self.assertEqual(1, self.main(Recording())[0])
+
+
+class FakeWatcher:
+    """Lists the initial objects of its kind when started, like the first event of a ResourceWatcher"""
+
+    objects = {}
+
+    def __init__(self, kind: str, namespace: str, events):
+        self.kind = kind
+        self.events = events
+
+    def start(self):
+        self.events.put((self.kind, "SYNC", self.objects[self.kind]))
+
+    def stop(self):
+        pass
+
+
+class TestRecordAndReplay(unittest.TestCase):
+    def test_replay_of_a_recording_reproduces_the_runs(self):
+        FakeWatcher.objects = {"pod": [pod("uid-0", *READY)], "endpoints": [endpoints("uid-0")]}
+        record = io.StringIO()
+
+        def disrupt(run: RecoveryRun):
+            new_uid = f"uid-{run.run}"
+            for kind, event_type, obj in [
+                ("pod", "DELETED", pod(run.old_uid, *READY)),
+                ("pod", "ADDED", pod(new_uid)),
+                ("pod", "MODIFIED", pod(new_uid, "PodScheduled", init_done=["wait-for-services"])),
+                ("pod", "MODIFIED", pod(new_uid, *READY, init_done=["wait-for-services"])),
+                ("endpoints", "MODIFIED", endpoints(new_uid)),
+            ]:
+                runner.events.put((kind, event_type, obj))
+
+        runner = ChaosRunner("ping-cloud", {SERVICE: Target(SERVICE, SERVICE)}, 2, "delete", timeout=5,
+                             settle_timeout=5, pause=0, serving_urls={}, record=record, watcher_class=FakeWatcher,
+                             disrupt=disrupt)
+        with redirect_stdout(io.StringIO()):
+            results = runner.run()
+
+        self.assertEqual([None, None], [result.error for result in results])
+        self.assertEqual(["uid-1", "uid-2"], [result.new_uid for result in results])
+
+        recording = Recording()
+        recording.lines = [json.loads(line) for line in record.getvalue().splitlines()]
+        self.assertEqual([asdict(result) for result in results],
+                         [asdict(result) for result in recording.replay()])
+
+
+if __name__ == "__main__":
+    unittest.main()
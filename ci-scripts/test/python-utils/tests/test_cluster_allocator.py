@@ -0,0 +1,289 @@
+import io
+import os
+import sys
+import threading
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cluster_allocator import (  # noqa: E402
+    AllocationError, ClusterAllocator, Lease, Probe, parse_candidates,
+)
+
+NOW = 1675184400.0
+HOUR = 3600
+HOLDER = "pipeline-1234"
+
+
+class FakeCluster:
+    """The nodes, lock objects and namespaces of a cluster, in memory"""
+
+    def __init__(self, name: str, ready_nodes: int = 2, lease: Lease = None, lock_namespace: float = None,
+                 namespaces: {} = None):
+        self.name = name
+        self.nodes = ready_nodes
+        self.lease = lease
+        self.lock_namespace = lock_namespace
+        # The creation time of each namespace by name
+        self.namespaces = dict(namespaces or {})
+        self.deleted = []
+        self.error = None
+        # Whether another pipeline writes the lease, or creates the lock namespace, just before this one
+        self.lease_race = False
+        self.lock_namespace_race = False
+        # Whether the lease is released once it is watched
+        self.release_when_watched = False
+
+    def ready_nodes(self) -> int:
+        if self.error:
+            raise self.error
+        return self.nodes
+
+    def read_lease(self) -> Lease:
+        return self.lease
+
+    def read_lock_namespace(self) -> float:
+        return self.lock_namespace
+
+    def write_lease(self, lease: Lease, previous: Lease) -> Lease:
+        if self.lease_race or self.lease is not previous:
+            return None
+        self.lease = lease
+        return lease
+
+    def delete_lease(self, lease: Lease):
+        self.lease = None
+
+    def create_lock_namespace(self) -> bool:
+        if self.lock_namespace_race:
+            self.lock_namespace = NOW
+        if self.lock_namespace is not None:
+            return False
+        self.lock_namespace = NOW
+        return True
+
+    def namespaces_since(self, since: float) -> [str]:
+        return sorted(name for name, created in self.namespaces.items() if created >= since)
+
+    def delete_namespaces(self, names: [str], timeout: float) -> [str]:
+        for name in names:
+            self.namespaces.pop(name)
+        self.deleted += names
+        return []
+
+    def watch_releases(self, kind: str, notify, stop: threading.Event):
+        if kind == "lease" and self.release_when_watched:
+            self.lease = Lease("", NOW + 60, self.lease.duration, transitions=self.lease.transitions)
+            notify(self.name, "lease released")
+        stop.wait()
+
+
+def lease(holder: str, renewed: float, acquired: float = None, kept: bool = False, duration: int = 3 * HOUR) -> Lease:
+    return Lease(holder, renewed, duration, "1", 1, acquired, kept)
+
+
+class AllocatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clusters = {}
+
+    def add(self, name: str, **state) -> FakeCluster:
+        self.clusters[name] = FakeCluster(name, **state)
+        return self.clusters[name]
+
+    def allocator(self, legacy_lock_seconds: float = 0, delete_previous_namespaces: bool = False,
+                  clock=lambda: NOW) -> ClusterAllocator:
+        candidates = {name: f"-{number}" for number, name in enumerate(self.clusters, start=1)}
+        return ClusterAllocator(candidates, HOLDER, 3 * HOUR, 2, legacy_lock_seconds, delete_previous_namespaces,
+                                cluster_class=self.clusters.__getitem__, clock=clock, sleep=lambda seconds: None)
+
+    def states(self, allocator: ClusterAllocator) -> {}:
+        with redirect_stdout(io.StringIO()):
+            return {probe.cluster: probe.state for probe in allocator.probe_all()}
+
+    def acquire(self, allocator: ClusterAllocator, timeout: float = 60) -> (Probe, str):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            probe = allocator.acquire(timeout, poll_seconds=60)
+        return probe, output.getvalue()
+
+
+class TestClassify(AllocatorTestCase):
+    def test_states(self):
+        self.add("ours", lease=lease(HOLDER, NOW - 60))
+        self.add("free")
+        self.add("released", lease=lease("", NOW - HOUR), lock_namespace=NOW - 2 * HOUR)
+        self.add("held", lease=lease("pipeline-1", NOW - HOUR))
+        self.add("expired", lease=lease("pipeline-2", NOW - 4 * HOUR))
+        self.add("kept", lease=lease("master", NOW - 48 * HOUR, kept=True), lock_namespace=NOW - 48 * HOUR)
+        self.add("kept-released", lease=lease("master", NOW - 48 * HOUR, kept=True))
+        self.add("small", ready_nodes=1)
+        self.add("unreachable").error = ConnectionError("connection refused\ntraceback")
+
+        self.assertEqual({"ours": "ours", "free": "free", "released": "free", "held": "held", "expired": "expired",
+                          "kept": "held", "kept-released": "expired", "small": "not-ready", "unreachable": "error"},
+                         self.states(self.allocator()))
+
+    def test_held_until_the_lease_expires(self):
+        self.add("held", lease=lease("pipeline-1", NOW - HOUR))
+        self.add("kept", lease=lease("master", NOW - HOUR, kept=True), lock_namespace=NOW - HOUR)
+
+        with redirect_stdout(io.StringIO()):
+            probes = self.allocator().probe_all()
+
+        self.assertEqual([NOW + 2 * HOUR, None], [probe.held_until for probe in probes])
+
+    def test_legacy_lock_namespace_holds_the_cluster_by_default(self):
+        self.add("legacy", lock_namespace=NOW - 30 * 24 * HOUR)
+        self.add("legacy-after-release", lease=lease("", NOW - 2 * HOUR), lock_namespace=NOW - HOUR)
+
+        self.assertEqual({"legacy": "held", "legacy-after-release": "held"}, self.states(self.allocator()))
+
+    def test_legacy_lock_namespace_reclaimed_when_enabled(self):
+        self.add("legacy", lock_namespace=NOW - 7 * HOUR)
+        self.add("recent-legacy", lock_namespace=NOW - HOUR)
+
+        self.assertEqual({"legacy": "orphaned", "recent-legacy": "held"},
+                         self.states(self.allocator(legacy_lock_seconds=6 * HOUR)))
+
+
+class TestAcquire(AllocatorTestCase):
+    def test_claim_order(self):
+        self.add("expired", lease=lease("pipeline-2", NOW - 4 * HOUR))
+        self.add("free")
+        self.add("held", lease=lease("pipeline-1", NOW - HOUR))
+        allocator = self.allocator()
+
+        probe, _ = self.acquire(allocator)
+
+        self.assertEqual(("free", "free"), (probe.cluster, probe.state))
+        self.assertEqual(HOLDER, self.clusters["free"].lease.holder)
+        self.assertEqual(NOW, self.clusters["free"].lock_namespace)
+        self.assertEqual({"cluster": "free", "postfix": "-2", "state": "free", "rounds": 1, "claim_conflicts": 0},
+                         {key: allocator.metrics[key] for key in ["cluster", "postfix", "state", "rounds",
+                                                                  "claim_conflicts"]})
+
+    def test_ours_is_claimed_again(self):
+        self.add("free")
+        self.add("ours", lease=lease(HOLDER, NOW - 60))
+
+        probe, _ = self.acquire(self.allocator())
+
+        self.assertEqual("ours", probe.cluster)
+        self.assertEqual(1, self.clusters["ours"].lease.transitions)
+
+    def test_conflicts_fall_through_to_the_next_candidate(self):
+        self.add("lease-race").lease_race = True
+        self.add("lock-namespace-race").lock_namespace_race = True
+        self.add("expired", lease=lease("pipeline-2", NOW - 4 * HOUR))
+        allocator = self.allocator()
+
+        probe, output = self.acquire(allocator)
+
+        self.assertEqual("expired", probe.cluster)
+        self.assertEqual(2, allocator.metrics["claim_conflicts"])
+        self.assertIsNone(self.clusters["lock-namespace-race"].lease)
+        self.assertIn("lock-namespace-race: claimed with the cluster-in-use-lock namespace by another pipeline first",
+                      output)
+        self.assertEqual(2, self.clusters["expired"].lease.transitions)
+        self.assertEqual("pipeline-2", allocator.metrics["previous_holder"])
+
+    def test_waits_for_a_release(self):
+        self.add("held", lease=lease("pipeline-1", NOW - HOUR)).release_when_watched = True
+        allocator = self.allocator()
+
+        probe, output = self.acquire(allocator)
+
+        self.assertEqual(("held", "free"), (probe.cluster, probe.state))
+        self.assertEqual(2, allocator.metrics["rounds"])
+        self.assertEqual({"release": 1, "expiry": 0, "poll": 0}, allocator.metrics["wakeups"])
+        self.assertIn("held: lease released", output)
+        self.assertTrue(allocator.stop.is_set())
+
+    def test_timeout(self):
+        self.add("held", lease=lease("pipeline-1", NOW - HOUR))
+        times = iter([NOW, NOW, NOW + 61, NOW + 61])
+
+        with self.assertRaisesRegex(AllocationError, "No cluster could be claimed in 60s"):
+            self.acquire(self.allocator(clock=lambda: next(times, NOW + 61)), timeout=60)
+
+
+class TestPreviousNamespaces(AllocatorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.namespaces = {"kube-system": NOW - 90 * 24 * HOUR, "ping-cloud-old": NOW - 10 * HOUR,
+                           "ping-cloud-pipeline-2": NOW - 5 * HOUR, "cluster-tools-pipeline-2": NOW - 5 * HOUR}
+
+    def test_namespaces_are_not_deleted_by_default(self):
+        self.add("expired", lease=lease("pipeline-2", NOW - 4 * HOUR, acquired=NOW - 5 * HOUR),
+                 namespaces=self.namespaces)
+        allocator = self.allocator()
+
+        _, output = self.acquire(allocator)
+
+        self.assertEqual([], self.clusters["expired"].deleted)
+        self.assertEqual((["cluster-tools-pipeline-2", "ping-cloud-pipeline-2"], []),
+                         (allocator.metrics["previous_namespaces"], allocator.metrics["deleted_namespaces"]))
+        self.assertIn("not deleting the namespaces of the previous holder without --delete-previous-namespaces",
+                      output)
+
+    def test_namespaces_of_the_previous_holder_are_deleted_when_enabled(self):
+        self.add("expired", lease=lease("pipeline-2", NOW - 4 * HOUR, acquired=NOW - 5 * HOUR),
+                 namespaces=self.namespaces)
+        allocator = self.allocator(delete_previous_namespaces=True)
+
+        self.acquire(allocator)
+
+        self.assertEqual(["cluster-tools-pipeline-2", "ping-cloud-pipeline-2"], self.clusters["expired"].deleted)
+        self.assertEqual(["cluster-tools-pipeline-2", "ping-cloud-pipeline-2"], allocator.metrics["deleted_namespaces"])
+
+    def test_namespaces_of_a_kept_environment_are_never_deleted(self):
+        self.add("kept-released", lease=lease("master", NOW - 48 * HOUR, acquired=NOW - 5 * HOUR, kept=True),
+                 namespaces=self.namespaces)
+        allocator = self.allocator(delete_previous_namespaces=True)
+
+        probe, output = self.acquire(allocator)
+
+        self.assertEqual("expired", probe.state)
+        self.assertEqual([], self.clusters["kept-released"].deleted)
+        self.assertIn("not deleting the namespaces of the previous holder of a kept environment", output)
+
+    def test_orphaned_cluster_namespaces_since_the_lock_namespace(self):
+        self.add("legacy", lock_namespace=NOW - 7 * HOUR, namespaces=self.namespaces)
+        allocator = self.allocator(legacy_lock_seconds=6 * HOUR, delete_previous_namespaces=True)
+
+        probe, _ = self.acquire(allocator)
+
+        self.assertEqual("orphaned", probe.state)
+        self.assertEqual(["cluster-tools-pipeline-2", "ping-cloud-pipeline-2"], self.clusters["legacy"].deleted)
+
+    def test_unknown_claim_time(self):
+        self.add("expired", lease=lease("pipeline-2", NOW - 4 * HOUR), namespaces=self.namespaces)
+        allocator = self.allocator(delete_previous_namespaces=True)
+
+        _, output = self.acquire(allocator)
+
+        self.assertEqual([], self.clusters["expired"].deleted)
+        self.assertIn("its claim time is unknown", output)
+
+    def test_free_cluster_is_not_cleaned_up(self):
+        self.add("free", lease=lease("", NOW - HOUR, acquired=NOW - 5 * HOUR), namespaces=self.namespaces)
+        allocator = self.allocator(delete_previous_namespaces=True)
+
+        self.acquire(allocator)
+
+        self.assertEqual(([], []), (self.clusters["free"].deleted, allocator.metrics["previous_namespaces"]))
+
+
+class TestParseCandidates(unittest.TestCase):
+    def test_candidates(self):
+        self.assertEqual({"ci-cd-1": "-1", "ci-cd": ""}, parse_candidates(["ci-cd-1=-1", "ci-cd="]))
+
+    def test_invalid_candidates(self):
+        for value in ["ci-cd-1", "=-1"]:
+            with self.subTest(value), self.assertRaises(ValueError):
+                parse_candidates([value])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from csd_upload_verifier import (  # noqa: E402
+    CsdJobLogTailer, CsdUploadVerifier, S3KeyTracker, VerificationResult, parse_log_timestamp,
+)
+
+JOB_STARTED = datetime(2023, 1, 31, 17, 0, 0, tzinfo=timezone.utc)
+
+
+def at(seconds: float) -> datetime:
+    return JOB_STARTED + timedelta(seconds=seconds)
+
+
+def log_line(seconds: float, line: str) -> str:
+    return f"{at(seconds).strftime('%Y-%m-%dT%H:%M:%S.%f')}123Z {line}"
+
+
+class StubS3Client:
+    """Lists the keys of a single bucket in lexicographic order, two keys per page"""
+
+    def __init__(self, objects: {}):
+        self.objects = objects
+        self.listings = []
+
+    def get_paginator(self, operation: str):
+        return self
+
+    def paginate(self, Bucket: str, Prefix: str, StartAfter: str = ""):
+        self.listings.append(StartAfter)
+        keys = sorted(key for key in self.objects if key.startswith(Prefix) and key > StartAfter)
+        for i in range(0, len(keys), 2):
+            yield {"Contents": [{"Key": key, "LastModified": self.objects[key]} for key in keys[i:i + 2]]}
+
+
+class StubCoreClient:
+    """Returns the whole log of each pod, like since_seconds does when it reaches back further than the last read"""
+
+    def __init__(self, logs: {}):
+        self.logs = logs
+        self.log_requests = []
+
+    def list_namespaced_pod(self, namespace: str, label_selector: str = None):
+        return SimpleNamespace(items=[SimpleNamespace(metadata=SimpleNamespace(name=name)) for name in self.logs])
+
+    def read_namespaced_pod_log(self, name: str, namespace: str, timestamps: bool = False, since_seconds: int = None):
+        self.log_requests.append((name, since_seconds))
+        return "\n".join(self.logs[name]) + "\n"
+
+
+class TestParseLogTimestamp(unittest.TestCase):
+    def test_nanoseconds_are_truncated(self):
+        self.assertEqual(datetime(2023, 1, 31, 17, 1, 2, 123456, tzinfo=timezone.utc),
+                         parse_log_timestamp("2023-01-31T17:01:02.123456789Z"))
+
+    def test_without_fraction(self):
+        self.assertEqual(datetime(2023, 1, 31, 17, 1, 2, tzinfo=timezone.utc),
+                         parse_log_timestamp("2023-01-31T17:01:02Z"))
+
+
+class TestS3KeyTracker(unittest.TestCase):
+    def test_only_new_csd_files_are_returned(self):
+        client = StubS3Client({
+            "pingaccess/a-support-data.zip": at(1),
+            "pingaccess/notes.txt": at(2),
+            "pingfederate/b-support-data.zip": at(3),
+        })
+        tracker = S3KeyTracker(client, "logs", "pingaccess")
+
+        self.assertEqual({"a-support-data.zip": at(1)}, tracker.poll({"a-support-data.zip"}))
+        client.objects["pingaccess/c-support-data.zip"] = at(4)
+        self.assertEqual({"c-support-data.zip": at(4)}, tracker.poll({"c-support-data.zip"}))
+
+    def test_listing_resumes_before_the_smallest_missing_file(self):
+        client = StubS3Client({f"pingaccess/{name}-support-data.zip": at(1) for name in "abd"})
+        tracker = S3KeyTracker(client, "logs", "pingaccess")
+        tracker.poll({"c-support-data.zip"})
+
+        client.objects["pingaccess/c-support-data.zip"] = at(5)
+        self.assertEqual({"c-support-data.zip": at(5)}, tracker.poll({"c-support-data.zip"}))
+        self.assertEqual(["", "pingaccess/b-support-data.zip"], client.listings)
+        # Nothing is missing any more, so the next listing starts from the beginning of the prefix
+        self.assertEqual({}, tracker.poll(set()))
+        self.assertEqual("", client.listings[-1])
+
+
+class TestCsdJobLogTailer(unittest.TestCase):
+    def test_last_line_is_the_list_of_files(self):
+        client = StubCoreClient({"csd-upload-abcde": [log_line(1, "Uploading"), log_line(2, "a.zip b.zip"),
+                                                      log_line(3, "")]})
+        tailer = CsdJobLogTailer(client, "ping-cloud", "csd-upload")
+
+        self.assertEqual({"a.zip": at(2), "b.zip": at(2)}, tailer.expected_files())
+
+    def test_only_lines_since_the_previous_read_are_used(self):
+        client = StubCoreClient({"csd-upload-abcde": [log_line(1, "Uploading")]})
+        tailer = CsdJobLogTailer(client, "ping-cloud", "csd-upload")
+
+        self.assertEqual({"Uploading": at(1)}, tailer.expected_files())
+        client.logs["csd-upload-abcde"].append(log_line(4, "a.zip"))
+        self.assertEqual({"a.zip": at(4)}, tailer.expected_files())
+        # The lines already read are dropped when the log is read again, so the last line is kept
+        self.assertEqual({"a.zip": at(4)}, tailer.expected_files())
+
+        first_read, second_read, _ = client.log_requests
+        self.assertIsNone(first_read[1])
+        self.assertGreaterEqual(second_read[1], 1)
+
+
+class TestVerificationResult(unittest.TestCase):
+    def test_missing_and_upload_times(self):
+        result = VerificationResult(expected={"a.zip": at(1), "b.zip": at(1)},
+                                    uploaded={"a.zip": at(7.5), "c.zip": at(2)}, job_started=JOB_STARTED)
+
+        self.assertEqual({"b.zip"}, result.missing)
+        self.assertEqual({"a.zip": 7.5}, result.upload_times())
+        self.assertEqual({}, VerificationResult(expected={"a.zip": at(1)}, uploaded={"a.zip": at(2)}).upload_times())
+
+
+class FakeClock:
+    """Advances on every sleep, and runs the step scheduled for that point in time, if any"""
+
+    def __init__(self, steps: {}):
+        self.now = 0.0
+        self.steps = steps
+        self.sleeps = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        for time_reached in sorted(t for t in self.steps if t <= self.now):
+            self.steps.pop(time_reached)()
+
+
+class TestCsdUploadVerifier(unittest.TestCase):
+    def setUp(self):
+        self.s3_client = StubS3Client({})
+        self.core_client = StubCoreClient({"csd-upload-abcde": [log_line(0, "Collecting")]})
+
+    def verify(self, clock: FakeClock, timeout: float) -> VerificationResult:
+        verifier = CsdUploadVerifier(S3KeyTracker(self.s3_client, "logs", "pingaccess"),
+                                     CsdJobLogTailer(self.core_client, "ping-cloud", "csd-upload"),
+                                     sleep=clock.sleep, clock=clock.clock)
+        return verifier.verify(timeout, initial_delay=0.5, max_delay=2, job_started=JOB_STARTED)
+
+    def upload(self, name: str, seconds: float):
+        self.s3_client.objects[f"pingaccess/{name}"] = at(seconds)
+
+    def test_job_that_is_still_running_is_followed(self):
+        clock = FakeClock({
+            # The file is listed before the job logs it
+            1: lambda: self.upload("a-support-data.zip", 1),
+            2: lambda: self.core_client.logs["csd-upload-abcde"].append(log_line(2, "a-support-data.zip")),
+        })
+
+        result = self.verify(clock, timeout=20)
+
+        self.assertEqual(set(), result.missing)
+        self.assertEqual({"a-support-data.zip": 1}, result.upload_times())
+        self.assertEqual([0.5, 1, 2], clock.sleeps)
+        self.assertEqual(4, result.polls)
+
+    def test_timeout(self):
+        self.core_client.logs["csd-upload-abcde"].append(log_line(1, "a-support-data.zip"))
+        clock = FakeClock({})
+
+        result = self.verify(clock, timeout=5)
+
+        self.assertEqual({"a-support-data.zip"}, result.missing)
+        # The delay doubles up to its maximum, and the last sleep is cut short by the deadline
+        self.assertEqual([0.5, 1, 2, 1.5], clock.sleeps)
+        self.assertEqual(5, clock.now)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from integration_test_scheduler import (  # noqa: E402
+    DurationHistory, IntegrationTestScheduler, all_test_dirs,
+)
+# Renamed so that pytest does not collect it as a test class
+from integration_test_scheduler import TestDirectory as IntegrationTestDirectory  # noqa: E402
+
+# Appends the name of the test to the run log, and fails if its name contains "fail"
+SCRIPT = """#!/bin/sh
+echo "{name}" >> {run_log}
+case "{name}" in
+  *fail*) exit 1 ;;
+esac
+"""
+
+
+class IntegrationDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.integration_dir = os.path.join(self.work_dir.name, "integration")
+        self.run_log = os.path.join(self.work_dir.name, "run.log")
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def add_script(self, relative_path: str):
+        path = os.path.join(self.integration_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as script:
+            script.write(SCRIPT.format(name=relative_path, run_log=self.run_log))
+        os.chmod(path, 0o755)
+
+    def runs(self) -> [str]:
+        with open(self.run_log) as run_log:
+            return run_log.read().split()
+
+
+class TestIntegrationTestDirectory(IntegrationDirTestCase):
+    def test_scripts_are_found_at_any_depth(self):
+        for path in ["pingaccess/10-b.sh", "pingaccess/2-not-a-test.sh", "pingaccess/02-a.sh", "pingaccess/util.sh",
+                     "pingaccess/runtime/01-c.sh", "pingaccess/prerequisites/00-urls.sh",
+                     "pingaccess/.hidden/01-d.sh"]:
+            self.add_script(path)
+
+        test_dir = IntegrationTestDirectory.load("pingaccess", os.path.join(self.integration_dir, "pingaccess"))
+        prerequisites = IntegrationTestDirectory.load("pingaccess/prerequisites",
+                                           os.path.join(self.integration_dir, "pingaccess", "prerequisites"))
+
+        self.assertEqual(["02-a.sh", "10-b.sh", "runtime/01-c.sh"], test_dir.scripts)
+        self.assertEqual(["00-urls.sh"], prerequisites.scripts)
+        self.assertFalse(test_dir.has_python_tests)
+
+    def test_missing_directory(self):
+        self.assertTrue(IntegrationTestDirectory.load("pingcentral", os.path.join(self.integration_dir, "pingcentral")).empty)
+
+
+class TestIntegrationTestScheduler(IntegrationDirTestCase):
+    def run_scheduler(self, test_dir_names: [str]) -> ([], bool):
+        history = DurationHistory(os.path.join(self.work_dir.name, "test-durations.json"))
+        with redirect_stdout(StringIO()):
+            return IntegrationTestScheduler(self.integration_dir, "", 4, history).run(test_dir_names)
+
+    def test_chaos_is_not_run_by_default(self):
+        for path in ["pingaccess/01-a.sh", "chaos/01-delete-pod.sh", "__pycache__/01-x.sh"]:
+            self.add_script(path)
+
+        self.assertEqual(["pingaccess"], all_test_dirs(self.integration_dir))
+
+    def test_chaos_runs_after_and_apart_from_the_other_directories(self):
+        for path in ["chaos/prerequisites/00-chaos.sh", "chaos/01-delete-pod.sh", "pingaccess/prerequisites/00-urls.sh",
+                     "pingaccess/01-a.sh", "pingfederate/01-b.sh"]:
+            self.add_script(path)
+
+        results, prerequisites_passed = self.run_scheduler(["chaos", "pingaccess", "pingfederate"])
+
+        self.assertTrue(prerequisites_passed)
+        runs = self.runs()
+        self.assertEqual(["chaos/prerequisites/00-chaos.sh", "chaos/01-delete-pod.sh"], runs[-2:])
+        self.assertEqual({"pingaccess/prerequisites/00-urls.sh", "pingaccess/01-a.sh", "pingfederate/01-b.sh"},
+                         set(runs[:-2]))
+        self.assertEqual(5, len(results))
+
+    def test_failed_prerequisites_stop_the_run(self):
+        for path in ["pingaccess/prerequisites/00-fail.sh", "pingaccess/01-a.sh", "chaos/01-delete-pod.sh"]:
+            self.add_script(path)
+
+        results, prerequisites_passed = self.run_scheduler(["pingaccess", "chaos"])
+
+        self.assertFalse(prerequisites_passed)
+        self.assertEqual(["pingaccess/prerequisites/00-fail.sh"], self.runs())
+        self.assertEqual([1], [result.exit_code for result in results])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from load_generator import LatencyHistogram, compare, expand, handle_stub, main  # noqa: E402
+
+
+def report(mode: str = "closed-loop", users: int = 10, rate: float = None, **metrics) -> {}:
+    result = {"scenario": "pf-heartbeat", "throughput": 100.0, "p50_ms": 10.0, "p99_ms": 50.0, "error_rate": 0}
+    result.update(metrics)
+    return {"mode": mode, "users": users, "rate": rate, "results": [result]}
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for value in range(128):
+            histogram.record(value)
+        self.assertEqual([0, 63, 126, 127], [histogram.percentile(p) for p in [0, 50, 99, 100]])
+
+    def test_relative_error(self):
+        histogram = LatencyHistogram(precision_bits=7)
+        values = random.Random(1).sample(range(1, 10 ** 9), 2000)
+        for value in values:
+            index = histogram.index(value)
+            lower, upper = histogram.lower_bound(index), histogram.lower_bound(index + 1)
+            self.assertTrue(lower <= value < upper, value)
+            self.assertLessEqual((upper - 1 - value) / value, 1 / 2 ** 6, value)
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 100001):
+            histogram.record(value)
+
+        for percentile in [50, 90, 99, 99.9]:
+            expected = percentile / 100 * 100000
+            self.assertAlmostEqual(expected, histogram.percentile(percentile), delta=expected / 64)
+        self.assertEqual(100000, histogram.percentile(100))
+        self.assertEqual((1, 100000, 50000.5), (histogram.min, histogram.max, histogram.mean()))
+
+    def test_percentile_is_capped_by_the_maximum(self):
+        histogram = LatencyHistogram()
+        histogram.record(1000.9)
+        self.assertEqual(1000, histogram.percentile(50))
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertEqual((0, 0), (histogram.percentile(99), histogram.mean()))
+
+    def test_merge_is_like_recording_every_value(self):
+        merged, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        values = random.Random(2).choices(range(10 ** 6), k=1000)
+        for value in values[:400]:
+            first.record(value)
+        for value in values[400:]:
+            second.record(value)
+        merged.merge(first)
+        merged.merge(second)
+        merged.merge(LatencyHistogram())
+
+        expected = LatencyHistogram()
+        for value in values:
+            expected.record(value)
+        self.assertEqual(expected.to_dict(), merged.to_dict())
+        self.assertEqual((expected.min, expected.max, expected.total, expected.sum),
+                         (merged.min, merged.max, merged.total, merged.sum))
+
+
+class TestExpand(unittest.TestCase):
+    def test_variables_and_nested_defaults(self):
+        with mock.patch.dict(os.environ, {"FQDN": ".ping-demo.com", "EMPTY": ""}):
+            self.assertEqual("https://healthcheck-httpbin-pa.ping-demo.com/anything",
+                             expand("${HTTPBIN_PA_URL_UNSET:-https://healthcheck-httpbin-pa${FQDN}}/anything"))
+            self.assertEqual("fallback", expand("${EMPTY:-fallback}"))
+
+
+class TestCompare(unittest.TestCase):
+    def compare(self, current: {}, baseline: {}, max_regression: float = 10) -> [str]:
+        with redirect_stdout(io.StringIO()):
+            return compare(current, baseline, max_regression)
+
+    def test_changes_within_the_limit(self):
+        self.assertEqual([], self.compare(report(throughput=95, p50_ms=10.9, p99_ms=40), report()))
+
+    def test_latency_and_throughput_regressions(self):
+        regressions = self.compare(report(throughput=80, p99_ms=60), report())
+        self.assertEqual(["pf-heartbeat throughput regressed from 100.0 to 80 (-20.0%)",
+                          "pf-heartbeat p99_ms regressed from 50.0 to 60 (+20.0%)"], regressions)
+        self.assertEqual([], self.compare(report(throughput=80, p99_ms=60), report(), max_regression=25))
+
+    def test_throughput_of_different_loads_is_not_compared(self):
+        self.assertEqual([], self.compare(report(users=5, throughput=50), report(users=10)))
+        self.assertEqual([], self.compare(report("open-loop", None, 200, throughput=50), report()))
+        self.assertEqual(["pf-heartbeat p50_ms regressed from 10.0 to 20 (+100.0%)"],
+                         self.compare(report(users=5, p50_ms=20), report()))
+
+    def test_error_rate(self):
+        # Below 0.1% more errors is noise, even from no errors at all
+        self.assertEqual([], self.compare(report(error_rate=0.0005), report()))
+        self.assertEqual(["pf-heartbeat error_rate regressed from 0 to 0.02 (+inf%)"],
+                         self.compare(report(error_rate=0.02), report()))
+
+    def test_scenarios_missing_from_the_baseline_are_skipped(self):
+        baseline = report()
+        baseline["results"][0]["scenario"] = "pa-heartbeat"
+        self.assertEqual([], self.compare(report(p99_ms=500), baseline))
+
+
+class TestMain(unittest.TestCase):
+    """Runs the generator against the stub endpoints served on a local port"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(lambda reader, writer: handle_stub(reader, writer, 0), "127.0.0.1", 0))
+        self.base_url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.stop_server, thread)
+
+    def stop_server(self, thread: threading.Thread):
+        asyncio.run_coroutine_threadsafe(self.close_connections(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        thread.join(5)
+        self.loop.close()
+
+    async def close_connections(self):
+        """Close the server, and cancel the handlers of the connections the generator left open"""
+        self.server.close()
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.work_dir.name, name)
+
+    def main(self, *args: str) -> (int, str):
+        stdout = io.StringIO()
+        code = 0
+        argv = ["load_generator.py", "run", "--base-url", self.base_url, "--users", "4", "--duration", "0.3",
+                "--warmup", "0", "--json", self.path("report.json"), *args]
+        with mock.patch.object(sys, "argv", argv), redirect_stdout(stdout):
+            try:
+                main()
+            except SystemExit as e:
+                code = e.code
+        return code, stdout.getvalue()
+
+    def write_baseline(self, **metrics) -> str:
+        with open(self.path("report.json")) as report_file:
+            baseline = json.load(report_file)
+        for result in baseline["results"]:
+            result.update(metrics)
+        with open(self.path("baseline.json"), "w") as baseline_file:
+            json.dump(baseline, baseline_file)
+        return self.path("baseline.json")
+
+    def test_report_of_the_stub_endpoints(self):
+        code, _ = self.main("pf-client-credentials", "pa-httpbin", "--csv", self.path("report.csv"))
+
+        self.assertEqual(0, code)
+        with open(self.path("report.json")) as report_file:
+            results = {result["scenario"]: result for result in json.load(report_file)["results"]}
+        self.assertEqual(["pf-client-credentials", "pa-httpbin", "total"], list(results))
+        self.assertGreater(results["total"]["requests"], 0)
+        self.assertEqual(0, results["total"]["errors"])
+        self.assertEqual(results["total"]["requests"],
+                         results["pf-client-credentials"]["requests"] + results["pa-httpbin"]["requests"])
+        with open(self.path("report.csv")) as csv_file:
+            self.assertEqual(4, len(csv_file.read().splitlines()))
+
+    def test_compare_passes_without_regressions(self):
+        self.main("pf-heartbeat")
+        # A baseline that was slower in every way
+        baseline = self.write_baseline(throughput=0.001, p50_ms=10 ** 6, p99_ms=10 ** 6)
+
+        code, stdout = self.main("pf-heartbeat", "--compare", baseline)
+
+        self.assertEqual(0, code)
+        self.assertNotIn("REGRESSION", stdout)
+
+    def test_compare_fails_on_a_regression(self):
+        self.main("pf-heartbeat")
+        # A baseline that was faster in every way
+        baseline = self.write_baseline(throughput=10 ** 9, p50_ms=0.0001, p99_ms=0.0001)
+
+        code, stdout = self.main("pf-heartbeat", "--compare", baseline)
+
+        self.assertEqual(1, code)
+        self.assertIn("REGRESSION: pf-heartbeat throughput regressed from 1000000000 to ", stdout)
+
+    def test_errors(self):
+        scenario_file = self.path("scenarios.json")
+        with open(scenario_file, "w") as scenarios:
+            json.dump([{"name": "missing", "url": "http://localhost/missing"}], scenarios)
+
+        code, _ = self.main("missing", "--scenario-file", scenario_file)
+
+        self.assertEqual(0, code)
+        with open(self.path("report.json")) as report_file:
+            result = json.load(report_file)["results"][0]
+        self.assertEqual(1, result["error_rate"])
+        self.assertEqual(["status 404"], list(result["error_kinds"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
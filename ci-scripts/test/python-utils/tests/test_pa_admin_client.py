@@ -0,0 +1,291 @@
+import base64
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pa_admin_client import (  # noqa: E402
+    Operation, PingAccessAdminClient, PingAccessAdminError, envsubst, main,
+)
+
+API_PATH = "/pa-admin-api/v3"
+PASSWORD = "2FederateM0re"
+
+
+class StubAdminApi(BaseHTTPRequestHandler):
+    """Serves the entities of the server in memory, like the admin API of PingAccess"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        collection, entity_id, query = self.parse()
+        if entity_id:
+            entity = self.server.entities.get(collection, {}).get(entity_id)
+            self.reply(200, entity) if entity else self.reply(404, {"message": "Resource not found"})
+        elif collection == "version":
+            self.reply(200, b"5.3.2")
+        else:
+            items = [entity for entity in self.server.entities.get(collection, {}).values()
+                     if all(str(entity.get(key)) == value for key, value in query.items())]
+            self.reply(200, {"items": items})
+
+    def do_POST(self):
+        collection, _, _ = self.parse()
+        entity = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if "name" in entity and not entity["name"]:
+            self.reply(422, {"form": {"name": ["Required"]}})
+            return
+        with self.server.lock:
+            self.server.next_id += 1
+            entity["id"] = self.server.next_id
+        self.server.entities.setdefault(collection, {})[str(entity["id"])] = entity
+        self.reply(200, entity)
+
+    def do_DELETE(self):
+        collection, entity_id, _ = self.parse()
+        if self.server.entities.get(collection, {}).pop(entity_id, None) is None:
+            self.reply(404, {"message": "Resource not found"})
+        else:
+            self.reply(200, b"")
+
+    def parse(self) -> (str, str, {}):
+        """:return: The collection, entity ID and query of the request path, after recording the request"""
+        path, _, query = self.path.partition("?")
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path, self.headers, self.client_address))
+        collection, _, entity_id = path[len(API_PATH) + 1:].partition("/")
+        params = dict(param.split("=", 1) for param in query.split("&") if param)
+        return collection, entity_id, {key: unquote(value) for key, value in params.items()}
+
+    def reply(self, status: int, body):
+        content = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerTestCase(unittest.TestCase):
+    """Runs the stub admin API on a local port"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubAdminApi)
+        self.server.daemon_threads = True
+        self.server.entities = {"sites": {"10": {"id": 10, "name": "site1"}, "20": {"id": 20, "name": "site2"}},
+                                "agents": {"30": {"id": 30, "name": "agent1"}, "31": {"id": 31, "name": "agent2"}},
+                                "virtualhosts": {"40": {"id": 40, "host": "*", "port": "443", "virtualHost": "*:443"}}}
+        self.server.requests = []
+        self.server.next_id = 100
+        self.server.lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}{API_PATH}"
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def client(self, **options) -> PingAccessAdminClient:
+        client = PingAccessAdminClient(self.url + "/", PASSWORD, **options)
+        self.addCleanup(client.session.close)
+        return client
+
+    def requests(self, method: str = None) -> [str]:
+        return [path[len(API_PATH):] for command, path, _, _ in self.server.requests if method in (None, command)]
+
+
+class TestRequest(StubServerTestCase):
+    def test_headers_and_json_body(self):
+        self.assertEqual({"id": 10, "name": "site1"}, self.client().get_site(10))
+
+        _, path, headers, _ = self.server.requests[0]
+        self.assertEqual(f"{API_PATH}/sites/10", path)
+        self.assertEqual("Basic " + base64.b64encode(f"Administrator:{PASSWORD}".encode()).decode(),
+                         headers["Authorization"])
+        self.assertEqual(("PingAccess", "application/json"), (headers["X-Xsrf-Header"], headers["Accept"]))
+
+    def test_text_and_empty_bodies(self):
+        client = self.client()
+        self.assertEqual("5.3.2", client.request("GET", "version"))
+        self.assertIsNone(client.request("DELETE", "/sites/10"))
+
+    def test_error_status(self):
+        with self.assertRaises(PingAccessAdminError) as raised:
+            self.client().create_application({"name": ""})
+
+        self.assertEqual(("POST", "applications", 422, {"form": {"name": ["Required"]}}),
+                         (raised.exception.method, raised.exception.path, raised.exception.status,
+                          raised.exception.body))
+        self.assertEqual("POST applications: HTTP 422: {'form': {'name': ['Required']}}", str(raised.exception))
+
+    def test_no_response(self):
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            port = unused.getsockname()[1]
+        client = PingAccessAdminClient(f"http://127.0.0.1:{port}", PASSWORD, timeout=5)
+
+        with self.assertRaises(PingAccessAdminError) as raised:
+            client.get_site(10)
+
+        self.assertIsNone(raised.exception.status)
+        self.assertIn("GET sites/10: no response: ", str(raised.exception))
+
+    def test_find_entities_quotes_the_query(self):
+        client = self.client()
+
+        self.assertEqual([40], [host["id"] for host in client.find_virtual_hosts("*", 443)])
+        self.assertEqual([31], [agent["id"] for agent in client.find_agents("agent2")])
+        self.assertEqual([], client.find_sites("missing"))
+        self.assertEqual(["/virtualhosts?virtualHost=%2A%3A443", "/agents?name=agent2", "/sites?name=missing"],
+                         self.requests())
+
+    def test_delete_missing_ok(self):
+        client = self.client()
+        client.delete_agent(30)
+        client.delete_agent(30, missing_ok=True)
+
+        with self.assertRaises(PingAccessAdminError) as raised:
+            client.delete_agent(30)
+        self.assertEqual(404, raised.exception.status)
+
+    def test_cache_until_the_collection_changes(self):
+        client = self.client(cache=True)
+        client.get_site(10)
+        client.find_sites("site1")
+        client.get_agent(30)
+        self.assertEqual({"id": 10, "name": "site1"}, client.get_site(10))
+        self.assertEqual(3, len(self.requests("GET")))
+
+        client.delete_agent(31)
+        client.get_site(10)
+        client.get_agent(30)
+        self.assertEqual(4, len(self.requests("GET")))
+
+        client.request("POST", "/sites?validate=true", {"name": "site3"})
+        client.get_site(10)
+        client.find_sites("site1")
+        self.assertEqual(["/sites/10", "/sites?name=site1", "/agents/30", "/agents/30", "/sites/10",
+                          "/sites?name=site1"], self.requests("GET"))
+
+    def test_no_cache_by_default(self):
+        client = self.client()
+        client.get_site(10)
+        client.get_site(10)
+        self.assertEqual(2, len(self.requests("GET")))
+
+
+class TestBulk(StubServerTestCase):
+    def test_results_in_order(self):
+        results = self.client().bulk([Operation("GET", f"sites/{site_id}") for site_id in [20, 10, 99, 10]])
+
+        self.assertEqual([{"id": 20, "name": "site2"}, {"id": 10, "name": "site1"}, None, {"id": 10, "name": "site1"}],
+                         [result.body for result in results])
+        self.assertEqual([200, 200, 404, 200], [result.status for result in results])
+        self.assertEqual([True, True, False, True], [result.ok for result in results])
+        self.assertEqual("GET sites/99: HTTP 404: {'message': 'Resource not found'}", str(results[2].error))
+
+    def test_missing_ok(self):
+        results = self.client().bulk_delete("agent", [30, 99, 31], missing_ok=True)
+
+        self.assertEqual(([200, 404, 200], True), ([result.status for result in results],
+                                                   all(result.ok for result in results)))
+        self.assertEqual({}, self.server.entities["agents"])
+
+    def test_create(self):
+        results = self.client().bulk_create("site", [{"name": f"site{number}"} for number in range(3, 8)])
+
+        self.assertEqual([f"site{number}" for number in range(3, 8)], [result.body["name"] for result in results])
+        self.assertEqual(5, len({result.body["id"] for result in results}))
+
+    def test_connections_are_reused(self):
+        client = self.client(max_workers=2)
+
+        results = client.bulk_get("site", [10, 20] * 10)
+
+        self.assertTrue(all(result.ok for result in results))
+        connections = {client_address for _, _, _, client_address in self.server.requests}
+        self.assertLessEqual(len(connections), 2)
+
+
+class TestEnvsubst(unittest.TestCase):
+    def test_variables(self):
+        with mock.patch.dict(os.environ, {"AGENT_NAME": "agent1", "PORT": "443"}):
+            os.environ.pop("UNSET", None)
+            self.assertEqual('{"name": "agent1", "port": "443", "unset": "", "price": "$5"}',
+                             envsubst('{"name": "${AGENT_NAME}", "port": "$PORT", "unset": "$UNSET", '
+                                      '"price": "$5"}'))
+
+
+class TestMain(StubServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+
+    def main(self, *args: str, password: str = PASSWORD) -> (int, str, str):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        code = 0
+        environment = {"PA_ADMIN_PASSWORD": password, "SITE_NAME": "site3"}
+        with mock.patch.object(sys, "argv", ["pa_admin_client.py", "--url", self.url, *args]), \
+                mock.patch.dict(os.environ, environment), redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                main()
+            except SystemExit as e:
+                code = e.code
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_get(self):
+        code, stdout, stderr = self.main("get", "sites/10", "agents?name=agent1", "sites/99")
+
+        self.assertEqual(1, code)
+        self.assertEqual({"sites/10": {"id": 10, "name": "site1"},
+                          "agents?name=agent1": {"items": [{"id": 30, "name": "agent1"}]}}, json.loads(stdout))
+        self.assertEqual("GET sites/99: HTTP 404: {'message': 'Resource not found'}\n", stderr)
+
+    def test_create_from_templates(self):
+        template = os.path.join(self.work_dir.name, "create-site-payload.json")
+        with open(template, "w") as template_file:
+            template_file.write('{"name": "${SITE_NAME}", "targets": ["httpbin:443"]}')
+
+        code, stdout, _ = self.main("create", f"sites={template}", f"sites={template}")
+
+        self.assertEqual(0, code)
+        self.assertEqual([{"name": "site3", "targets": ["httpbin:443"], "id": 101},
+                          {"name": "site3", "targets": ["httpbin:443"], "id": 102}],
+                         sorted(json.loads(stdout), key=lambda site: site["id"]))
+
+    def test_invalid_templates(self):
+        for spec in ["sites", "sites=missing.json"]:
+            with self.subTest(spec):
+                code, _, stderr = self.main("create", spec)
+                self.assertEqual(2, code)
+                self.assertIn("Invalid template", stderr)
+
+    def test_delete(self):
+        self.assertEqual(1, self.main("delete", "sites/10", "sites/99")[0])
+        self.assertEqual((0, ""), self.main("delete", "sites/10", "sites/20", "--missing-ok")[::2])
+        self.assertEqual({}, self.server.entities["sites"])
+
+    def test_password_is_required(self):
+        code, _, stderr = self.main("get", "sites/10", password="")
+
+        self.assertEqual(2, code)
+        self.assertIn("--password or $PA_ADMIN_PASSWORD is required", stderr)
+        self.assertEqual([], self.server.requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from user_verifier import (  # noqa: E402
+    Target, TargetError, UserVerifier, check_identity, parse_identity, parse_selector,
+)
+
+PING_IDENTITY = """user=ping
+uid=9031
+gid=9999
+process_user=ping
+process_uid=9031
+process_gid=9999
+"""
+
+# Both the container user and its main process are root
+ROOT_IDENTITY = """user=root
+uid=0
+gid=0
+process_user=root
+process_uid=0
+process_gid=0
+"""
+
+
+def pod(name: str, labels: {}, *containers: str):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, labels=labels),
+                           spec=SimpleNamespace(containers=[SimpleNamespace(name=c) for c in containers]))
+
+
+class StubCoreClient:
+    def __init__(self, pods: []):
+        self.pods = pods
+        self.calls = []
+
+    def list_namespaced_pod(self, namespace: str, field_selector: str = None):
+        self.calls.append((namespace, field_selector))
+        return SimpleNamespace(items=self.pods)
+
+
+class StubBackend:
+    """Returns the output of each pod, or raises it if it is an exception"""
+
+    def __init__(self, outputs: {}):
+        self.outputs = outputs
+        self.runs = []
+
+    def run(self, pod_name: str, container: str, script: str) -> str:
+        self.runs.append((pod_name, container))
+        output = self.outputs[pod_name]
+        if isinstance(output, Exception):
+            raise output
+        return output
+
+
+class TestParseSelector(unittest.TestCase):
+    def test_requirements(self):
+        self.assertEqual([("role", "pingaccess", True), ("tier", "admin", True), ("app", "x", False)],
+                         parse_selector("role=pingaccess,tier==admin,app!=x"))
+
+    def test_requirements_of_the_same_key_are_kept(self):
+        self.assertEqual([("role", "a", False), ("role", "b", True)], parse_selector("role!=a,role=b"))
+
+    def test_unsupported_requirement(self):
+        with self.assertRaises(ValueError):
+            parse_selector("role in (a,b)")
+
+
+class TestTarget(unittest.TestCase):
+    def test_parse(self):
+        target = Target.parse("role=pingaccess-engine@pingaccess:2")
+        self.assertEqual([("role", "pingaccess-engine", True)], target.selector)
+        self.assertEqual("pingaccess", target.container)
+        self.assertEqual(2, target.min_pods)
+        self.assertEqual(1, Target.parse("role=pingcentral@pingcentral").min_pods)
+
+    def test_parse_invalid(self):
+        for spec in ("role=pingcentral", "role=pingcentral@", "role=pingcentral@pingcentral:many"):
+            with self.assertRaises(TargetError):
+                Target.parse(spec)
+
+    def test_matches(self):
+        target = Target.parse("role=pingaccess,tier!=admin@pingaccess")
+        self.assertTrue(target.matches(pod("engine", {"role": "pingaccess"}, "pingaccess")))
+        self.assertFalse(target.matches(pod("admin", {"role": "pingaccess", "tier": "admin"}, "pingaccess")))
+        self.assertFalse(target.matches(pod("other", {"role": "pingfederate"}, "pingaccess")))
+        self.assertFalse(target.matches(pod("sidecar", {"role": "pingaccess"}, "pingaccess-init")))
+        self.assertFalse(target.matches(pod("unlabeled", None, "pingaccess")))
+
+    def test_matches_with_conflicting_requirements_of_the_same_key(self):
+        target = Target.parse("role!=pingaccess,role=pingaccess@pingaccess")
+        self.assertFalse(target.matches(pod("engine", {"role": "pingaccess"}, "pingaccess")))
+
+
+class TestIdentity(unittest.TestCase):
+    def test_parse_identity(self):
+        identity = parse_identity("noise\n" + PING_IDENTITY)
+        self.assertEqual("ping", identity["user"])
+        self.assertEqual("9999", identity["process_gid"])
+
+    def test_parse_identity_missing_keys(self):
+        with self.assertRaisesRegex(ValueError, "missing process_user"):
+            parse_identity(PING_IDENTITY.replace("process_user=ping", "process_user="))
+
+    def test_check_identity(self):
+        self.assertEqual([], check_identity(parse_identity(PING_IDENTITY), "ping"))
+        self.assertEqual(["running as root (uid 0), expected ping",
+                          "main process owned by root (uid 0), expected ping"],
+                         check_identity(parse_identity(ROOT_IDENTITY), "ping"))
+
+    def test_check_identity_of_the_main_process(self):
+        identity = parse_identity(PING_IDENTITY.replace("process_user=ping", "process_user=root"))
+        self.assertEqual(["main process owned by root (uid 9031), expected ping"], check_identity(identity, "ping"))
+
+
+class TestUserVerifier(unittest.TestCase):
+    def verify(self, pods: [], outputs: {}, *specs: str) -> {}:
+        self.core_client = StubCoreClient(pods)
+        self.backend = StubBackend(outputs)
+        return UserVerifier(self.core_client, self.backend, "ping-cloud").verify([Target.parse(s) for s in specs])
+
+    def test_pods_of_every_target_are_verified_once(self):
+        pods = [pod("pingaccess-0", {"role": "pingaccess"}, "pingaccess"),
+                pod("pingaccess-1", {"role": "pingaccess"}, "pingaccess"),
+                pod("pingdirectory-0", {"role": "pingdirectory"}, "pingdirectory")]
+        outputs = {"pingaccess-0": PING_IDENTITY, "pingaccess-1": PING_IDENTITY, "pingdirectory-0": ROOT_IDENTITY}
+
+        report = self.verify(pods, outputs, "role=pingaccess@pingaccess:2", "role=pingaccess@pingaccess",
+                             "role=pingdirectory@pingdirectory")
+
+        self.assertEqual([("ping-cloud", "status.phase=Running")], self.core_client.calls)
+        self.assertEqual(3, len(self.backend.runs))
+        self.assertEqual([], report["role=pingaccess@pingaccess:2"]["failures"])
+        self.assertEqual(["pingaccess-0", "pingaccess-1"], list(report["role=pingaccess@pingaccess"]["pods"]))
+        self.assertEqual(["pingdirectory-0/pingdirectory: running as root (uid 0), expected ping",
+                          "pingdirectory-0/pingdirectory: main process owned by root (uid 0), expected ping"],
+                         report["role=pingdirectory@pingdirectory"]["failures"])
+
+    def test_min_pods(self):
+        pods = [pod("pingfederate-0", {"role": "pingfederate"}, "pingfederate")]
+
+        report = self.verify(pods, {"pingfederate-0": PING_IDENTITY}, "role=pingfederate@pingfederate:2")
+
+        self.assertEqual(["1 Running pod(s) found, expected at least 2"],
+                         report["role=pingfederate@pingfederate:2"]["failures"])
+
+    def test_optional_target_without_pods_is_a_warning(self):
+        report = self.verify([], {}, "role=pingdatasync@pingdatasync:0")
+
+        result = report["role=pingdatasync@pingdatasync:0"]
+        self.assertEqual([], result["failures"])
+        self.assertEqual(["no Running pod matches the optional target, so it was not verified"], result["warnings"])
+
+    def test_exec_failure(self):
+        pods = [pod("pingcentral-0", {"role": "pingcentral"}, "pingcentral")]
+
+        report = self.verify(pods, {"pingcentral-0": RuntimeError("container not found")},
+                             "role=pingcentral@pingcentral")
+
+        self.assertEqual(["pingcentral-0/pingcentral: could not be verified: container not found"],
+                         report["role=pingcentral@pingcentral"]["failures"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from artifact_verifier import KubernetesExec
+
+USAGE = """
+Each TARGET has the form SELECTOR@CONTAINER[:MIN_PODS], where SELECTOR is a label selector of equality (k=v, k==v)
+and inequality (k!=v) requirements. The Running pods of the namespace are listed once, the pods matching a target are
+those with its labels and container, and a target with fewer than MIN_PODS (default 1) matching pods fails. Use
+MIN_PODS 0 for optional products; an optional target without matching pods is reported with a warning, since a wrong
+selector would leave it unverified.
+
+One exec per pod gathers the effective user, uid and gid of the container and the owner of its main process (PID 1),
+all pods at once. A pod fails if the user or the owner of the main process is not the expected user.
+
+Examples:
+  user_verifier.py role=pingaccess-engine@pingaccess:2 role=pingcentral@pingcentral:0 --json users-report.json
+"""
+
+# Prints one KEY=VALUE line per identity fact
+IDENTITY_SCRIPT = """
+echo "user=$(id -un)"
+echo "uid=$(id -u)"
+echo "gid=$(id -g)"
+process_uid=$(awk '/^Uid:/ { print $2 }' /proc/1/status)
+echo "process_uid=${process_uid}"
+echo "process_gid=$(awk '/^Gid:/ { print $2 }' /proc/1/status)"
+echo "process_user=$(awk -F: -v uid="${process_uid}" '$3 == uid { print $1; exit }' /etc/passwd)"
+"""
+
+IDENTITY_KEYS = ["user", "uid", "gid", "process_user", "process_uid", "process_gid"]
+
+
+class TargetError(Exception):
+    """Raised for a target that cannot be parsed"""
+
+
+@dataclass
+class Target:
+    spec: str
+    selector: [(str, str, bool)]
+    container: str
+    min_pods: int = 1
+    pods: [str] = field(default_factory=list)
+
+    @classmethod
+    def parse(cls, spec: str):
+        selector, separator, rest = spec.partition("@")
+        if not separator or not rest:
+            raise TargetError(f"Invalid target '{spec}', expected SELECTOR@CONTAINER[:MIN_PODS]")
+        container, _, min_pods = rest.partition(":")
+        try:
+            return cls(spec, parse_selector(selector), container, int(min_pods) if min_pods else 1)
+        except ValueError as e:
+            raise TargetError(f"Invalid target '{spec}': {e}") from e
+
+    def matches(self, pod) -> bool:
+        labels = pod.metadata.labels or {}
+        if not all((labels.get(key) == value) == equal for key, value, equal in self.selector):
+            return False
+        return any(container.name == self.container for container in pod.spec.containers)
+
+
+def parse_selector(selector: str) -> [(str, str, bool)]:
+    """
+    :return: The label key and value of each requirement, and whether the label must equal (True) or differ from
+             (False) the value
+    """
+    requirements = []
+    for requirement in filter(None, selector.split(",")):
+        if "!=" in requirement:
+            key, value = requirement.split("!=", 1)
+            requirements.append((key.strip(), value.strip(), False))
+        elif "=" in requirement:
+            key, value = requirement.replace("==", "=", 1).split("=", 1)
+            requirements.append((key.strip(), value.strip(), True))
+        else:
+            raise ValueError(f"unsupported label requirement '{requirement}'")
+    return requirements
+
+
+def parse_identity(output: str) -> {}:
+    identity = {}
+    for line in output.splitlines():
+        key, separator, value = line.partition("=")
+        if separator and key in IDENTITY_KEYS:
+            identity[key] = value.strip()
+    missing = [key for key in IDENTITY_KEYS if not identity.get(key)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)} in the output: {output.strip()!r}")
+    return identity
+
+
+def check_identity(identity: {}, expected_user: str) -> [str]:
+    failures = []
+    if identity["user"] != expected_user:
+        failures.append(f"running as {identity['user']} (uid {identity['uid']}), expected {expected_user}")
+    if identity["process_user"] != expected_user:
+        failures.append(f"main process owned by {identity['process_user']} (uid {identity['process_uid']}), "
+                        f"expected {expected_user}")
+    return failures
+
+
+class UserVerifier:
+    """Verifies the user of the containers of many products with one pod listing and one exec per pod"""
+
+    def __init__(self, core_client, backend, namespace: str, expected_user: str = "ping", workers: int = 8):
+        """
+        :param core_client: Lists the pods, like kubernetes.client.CoreV1Api
+        :param backend: Runs a shell script in a pod container and returns its output, like KubernetesExec
+        """
+        self.core_client = core_client
+        self.backend = backend
+        self.namespace = namespace
+        self.expected_user = expected_user
+        self.workers = workers
+
+    def verify(self, targets: [Target]) -> {}:
+        """
+        :return: The report, with the identity and failures of each pod of each target, and the failures and
+                 warnings of each target, by target spec
+        """
+        pods = self.core_client.list_namespaced_pod(self.namespace, field_selector="status.phase=Running").items
+        for target in targets:
+            target.pods = sorted(pod.metadata.name for pod in pods if target.matches(pod))
+
+        execs = sorted({(pod, target.container) for target in targets for pod in target.pods})
+        identities = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.backend.run, pod, container, IDENTITY_SCRIPT): (pod, container)
+                       for pod, container in execs}
+            for future, target in futures.items():
+                try:
+                    identities[target] = parse_identity(future.result())
+                except Exception as e:
+                    identities[target] = e
+
+        report = {}
+        for target in targets:
+            failures = []
+            warnings = []
+            if len(target.pods) < target.min_pods:
+                failures.append(f"{len(target.pods)} Running pod(s) found, expected at least {target.min_pods}")
+            elif not target.pods:
+                warnings.append("no Running pod matches the optional target, so it was not verified")
+            pod_reports = {}
+            for pod in target.pods:
+                identity = identities[(pod, target.container)]
+                if isinstance(identity, Exception):
+                    pod_failures = [f"could not be verified: {identity}"]
+                    identity = {}
+                else:
+                    pod_failures = check_identity(identity, self.expected_user)
+                pod_reports[pod] = {**identity, "failures": pod_failures}
+                failures.extend(f"{pod}/{target.container}: {failure}" for failure in pod_failures)
+            report[target.spec] = {"container": target.container, "pods": pod_reports, "failures": failures,
+                                   "warnings": warnings}
+        return report
+
+
+def print_report(report: {}):
+    rows = [("target", "pod", *IDENTITY_KEYS, "result")]
+    for spec, result in report.items():
+        for pod, identity in result["pods"].items():
+            rows.append((spec, pod, *(identity.get(key, "-") for key in IDENTITY_KEYS),
+                         "FAIL" if identity["failures"] else "ok"))
+        if not result["pods"]:
+            rows.append((spec, "-", *("-" for _ in IDENTITY_KEYS),
+                         "FAIL" if result["failures"] else "WARN" if result["warnings"] else "ok"))
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+    for spec, result in report.items():
+        for failure in result["failures"]:
+            print(f"{spec}: {failure}")
+        for warning in result["warnings"]:
+            print(f"{spec}: warning: {warning}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Verify that the containers of many products run as the expected user, with one pod listing and "
+                    "one exec per pod",
+        epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("targets", nargs="+", metavar="TARGET")
+    parser.add_argument("--namespace", default=os.getenv("PING_CLOUD_NAMESPACE", "ping-cloud"))
+    parser.add_argument("--user", default="ping", help="The user the containers must run as")
+    parser.add_argument("--workers", type=int, default=8, help="Number of pods verified concurrently")
+    parser.add_argument("--json", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        targets = [Target.parse(spec) for spec in args.targets]
+    except TargetError as e:
+        parser.error(str(e))
+
+    import kubernetes as k8s
+
+    k8s.config.load_kube_config()
+    core_client = k8s.client.CoreV1Api()
+    verifier = UserVerifier(core_client, KubernetesExec(core_client, args.namespace), args.namespace, args.user,
+                            args.workers)
+    report = verifier.verify(targets)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+    sys.exit(1 if any(result["failures"] for result in report.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
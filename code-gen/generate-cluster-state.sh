@@ -850,6 +850,7 @@ PING_CENTRAL='pingcentral'
 
 mkdir -p "${BOOTSTRAP_DIR}"
 mkdir -p "${K8S_CONFIGS_DIR}"
+mkdir -p "${GIT_OPS_VALIDATION_FOLDER}"
 mkdir -p "${PROFILE_REPO_DIR}"
 
 cp ./update-cluster-state-wrapper.sh "${CLUSTER_STATE_REPO_DIR}"
@@ -861,6 +862,10 @@ cp ../.gitignore "${PROFILE_REPO_DIR}"
 cp ../k8s-configs/cluster-tools/base/git-ops/git-ops-command.sh "${K8S_CONFIGS_DIR}"
 cp ../k8s-configs/cluster-tools/base/git-ops/validation/verify_descriptor_json.py "${GIT_OPS_VALIDATION_FOLDER}"
 cp ../k8s-configs/cluster-tools/base/git-ops/validation/json_util.py "${GIT_OPS_VALIDATION_FOLDER}"
+cp ../k8s-configs/cluster-tools/base/git-ops/validation/k8s_manifests.py "${GIT_OPS_VALIDATION_FOLDER}"
+cp ../k8s-configs/cluster-tools/base/git-ops/validation/manifest_diff.py "${GIT_OPS_VALIDATION_FOLDER}"
+cp ../k8s-configs/cluster-tools/base/git-ops/validation/render_workspace.py "${GIT_OPS_VALIDATION_FOLDER}"
+cp ../k8s-configs/cluster-tools/base/git-ops/validation/validate_cluster_state.py "${GIT_OPS_VALIDATION_FOLDER}"
 
 find "${TEMPLATES_HOME}" -type f -maxdepth 1 | xargs -I {} cp {} "${K8S_CONFIGS_DIR}"
 
@@ -19,9 +19,12 @@
 #   ENVIRONMENTS -> A space-separated list of environments. Defaults to 'dev test stage prod', if unset. If provided,
 #       it must contain all or a subset of the environments currently created by the generate-cluster-state.sh script,
 #       i.e. dev, test, stage, prod.
-#   PUSH_RETRY_COUNT -> The number of times to try pushing to the cluster state repo with a 2s sleep between each
-#       attempt to avoid IAM permission to repo sync issue.
-#   PUSH_TO_SERVER -> A flag indicating whether or not to push the code to the remote server. Defaults to true.
+#   PUSH_RETRY_COUNT -> The number of times to try pushing to the cluster state repo, with an exponential backoff
+#       between each attempt to avoid IAM permission to repo sync issue. Defaults to 30.
+#   PUSH_MAX_BACKOFF_SECONDS -> The maximum delay between push attempts. Defaults to 16.
+#   PUSH_TO_SERVER -> A flag indicating whether or not to push the code to the remote server. Defaults to true. All
+#       branches are pushed together in one atomic push after they have all been committed.
+#   RETAIN_GLOB -> A glob of files or directories directly under the repo that must never be deleted, e.g. *.iml.
 #   DISABLE_GIT -> Don't interact with git, only change the file structure locally - best used for testing
 #       git-ops-command.sh rendering of files as if in a CSR
 
@@ -38,28 +41,97 @@ CUSTOMER_HUB='customer-hub'
 DISABLE_GIT=${DISABLE_GIT:-false}
 
 ########################################################################################################################
-# Delete all files and directories under the provided directory. All hidden files and directories directly under the
-# provided directory will be left intact. Any glob specified through the RETAIN_GLOB environment variable will be
-# ignored.
+# Print an index of the files under the provided directory, one line per file, sorted by path. Each line holds the
+# path relative to the directory, the git blob hash of the file's contents and whether the file is executable ("x" or
+# "-"). Symbolic links are listed with their target instead of a hash, and "l". The .git directory directly under the
+# provided directory is skipped.
 #
 # Arguments
-#   ${1} -> The directory to clean up.
+#   ${1} -> The directory to index.
 ########################################################################################################################
-dir_deep_clean() {
-  dir="$1"
-  if test -d "${dir}"; then
-    echo "Contents of directory ${dir} before deletion:"
-    find "${dir}" -mindepth 1 -maxdepth 1
-    # Allow a glob to be retained with an environment variable. For example,
-    # users may want project files such as *.iml and *.vscode to be retained.
-    if test "${RETAIN_GLOB}"; then
-      find "${dir}" -mindepth 1 -maxdepth 1 -not -path "${dir}/.*" -not -path "${dir}/${RETAIN_GLOB}" -exec rm -rf {} +
-    else
-      find "${dir}" -mindepth 1 -maxdepth 1 -not -path "${dir}/.*" -exec rm -rf {} +
+file_index() {
+  (
+    cd "${1}" || exit 1
+    paths="$(mktemp)"
+    hashes="$(mktemp)"
+    executables="$(mktemp)"
+
+    find . -path ./.git -prune -o -type f -print | LC_ALL=C sort > "${paths}"
+    git hash-object --stdin-paths < "${paths}" > "${hashes}"
+    find . -path ./.git -prune -o -type f -perm -u+x -print > "${executables}"
+
+    {
+      awk -v OFS='\t' '
+        FILENAME == ARGV[1] { executable[$0] = 1; next }
+        FILENAME == ARGV[2] { hash[FNR] = $0; next }
+        { print $0, hash[FNR], ($0 in executable) ? "x" : "-" }
+      ' "${executables}" "${hashes}" "${paths}"
+
+      # Symbolic links are indexed by their target, so that they are copied as links.
+      find . -path ./.git -prune -o -type l -print | while read -r link; do
+        printf '%s\tlink:%s\tl\n' "${link}" "$(readlink "${link}")"
+      done
+    } | LC_ALL=C sort
+
+    rm -f "${paths}" "${hashes}" "${executables}"
+  )
+}
+
+########################################################################################################################
+# Make the contents of the destination directory identical to the source directory, touching only what differs. Files
+# whose content hash or executable bit differs are copied, and files that no longer exist in the source are deleted.
+# Unchanged files are left alone, so their timestamps are kept and git does not need to re-read them. All hidden files
+# and directories directly under the destination directory are never deleted. Neither is any glob specified through the
+# RETAIN_GLOB environment variable.
+#
+# Arguments
+#   ${1} -> The source directory.
+#   ${2} -> The destination directory.
+########################################################################################################################
+sync_dir() {
+  src_dir="${1}"
+  dst_dir="${2}"
+
+  mkdir -p "${dst_dir}"
+  src_index="$(mktemp)"
+  dst_index="$(mktemp)"
+  file_index "${src_dir}" > "${src_index}"
+  file_index "${dst_dir}" > "${dst_index}"
+
+  # Delete the stale files first, so that a file replaced by a directory of the same name (or the other way around) is
+  # out of the way of the copy. Allow a glob to be retained with an environment variable. For example, users may want
+  # project files such as *.iml and *.vscode to be retained.
+  deleted_count=0
+  while read -r path; do
+    case "${path}" in
+      ./.*) continue ;;
+    esac
+    # shellcheck disable=SC2053
+    if test "${RETAIN_GLOB}" && [[ "${path#./}" == ${RETAIN_GLOB} || "${path#./}" == ${RETAIN_GLOB}/* ]]; then
+      continue
     fi
-    echo "Contents of directory ${dir} after deletion:"
-    find "${dir}" -mindepth 1 -maxdepth 1
-  fi
+    rm -f "${dst_dir:?}/${path:?}"
+    deleted_count=$((deleted_count + 1))
+  done < <(LC_ALL=C comm -13 <(cut -f1 "${src_index}") <(cut -f1 "${dst_index}"))
+
+  # Remove the directories emptied by the deletions. Subdirectories sort after their parent, so a directory that only
+  # held empty directories is removed too.
+  find "${dst_dir}" -mindepth 1 -path "${dst_dir}/.*" -prune -o -type d -print |
+      LC_ALL=C sort -r | while read -r dir; do rmdir "${dir}" 2> /dev/null; done
+
+  # Copy the new and changed files.
+  changed_count=0
+  while IFS="$(printf '\t')" read -r path _; do
+    mkdir -p "$(dirname "${dst_dir}/${path}")"
+    # Replace rather than write through the destination, which may be a symbolic link.
+    rm -f "${dst_dir:?}/${path:?}"
+    cp -P -p "${src_dir}/${path}" "${dst_dir}/${path}"
+    changed_count=$((changed_count + 1))
+  done < <(LC_ALL=C comm -23 "${src_index}" "${dst_index}")
+
+  unchanged_count=$(($(wc -l < "${src_index}") - changed_count))
+  echo "Synced ${src_dir} to ${dst_dir}: ${changed_count} copied, ${deleted_count} deleted, ${unchanged_count} unchanged"
+  rm -f "${src_index}" "${dst_index}"
 }
 
 ########################################################################################################################
@@ -107,24 +179,40 @@ organize_code_for_environment() {
 }
 
 ########################################################################################################################
-# Attempt to push to the provided branch on the cluster state repo up to the specified number of retries.
+# Attempt to push the provided branches to the cluster state repo in a single atomic push, up to the specified number
+# of retries. Either all branches are updated on the server or none of them are. The delay between attempts starts at
+# 1s and doubles after every attempt up to PUSH_MAX_BACKOFF_SECONDS. If the server does not support atomic pushes, the
+# branches are pushed together without it.
 #
 # Arguments
 #   ${1} -> Retry count.
-#   ${2} -> The git branch to push to on origin.
+#   ${2..} -> The git branches to push to on origin.
 ########################################################################################################################
 push_with_retries() {
   retry_count=${1}
-  git_branch=${2}
-  attempt=1
+  shift
+  atomic='--atomic'
+  delay=1
 
   for attempt in $(seq 1 "${retry_count}"); do
-    echo "Attempt #${attempt} pushing to server"
-    git push --set-upstream origin "${git_branch}" && return 0
-    sleep 2s
+    echo "Attempt #${attempt} pushing branches to server: $*"
+    # shellcheck disable=SC2086
+    push_output="$(git push ${atomic} --set-upstream origin "$@" 2>&1)"
+    push_exit_code=$?
+    echo "${push_output}"
+    test ${push_exit_code} -eq 0 && return 0
+
+    if test "${atomic}" && echo "${push_output}" | grep -q 'does not support --atomic'; then
+      echo "Server does not support atomic pushes, pushing branches without it"
+      atomic=''
+      continue
+    fi
+
+    test "${attempt}" -lt "${retry_count}" && sleep "${delay}"
+    delay=$((delay * 2 > PUSH_MAX_BACKOFF_SECONDS ? PUSH_MAX_BACKOFF_SECONDS : delay * 2))
   done
 
-  echo "Unable to push to server branch ${git_branch} after ${retry_count} attempts"
+  echo "Unable to push to server branches $* after ${retry_count} attempts"
   return 1
 }
 
@@ -139,6 +227,11 @@ finalize() {
 
 ### Script start ###
 
+# When sourced, e.g. by the tests, only define the functions above.
+if test "${BASH_SOURCE[0]}" != "${0}"; then
+  return 0
+fi
+
 # If profile repo and secondary region, early-out. The profiles will be exactly identical for all regions and should
 # already have been seeded when this script was run on primary region.
 IS_PRIMARY="${IS_PRIMARY:-false}"
@@ -160,6 +253,7 @@ GENERATED_CODE_DIR="${GENERATED_CODE_DIR:-/tmp/sandbox}"
 INCLUDE_PROFILES_IN_CSR="${INCLUDE_PROFILES_IN_CSR:-false}"
 
 PUSH_RETRY_COUNT="${PUSH_RETRY_COUNT:-30}"
+PUSH_MAX_BACKOFF_SECONDS="${PUSH_MAX_BACKOFF_SECONDS:-16}"
 PUSH_TO_SERVER="${PUSH_TO_SERVER:-true}"
 PCB_COMMIT_SHA=$(cat "${GENERATED_CODE_DIR}"/pcb-commit-sha.txt)
 
@@ -181,6 +275,7 @@ if test "${CURRENT_BRANCH}" && test -n "$(git status -s)"; then
 fi
 
 REMOTE_BRANCHES=""
+PUSH_BRANCHES=""
 
 # Get a list of the remote branches from the server.
 if ! ${DISABLE_GIT}; then
@@ -266,58 +361,52 @@ for ENV_OR_BRANCH in ${ENVIRONMENTS}; do
     echo "Branch ${GIT_BRANCH} does not exist on server."
   fi
 
+  # shellcheck disable=SC2010
+  region="$(ls "${ENV_CODE_DIR}/${K8S_CONFIGS_DIR}" | grep -v "${BASE_DIR}")"
+
   if "${IS_PRIMARY}"; then
-    # Clean-up everything in the repo.
-    echo "Cleaning up ${PWD}"
-    dir_deep_clean "${PWD}"
+    # Stage the entire contents of the repo, then sync only the differences into it.
+    STAGE_DIR=$(mktemp -d)
 
     if "${IS_PROFILE_REPO}" || "${INCLUDE_PROFILES_IN_CSR}"; then
-      # Copy the base files into the environment directory.
+      # Stage the base files.
       src_dir="${ENV_CODE_DIR}"
-      echo "Copying base files from ${src_dir} to ${PWD}"
-      cp "${src_dir}"/.gitignore ./
-      cp "${src_dir}"/version.txt ./
-      cp "${src_dir}"/update-profile-wrapper.sh ./
-
-      # Copy the profiles.
-      src_dir="${ENV_CODE_DIR}/${PROFILES_DIR}"
-      echo "Copying ${src_dir} to ${PWD}"
-      cp -pr "${src_dir}" ./
+      cp "${src_dir}"/.gitignore "${STAGE_DIR}"
+      cp "${src_dir}"/version.txt "${STAGE_DIR}"
+      cp "${src_dir}"/update-profile-wrapper.sh "${STAGE_DIR}"
+
+      # Stage the profiles.
+      mv "${ENV_CODE_DIR}/${PROFILES_DIR}" "${STAGE_DIR}"
     fi
 
     if ! "${IS_PROFILE_REPO}"; then
-      # Copy the base files into the environment directory.
+      # Stage the base files.
       src_dir="${ENV_CODE_DIR}"
-      echo "Copying base files from ${src_dir} to ${PWD}"
-      cp "${src_dir}"/.gitignore ./
-      cp "${src_dir}"/version.txt ./
-      cp "${src_dir}"/update-cluster-state-wrapper.sh ./
+      cp "${src_dir}"/.gitignore "${STAGE_DIR}"
+      cp "${src_dir}"/version.txt "${STAGE_DIR}"
+      cp "${src_dir}"/update-cluster-state-wrapper.sh "${STAGE_DIR}"
 
-      # Copy the k8s-configs.
-      mkdir -p "${K8S_CONFIGS_DIR}"
-
-      # Copy base files into the k8s-configs directory.
+      # Stage the base files of the k8s-configs directory.
+      mkdir -p "${STAGE_DIR}/${K8S_CONFIGS_DIR}"
       src_dir="${GENERATED_CODE_DIR}/${CLUSTER_STATE_REPO_DIR}/${K8S_CONFIGS_DIR}"
-      echo "Copying base files from ${src_dir} to ${K8S_CONFIGS_DIR}"
-      find "${src_dir}" -type f -maxdepth 1 -exec cp {} "${K8S_CONFIGS_DIR}" \;
+      find "${src_dir}" -type f -maxdepth 1 -exec cp {} "${STAGE_DIR}/${K8S_CONFIGS_DIR}" \;
 
-      # Copy the k8s-configs/base directory, which is common code for all regions.
-      src_dir="${ENV_CODE_DIR}/${K8S_CONFIGS_DIR}/${BASE_DIR}"
-      echo "Copying ${src_dir} to ${K8S_CONFIGS_DIR}"
-      cp -pr "${src_dir}" "${K8S_CONFIGS_DIR}/"
+      # Stage the k8s-configs/base directory, which is common code for all regions, and the region directory.
+      mv "${ENV_CODE_DIR}/${K8S_CONFIGS_DIR}/${BASE_DIR}" "${STAGE_DIR}/${K8S_CONFIGS_DIR}"
+      mv "${ENV_CODE_DIR}/${K8S_CONFIGS_DIR}/${region}" "${STAGE_DIR}/${K8S_CONFIGS_DIR}"
     fi
+
+    sync_dir "${STAGE_DIR}" "${PWD}"
+    rm -rf "${STAGE_DIR:?}"
+  elif ! "${IS_PROFILE_REPO}"; then
+    # Secondary regions only own their region directory.
+    sync_dir "${ENV_CODE_DIR}/${K8S_CONFIGS_DIR}/${region}" "${K8S_CONFIGS_DIR}/${region}"
   fi
+  rm -rf "${ENV_CODE_DIR:?}"
 
   if "${IS_PROFILE_REPO}"; then
     commit_msg="Initial commit of profile code for environment '${ENV}' - ping-cloud-base@${PCB_COMMIT_SHA}"
   else
-    # shellcheck disable=SC2010
-    region="$(ls "${ENV_CODE_DIR}/${K8S_CONFIGS_DIR}" | grep -v "${BASE_DIR}")"
-    src_dir="${ENV_CODE_DIR}/${K8S_CONFIGS_DIR}/${region}"
-
-    echo "Copying ${src_dir} to ${K8S_CONFIGS_DIR}"
-    cp -pr "${src_dir}" "${K8S_CONFIGS_DIR}/"
-
     commit_msg="Initial commit of k8s code for environment '${ENV}' in region '${region}' - ping-cloud-base@${PCB_COMMIT_SHA}"
   fi
 
@@ -327,11 +416,7 @@ for ENV_OR_BRANCH in ${ENVIRONMENTS}; do
     git commit --allow-empty -m "${commit_msg}"
   fi
 
-  if "${PUSH_TO_SERVER}" && ! "${DISABLE_GIT}"; then
-    push_with_retries "${PUSH_RETRY_COUNT}" "${GIT_BRANCH}"
-  else
-    echo "Not pushing changes to the server for branch '${GIT_BRANCH}' - PUSH_TO_SERVER set to false or DISABLE_GIT set to true"
-  fi
+  PUSH_BRANCHES="${PUSH_BRANCHES} ${GIT_BRANCH}"
 
   if ! "${QUIET}"; then
     echo
@@ -340,5 +425,18 @@ for ENV_OR_BRANCH in ${ENVIRONMENTS}; do
   fi
 done
 
+PUSH_EXIT_CODE=0
+if "${PUSH_TO_SERVER}" && ! "${DISABLE_GIT}"; then
+  # Push all branches at once, so the server sees either all of the new state or none of it.
+  if test "${PUSH_BRANCHES}"; then
+    # shellcheck disable=SC2086
+    push_with_retries "${PUSH_RETRY_COUNT}" ${PUSH_BRANCHES}
+    PUSH_EXIT_CODE=$?
+  fi
+else
+  echo "Not pushing changes to the server for branches '${PUSH_BRANCHES# }' - PUSH_TO_SERVER set to false or DISABLE_GIT set to true"
+fi
+
 # Run any required finalization
 finalize
+exit ${PUSH_EXIT_CODE}
@@ -3,7 +3,7 @@
 ##### ----- READ BEFORE RUNNING THE SCRIPT ----- #####
 
 # The following script shows how to seal all the secrets used by ping apps and their supporting cluster tools.
-# It requires kustomize and kubeseal to be installed.
+# It requires kustomize, kubeseal and python3 to be installed.
 
 # It is recommended that all (instead of a subset) of the secrets be sealed at the same time. This ensures that they
 # are all encrypted with the same sealing key. After sealing the secrets, make sure to save off the Bitnami service's
@@ -59,7 +59,7 @@ usage() {
 ####################
 
 # Check for required binaries.
-check_binaries "kustomize" "kubeseal"
+check_binaries "kustomize" "kubeseal" "python3"
 HAS_REQUIRED_TOOLS=${?}
 test ${HAS_REQUIRED_TOOLS} -ne 0 && exit 1
 
@@ -80,12 +80,16 @@ REGION_DIR="$(find . \
     -type d \( ! -name 'base' \) \
     -exec basename {} \; | tail -1)"
 
-# Run git-ops-command.sh with an OUT_DIR so each k8s resource is written to a separate file.
-OUT_DIR=$(mktemp -d)
-OUT_DIR="${OUT_DIR}" "${SCRIPT_DIR}"/git-ops-command.sh "${REGION_DIR}"
+# Render the region directory, and write each k8s resource managed by sealed secrets to a separate file. Each line of
+# SECRETS_TO_SEAL holds the file, namespace, name and top-level keys of one resource.
+DEPLOY_FILE=$(mktemp)
+"${SCRIPT_DIR}"/git-ops-command.sh "${REGION_DIR}" > "${DEPLOY_FILE}"
 
-YAML_FILES=$(find "${OUT_DIR}" -type f | xargs grep -rl 'sealedsecrets.bitnami.com/managed: "true"')
-if test -z "${YAML_FILES}"; then
+OUT_DIR=$(mktemp -d)
+SECRETS_TO_SEAL=$(python3 "${SCRIPT_DIR}"/validation/k8s_manifests.py -f "${DEPLOY_FILE}" \
+    split "${OUT_DIR}" --annotation 'sealedsecrets.bitnami.com/managed=true' \
+    --format '{path}|{namespace}|{name}|{keys}')
+if test -z "${SECRETS_TO_SEAL}"; then
   echo "No secrets found to seal"
   exit 0
 fi
@@ -116,10 +120,7 @@ rm -f "${SEALED_SECRETS_FILE}"
 SECRETS_FILE=/tmp/ping-secrets.yaml
 rm -f "${SECRETS_FILE}"
 
-for FILE in ${YAML_FILES}; do
-  NAME=$(grep '^  name:' "${FILE}" | cut -d: -f2 | tr -d '[:space:]')
-  NAMESPACE=$(grep '^  namespace:' "${FILE}" | cut -d: -f2 | tr -d '[:space:]')
-
+while IFS='|' read -r FILE NAMESPACE NAME KEYS; do
   cat >> "${SECRETS_FILE}" <<EOF
 apiVersion: v1
 kind: Secret
@@ -133,7 +134,7 @@ metadata:
 EOF
 
   # Only seal secrets that have data in them.
-  if grep '^data' "${FILE}" &> /dev/null; then
+  if echo ",${KEYS}," | grep -q ',data,'; then
     echo "Creating sealed secret for \"${NAMESPACE}:${NAME}\""
 
     # Append the sealed secret to the sealed secrets file.
@@ -146,7 +147,7 @@ EOF
   else
     echo "Not creating sealed secret for \"${NAMESPACE}:${NAME}\" because it doesn't have any data"
   fi
-done
+done <<< "${SECRETS_TO_SEAL}"
 
 if "${UPDATE_MANIFESTS}"; then
   test -f "${SECRETS_FILE}" && cp "${SECRETS_FILE}" "${BUILD_DIR}/secrets.yaml"
@@ -161,8 +162,8 @@ else
   echo "      test -f ${SECRETS_FILE} && cp ${SECRETS_FILE} ${BUILD_DIR}/secrets.yaml"
   echo "      test -f ${SEALED_SECRETS_FILE} && cp ${SEALED_SECRETS_FILE} ${BUILD_DIR}/sealed-secrets.yaml"
   echo "      ./git-ops-command.sh \${REGION_DIR} > /tmp/deploy.yaml"
-  echo "      grep 'kind: Secret' /tmp/deploy.yaml # shouldn't have Secrets manifests, but could have ConfigMap manifests"
-  echo "      grep 'kind: SealedSecret' /tmp/deploy.yaml # should have hits"
+  echo "      python3 validation/k8s_manifests.py -f /tmp/deploy.yaml list --kind Secret # shouldn't have Secrets manifests"
+  echo "      python3 validation/k8s_manifests.py -f /tmp/deploy.yaml list --kind SealedSecret # should have hits"
   echo "- Push all modified files into the cluster state repo"
   echo "- Run this script for each CDE branch and region directory in the order - dev, test, stage, prod"
   echo "- IMPORTANT: create a backup of the Bitnami service's master key using PingCloud docs"
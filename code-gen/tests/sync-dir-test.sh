@@ -0,0 +1,105 @@
+#!/bin/bash
+
+# Unit tests of the sync_dir function of push-cluster-state.sh. Run with:
+#     SHUNIT_PATH=<shunit2 script> code-gen/tests/sync-dir-test.sh
+# SHUNIT_PATH defaults to the shunit2 that prepareShunit in ci-scripts/common.sh unpacks.
+
+SCRIPT_HOME=$(cd $(dirname ${0}); pwd)
+PROJECT_DIR="${PROJECT_DIR:-$(cd "${SCRIPT_HOME}"/../..; pwd)}"
+SHUNIT_PATH="${SHUNIT_PATH:-${PROJECT_DIR}/ci-scripts/test/shunit/shunit2-2.1.x/shunit2}"
+
+. "${SCRIPT_HOME}"/../push-cluster-state.sh
+
+setUp() {
+  work_dir="$(mktemp -d)"
+  src="${work_dir}/src"
+  dst="${work_dir}/dst"
+  mkdir -p "${src}" "${dst}"
+}
+
+tearDown() {
+  rm -rf "${work_dir:?}"
+}
+
+# Print every file, link and directory under the provided directory, with the contents of the files.
+tree_of() {
+  (
+    cd "${1}" || exit 1
+    find . -mindepth 1 | LC_ALL=C sort | while read -r path; do
+      if test -L "${path}"; then
+        echo "${path} -> $(readlink "${path}")"
+      elif test -d "${path}"; then
+        echo "${path}/"
+      else
+        echo "${path}: $(cat "${path}")"
+      fi
+    done
+  )
+}
+
+assertSynced() {
+  assertEquals "sync_dir failed" 0 "${1}"
+  assertEquals "The destination differs from the source" "$(tree_of "${src}")" "$(tree_of "${dst}")"
+}
+
+testNewChangedAndStaleFiles() {
+  mkdir -p "${src}/base" "${dst}/base" "${dst}/old"
+  echo same > "${src}/base/same.yaml"
+  cp -p "${src}/base/same.yaml" "${dst}/base/same.yaml"
+  echo new > "${src}/base/changed.yaml"
+  echo old > "${dst}/base/changed.yaml"
+  echo stale > "${dst}/old/stale.yaml"
+  echo added > "${src}/added.yaml"
+
+  output="$(sync_dir "${src}" "${dst}")"
+
+  assertSynced $?
+  assertEquals "Synced ${src} to ${dst}: 2 copied, 1 deleted, 1 unchanged" "${output}"
+}
+
+testFileReplacedByDirectory() {
+  mkdir -p "${src}/region"
+  echo file > "${dst}/region"
+  echo kustomization > "${src}/region/kustomization.yaml"
+
+  sync_dir "${src}" "${dst}" > /dev/null
+
+  assertSynced $?
+}
+
+testDirectoryReplacedByFile() {
+  mkdir -p "${dst}/region/nested"
+  echo kustomization > "${dst}/region/nested/kustomization.yaml"
+  echo file > "${src}/region"
+
+  sync_dir "${src}" "${dst}" > /dev/null
+
+  assertSynced $?
+}
+
+testDirectoryReplacedByLink() {
+  mkdir -p "${src}/target" "${dst}/region"
+  echo target > "${src}/target/env_vars"
+  ln -s target "${src}/region"
+  echo env > "${dst}/region/env_vars"
+
+  sync_dir "${src}" "${dst}" > /dev/null
+
+  assertSynced $?
+}
+
+testHiddenAndRetainedFilesAreKept() {
+  mkdir -p "${dst}/.git"
+  echo head > "${dst}/.git/HEAD"
+  echo project > "${dst}/project.iml"
+
+  RETAIN_GLOB='*.iml' sync_dir "${src}" "${dst}" > /dev/null
+
+  assertEquals "sync_dir failed" 0 $?
+  assertEquals "./.git/
+./.git/HEAD: head
+./project.iml: project" "$(tree_of "${dst}")"
+}
+
+# load shunit
+. ${SHUNIT_PATH}
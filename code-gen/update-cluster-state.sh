@@ -324,7 +324,9 @@ get_base64_decode_opt() {
 }
 
 ########################################################################################################################
-# Find the secrets.yaml and parse it for the given secret_key, then set the var_to_set to the value under the key
+# Find the secrets.yaml and parse it for the given secret_key, then set the var_to_set to the value under the key. This
+# runs a yq query per key; use get_secrets_from_yaml to look up keys, which falls back to this function only when the
+# secrets index is not available.
 #
 # Arguments
 #   $1 secret_key -> The secret key to retrieve from the secrets.yaml
@@ -370,6 +372,52 @@ get_secret_from_yaml() {
   export "${var_to_set}=${secret_value}"
 }
 
+########################################################################################################################
+# Whether the secrets index of the new ping-cloud-base version can be used instead of yq to look up secrets.
+########################################################################################################################
+secrets_index_available() {
+  SECRETS_INDEX="${NEW_PING_CLOUD_BASE_REPO}/k8s-configs/cluster-tools/base/git-ops/validation/secrets_index.py"
+  test -n "${NEW_PING_CLOUD_BASE_REPO}" && test -f "${SECRETS_INDEX}" && command -v python3 >/dev/null
+}
+
+########################################################################################################################
+# Parse the secrets.yaml files once, and export the base64-decoded values of several secret keys. Each key is looked up
+# like get_secret_from_yaml, but all of them are read from one index of the files instead of a yq query per key.
+#
+# Arguments
+#   ${@} -> The lookups, as secret_key=var_to_set, where secret_key may be qualified with the secret name, e.g.
+#           ssh-id-key-secret/id_rsa=ID_RSA_VALUE.
+# Returns
+#   Non-zero if a secrets.yaml file is not found, or a key is not found or not base64-encoded. The variables of the
+#   keys that were found are exported regardless.
+########################################################################################################################
+get_secrets_from_yaml() {
+  local secrets_env status lookup
+
+  if ! secrets_index_available; then
+    log "Secrets index not found in '${NEW_PING_CLOUD_BASE_REPO}', using yq"
+    status=0
+    for lookup in "${@}"; do
+      get_secret_from_yaml "${lookup%%=*}" "${lookup#*=}" || status=1
+    done
+    return "${status}"
+  fi
+
+  log "Attempting to retrieve ${*%%=*} from the secrets.yaml index"
+  secrets_env="$(mktemp)"
+  python3 "${SECRETS_INDEX}" --dir . export --output "${secrets_env}" "${@}"
+  status=$?
+
+  . "${secrets_env}"
+  rm -f "${secrets_env}"
+
+  if test ${status} -ne 0; then
+    log "Unable to retrieve all of ${*%%=*} from the secrets.yaml index"
+    return 1
+  fi
+  log "Successfully decoded ${*%%=*} from the secrets.yaml index"
+}
+
 ########################################################################################################################
 # Run a git diff from a source branch to a destination branch to determine the list of files that are deleted or renamed
 # in the destination branch for a particular directory. It handles whitespaces in filenames and addresses PDO-2066.
@@ -674,6 +722,12 @@ print_readme() {
   echo
   echo "    - Verify that the generated manifest looks right for the environment and region."
   echo
+  echo "    - To review only the resources that changed from the default git branch, with"
+  echo "      field-level differences, run the following command from the same directory:"
+  echo
+  echo "          python3 validation/manifest_diff.py --repo .. --region <REGION_DIR> \\"
+  echo "              --old-ref <default-cde-branch> --new-ref <new-cde-branch>"
+  echo
   echo "    - Repeat the command for every region for multi-region customers."
   echo
   echo "    - Pay special attention to app JVM settings and ensure that they are"
@@ -826,8 +880,9 @@ fi
 # The base environment variables file that's common to all regions.
 BASE_ENV_VARS="${K8S_CONFIGS_DIR}/${BASE_DIR}/${ENV_VARS_FILE_NAME}"
 
-# Get existing SSH key from secrets.yaml for upgraded secrets.yaml and place into a file for generate-cluster-state.sh
-get_secret_from_yaml "id_rsa" "ID_RSA_VALUE"
+# Get existing SSH key from secrets.yaml for upgraded secrets.yaml and place into a file for generate-cluster-state.sh.
+# Any other key to migrate belongs in this one lookup, so that the secrets files are parsed once.
+get_secrets_from_yaml "id_rsa=ID_RSA_VALUE"
 ID_RSA_FILE=""
 if [[ -n "${ID_RSA_VALUE}" ]]; then
   ID_RSA_FILE=$(mktemp)
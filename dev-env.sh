@@ -34,6 +34,12 @@
 # be deployed as-is onto the cluster. In fact, this is exactly what gets deployed when the script is run in real
 # mode, i.e. without the -n option.
 #
+# When INCREMENTAL_APPLY is true, only the resources that were added or changed since the last successful apply to the
+# same cluster and namespace are applied, in batches of CRDs, namespaces, other cluster-scoped resources and then
+# namespaced resources. The content hash of every applied resource is saved under INCREMENTAL_APPLY_STATE_DIR. If the
+# cluster was changed by other means since then, e.g. the namespace was deleted, delete the state file or run once with
+# INCREMENTAL_APPLY set to false to apply everything again.
+#
 # The following environment variables, if present, will be used for the following purposes:
 #
 # ----------------------------------------------------------------------------------------------------------------------
@@ -82,6 +88,19 @@
 # IS_MULTI_CLUSTER          | Flag indicating whether or not this is a           | false
 #                           | multi-cluster deployment.                          |
 #                           |                                                    |
+# INCREMENTAL_APPLY         | Flag indicating whether to apply only the          | false
+#                           | resources that changed since the last successful   |
+#                           | apply to the cluster and namespace. A full apply   |
+#                           | with this flag set to false resets the saved state.|
+#                           |                                                    |
+# INCREMENTAL_APPLY_PRUNE   | Flag indicating whether to delete resources that   | false
+#                           | were applied before but are no longer rendered.    |
+#                           | Only used if INCREMENTAL_APPLY is true.            |
+#                           |                                                    |
+# INCREMENTAL_APPLY_STATE_  | The directory where the content hashes of the last | ~/.cache/ping-cloud-base/apply-state
+# DIR                       | successful apply are saved, one file per cluster   |
+#                           | and namespace.                                     |
+#                           |                                                    |
 # K8S_CONTEXT               | The current Kubernetes context, i.e. cluster.      | The current context as set in
 #                           | spec is saved before applying it.                  | ~/.kube/config or the config file
 #                           |                                                    | to which KUBECONFIG is set.
@@ -366,6 +385,15 @@ export MYSQL_DATABASE="pingcentral_${ENV_NAME_NO_DASHES}"
 DEPLOY_FILE=${DEPLOY_FILE:-/tmp/deploy.yaml}
 test -z "${K8S_CONTEXT}" && K8S_CONTEXT=$(kubectl config current-context)
 
+INCREMENTAL_APPLY=${INCREMENTAL_APPLY:-false}
+INCREMENTAL_APPLY_PRUNE=${INCREMENTAL_APPLY_PRUNE:-false}
+INCREMENTAL_APPLY_STATE_DIR=${INCREMENTAL_APPLY_STATE_DIR:-${HOME}/.cache/ping-cloud-base/apply-state}
+INCREMENTAL_APPLY_PY="${CUR_DIR}/k8s-configs/cluster-tools/base/git-ops/validation/incremental_apply.py"
+if test "${INCREMENTAL_APPLY}" = 'true' && ! check_binaries "python3"; then
+  popd > /dev/null 2>&1
+  exit 1
+fi
+
 # Show the values being used for the relevant environment variables.
 log "Using TENANT_NAME: ${TENANT_NAME}"
 log "Using ENVIRONMENT: ${BELUGA_ENV_NAME}"
@@ -403,6 +431,8 @@ log "Using LEGACY_LOGGING: ${LEGACY_LOGGING}"
 
 log "Using DEPLOY_FILE: ${DEPLOY_FILE}"
 log "Using K8S_CONTEXT: ${K8S_CONTEXT}"
+log "Using INCREMENTAL_APPLY: ${INCREMENTAL_APPLY}"
+log "Using INCREMENTAL_APPLY_PRUNE: ${INCREMENTAL_APPLY_PRUNE}"
 log "Using PF_PROVISIONING_ENABLED: ${PF_PROVISIONING_ENABLED}"
 
 log "Using DASH_REPO_URL: ${DASH_REPO_URL}"
@@ -452,9 +482,23 @@ if test "${dryrun}" = 'false'; then
   apply_crds "${homeDir}"
 
   log "Deploying ${DEPLOY_FILE} to cluster ${CLUSTER_NAME}, namespace ${PING_CLOUD_NAMESPACE} for tenant ${TENANT_DOMAIN}"
-  kubectl apply -f "${DEPLOY_FILE}" --context "${K8S_CONTEXT}" | tee -a "${LOG_FILE}"
+  INCREMENTAL_APPLY_ARGS=(-f "${DEPLOY_FILE}" --context "${K8S_CONTEXT}" --namespace "${PING_CLOUD_NAMESPACE}"
+      --state-dir "${INCREMENTAL_APPLY_STATE_DIR}")
+  if test "${INCREMENTAL_APPLY}" = 'true'; then
+    test "${INCREMENTAL_APPLY_PRUNE}" = 'true' && INCREMENTAL_APPLY_ARGS+=(--prune)
+    python3 "${INCREMENTAL_APPLY_PY}" "${INCREMENTAL_APPLY_ARGS[@]}" | tee -a "${LOG_FILE}"
+    APPLY_EXIT_CODE=${PIPESTATUS[0]}
+  else
+    kubectl apply -f "${DEPLOY_FILE}" --context "${K8S_CONTEXT}" | tee -a "${LOG_FILE}"
+    APPLY_EXIT_CODE=${PIPESTATUS[0]}
+
+    # A full apply resets the saved state, so that a later incremental apply starts from what was applied here
+    if test "${APPLY_EXIT_CODE}" = 0 && type python3 > /dev/null 2>&1; then
+      python3 "${INCREMENTAL_APPLY_PY}" "${INCREMENTAL_APPLY_ARGS[@]}" --full --record-only > /dev/null
+    fi
+  fi
 
-  if [[ "${PIPESTATUS[0]}" != 0 ]]; then
+  if [[ "${APPLY_EXIT_CODE}" != 0 ]]; then
     echo -e "\033[31m->>>> Non-zero exit code while applying changes to cluster ^^^^^\033[0m"
     exit 1
   else
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Serve the git-ops-command.sh render metrics to Prometheus at /metrics. Only the metrics file is served, and none of
+the other files of its directory, e.g. the JSON lines of the render timings.
+
+It runs in a sidecar of the ArgoCD repo server, from the ArgoCD image, which has python3 under /usr/bin/python3.
+"""
+import http.server
+import os
+
+METRICS_FILE = os.environ.get("GIT_OPS_METRICS_FILE", "/git-ops-metrics/git-ops-command.prom")
+PORT = int(os.environ.get("GIT_OPS_METRICS_PORT", "9110"))
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            with open(METRICS_FILE, "rb") as metrics_file:
+                body = metrics_file.read()
+        except FileNotFoundError:
+            # Nothing has been rendered since the pod started
+            body = b""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, message_format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    http.server.HTTPServer(("", PORT), MetricsHandler).serve_forever()
@@ -8,6 +8,11 @@
 
 LOG_FILE=/tmp/git-ops-command.log
 
+# Per-phase timings of every render are appended as JSON lines to GIT_OPS_TIMING_FILE, keeping at most
+# GIT_OPS_TIMING_MAX_LINES lines, and the last render of each target is written to GIT_OPS_METRICS_FILE in the
+# Prometheus text format. Either is disabled when unset.
+GIT_OPS_TIMING_MAX_LINES="${GIT_OPS_TIMING_MAX_LINES:-1000}"
+
 ########################################################################################################################
 # Add the provided message to LOG_FILE.
 #
@@ -23,6 +28,185 @@ log() {
   fi
 }
 
+########################################################################################################################
+# Print the current time in microseconds since the epoch.
+########################################################################################################################
+now_us() {
+  if test -n "${EPOCHREALTIME}"; then
+    echo "${EPOCHREALTIME//[!0-9]/}"
+  else
+    echo $(( $(date +%s%N) / 1000 ))
+  fi
+}
+
+########################################################################################################################
+# Start timing a phase of the render.
+########################################################################################################################
+phase_begin() {
+  PHASE_START_US="$(now_us)"
+}
+
+########################################################################################################################
+# Record the duration of the phase started by the last phase_begin. Phases recorded more than once are added up.
+#
+# Arguments
+#   $1 -> The phase name.
+########################################################################################################################
+phase_end() {
+  if test -n "${PHASE_TIMINGS}"; then
+    echo "${1} $(( $(now_us) - PHASE_START_US ))" >> "${PHASE_TIMINGS}"
+  fi
+}
+
+########################################################################################################################
+# Run a command while holding an exclusive lock on a file, if flock is available.
+#
+# Arguments
+#   $1 -> The file to lock.
+#   ${@:2} -> The command to run.
+########################################################################################################################
+with_lock() {
+  lock_file="${1}.lock"
+  shift
+  if type flock >/dev/null 2>&1; then
+    (
+      flock -w 5 9 || true
+      "$@"
+    ) 9>"${lock_file}"
+  else
+    "$@"
+  fi
+}
+
+########################################################################################################################
+# Append a JSON line to the timing file, dropping the oldest lines beyond GIT_OPS_TIMING_MAX_LINES.
+#
+# Arguments
+#   $1 -> The JSON line.
+########################################################################################################################
+append_timing() {
+  echo "${1}" >> "${GIT_OPS_TIMING_FILE}"
+  if test "$(wc -l < "${GIT_OPS_TIMING_FILE}")" -gt "${GIT_OPS_TIMING_MAX_LINES}"; then
+    tail -n "${GIT_OPS_TIMING_MAX_LINES}" "${GIT_OPS_TIMING_FILE}" > "${GIT_OPS_TIMING_FILE}.tmp"
+    mv "${GIT_OPS_TIMING_FILE}.tmp" "${GIT_OPS_TIMING_FILE}"
+  fi
+}
+
+########################################################################################################################
+# Replace the samples of one render target in the metrics file, keeping those of the other targets, and increment its
+# render counter.
+#
+# Arguments
+#   $1 -> The labels identifying the target, e.g. app="ping-cloud",target="us-west-2".
+#   $2 -> The file with the new samples of the target, without the render counter.
+#   $3 -> The result of the render, i.e. success or failure.
+########################################################################################################################
+update_metrics() {
+  labels="${1}"
+  samples_file="${2}"
+  result="${3}"
+
+  test -f "${GIT_OPS_METRICS_FILE}" || touch "${GIT_OPS_METRICS_FILE}"
+  counter="git_ops_command_renders_total{${labels},result=\"${result}\"}"
+  count="$(awk -v counter="${counter}" '$1 == counter { print $2 }' "${GIT_OPS_METRICS_FILE}")"
+  echo "${counter} $(( ${count:-0} + 1 ))" >> "${samples_file}"
+
+  # Keep the samples of the other targets, and the render counters of this target for the other result
+  {
+    awk -v labels="{${labels}" -v counter="${counter}" '
+      !/^#/ && $1 != counter && (index($0, labels) == 0 || /^git_ops_command_renders_total[{]/)
+    ' "${GIT_OPS_METRICS_FILE}"
+    cat "${samples_file}"
+  } |
+    sort |
+    awk '
+      BEGIN {
+        help["git_ops_command_phase_duration_seconds"] = "gauge Duration of each phase of the last render."
+        help["git_ops_command_render_duration_seconds"] = "gauge Duration of the last render."
+        help["git_ops_command_render_success"] = "gauge Whether the last render succeeded."
+        help["git_ops_command_output_bytes"] = "gauge Size of the output of the last render."
+        help["git_ops_command_output_resources"] = "gauge Number of resources in the output of the last render."
+        help["git_ops_command_last_render_timestamp_seconds"] = "gauge Time of the last render."
+        help["git_ops_command_renders_total"] = "counter Number of renders by result."
+      }
+      NF == 2 {
+        name = $1
+        sub(/\{.*/, "", name)
+        if (name != last && name in help) {
+          type = help[name]
+          sub(/ .*/, "", type)
+          text = help[name]
+          sub(/^[^ ]* /, "", text)
+          print "# HELP " name " " text
+          print "# TYPE " name " " type
+        }
+        last = name
+        print
+      }' > "${GIT_OPS_METRICS_FILE}.tmp"
+  mv "${GIT_OPS_METRICS_FILE}.tmp" "${GIT_OPS_METRICS_FILE}"
+}
+
+########################################################################################################################
+# Write the timings, output size and resource count of the render to the timing and metrics files, if enabled.
+#
+# Arguments
+#   $1 -> The exit code of the render.
+########################################################################################################################
+record_render() {
+  exit_code="${1}"
+  test -z "${GIT_OPS_TIMING_FILE}" && test -z "${GIT_OPS_METRICS_FILE}" && return 0
+  test -z "${PHASE_TIMINGS}" && return 0
+
+  result=success
+  test "${exit_code}" -ne 0 && result=failure
+
+  end_us="$(now_us)"
+  app="${ARGOCD_APP_NAME:-${TARGET_DIR_SHORT}}"
+  app="${app//[\"\\]/}"
+  target="${TARGET_DIR_SHORT//[\"\\]/}"
+
+  if test -n "${GIT_OPS_TIMING_FILE}"; then
+    json="$(awk -v app="${app}" -v target="${target}" -v result="${result}" -v exit_code="${exit_code}" \
+        -v start_us="${RENDER_START_US}" -v end_us="${end_us}" -v output_bytes="${OUTPUT_BYTES:-0}" \
+        -v resources="${OUTPUT_RESOURCES:-0}" '
+      { duration[$1] += $2; if (!($1 in seen)) { seen[$1] = 1; order[++count] = $1 } }
+      END {
+        printf "{\"timestamp\":%.3f,\"app\":\"%s\",\"target\":\"%s\",\"result\":\"%s\",\"exit_code\":%d,",
+            end_us / 1000000, app, target, result, exit_code
+        printf "\"duration_seconds\":%.6f,\"output_bytes\":%d,\"resources\":%d,\"phases\":{",
+            (end_us - start_us) / 1000000, output_bytes, resources
+        for (i = 1; i <= count; i++) {
+          printf "%s\"%s\":%.6f", (i > 1 ? "," : ""), order[i], duration[order[i]] / 1000000
+        }
+        print "}}"
+      }' "${PHASE_TIMINGS}")"
+    mkdir -p "$(dirname "${GIT_OPS_TIMING_FILE}")"
+    with_lock "${GIT_OPS_TIMING_FILE}" append_timing "${json}"
+  fi
+
+  if test -n "${GIT_OPS_METRICS_FILE}"; then
+    labels="app=\"${app}\",target=\"${target}\""
+    samples_file="${PHASE_TIMINGS}.prom"
+    awk -v labels="${labels}" '
+      { duration[$1] += $2 }
+      END {
+        for (phase in duration) {
+          printf "git_ops_command_phase_duration_seconds{%s,phase=\"%s\"} %.6f\n", labels, phase, duration[phase] / 1000000
+        }
+      }' "${PHASE_TIMINGS}" > "${samples_file}"
+    {
+      printf 'git_ops_command_render_duration_seconds{%s} %.6f\n' "${labels}" \
+          "$(awk -v d=$(( end_us - RENDER_START_US )) 'BEGIN { print d / 1000000 }')"
+      echo "git_ops_command_render_success{${labels}} $(test "${result}" = success && echo 1 || echo 0)"
+      echo "git_ops_command_output_bytes{${labels}} ${OUTPUT_BYTES:-0}"
+      echo "git_ops_command_output_resources{${labels}} ${OUTPUT_RESOURCES:-0}"
+      echo "git_ops_command_last_render_timestamp_seconds{${labels}} $(( end_us / 1000000 ))"
+    } >> "${samples_file}"
+    mkdir -p "$(dirname "${GIT_OPS_METRICS_FILE}")"
+    with_lock "${GIT_OPS_METRICS_FILE}" update_metrics "${labels}" "${samples_file}" "${result}"
+  fi
+}
+
 ########################################################################################################################
 # Substitute variables in all files in the provided directory with the values provided through the environments file.
 #
@@ -43,12 +227,19 @@ substitute_vars() {
   # Export the environment variables
   set -a; . "${env_file}"; set +a
 
-  for file in $(find "${subst_dir}" -type f); do
-    old_file="${file}.bak"
-    cp "${file}" "${old_file}"
+  # Only the files that reference the variables need substitution. The others may stay linked to the inputs.
+  if test "${RENDER_WORKSPACE}"; then
+    files="$(python3 "${RENDER_WORKSPACE}" substitutable --env-file "${env_file}" "${subst_dir}")"
+  else
+    files="$(find "${subst_dir}" -type f)"
+  fi
 
-    envsubst "${vars}" < "${old_file}" > "${file}"
-    rm -f "${old_file}"
+  # The files of a linked workspace are shared with the inputs, so they are replaced rather than written in place
+  for file in ${files}; do
+    new_file="${file}.subst"
+    cp -p "${file}" "${new_file}"
+    envsubst "${vars}" < "${file}" > "${new_file}"
+    mv "${new_file}" "${file}"
   done
 }
 
@@ -75,12 +266,21 @@ relative_path() {
 }
 
 ########################################################################################################################
-# Comments out feature flagged resources from k8s-configs kustomization.yaml files.
+# Comments out feature flagged resources from k8s-configs kustomization.yaml files. The flags are declared in
+# k8s-configs/feature-flags.json and the lines holding their markers are looked up in the precomputed
+# k8s-configs/feature-flags-index.json, so each affected file is rewritten once without searching the repository.
+# Branches without the index fall back to searching for every marker.
 #
 # Arguments
 #   $1 -> The directory containing k8s-configs.
 ########################################################################################################################
 feature_flags() {
+  flags_tool="${1}/k8s-configs/cluster-tools/base/git-ops/validation/feature_flags.py"
+  if test -f "${1}/k8s-configs/feature-flags-index.json" && test -f "${flags_tool}" && type python3 >/dev/null 2>&1; then
+    log "$(python3 "${flags_tool}" --repo "${1}" apply)"
+    return
+  fi
+
   cd "${1}/k8s-configs"
 
   # Map with the feature flag environment variable & the term to search to find the kustomization files
@@ -126,11 +326,18 @@ kustomize_version() {
 }
 
 ########################################################################################################################
-# Clean up on exit. If non-zero exit, then print the log file to stdout before deleting it. Change back to the previous
-# directory. Delete the kustomize build directory, if it exists.
+# Clean up on exit. Record the timings of the render. If non-zero exit, then print the log file to stdout before
+# deleting it. Change back to the previous directory. Delete the kustomize build directory, if it exists.
 ########################################################################################################################
 cleanup() {
-  test $? -ne 0 && cat "${LOG_FILE}"
+  exit_code=$?
+  record_render "${exit_code}" || log "WARN: unable to record the render timings"
+  rm -f "${PHASE_TIMINGS}" "${PHASE_TIMINGS}.prom"
+
+  if [[ "${DEBUG}" == "true" ]]; then
+    return
+  fi
+  test ${exit_code} -ne 0 && cat "${LOG_FILE}"
   rm -f "${LOG_FILE}"
   cd - >/dev/null 2>&1
   test ! -z "${TMP_DIR}" && rm -rf "${TMP_DIR}"
@@ -138,26 +345,46 @@ cleanup() {
 
 # Main script
 
-# Validate descriptor.json file in a multi-region environment
-if [[ "${IS_MULTI_CLUSTER}" == "true" ]]; then
-  if [[ -f ./base/ping-cloud/descriptor.json ]]; then
-    # Verify JSON and descriptor file content is valid
-    python3 ./validation/verify_descriptor_json.py ./base/ping-cloud/descriptor.json
-  fi
-
+RENDER_START_US="$(now_us)"
+if test -n "${GIT_OPS_TIMING_FILE}" || test -n "${GIT_OPS_METRICS_FILE}"; then
+  PHASE_TIMINGS="$(mktemp)"
 fi
+
+# Trap all exit codes from here on so cleanup is run. In debug mode, only the render timings are recorded.
+trap "cleanup" EXIT
+
 TARGET_DIR="${1:-.}"
 cd "${TARGET_DIR}" >/dev/null 2>&1
 
-if [[ "${DEBUG}" != "true" ]]; then
-  # Trap all exit codes from here on so cleanup is run
-  trap "cleanup" EXIT
-fi
-
 # Get short and full directory names of the target directory
 TARGET_DIR_FULL="$(pwd)"
 TARGET_DIR_SHORT="$(basename "${TARGET_DIR_FULL}")"
 
+# Validate descriptor.json, the env_vars files, the kustomization references and secrets.yaml of the cluster state
+# repo in one pass before rendering. Files unchanged since the last render are not validated again.
+K8S_CONFIGS_DIR="$(cd "${TARGET_DIR_FULL}/.."; pwd)"
+CLUSTER_STATE_VALIDATOR="${K8S_CONFIGS_DIR}/validation/validate_cluster_state.py"
+phase_begin
+if test -f "${CLUSTER_STATE_VALIDATOR}" && command -v python3 >/dev/null; then
+  validator_args=(--quiet)
+  if [[ "${IS_MULTI_CLUSTER}" == "true" ]]; then
+    validator_args+=(--multi-region)
+  fi
+  if ! validation_output="$(python3 "${CLUSTER_STATE_VALIDATOR}" "${validator_args[@]}" "${K8S_CONFIGS_DIR}" 2>&1)"; then
+    log "${validation_output}"
+    echo "${validation_output}" >&2
+    exit 1
+  fi
+  log "${validation_output}"
+elif [[ "${IS_MULTI_CLUSTER}" == "true" ]]; then
+  # Validate descriptor.json file in a multi-region environment
+  if [[ -f "${K8S_CONFIGS_DIR}/base/ping-cloud/descriptor.json" ]]; then
+    # Verify JSON and descriptor file content is valid
+    python3 "${K8S_CONFIGS_DIR}/validation/verify_descriptor_json.py" "${K8S_CONFIGS_DIR}/base/ping-cloud/descriptor.json"
+  fi
+fi
+phase_end validation
+
 # Directory paths relative to TARGET_DIR
 BASE_DIR='../base'
 
@@ -171,14 +398,32 @@ else
 fi
 BUILD_DIR="${TMP_DIR}/${TARGET_DIR_SHORT}"
 
+# Build the workspace with links to the templates, if the cluster state repo has the workspace builder. Otherwise, copy
+# the templates. The files are reflinked by default, i.e. shared copy-on-write, or copied where that's not supported.
+# GIT_OPS_LINK_MODE=hardlink or symlink shares the files of the checkout itself. That is only safe as long as every
+# change to the workspace below replaces its file instead of writing to it, as substitute_vars and rewrite-urls do.
+RENDER_WORKSPACE="${K8S_CONFIGS_DIR}/validation/render_workspace.py"
+if test ! -f "${RENDER_WORKSPACE}" || ! type python3 >/dev/null 2>&1; then
+  RENDER_WORKSPACE=
+fi
+
 # Copy contents of target directory into temporary directory
-log "copying '${TARGET_DIR_FULL}' templates into '${TMP_DIR}'"
-cp -pr "${TARGET_DIR_FULL}" "${TMP_DIR}"
+phase_begin
+if test "${RENDER_WORKSPACE}"; then
+  workspace_sources="${TARGET_DIR_FULL}"
+  test -d "${BASE_DIR}" && workspace_sources="${workspace_sources} ${BASE_DIR}"
+  log "linking ${workspace_sources} templates into '${TMP_DIR}'"
+  log "$(python3 "${RENDER_WORKSPACE}" link --mode "${GIT_OPS_LINK_MODE:-auto}" --dest "${TMP_DIR}" ${workspace_sources})"
+else
+  log "copying '${TARGET_DIR_FULL}' templates into '${TMP_DIR}'"
+  cp -pr "${TARGET_DIR_FULL}" "${TMP_DIR}"
 
-if test -d "${BASE_DIR}"; then
-  log "copying '${BASE_DIR}' templates into '${TMP_DIR}'" && \
-  cp -pr "${BASE_DIR}" "${TMP_DIR}"
+  if test -d "${BASE_DIR}"; then
+    log "copying '${BASE_DIR}' templates into '${TMP_DIR}'" && \
+    cp -pr "${BASE_DIR}" "${TMP_DIR}"
+  fi
 fi
+phase_end copy
 
 # If there's an environment file, then perform substitution
 if test -f 'env_vars'; then
@@ -191,12 +436,21 @@ if test -f 'env_vars'; then
     env_vars_file=env_vars
 
     if test -f "${BASE_ENV_VARS}"; then
+      phase_begin
       env_vars_file="$(mktemp)"
       awk 1 env_vars "${BASE_ENV_VARS}" > "${env_vars_file}"
+      phase_end env_vars_merge
+
+      phase_begin
       substitute_vars "${env_vars_file}" "${BASE_DIR}"
+      phase_end substitute_vars
     fi
 
+    phase_begin
     substitute_vars "${env_vars_file}" .
+    phase_end substitute_vars
+
+    phase_begin
 
     PCB_TMP="${TMP_DIR}/${K8S_GIT_BRANCH}"
 
@@ -213,21 +467,33 @@ if test -f 'env_vars'; then
       log "cloning git branch '${K8S_GIT_BRANCH}' from: ${K8S_GIT_URL}"
       git clone -c advice.detachedHead=false -q --depth=1 -b "${K8S_GIT_BRANCH}" --single-branch "${K8S_GIT_URL}" "${PCB_TMP}"
     fi
+    phase_end clone
+
+    phase_begin
 
     log "replacing remote repo URL '${K8S_GIT_URL}' with locally cloned repo at ${PCB_TMP}"
-    kust_files="$(find "${TMP_DIR}" -name kustomization.yaml | grep -wv "${K8S_GIT_BRANCH}")"
-
-    for kust_file in ${kust_files}; do
-      rel_resource_dir="$(relative_path "$(dirname "${kust_file}")" "${PCB_TMP}")"
-      log "replacing ${K8S_GIT_URL} in file ${kust_file} with ${rel_resource_dir}"
-      sed -i.bak \
-          -e "s|${K8S_GIT_URL}|${rel_resource_dir}|g" \
-          -e "s|\?ref=${K8S_GIT_BRANCH}$||g" \
-          "${kust_file}"
-      rm -f "${kust_file}".bak
-    done
+    if test "${RENDER_WORKSPACE}"; then
+      # Rewrite all the kustomization files in one pass
+      log "$(python3 "${RENDER_WORKSPACE}" rewrite-urls --root "${TMP_DIR}" --repo-dir "${PCB_TMP}" \
+          --url "${K8S_GIT_URL}" --branch "${K8S_GIT_BRANCH}")"
+    else
+      kust_files="$(find "${TMP_DIR}" -name kustomization.yaml | grep -wv "${K8S_GIT_BRANCH}")"
 
+      for kust_file in ${kust_files}; do
+        rel_resource_dir="$(relative_path "$(dirname "${kust_file}")" "${PCB_TMP}")"
+        log "replacing ${K8S_GIT_URL} in file ${kust_file} with ${rel_resource_dir}"
+        sed -i.bak \
+            -e "s|${K8S_GIT_URL}|${rel_resource_dir}|g" \
+            -e "s|\?ref=${K8S_GIT_BRANCH}$||g" \
+            "${kust_file}"
+        rm -f "${kust_file}".bak
+      done
+    fi
+    phase_end kustomization_url_rewrite
+
+    phase_begin
     feature_flags "${TMP_DIR}/${K8S_GIT_BRANCH}"
+    phase_end feature_flags
   )
   test $? -ne 0 && exit 1
 fi
@@ -250,18 +516,34 @@ else
 fi
 
 # Build the uber deploy yaml
+phase_begin
 if [[ ${DEBUG} == "true" ]]; then
   log "DEBUG - generating uber yaml file from '${BUILD_DIR}' to /tmp/uber-debug.yaml"
   kustomize build ${build_load_arg} ${build_load_arg_value} "${BUILD_DIR}" --output /tmp/uber-debug.yaml
+  OUTPUT_FILES=/tmp/uber-debug.yaml
 # Output the yaml to stdout for Argo when operating normally
 elif test -z "${OUT_DIR}" || test ! -d "${OUT_DIR}"; then
   log "generating uber yaml file from '${BUILD_DIR}' to stdout"
-  kustomize build ${build_load_arg} ${build_load_arg_value} "${BUILD_DIR}"
+  if test -n "${PHASE_TIMINGS}"; then
+    # Build into a file first, so its size and resource count can be recorded
+    OUTPUT_FILES="${TMP_DIR}/uber.yaml"
+    kustomize build ${build_load_arg} ${build_load_arg_value} "${BUILD_DIR}" > "${OUTPUT_FILES}"
+    cat "${OUTPUT_FILES}"
+  else
+    kustomize build ${build_load_arg} ${build_load_arg_value} "${BUILD_DIR}"
+  fi
 # TODO: leave this functionality for now - it outputs many yaml files to the OUT_DIR
 # it isn't clear if this is still used in actual CDEs
 else
   log "generating yaml files from '${BUILD_DIR}' to '${OUT_DIR}'"
   kustomize build ${build_load_arg} ${build_load_arg_value} "${BUILD_DIR}" --output "${OUT_DIR}"
+  OUTPUT_FILES="${OUT_DIR}"
+fi
+phase_end kustomize_build
+
+if test -n "${PHASE_TIMINGS}" && test -n "${OUTPUT_FILES}"; then
+  OUTPUT_BYTES="$(find "${OUTPUT_FILES}" -type f -exec cat {} + | wc -c | tr -d ' ')"
+  OUTPUT_RESOURCES="$(find "${OUTPUT_FILES}" -type f -exec cat {} + | grep -c '^kind:' || true)"
 fi
 
 exit 0
\ No newline at end of file
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Both files live in the k8s-configs directory of ping-cloud-base. Flags are declared by hand in FLAGS_FILE, and
+# INDEX_FILE is generated from the kustomization files with 'feature_flags.py generate'.
+FLAGS_FILE = "feature-flags.json"
+INDEX_FILE = "feature-flags-index.json"
+
+KUSTOMIZATION_FILE = "kustomization.yaml"
+
+# A feature flag marker, e.g. ff-radius-proxy in '- ff-radius-proxy/pingfederate-radsecproxy.yaml'
+MARKER_REGEX = re.compile(r"(?<![A-Za-z0-9_-])ff-[a-z0-9]+(?:-[a-z0-9]+)*")
+
+COMMENT_REGEX = re.compile(r"^#*")
+
+
+def read_json(path: str) -> {}:
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def write_json(path: str, value: {}):
+    with open(path, "w") as json_file:
+        json.dump(value, json_file, indent=2, sort_keys=True)
+        json_file.write("\n")
+
+
+def kustomization_files(repo_dir: str) -> [str]:
+    """The kustomization files under k8s-configs, relative to the repository, from git if possible"""
+    try:
+        output = subprocess.run(["git", "ls-files", "-z", "k8s-configs"], cwd=repo_dir, check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode()
+        paths = [path for path in output.split("\0") if path]
+    except (OSError, subprocess.CalledProcessError):
+        paths = []
+        for root, dirs, files in os.walk(os.path.join(repo_dir, "k8s-configs")):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            paths += [os.path.relpath(os.path.join(root, name), repo_dir) for name in files]
+    return sorted(path for path in paths if os.path.basename(path) == KUSTOMIZATION_FILE)
+
+
+def build_index(repo_dir: str, flags: {}) -> ({}, {}):
+    """
+    Find the lines of every kustomization file that hold a feature flag marker
+    :return: The index of each declared marker to its files and line numbers, and the undeclared markers to the files
+             using them
+    """
+    index = {marker: {} for marker in flags}
+    undeclared = {}
+    for path in kustomization_files(repo_dir):
+        with open(os.path.join(repo_dir, path), errors="replace") as kustomization:
+            for line_number, line in enumerate(kustomization, start=1):
+                if "ff-" not in line:
+                    continue
+                for marker in flags:
+                    if marker in line:
+                        index[marker].setdefault(path, []).append(line_number)
+                for marker in MARKER_REGEX.findall(line):
+                    if marker not in flags:
+                        undeclared.setdefault(marker, set()).add(path)
+    return index, undeclared
+
+
+def disabled_markers(flags: {}, environ=os.environ) -> [str]:
+    """A flag is enabled only if its variable is exactly 'true', as in the original feature_flags function"""
+    return sorted(marker for marker, flag in flags.items() if environ.get(flag["variable"]) != "true")
+
+
+def comment_out(repo_dir: str, index: {}, markers: [str]) -> {}:
+    """
+    Comment out the indexed lines of the markers, rewriting each affected file once. A line that no longer holds its
+    marker means the index is stale for that file, so the whole file is searched for the marker instead.
+    :return: The number of lines commented out in each file
+    """
+    lines_by_path = {}
+    for marker in markers:
+        for path, line_numbers in index.get(marker, {}).items():
+            lines_by_path.setdefault(path, []).append((marker, line_numbers))
+
+    changed = {}
+    for path, markers_and_lines in sorted(lines_by_path.items()):
+        full_path = os.path.join(repo_dir, path)
+        if not os.path.isfile(full_path):
+            continue
+        with open(full_path, newline="") as kustomization:
+            lines = kustomization.read().splitlines(keepends=True)
+
+        to_comment = set()
+        for marker, line_numbers in markers_and_lines:
+            if all(n <= len(lines) and marker in lines[n - 1] for n in line_numbers):
+                to_comment.update(n - 1 for n in line_numbers)
+            else:
+                to_comment.update(i for i, line in enumerate(lines) if marker in line)
+
+        for i in to_comment:
+            lines[i] = COMMENT_REGEX.sub("#", lines[i], count=1)
+        with open(full_path, "w", newline="") as kustomization:
+            kustomization.writelines(lines)
+        changed[path] = len(to_comment)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the feature flag markers of the ping-cloud-base kustomizations")
+    parser.add_argument("--repo", default=".", help="Root of the ping-cloud-base repository")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help=f"Regenerate k8s-configs/{INDEX_FILE}")
+    generate_parser.add_argument("--check", action="store_true",
+                                 help="Only check that the index is up to date and every marker is declared")
+    subparsers.add_parser("apply", help="Comment out the markers of the flags that are not enabled in the environment")
+    args = parser.parse_args()
+
+    flags = read_json(os.path.join(args.repo, "k8s-configs", FLAGS_FILE))
+    index_path = os.path.join(args.repo, "k8s-configs", INDEX_FILE)
+
+    if args.command == "apply":
+        markers = disabled_markers(flags)
+        for marker in sorted(flags):
+            print(f"{marker} is set to {os.environ.get(flags[marker]['variable'], '')}")
+        for path, count in comment_out(args.repo, read_json(index_path), markers).items():
+            print(f"Commented out {count} lines in {path}")
+        return
+
+    index, undeclared = build_index(args.repo, flags)
+    for marker, paths in sorted(undeclared.items()):
+        print(f"Marker {marker} is not declared in k8s-configs/{FLAGS_FILE}, used in: {', '.join(sorted(paths))}",
+              file=sys.stderr)
+
+    if args.check:
+        current = read_json(index_path) if os.path.isfile(index_path) else None
+        if current != index:
+            print(f"k8s-configs/{INDEX_FILE} is stale, run: python3 {os.path.relpath(__file__, args.repo)} generate",
+                  file=sys.stderr)
+            sys.exit(1)
+        if undeclared:
+            sys.exit(1)
+        print(f"k8s-configs/{INDEX_FILE} is up to date")
+    else:
+        write_json(index_path, index)
+        print(f"Wrote k8s-configs/{INDEX_FILE}")
+        if undeclared:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
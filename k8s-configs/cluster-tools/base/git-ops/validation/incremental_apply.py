@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+from k8s_manifests import ManifestIndex, Manifest, ResourceId, load_document
+
+# Batches are applied in this order, so the definitions and namespaces a resource depends on exist before it is applied
+BATCHES = ["crds", "namespaces", "cluster-scoped", "namespaced"]
+
+# The built-in cluster-scoped kinds. Any other kind is namespaced, unless a CRD of the stream defines it with the Cluster
+# scope. The scope cannot be told from metadata.namespace, which is often left to the namespace of the apply.
+CLUSTER_SCOPED_KINDS = frozenset([
+    "APIService", "CertificateSigningRequest", "ClusterRole", "ClusterRoleBinding", "ComponentStatus", "CSIDriver",
+    "CSINode", "CustomResourceDefinition", "FlowSchema", "IngressClass", "MutatingWebhookConfiguration", "Namespace",
+    "Node", "PersistentVolume", "PodSecurityPolicy", "PriorityClass", "PriorityLevelConfiguration", "RuntimeClass",
+    "StorageClass", "ValidatingAdmissionPolicy", "ValidatingAdmissionPolicyBinding", "ValidatingWebhookConfiguration",
+    "VolumeAttachment",
+])
+
+
+def default_state_dir() -> str:
+    """The default --state-dir, resolved on every call so that pcb daemon requests use the caller's XDG_CACHE_HOME"""
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "ping-cloud-base",
+                        "apply-state")
+
+
+def resource_key(manifest: Manifest) -> str:
+    """
+    The identity of a resource across applies. The version is left out of the API group, so that moving a resource
+    to a new API version changes it rather than adding one resource and removing another.
+    """
+    api_version = manifest.id.api_version or ""
+    group = api_version.rsplit("/", 1)[0] if "/" in api_version else ""
+    return "/".join([group, manifest.id.kind or "", manifest.id.namespace or "", manifest.id.name or ""])
+
+
+def batch_of(resource_id: ResourceId, cluster_scoped_kinds: frozenset = CLUSTER_SCOPED_KINDS) -> str:
+    if resource_id.kind == "CustomResourceDefinition":
+        return "crds"
+    if resource_id.kind == "Namespace":
+        return "namespaces"
+    if resource_id.kind in cluster_scoped_kinds:
+        return "cluster-scoped"
+    return "namespaced"
+
+
+def cluster_scoped_kinds(index: ManifestIndex) -> frozenset:
+    """The built-in cluster-scoped kinds, and the kinds that the CRDs of the stream define with the Cluster scope"""
+    kinds = set(CLUSTER_SCOPED_KINDS)
+    for manifest in index.select(kind="CustomResourceDefinition"):
+        try:
+            spec = load_document(index.read(manifest)).get("spec") or {}
+        except Exception as e:
+            print(f"Cannot read the scope of {manifest.id}, its resources are treated as namespaced: {e}",
+                  file=sys.stderr)
+            continue
+        if spec.get("scope") == "Cluster" and (spec.get("names") or {}).get("kind"):
+            kinds.add(spec["names"]["kind"])
+    return frozenset(kinds)
+
+
+def state_file(state_dir: str, context: str, namespace: str) -> str:
+    """The state of each (cluster, namespace) lives in its own file"""
+    safe = [re.sub(r"[^A-Za-z0-9_.-]", "_", value) for value in (context, namespace)]
+    return os.path.join(state_dir, safe[0], f"{safe[1]}.json")
+
+
+def read_state(path: str) -> {}:
+    """
+    Read the resources of the last successful apply
+    :return: A dict of resource key to its apiVersion, kind, namespace, name and sha256
+    """
+    try:
+        with open(path) as state:
+            return json.load(state).get("resources", {})
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        print(f"Ignoring unreadable apply state {path}: {e}", file=sys.stderr)
+        return {}
+
+
+def write_state(path: str, context: str, namespace: str, resources: {}):
+    """Replace the state file atomically, so an interrupted write never leaves a partial state behind"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False) as state:
+        json.dump({"context": context, "namespace": namespace, "resources": resources}, state, indent=1,
+                  sort_keys=True)
+    os.replace(state.name, path)
+
+
+def state_entry(manifest: Manifest) -> {}:
+    return {
+        "apiVersion": manifest.id.api_version,
+        "kind": manifest.id.kind,
+        "namespace": manifest.id.namespace,
+        "name": manifest.id.name,
+        "sha256": manifest.sha256,
+    }
+
+
+def entry_id(entry: {}) -> ResourceId:
+    return ResourceId(entry.get("apiVersion"), entry.get("kind"), entry.get("namespace"), entry.get("name"))
+
+
+def resource_stub(entry: {}) -> bytes:
+    """The smallest document that identifies a resource, which is all 'kubectl delete -f' needs"""
+    lines = [f"apiVersion: {entry['apiVersion']}", f"kind: {entry['kind']}", "metadata:",
+             f"  name: {json.dumps(entry['name'])}"]
+    if entry.get("namespace"):
+        lines.append(f"  namespace: {json.dumps(entry['namespace'])}")
+    return "\n".join(lines).encode() + b"\n"
+
+
+class Kubectl:
+    """Run kubectl against one cluster context. Any command that takes the same arguments may stand in for kubectl."""
+
+    def __init__(self, context: str = None, binary: str = "kubectl", log=None):
+        self.context = context
+        self.binary = binary
+        self.log = log or sys.stdout
+
+    def run(self, args: [str], content: bytes = None):
+        command = [self.binary, *args] + (["--context", self.context] if self.context else [])
+        result = subprocess.run(command, input=content, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.log.write(result.stdout.decode(errors="replace"))
+        self.log.flush()
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(args[:2])} failed with exit code {result.returncode}")
+
+    def apply(self, content: bytes):
+        self.run(["apply", "-f", "-"], content)
+
+    def delete(self, content: bytes):
+        self.run(["delete", "--ignore-not-found", "-f", "-"], content)
+
+    def wait_established(self, crd_names: [str], timeout: str = "60s"):
+        self.run(["wait", "--for", "condition=established", f"--timeout={timeout}",
+                  *[f"crd/{name}" for name in crd_names]])
+
+
+@dataclass
+class ApplyPlan:
+    added: [Manifest] = field(default_factory=list)
+    changed: [Manifest] = field(default_factory=list)
+    unchanged: [Manifest] = field(default_factory=list)
+    removed: {} = field(default_factory=dict)
+    cluster_scoped_kinds: frozenset = CLUSTER_SCOPED_KINDS
+
+    def batches(self) -> [(str, [Manifest])]:
+        """The added and changed manifests grouped by batch, in dependency order and then in stream order"""
+        grouped = {name: [] for name in BATCHES}
+        for manifest in sorted(self.added + self.changed, key=lambda m: m.offset):
+            grouped[batch_of(manifest.id, self.cluster_scoped_kinds)].append(manifest)
+        return [(name, grouped[name]) for name in BATCHES if grouped[name]]
+
+
+class IncrementalApply:
+    """
+    Apply only the resources of a rendered stack that were added or changed since the last successful apply to the
+    same cluster and namespace, by comparing the content hash of each resource to the one saved after that apply.
+    """
+
+    def __init__(self, index: ManifestIndex, state_path: str, context: str, namespace: str, kubectl: Kubectl):
+        self.index = index
+        self.state_path = state_path
+        self.context = context
+        self.namespace = namespace
+        self.kubectl = kubectl
+
+    def plan(self, full: bool = False) -> ApplyPlan:
+        previous = {} if full else read_state(self.state_path)
+        plan = ApplyPlan(cluster_scoped_kinds=cluster_scoped_kinds(self.index))
+        seen = set()
+        for manifest in self.index:
+            key = resource_key(manifest)
+            seen.add(key)
+            if key not in previous:
+                plan.added.append(manifest)
+            elif previous[key]["sha256"] != manifest.sha256:
+                plan.changed.append(manifest)
+            else:
+                plan.unchanged.append(manifest)
+        plan.removed = {key: entry for key, entry in read_state(self.state_path).items() if key not in seen}
+        return plan
+
+    def record(self):
+        """Save every resource of the stream as applied, e.g. after the whole stream was applied by other means"""
+        write_state(self.state_path, self.context, self.namespace,
+                    {resource_key(manifest): state_entry(manifest) for manifest in self.index})
+
+    def run(self, plan: ApplyPlan, prune: bool = False) -> bool:
+        """
+        Apply the plan batch by batch, stopping at the first failed batch. The state is saved after every successful
+        batch, so the next run retries only what failed.
+        :return: True if every batch succeeded
+        """
+        resources = read_state(self.state_path)
+        for manifest in plan.unchanged:
+            resources[resource_key(manifest)] = state_entry(manifest)
+
+        for name, manifests in plan.batches():
+            print(f"Applying {len(manifests)} {name} resources")
+            content = b"---\n".join(self.index.read(m).rstrip(b"\n") + b"\n" for m in manifests)
+            try:
+                self.kubectl.apply(content)
+                if name == "crds":
+                    self.kubectl.wait_established([m.id.name for m in manifests])
+            except RuntimeError as e:
+                print(f"Failed to apply {name} resources: {e}", file=sys.stderr)
+                write_state(self.state_path, self.context, self.namespace, resources)
+                return False
+            for manifest in manifests:
+                resources[resource_key(manifest)] = state_entry(manifest)
+            write_state(self.state_path, self.context, self.namespace, resources)
+
+        if prune and plan.removed:
+            print(f"Pruning {len(plan.removed)} removed resources")
+            # Delete in the reverse of the apply order, so namespaces and definitions go after what they hold
+            entries = sorted(plan.removed.items(),
+                             key=lambda item: -BATCHES.index(batch_of(entry_id(item[1]), plan.cluster_scoped_kinds)))
+            try:
+                self.kubectl.delete(b"---\n".join(resource_stub(entry) for _, entry in entries))
+            except RuntimeError as e:
+                print(f"Failed to prune removed resources: {e}", file=sys.stderr)
+                return False
+            for key, _ in entries:
+                resources.pop(key, None)
+        # Removed resources that were not pruned stay in the state, so that a later run may still prune them
+
+        write_state(self.state_path, self.context, self.namespace, resources)
+        print(f"Saved the state of {len(resources)} applied resources to {self.state_path}")
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply only the resources of a rendered stack that changed since the last successful apply to the "
+                    "same cluster and namespace")
+    parser.add_argument("-f", "--file", required=True, help="Rendered YAML stream to apply, or '-' for stdin")
+    parser.add_argument("--context", default=None, help="kubectl context of the cluster")
+    parser.add_argument("--namespace", required=True, help="Namespace of the stack; the state is kept per namespace")
+    state_dir = default_state_dir()
+    parser.add_argument("--state-dir", default=state_dir, help=f"Defaults to {state_dir}")
+    parser.add_argument("--prune", action="store_true", help="Delete resources that are no longer rendered")
+    parser.add_argument("--full", action="store_true", help="Apply every resource, and reset the saved state")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be applied and pruned")
+    parser.add_argument("--record-only", action="store_true",
+                        help="Save every resource as applied without applying anything, e.g. after a full apply")
+    parser.add_argument("--kubectl", default=os.environ.get("KUBECTL", "kubectl"), help="kubectl binary to run")
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    with ManifestIndex.from_file(args.file) as index:
+        incremental = IncrementalApply(index, state_file(args.state_dir, args.context or "default", args.namespace),
+                                       args.context, args.namespace, Kubectl(args.context, args.kubectl))
+        if args.record_only:
+            incremental.record()
+            print(f"Recorded {len(index)} resources in {incremental.state_path}")
+            return
+
+        if args.full and not args.dry_run:
+            print(f"Applying every resource and replacing the saved state in {incremental.state_path}")
+        plan = incremental.plan(full=args.full)
+        print(f"{len(plan.added)} added, {len(plan.changed)} changed, {len(plan.unchanged)} unchanged, "
+              f"{len(plan.removed)} removed since the last apply to {incremental.state_path}")
+
+        if args.dry_run:
+            for label, manifests in [("add", plan.added), ("change", plan.changed)]:
+                for manifest in manifests:
+                    print(f"  {label}: {manifest.id}")
+            for entry in plan.removed.values():
+                print(f"  {'prune' if args.prune else 'removed'}: {entry_id(entry)}")
+            return
+
+        succeeded = incremental.run(plan, prune=args.prune)
+
+    if succeeded:
+        pruned = len(plan.removed) if args.prune else 0
+        print(f"Applied {len(plan.added) + len(plan.changed)} resources ({len(plan.added)} added, "
+              f"{len(plan.changed)} changed), skipped {len(plan.unchanged)} unchanged and pruned {pruned} in "
+              f"{time.monotonic() - start:.1f}s")
+    sys.exit(0 if succeeded else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+import argparse
+import fnmatch
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass, field
+
+# Streams larger than this are spooled to disk when they cannot be re-read, e.g. stdin or kustomize output
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+BLOCK_SCALAR_INDICATORS = (b"|", b">")
+
+# A '---' document separator line, optionally followed by a comment. Any content after it on the same line is dropped.
+SEPARATOR_REGEX = re.compile(rb"^---(?:[ \t][^\n]*)?(?:\n|\Z)", re.MULTILINE)
+
+# The first line of a document that is not blank, a comment or a directive
+FIRST_CONTENT_REGEX = re.compile(rb"^[ \t]*[^\s#%][^\n]*", re.MULTILINE)
+
+# A 'key: value' or 'key:' line of the top-level mapping
+TOP_LEVEL_KEY_REGEX = re.compile(rb"^([^\s#\-{\[\"'][^:\n]*|\"[^\"\n]*\"|'[^'\n]*'):(?:[ \t]+([^\n]*?))?[ \t]*\r?$",
+                                 re.MULTILINE)
+
+METADATA_REGEX = re.compile(rb"^metadata:[ \t]*\r?\n", re.MULTILINE)
+TOP_LEVEL_LINE_REGEX = re.compile(rb"^[^\s#]", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class ResourceId:
+    api_version: str
+    kind: str
+    namespace: str
+    name: str
+
+    def __str__(self):
+        return "/".join(filter(None, [self.kind, self.namespace, self.name]))
+
+
+@dataclass
+class Manifest:
+    """The index entry of one document in a YAML stream. The document itself stays in the stream."""
+
+    id: ResourceId
+    offset: int
+    length: int
+    sha256: str
+    keys: tuple = ()
+    labels: dict = field(default_factory=dict)
+    annotations: dict = field(default_factory=dict)
+
+    def matches(self, api_version=None, kind=None, namespace=None, name=None, labels=None, annotations=None):
+        """Match the manifest against shell-style patterns for its identity, and exact label and annotation values"""
+        for pattern, value in [(api_version, self.id.api_version), (kind, self.id.kind),
+                               (namespace, self.id.namespace), (name, self.id.name)]:
+            if pattern is None:
+                continue
+            if not (fnmatch.fnmatchcase(value or "", pattern) if has_glob(pattern) else value == pattern):
+                return False
+        for expected, actual in [(labels, self.labels), (annotations, self.annotations)]:
+            for key, value in (expected or {}).items():
+                if actual.get(key) != value:
+                    return False
+        return True
+
+    def format(self, template, **extra):
+        return template.format(
+            api_version=self.id.api_version or "", kind=self.id.kind or "", namespace=self.id.namespace or "",
+            name=self.id.name or "", sha256=self.sha256, offset=self.offset, length=self.length,
+            keys=",".join(self.keys), **extra)
+
+
+def scalar(value: bytes) -> str:
+    """Decode a plain or quoted YAML scalar on a single line"""
+    value = value.strip()
+    if value.startswith((b'"', b"'")) and len(value) > 1 and value[-1:] == value[:1]:
+        return value[1:-1].decode(errors="replace")
+    comment = value.find(b" #")
+    if comment != -1:
+        value = value[:comment].rstrip()
+    return value.decode(errors="replace")
+
+
+def split_key(line: bytes) -> (bytes, bytes):
+    """Split a 'key: value' line into its key and value, or return a None key if it isn't one"""
+    key, sep, value = line.partition(b": ")
+    if not sep:
+        if not line.endswith(b":"):
+            return None, b""
+        key, value = line[:-1], b""
+    if key.startswith(b"- ") or key.startswith((b"{", b"[")):
+        return None, b""
+    return key.strip(b"\"'"), value
+
+
+def unquote(value: str) -> str:
+    """Strip the quotes around a single-line value"""
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def secret_data_values(document: bytes) -> [(int, str, str)]:
+    """
+    Read the entries of the top-level data mapping of a block-style Secret, including block scalars
+    :return: A list of (line number, key, value)
+    """
+    entries = []
+    lines = document.decode(errors="replace").splitlines()
+    in_data = False
+    data_indent = None
+    current = None
+    for number, raw in enumerate(lines, start=1):
+        stripped = raw.strip()
+        indent = len(raw) - len(raw.lstrip(" "))
+        if not stripped or stripped.startswith("#"):
+            continue
+        if indent == 0:
+            in_data = stripped.rstrip() == "data:"
+            data_indent = None
+            current = None
+            continue
+        if not in_data:
+            continue
+        if data_indent is None:
+            data_indent = indent
+        if indent == data_indent:
+            key, _, value = stripped.partition(":")
+            value = value.strip()
+            if value.startswith(("|", ">")):
+                current = [number, key.strip(), ""]
+                entries.append(current)
+            else:
+                current = None
+                entries.append([number, key.strip(), unquote(value.split(" #", 1)[0])])
+        elif current is not None:
+            current[2] += stripped
+    return [tuple(entry) for entry in entries]
+
+
+def scan_header(content: bytes) -> Manifest:
+    """
+    Read the identity, top-level keys, labels and annotations of a document without parsing it as a whole. Only the
+    top-level lines and the metadata block are looked at, which is enough for any block-style manifest such as the
+    output of kustomize. Returns None for documents that are not a block-style mapping.
+    """
+    first_line = FIRST_CONTENT_REGEX.search(content)
+    if not first_line or first_line.group(0).startswith((b"{", b"[", b"- ", b"-\n")):
+        return None
+
+    top = {}
+    keys = []
+    for key, value in TOP_LEVEL_KEY_REGEX.findall(content):
+        keys.append(key.decode(errors="replace"))
+        if value and not value.startswith(BLOCK_SCALAR_INDICATORS):
+            top[key] = scalar(value)
+
+    metadata = {}
+    labels = {}
+    annotations = {}
+    metadata_start = METADATA_REGEX.search(content)
+    if metadata_start:
+        metadata_end = TOP_LEVEL_LINE_REGEX.search(content, metadata_start.end())
+        block = content[metadata_start.end():metadata_end.start() if metadata_end else len(content)]
+        scan_metadata(block, metadata, labels, annotations)
+
+    resource_id = ResourceId(top.get(b"apiVersion"), top.get(b"kind"), metadata.get(b"namespace"),
+                             metadata.get(b"name"))
+    return Manifest(resource_id, 0, 0, "", tuple(keys), labels, annotations)
+
+
+def scan_metadata(block: bytes, metadata: {}, labels: {}, annotations: {}):
+    """Read the scalars directly under metadata, and the entries of metadata.labels and metadata.annotations"""
+    metadata_indent = None
+    subsection = None
+    subsection_indent = None
+
+    for line in block.splitlines():
+        stripped = line.lstrip(b" ")
+        if not stripped or stripped.startswith(b"#"):
+            continue
+        indent = len(line) - len(stripped)
+
+        if metadata_indent is None:
+            metadata_indent = indent
+        if indent == metadata_indent:
+            key, value = split_key(stripped)
+            subsection = key
+            subsection_indent = None
+            if key and value and not value.startswith(BLOCK_SCALAR_INDICATORS):
+                metadata[key] = scalar(value)
+        elif subsection in (b"labels", b"annotations") and indent > metadata_indent:
+            if subsection_indent is None:
+                subsection_indent = indent
+            if indent == subsection_indent:
+                key, value = split_key(stripped)
+                if key and not value.startswith(BLOCK_SCALAR_INDICATORS):
+                    target = labels if subsection == b"labels" else annotations
+                    target[key.decode(errors="replace")] = scalar(value)
+
+
+def load_document(content: bytes):
+    """Fully parse one document. PyYAML is only required here, JSON documents are parsed with the standard library."""
+    stripped = content.lstrip()
+    if stripped.startswith(b"{"):
+        import json
+        return json.loads(stripped)
+    import yaml
+    return yaml.load(content, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+def header_from_document(content: bytes) -> Manifest:
+    """Slow path for documents that are not block-style mappings, e.g. flow-style YAML or JSON"""
+    try:
+        document = load_document(content)
+    except Exception:
+        document = None
+    if not isinstance(document, dict):
+        return Manifest(ResourceId(None, None, None, None), 0, 0, "")
+
+    metadata = document.get("metadata") or {}
+    resource_id = ResourceId(document.get("apiVersion"), document.get("kind"), metadata.get("namespace"),
+                             metadata.get("name"))
+    return Manifest(resource_id, 0, 0, "", tuple(document), dict(metadata.get("labels") or {}),
+                    dict(metadata.get("annotations") or {}))
+
+
+def iter_documents(stream):
+    """
+    Read a multi-document YAML stream lazily, one document at a time
+    :param stream: Binary file object
+    :return: Generator of (offset, content) for each non-empty document, where offset is the byte offset of its content
+    """
+    offset = 0
+    buffer = b""
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+        for separator in SEPARATOR_REGEX.finditer(buffer):
+            content = buffer[position:separator.start()]
+            if FIRST_CONTENT_REGEX.search(content):
+                yield offset + position, content
+            position = separator.end()
+
+        if not chunk:
+            content = buffer[position:]
+            if FIRST_CONTENT_REGEX.search(content):
+                yield offset + position, content
+            return
+
+        # Keep the last, possibly incomplete, document for the next chunk
+        offset += position
+        buffer = buffer[position:]
+
+
+class ManifestIndex:
+    """
+    An index of the documents of a YAML stream by (apiVersion, kind, namespace, name). Each entry holds the byte offset
+    and content hash of its document, so queries never touch the stream and only the selected documents are read back.
+    """
+
+    def __init__(self, source, manifests: [Manifest], owns_source: bool = False):
+        self.source = source
+        self.manifests = manifests
+        self.owns_source = owns_source
+        self.by_kind_name = {}
+        for manifest in manifests:
+            self.by_kind_name.setdefault((manifest.id.kind, manifest.id.name), []).append(manifest)
+
+    @classmethod
+    def build(cls, stream, seekable: bool = None):
+        """
+        Index a binary stream. A stream that cannot be re-read, e.g. stdin or a pipe, is copied into a spooled
+        temporary file while it is indexed.
+        """
+        if seekable is None:
+            seekable = stream.seekable()
+
+        source = stream
+        reader = stream
+        if not seekable:
+            source = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            reader = TeeReader(stream, source)
+
+        manifests = []
+        for offset, content in iter_documents(reader):
+            manifest = scan_header(content)
+            if manifest is None or manifest.id.kind is None:
+                manifest = header_from_document(content)
+            manifest.offset = offset
+            manifest.length = len(content)
+            manifest.sha256 = hashlib.sha256(content.rstrip()).hexdigest()
+            manifests.append(manifest)
+        return cls(source, manifests, owns_source=not seekable)
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Index a file, or stdin if the path is '-'"""
+        if path == "-":
+            return cls.build(sys.stdin.buffer, seekable=False)
+        index = cls.build(open(path, "rb"), seekable=True)
+        index.owns_source = True
+        return index
+
+    @classmethod
+    def from_kustomize(cls, path: str, build_args: [str] = None):
+        """Index the output of 'kustomize build' as it streams"""
+        process = subprocess.Popen(["kustomize", "build", *(build_args or []), path], stdout=subprocess.PIPE)
+        try:
+            index = cls.build(process.stdout, seekable=False)
+        finally:
+            process.stdout.close()
+        if process.wait() != 0:
+            index.close()
+            raise RuntimeError(f"kustomize build {path} failed with exit code {process.returncode}")
+        return index
+
+    def close(self):
+        if self.owns_source:
+            self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.manifests)
+
+    def __iter__(self):
+        return iter(self.manifests)
+
+    def get(self, kind: str, name: str, namespace: str = None, api_version: str = None) -> Manifest:
+        """Look up a single manifest by its identity; the api version is only needed to tell apart duplicates"""
+        for manifest in self.select(kind=kind, name=name, namespace=namespace, api_version=api_version):
+            return manifest
+        return None
+
+    def select(self, **criteria) -> [Manifest]:
+        """Return the manifests matching the criteria of Manifest.matches, in stream order"""
+        kind, name = criteria.get("kind"), criteria.get("name")
+        if kind and name and not has_glob(kind) and not has_glob(name):
+            return [m for m in self.by_kind_name.get((kind, name), []) if m.matches(**criteria)]
+        return [manifest for manifest in self.manifests if manifest.matches(**criteria)]
+
+    def read(self, manifest: Manifest) -> bytes:
+        """Read the document of a manifest back from the stream"""
+        self.source.seek(manifest.offset)
+        return self.source.read(manifest.length)
+
+    def load(self, manifest: Manifest):
+        """Parse the document of a manifest. Requires PyYAML for YAML documents."""
+        return load_document(self.read(manifest))
+
+    def write(self, manifests: [Manifest], out):
+        """Write the documents of the manifests as a multi-document YAML stream to a binary file object"""
+        for i, manifest in enumerate(manifests):
+            if i:
+                out.write(b"---\n")
+            content = self.read(manifest)
+            out.write(content)
+            if not content.endswith(b"\n"):
+                out.write(b"\n")
+
+    def split(self, manifests: [Manifest], out_dir: str) -> {}:
+        """
+        Write each document to its own file, named like the files of 'kustomize build --output'
+        :return: The path of each manifest's file
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths = {}
+        for manifest in manifests:
+            file_name = "_".join(filter(None, [
+                manifest.id.api_version and manifest.id.api_version.replace("/", "_"),
+                manifest.id.kind, manifest.id.namespace, manifest.id.name,
+            ])).lower() or f"document_{manifest.offset}"
+            file_name += ".yaml"
+            path = os.path.join(out_dir, file_name)
+            with open(path, "wb") as out:
+                self.write([manifest], out)
+            paths[id(manifest)] = path
+        return paths
+
+
+def has_glob(pattern: str) -> bool:
+    return any(c in pattern for c in "*?[")
+
+
+class TeeReader:
+    """Copy everything read from a stream to another file object"""
+
+    def __init__(self, stream, copy):
+        self.stream = stream
+        self.copy = copy
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.copy.write(data)
+        return data
+
+
+def parse_key_values(values: [str]) -> {}:
+    pairs = {}
+    for value in values:
+        key, sep, val = value.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected KEY=VALUE: {value}")
+        pairs[key] = val
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index, query, split and re-serialize a multi-document Kubernetes YAML stream, one document at a "
+                    "time")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("-f", "--file", default="-", help="YAML stream to read, defaults to stdin")
+    source.add_argument("-k", "--kustomize", help="Directory to run 'kustomize build' on")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="Print one line per matching manifest")
+    get_parser = subparsers.add_parser("get", help="Print the matching documents as a YAML stream")
+    split_parser = subparsers.add_parser("split", help="Write each matching document to its own file")
+    split_parser.add_argument("out_dir", help="Directory to write the documents into")
+    subparsers.add_parser("count", help="Print the number of matching manifests")
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--api-version", help="apiVersion pattern")
+        subparser.add_argument("--kind", help="kind pattern, e.g. Secret or '*Secret'")
+        subparser.add_argument("--namespace", help="Namespace pattern")
+        subparser.add_argument("--name", help="Name pattern")
+        subparser.add_argument("--label", action="append", default=[], help="Required label as KEY=VALUE")
+        subparser.add_argument("--annotation", action="append", default=[], help="Required annotation as KEY=VALUE")
+    for subparser in [list_parser, split_parser]:
+        subparser.add_argument("--format", default=None,
+                               help="Output line template with the fields {api_version} {kind} {namespace} {name} "
+                                    "{sha256} {offset} {length} {keys}, and {path} for split")
+    args = parser.parse_args()
+
+    if args.kustomize:
+        index = ManifestIndex.from_kustomize(args.kustomize)
+    else:
+        index = ManifestIndex.from_file(args.file)
+
+    with index:
+        try:
+            criteria = {
+                "api_version": args.api_version, "kind": args.kind, "namespace": args.namespace, "name": args.name,
+                "labels": parse_key_values(args.label), "annotations": parse_key_values(args.annotation),
+            }
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+        manifests = index.select(**criteria)
+
+        if args.command == "count":
+            print(len(manifests))
+        elif args.command == "get":
+            index.write(manifests, sys.stdout.buffer)
+        elif args.command == "list":
+            template = args.format or "{api_version}\t{kind}\t{namespace}\t{name}\t{sha256}"
+            for manifest in manifests:
+                print(manifest.format(template))
+        else:
+            paths = index.split(manifests, args.out_dir)
+            template = args.format or "{path}"
+            for manifest in manifests:
+                print(manifest.format(template, path=paths[id(manifest)]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from k8s_manifests import ManifestIndex, load_document
+
+# Fields that change on every render or are managed by the cluster, and are never worth reviewing
+DEFAULT_IGNORED_FIELDS = [
+    "metadata.annotations[kubectl.kubernetes.io/last-applied-configuration]",
+    "metadata.creationTimestamp",
+    "metadata.generation",
+    "metadata.managedFields",
+    "metadata.resourceVersion",
+    "metadata.uid",
+    "status",
+]
+
+# Suffix kustomize appends to the names of generated config maps and secrets, e.g. pingfederate-environment-variables-
+# 8h7k9mgf2t. The hash is encoded with this alphabet, so other names ending in 10 characters are rarely mistaken for it.
+GENERATED_NAME_REGEX = re.compile(r"^(.+)-([2456789bcdfghkmt]{10})$")
+GENERATED_KINDS = ["ConfigMap", "Secret"]
+HASH_PLACEHOLDER = "<hash>"
+
+# Longest value printed in a field-level change
+MAX_VALUE_LENGTH = 200
+
+
+def parse_field_path(path: str) -> tuple:
+    """Parse a dotted field path. Keys containing dots go in brackets, e.g. metadata.annotations[example.com/key]"""
+    return tuple(key[1:-1] if key.startswith("[") else key for key in re.findall(r"\[[^\]]*\]|[^.\[\]]+", path))
+
+
+def format_path(path: tuple) -> str:
+    formatted = ""
+    for key in path:
+        if isinstance(key, int) or key.startswith("["):
+            formatted += f"[{key}]" if isinstance(key, int) else key
+        elif "." in key or "/" in key:
+            formatted += f"[{key}]"
+        else:
+            formatted += f".{key}" if formatted else key
+    return formatted
+
+
+def remove_field(document, path: tuple):
+    for key in path[:-1]:
+        if not isinstance(document, dict) or key not in document:
+            return
+        document = document[key]
+    if isinstance(document, dict):
+        document.pop(path[-1], None)
+
+
+def resource_key(manifest, generated_names: {}) -> tuple:
+    """
+    Identity used to match resources between the renders. The API version is left out so that a resource moving to a
+    new version of its group is reported as changed, and the hash suffix of generated names is ignored.
+    """
+    resource_id = manifest.id
+    group = resource_id.api_version.rsplit("/", 1)[0] if resource_id.api_version and "/" in resource_id.api_version \
+        else ""
+    return group, resource_id.kind, resource_id.namespace, generated_names.get(resource_id.name, resource_id.name)
+
+
+def generated_names(index: ManifestIndex) -> {}:
+    """Map the names of the config maps and secrets generated by kustomize to their names without the hash suffix"""
+    names = {}
+    for manifest in index:
+        if manifest.id.kind in GENERATED_KINDS and manifest.id.name:
+            match = GENERATED_NAME_REGEX.match(manifest.id.name)
+            if match:
+                names[manifest.id.name] = f"{match.group(1)}-{HASH_PLACEHOLDER}"
+    return names
+
+
+def normalize(document, ignored_fields: [tuple], names: {}):
+    """Drop the ignored fields, and replace every reference to a generated name with its name without the hash"""
+    for path in ignored_fields:
+        remove_field(document, path)
+
+    def replace_names(value):
+        if isinstance(value, dict):
+            return {k: replace_names(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [replace_names(v) for v in value]
+        if isinstance(value, str):
+            return names.get(value, value)
+        return value
+
+    return replace_names(document) if names else document
+
+
+def normalized_hash(document) -> str:
+    return hashlib.sha256(json.dumps(document, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@dataclass
+class Change:
+    path: tuple
+    old: object = None
+    new: object = None
+    added: bool = False
+    removed: bool = False
+
+
+@dataclass
+class ResourceDiff:
+    key: tuple
+    changes: [Change] = field(default_factory=list)
+    text_diff: [str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        _, kind, namespace, name = self.key
+        return "/".join(filter(None, [kind, namespace, name]))
+
+
+def diff_values(old, new, path: tuple = ()) -> [Change]:
+    """Structural diff of two parsed documents. Lists of objects with a name are matched by name."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in sorted(set(old) | set(new), key=str):
+            if key not in new:
+                changes.append(Change(path + (key,), old=old[key], removed=True))
+            elif key not in old:
+                changes.append(Change(path + (key,), new=new[key], added=True))
+            elif old[key] != new[key]:
+                changes.extend(diff_values(old[key], new[key], path + (key,)))
+        return changes
+
+    if isinstance(old, list) and isinstance(new, list):
+        if all(isinstance(item, dict) and "name" in item for item in old + new):
+            return diff_values(
+                {f"[name={item['name']}]": item for item in old},
+                {f"[name={item['name']}]": item for item in new},
+                path,
+            )
+        changes = []
+        for i in range(max(len(old), len(new))):
+            if i >= len(new):
+                changes.append(Change(path + (i,), old=old[i], removed=True))
+            elif i >= len(old):
+                changes.append(Change(path + (i,), new=new[i], added=True))
+            elif old[i] != new[i]:
+                changes.extend(diff_values(old[i], new[i], path + (i,)))
+        return changes
+
+    return [Change(path, old=old, new=new)]
+
+
+class ManifestDiff:
+    """Match the resources of two renders by identity and diff only the resources whose content changed"""
+
+    def __init__(self, old: ManifestIndex, new: ManifestIndex, ignored_fields: [str] = None):
+        self.old = old
+        self.new = new
+        self.ignored_fields = [parse_field_path(path) for path in
+                               (DEFAULT_IGNORED_FIELDS if ignored_fields is None else ignored_fields)]
+        self.old_names = generated_names(old)
+        self.new_names = generated_names(new)
+
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.unchanged = 0
+
+    def compare(self):
+        old_by_key = {resource_key(m, self.old_names): m for m in self.old}
+        new_by_key = {resource_key(m, self.new_names): m for m in self.new}
+
+        self.removed = sorted(key for key in old_by_key if key not in new_by_key)
+        self.added = sorted(key for key in new_by_key if key not in old_by_key)
+
+        for key in sorted(key for key in new_by_key if key in old_by_key):
+            old_manifest, new_manifest = old_by_key[key], new_by_key[key]
+            # Identical content needs no parsing at all
+            if old_manifest.sha256 == new_manifest.sha256:
+                self.unchanged += 1
+                continue
+            resource_diff = self.diff_resource(key, old_manifest, new_manifest)
+            if resource_diff:
+                self.changed.append(resource_diff)
+            else:
+                self.unchanged += 1
+        return self
+
+    def diff_resource(self, key: tuple, old_manifest, new_manifest) -> ResourceDiff:
+        old_content, new_content = self.old.read(old_manifest), self.new.read(new_manifest)
+        try:
+            old_document = normalize(load_document(old_content), self.ignored_fields, self.old_names)
+            new_document = normalize(load_document(new_content), self.ignored_fields, self.new_names)
+        except ImportError:
+            # Without PyYAML, fall back to a line diff of the documents
+            text_diff = list(difflib.unified_diff(
+                old_content.decode(errors="replace").splitlines(), new_content.decode(errors="replace").splitlines(),
+                lineterm="", n=2))[2:]
+            return ResourceDiff(key, text_diff=text_diff) if text_diff else None
+
+        if normalized_hash(old_document) == normalized_hash(new_document):
+            return None
+        return ResourceDiff(key, changes=diff_values(old_document, new_document))
+
+    @property
+    def has_differences(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def to_dict(self) -> {}:
+        def name(key):
+            return "/".join(filter(None, key[1:]))
+
+        return {
+            "added": [name(key) for key in self.added],
+            "removed": [name(key) for key in self.removed],
+            "changed": {
+                diff.name: [{"path": format_path(c.path), "old": c.old, "new": c.new} for c in diff.changes]
+                or diff.text_diff
+                for diff in self.changed
+            },
+            "unchanged": self.unchanged,
+        }
+
+
+def format_value(value) -> str:
+    text = json.dumps(value, default=str)
+    return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH] + "..."
+
+
+def format_change(change: Change) -> [str]:
+    path = format_path(change.path)
+    if change.added:
+        return [f"  + {path}: {format_value(change.new)}"]
+    if change.removed:
+        return [f"  - {path}: {format_value(change.old)}"]
+    if isinstance(change.old, str) and isinstance(change.new, str) and ("\n" in change.old or "\n" in change.new):
+        # Show a line diff of multi-line values such as configuration files in config maps
+        lines = difflib.unified_diff(change.old.splitlines(), change.new.splitlines(), lineterm="", n=1)
+        return [f"  ~ {path}:"] + [f"      {line}" for line in list(lines)[2:]]
+    return [f"  ~ {path}: {format_value(change.old)} -> {format_value(change.new)}"]
+
+
+def print_report(diff: ManifestDiff, summary_only: bool = False):
+    print(f"{len(diff.added)} added, {len(diff.removed)} removed, {len(diff.changed)} changed, "
+          f"{diff.unchanged} unchanged")
+    if summary_only:
+        return
+    for key in diff.removed:
+        print(f"- {'/'.join(filter(None, key[1:]))}")
+    for key in diff.added:
+        print(f"+ {'/'.join(filter(None, key[1:]))}")
+    for resource_diff in diff.changed:
+        print(f"~ {resource_diff.name}")
+        for change in resource_diff.changes:
+            for line in format_change(change):
+                print(line)
+        for line in resource_diff.text_diff:
+            print(f"      {line}")
+
+
+def render_ref(repo_dir: str, ref: str, region: str, work_dir: str) -> str:
+    """
+    Render a region of a git ref of the cluster state repo with the ref's own git-ops-command.sh, in a temporary
+    worktree so the current checkout is left alone
+    :return: Path of the rendered YAML stream
+    """
+    worktree = os.path.join(work_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", ref))
+    output = f"{worktree}.yaml"
+    subprocess.run(["git", "-C", repo_dir, "worktree", "add", "--quiet", "--detach", worktree, ref], check=True)
+    try:
+        k8s_configs_dir = os.path.join(worktree, "k8s-configs")
+        with open(output, "wb") as rendered:
+            subprocess.run(["./git-ops-command.sh", region], cwd=k8s_configs_dir, stdout=rendered, check=True)
+    finally:
+        subprocess.run(["git", "-C", repo_dir, "worktree", "remove", "--force", worktree], check=False)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two renders of the cluster state resource by resource, and print field-level changes of "
+                    "only the resources that differ")
+    parser.add_argument("--old-file", help="Rendered YAML of the old version")
+    parser.add_argument("--new-file", help="Rendered YAML of the new version")
+    parser.add_argument("--old-ref", help="Git ref of the old version to render, e.g. the default CDE branch")
+    parser.add_argument("--new-ref", help="Git ref of the new version to render, e.g. v1.18-dev")
+    parser.add_argument("--region", help="Region directory to render from each ref, e.g. us-west-2")
+    parser.add_argument("--repo", default=".", help="Cluster state repo to render the refs from")
+    parser.add_argument("--ignore", action="append", default=[],
+                        help="Additional field to ignore, e.g. metadata.labels[app.kubernetes.io/version]")
+    parser.add_argument("--no-default-ignores", action="store_true",
+                        help=f"Do not ignore the default fields: {', '.join(DEFAULT_IGNORED_FIELDS)}")
+    parser.add_argument("--summary", action="store_true", help="Only print the number of changed resources")
+    parser.add_argument("--json", help="Also write the diff as JSON to this file")
+    args = parser.parse_args()
+
+    refs = args.old_ref or args.new_ref
+    if refs and not (args.old_ref and args.new_ref and args.region):
+        parser.error("--old-ref, --new-ref and --region are required to render refs")
+    if not refs and not (args.old_file and args.new_file):
+        parser.error("either --old-file and --new-file, or --old-ref, --new-ref and --region are required")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        old_file, new_file = args.old_file, args.new_file
+        if refs:
+            repo_dir = os.path.abspath(args.repo)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                old_file, new_file = executor.map(lambda ref: render_ref(repo_dir, ref, args.region, work_dir),
+                                                  [args.old_ref, args.new_ref])
+
+        ignored_fields = ([] if args.no_default_ignores else DEFAULT_IGNORED_FIELDS) + args.ignore
+        with ManifestIndex.from_file(old_file) as old, ManifestIndex.from_file(new_file) as new:
+            diff = ManifestDiff(old, new, ignored_fields).compare()
+
+    print_report(diff, args.summary)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(diff.to_dict(), json_file, indent=2, default=str)
+
+    sys.exit(1 if diff.has_differences else 0)
+
+
+if __name__ == "__main__":
+    main()
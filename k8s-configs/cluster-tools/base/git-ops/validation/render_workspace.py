@@ -0,0 +1,209 @@
+import argparse
+import errno
+import os
+import re
+import shutil
+import tempfile
+
+# FICLONE from linux/fs.h: share the extents of a file, where the filesystem supports it, e.g. btrfs or XFS
+FICLONE = 0x40049409
+
+LINK_MODES = ["auto", "hardlink", "reflink", "symlink", "copy"]
+
+KUSTOMIZATION_FILE = "kustomization.yaml"
+
+
+class Linker:
+    """
+    Mirror read-only inputs into a render workspace without copying their content. By default, files are reflinked,
+    which shares their content copy-on-write, and copied where the filesystem can't reflink. Either way, a write to the
+    workspace never reaches the inputs.
+
+    A hardlink or a symlink shares the input file itself, so they are only used when asked for. Anything in such a
+    workspace that must change has to be replaced, never written in place, or the input changes with it.
+    """
+
+    def __init__(self, mode: str = "auto"):
+        self.mode = mode
+        self.counts = {}
+
+    def link_file(self, src: str, dst: str):
+        methods = [self.mode] if self.mode != "auto" else ["reflink", "copy"]
+        # kustomize resolves some paths through symlinks, so kustomization files are copied instead
+        if os.path.basename(dst) == KUSTOMIZATION_FILE:
+            methods = [method if method != "symlink" else "copy" for method in methods]
+        for method in methods:
+            try:
+                getattr(self, method)(src, dst)
+            except OSError as e:
+                if self.mode != "auto" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP,
+                                                          errno.ENOTTY, errno.EINVAL, errno.EACCES):
+                    raise
+                continue
+            self.counts[method] = self.counts.get(method, 0) + 1
+            # Once a method fails, e.g. on a filesystem without reflinks, the remaining files will fail the same way
+            if self.mode == "auto" and method != methods[0]:
+                self.mode = method
+            return
+        raise OSError(f"Unable to link {src} to {dst}")
+
+    @staticmethod
+    def hardlink(src: str, dst: str):
+        os.link(src, dst)
+
+    @staticmethod
+    def reflink(src: str, dst: str):
+        import fcntl
+
+        with open(src, "rb") as source, open(dst, "wb") as target:
+            try:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            except OSError:
+                target.close()
+                os.remove(dst)
+                raise
+        shutil.copystat(src, dst)
+
+    @staticmethod
+    def symlink(src: str, dst: str):
+        os.symlink(os.path.abspath(src), dst)
+
+    @staticmethod
+    def copy(src: str, dst: str):
+        shutil.copy2(src, dst)
+
+    def mirror(self, src_dir: str, dst_dir: str):
+        """Recreate the directories of src_dir under dst_dir and link every file. Symlinks are copied as symlinks."""
+        for root, dirs, files in os.walk(src_dir):
+            target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+            os.makedirs(target_root, exist_ok=True)
+            for name in list(dirs):
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(target_root, name))
+                    dirs.remove(name)
+            for name in files:
+                path = os.path.join(root, name)
+                target = os.path.join(target_root, name)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), target)
+                else:
+                    self.link_file(path, target)
+
+
+def replace_file(path: str, content: bytes):
+    """Replace a file with new content and the same mode, breaking any link to the original"""
+    directory, name = os.path.split(path)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=f".{name}.", delete=False) as new_file:
+        new_file.write(content)
+    shutil.copymode(path, new_file.name)
+    os.replace(new_file.name, path)
+
+
+def env_var_names(env_file: str) -> [str]:
+    """The names of the variables in an env_vars file, skipping blank and commented lines like substitute_vars does"""
+    names = []
+    with open(env_file) as env_vars:
+        for line in env_vars:
+            line = line.rstrip("\n")
+            if line and "#" not in line:
+                names.append(line.split("=", 1)[0])
+    return names
+
+
+def substitutable_files(dirs: [str], names: [str]) -> [str]:
+    """
+    Find the files that reference any of the variables as $NAME or ${NAME}, i.e. the only ones envsubst would change
+    :return: The paths of the files, in walk order
+    """
+    names = [name for name in names if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name)]
+    if not names:
+        return []
+    alternatives = "|".join(sorted(map(re.escape, set(names)), key=len, reverse=True))
+    regex = re.compile(rf"\$(?:\{{(?:{alternatives})\}}|(?:{alternatives})(?![A-Za-z0-9_]))".encode())
+
+    paths = []
+    for directory in dirs:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.islink(path) and not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as file:
+                    content = file.read()
+                if b"$" in content and regex.search(content):
+                    paths.append(path)
+    return paths
+
+
+def rewrite_kustomizations(root: str, repo_dir: str, url: str, branch: str) -> [str]:
+    """
+    Point the remote resources of every kustomization file under root, outside of repo_dir, at the local clone of the
+    repository in repo_dir. Every occurrence of the URL becomes the path of repo_dir relative to the file's directory,
+    and a '?ref=<branch>' suffix at the end of a line is dropped.
+    :return: The paths of the rewritten files
+    """
+    repo_dir = os.path.abspath(repo_dir)
+    ref_suffix = re.compile(rb"\?ref=" + re.escape(branch.encode()) + rb"$", re.MULTILINE)
+    rewritten = []
+    for directory, dirs, files in os.walk(root):
+        if os.path.abspath(directory) == repo_dir:
+            dirs[:] = []
+            continue
+        if KUSTOMIZATION_FILE not in files:
+            continue
+        path = os.path.join(directory, KUSTOMIZATION_FILE)
+        with open(path, "rb") as file:
+            content = file.read()
+        relative_repo_dir = os.path.relpath(repo_dir, os.path.abspath(directory)).encode()
+        new_content = ref_suffix.sub(b"", content.replace(url.encode(), relative_repo_dir))
+        if new_content != content:
+            replace_file(path, new_content)
+            rewritten.append(path)
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the workspace of a git-ops-command.sh render, linking the inputs instead of copying them")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    link_parser = subparsers.add_parser("link", help="Mirror directories into the workspace with links")
+    link_parser.add_argument("--dest", required=True, help="Workspace directory")
+    link_parser.add_argument("--mode", choices=LINK_MODES, default="auto",
+                             help="How to link files (default: auto, i.e. reflink, or else copy)")
+    link_parser.add_argument("sources", nargs="+", help="Directories to mirror as <dest>/<directory name>")
+
+    subst_parser = subparsers.add_parser("substitutable",
+                                         help="Print the files that reference a variable of an env_vars file")
+    subst_parser.add_argument("--env-file", required=True, help="env_vars file with the variables to substitute")
+    subst_parser.add_argument("dirs", nargs="+", help="Directories to search")
+
+    rewrite_parser = subparsers.add_parser("rewrite-urls",
+                                           help="Point remote kustomize resources at a local clone of the repository")
+    rewrite_parser.add_argument("--root", required=True, help="Directory with the kustomization files to rewrite")
+    rewrite_parser.add_argument("--repo-dir", required=True, help="Directory of the local clone")
+    rewrite_parser.add_argument("--url", required=True, help="Remote URL of the repository")
+    rewrite_parser.add_argument("--branch", required=True, help="Branch of the remote resources")
+    args = parser.parse_args()
+
+    if args.command == "link":
+        linker = Linker(args.mode)
+        try:
+            for source in args.sources:
+                linker.mirror(source, os.path.join(args.dest, os.path.basename(os.path.abspath(source))))
+        except OSError as e:
+            parser.exit(1, f"Unable to {args.mode} {source} into {args.dest}: {e}\n")
+        counts = ", ".join(f"{count} {method}" for method, count in sorted(linker.counts.items())) or "no files"
+        print(f"linked {' '.join(args.sources)} into {args.dest}: {counts}")
+    elif args.command == "substitutable":
+        for path in substitutable_files(args.dirs, env_var_names(args.env_file)):
+            print(path)
+    else:
+        rewritten = rewrite_kustomizations(args.root, args.repo_dir, args.url, args.branch)
+        for path in rewritten:
+            print(f"rewrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import base64
+import binascii
+import io
+import os
+import re
+import shlex
+import sys
+from dataclasses import dataclass
+
+from k8s_manifests import iter_documents, scan_header, secret_data_values
+
+SECRETS_FILE_NAME = "secrets.yaml"
+OLD_SUFFIX = ".old"
+
+# A lookup of one key, optionally qualified with the secret name, into a shell variable, e.g. ssh-id-key-secret/id_rsa
+LOOKUP_REGEX = re.compile(r"^(?:([a-z0-9][a-z0-9.-]*)/)?([-._a-zA-Z0-9]+)(?:=([A-Za-z_][A-Za-z0-9_]*))?$")
+
+
+@dataclass
+class SecretValue:
+    secret: str
+    key: str
+    path: str
+    line: int
+    value: str = None
+    error: str = None
+
+
+def decode(value: str) -> (str, str):
+    """
+    Decode a base64 data value of a Secret
+    :param value: The value as written in the secrets file
+    :return: The decoded value and None, or None and the reason it could not be decoded
+    """
+    if "${" in value:
+        return None, "is an unsubstituted variable"
+    try:
+        return base64.b64decode(value, validate=True).decode(), None
+    except (binascii.Error, UnicodeDecodeError) as e:
+        return None, f"is not base64-encoded text: {e}"
+
+
+class SecretsIndex:
+    """
+    The decoded data values of the Secrets of secrets files, parsed once. A key is looked up in the files in the order
+    they were added, and in the secrets of a file in order, like a recursive yq query over each file.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.values = {}
+
+    def add_file(self, path: str):
+        self.files.append(path)
+        with open(path, "rb") as secrets_file:
+            content = secrets_file.read()
+        for offset, document in iter_documents(io.BytesIO(content)):
+            header = scan_header(document)
+            if header is None or header.id.kind != "Secret":
+                continue
+            first_line = content.count(b"\n", 0, offset)
+            for number, key, value in secret_data_values(document):
+                decoded, error = decode(value)
+                entry = SecretValue(header.id.name, key, path, first_line + number, decoded, error)
+                for lookup in (key, f"{header.id.name}/{key}"):
+                    self.values.setdefault(lookup, entry)
+
+    def get(self, key: str) -> SecretValue:
+        """
+        :param key: A data key, or a secret name and data key separated by a '/'
+        :return: The first value of the key, or None if no secret has it
+        """
+        return self.values.get(key)
+
+
+def find_secrets_files(root: str, old: bool) -> [str]:
+    """
+    :param root: The directory to search, e.g. the k8s-configs directory of a cluster state repo branch
+    :param old: Whether to find the secrets.yaml.old files copied from the previous version instead
+    :return: The paths of the secrets files under root, in sorted directory order
+    """
+    name = SECRETS_FILE_NAME + (OLD_SUFFIX if old else "")
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        if name in files:
+            found.append(os.path.join(directory, name))
+    return found
+
+
+def env_line(name: str, value: str) -> str:
+    # Trailing newlines are dropped like in a command substitution of the decoded value
+    value = value.rstrip("\n")
+    return f"export {name}={shlex.quote(value)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Look up the decoded data values of the Secrets of secrets.yaml files, parsing each file once")
+    parser.add_argument("--dir", default=".", help="Directory to search for secrets.yaml files, defaults to '.'")
+    parser.add_argument("--file", action="append", default=[],
+                        help="Secrets file to index instead of searching --dir. May be repeated; the first file "
+                             "with a key wins.")
+    parser.add_argument("--old", action="store_true",
+                        help="Also index the secrets.yaml.old files under --dir, after the secrets.yaml files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    get_parser = subparsers.add_parser("get", help="Print the decoded value of a key")
+    get_parser.add_argument("key", help="Data key, optionally qualified with the secret name, e.g. "
+                                        "ssh-id-key-secret/id_rsa")
+
+    export_parser = subparsers.add_parser("export", help="Print a sourceable env file with the decoded values of keys")
+    export_parser.add_argument("lookups", nargs="+", metavar="KEY[=VARIABLE]",
+                               help="Data key to export, into the variable of the same name unless one is given")
+    export_parser.add_argument("--output", help="Write the env file to this file instead of stdout")
+
+    subparsers.add_parser("list", help="List the indexed keys, without their values")
+    args = parser.parse_args()
+
+    paths = args.file or find_secrets_files(args.dir, old=False) + (find_secrets_files(args.dir, old=True)
+                                                                     if args.old else [])
+    if not paths:
+        print(f"No {SECRETS_FILE_NAME} file found under {args.dir}", file=sys.stderr)
+        sys.exit(1)
+    index = SecretsIndex()
+    for path in paths:
+        index.add_file(path)
+
+    if args.command == "list":
+        for lookup, entry in index.values.items():
+            if "/" in lookup:
+                status = entry.error or "ok"
+                print(f"{entry.path}:{entry.line}: {lookup}: {status}")
+        return
+
+    lookups = [args.key] if args.command == "get" else args.lookups
+    lines = []
+    failed = False
+    for lookup in lookups:
+        match = LOOKUP_REGEX.match(lookup)
+        if not match:
+            print(f"Invalid lookup {lookup}: expected KEY, SECRET/KEY, KEY=VARIABLE or SECRET/KEY=VARIABLE",
+                  file=sys.stderr)
+            failed = True
+            continue
+        secret, key, variable = match.groups()
+        entry = index.get(f"{secret}/{key}" if secret else key)
+        if entry is None:
+            print(f"{lookup} not found in {', '.join(paths)}", file=sys.stderr)
+            failed = True
+        elif entry.error:
+            print(f"{entry.path}:{entry.line}: {entry.secret}/{entry.key} {entry.error}", file=sys.stderr)
+            failed = True
+        elif args.command == "get":
+            sys.stdout.write(entry.value)
+        else:
+            lines.append(env_line(variable or key.replace("-", "_").replace(".", "_"), entry.value))
+
+    if args.command == "export":
+        content = "".join(line + "\n" for line in lines)
+        if args.output:
+            with open(args.output, "w") as env_file:
+                env_file.write(content)
+        else:
+            sys.stdout.write(content)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from feature_flags import build_index, comment_out, disabled_markers, main  # noqa: E402
+
+# The ping-cloud-base repository this file belongs to
+PCB_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), *[".."] * 6))
+
+FLAGS = {
+    "ff-radius-proxy": {"description": "RADIUS proxy", "variable": "RADIUS_PROXY_ENABLED"},
+    "ff-new-ui": {"description": "New UI", "variable": "NEW_UI_ENABLED"},
+}
+
+ENGINE_KUSTOMIZATION = """resources:
+- engine.yaml
+- ff-radius-proxy/pingfederate-radsecproxy.yaml
+
+patchesStrategicMerge:
+- ff-radius-proxy/engine-patch.yaml
+- ff-new-ui/engine-patch.yaml
+"""
+
+
+class FeatureFlagsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.repo = self.work_dir.name
+        self.engine_path = "k8s-configs/ping-cloud/base/pingfederate/engine/kustomization.yaml"
+        self.write("k8s-configs/feature-flags.json", json.dumps(FLAGS))
+        self.write(self.engine_path, ENGINE_KUSTOMIZATION)
+        self.write("k8s-configs/ping-cloud/base/kustomization.yaml", "resources:\n- pingfederate/engine\n")
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def write(self, path: str, content: str):
+        os.makedirs(os.path.dirname(os.path.join(self.repo, path)), exist_ok=True)
+        with open(os.path.join(self.repo, path), "w") as file:
+            file.write(content)
+
+    def read(self, path: str) -> str:
+        with open(os.path.join(self.repo, path)) as file:
+            return file.read()
+
+    def main(self, *args: str, environ: {} = None) -> (int, str, str):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        code = 0
+        with mock.patch.object(sys, "argv", ["feature_flags.py", "--repo", self.repo, *args]), \
+                mock.patch.dict(os.environ, environ or {}), redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                main()
+            except SystemExit as e:
+                code = e.code
+        return code, stdout.getvalue(), stderr.getvalue()
+
+
+class TestBuildIndex(FeatureFlagsTestCase):
+    def test_index_and_undeclared_markers(self):
+        self.write("k8s-configs/other/kustomization.yaml", "resources:\n- ff-unknown-flag/x.yaml\n")
+
+        index, undeclared = build_index(self.repo, FLAGS)
+
+        self.assertEqual({"ff-radius-proxy": {self.engine_path: [3, 6]}, "ff-new-ui": {self.engine_path: [7]}}, index)
+        self.assertEqual({"ff-unknown-flag": {"k8s-configs/other/kustomization.yaml"}}, undeclared)
+
+    def test_disabled_markers(self):
+        self.assertEqual(["ff-new-ui"], disabled_markers(FLAGS, {"RADIUS_PROXY_ENABLED": "true",
+                                                                 "NEW_UI_ENABLED": "True"}))
+
+
+class TestCommentOut(FeatureFlagsTestCase):
+    def test_indexed_lines(self):
+        index, _ = build_index(self.repo, FLAGS)
+
+        changed = comment_out(self.repo, index, ["ff-radius-proxy"])
+
+        self.assertEqual({self.engine_path: 2}, changed)
+        self.assertEqual(ENGINE_KUSTOMIZATION.replace("- ff-radius", "#- ff-radius"), self.read(self.engine_path))
+
+    def test_stale_index_falls_back_to_searching_the_file(self):
+        index, _ = build_index(self.repo, FLAGS)
+        self.write(self.engine_path, "# A line added after the index was generated\n" + ENGINE_KUSTOMIZATION)
+
+        comment_out(self.repo, index, ["ff-new-ui"])
+
+        self.assertIn("#- ff-new-ui/engine-patch.yaml", self.read(self.engine_path))
+        self.assertIn("\n- engine.yaml", self.read(self.engine_path))
+
+    def test_already_commented_lines_are_not_commented_twice(self):
+        index, _ = build_index(self.repo, FLAGS)
+        self.write(self.engine_path, ENGINE_KUSTOMIZATION.replace("- ff-new-ui", "#- ff-new-ui"))
+
+        comment_out(self.repo, index, ["ff-new-ui"])
+
+        self.assertIn("\n#- ff-new-ui/engine-patch.yaml", self.read(self.engine_path))
+
+
+class TestMain(FeatureFlagsTestCase):
+    def test_generate_then_check(self):
+        code, stdout, _ = self.main("generate")
+        self.assertEqual(0, code)
+        self.assertEqual("Wrote k8s-configs/feature-flags-index.json\n", stdout)
+
+        code, stdout, _ = self.main("generate", "--check")
+        self.assertEqual(0, code)
+        self.assertEqual("k8s-configs/feature-flags-index.json is up to date\n", stdout)
+
+    def test_check_stale_or_missing_index(self):
+        code, _, stderr = self.main("generate", "--check")
+        self.assertEqual(1, code)
+        self.assertIn("k8s-configs/feature-flags-index.json is stale", stderr)
+
+        self.main("generate")
+        self.write(self.engine_path, "\n" + ENGINE_KUSTOMIZATION)
+        code, _, stderr = self.main("generate", "--check")
+        self.assertEqual(1, code)
+        self.assertIn("is stale", stderr)
+
+    def test_check_undeclared_marker(self):
+        self.write("k8s-configs/other/kustomization.yaml", "resources:\n- ff-unknown-flag/x.yaml\n")
+        self.main("generate")
+
+        code, _, stderr = self.main("generate", "--check")
+
+        self.assertEqual(1, code)
+        self.assertIn("Marker ff-unknown-flag is not declared in k8s-configs/feature-flags.json", stderr)
+
+    def test_apply(self):
+        self.main("generate")
+
+        code, stdout, _ = self.main("apply", environ={"RADIUS_PROXY_ENABLED": "true", "NEW_UI_ENABLED": "false"})
+
+        self.assertEqual(0, code)
+        self.assertEqual(["ff-new-ui is set to false", "ff-radius-proxy is set to true",
+                          f"Commented out 1 lines in {self.engine_path}"], stdout.splitlines())
+        self.assertEqual(ENGINE_KUSTOMIZATION.replace("- ff-new-ui", "#- ff-new-ui"), self.read(self.engine_path))
+
+
+class TestRepositoryIndex(unittest.TestCase):
+    def test_index_of_this_repository_is_up_to_date(self):
+        flags_path = os.path.join(PCB_DIR, "k8s-configs", "feature-flags.json")
+        if not os.path.isfile(flags_path):
+            self.skipTest("not run from a ping-cloud-base checkout")
+        with open(flags_path) as flags_file:
+            index, undeclared = build_index(PCB_DIR, json.load(flags_file))
+        with open(os.path.join(PCB_DIR, "k8s-configs", "feature-flags-index.json")) as index_file:
+            self.assertEqual(json.load(index_file), index, "run: feature_flags.py generate")
+        self.assertEqual({}, undeclared)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from incremental_apply import IncrementalApply, Kubectl, batch_of, state_file  # noqa: E402
+from k8s_manifests import ManifestIndex, ResourceId  # noqa: E402
+
+# Stands in for kubectl: records the arguments and the input of every call as a JSON line in $FAKE_KUBECTL_LOG
+FAKE_KUBECTL = """#!{python}
+import json, os, sys
+content = sys.stdin.read() if "-f" in sys.argv else ""
+with open(os.environ["FAKE_KUBECTL_LOG"], "a") as log:
+    log.write(json.dumps({{"args": sys.argv[1:], "input": content}}) + "\\n")
+"""
+
+CRD = """apiVersion: apiextensions.k8s.io/v1
+kind: CustomResourceDefinition
+metadata:
+  name: clusterissuers.cert-manager.io
+spec:
+  group: cert-manager.io
+  names:
+    kind: ClusterIssuer
+    plural: clusterissuers
+  scope: Cluster
+"""
+
+NAMESPACE = """apiVersion: v1
+kind: Namespace
+metadata:
+  name: ping-cloud
+"""
+
+CLUSTER_ROLE = """apiVersion: rbac.authorization.k8s.io/v1
+kind: ClusterRole
+metadata:
+  name: ping-reader
+rules: []
+"""
+
+CLUSTER_ISSUER = """apiVersion: cert-manager.io/v1
+kind: ClusterIssuer
+metadata:
+  name: letsencrypt
+spec: {}
+"""
+
+
+def config_map(name: str, value: str, namespace: str = None) -> str:
+    namespace_line = f"\n  namespace: {namespace}" if namespace else ""
+    return textwrap.dedent(f"""\
+        apiVersion: v1
+        kind: ConfigMap
+        metadata:
+          name: {name}""") + namespace_line + f"\ndata:\n  value: {value}\n"
+
+
+class TestBatchOf(unittest.TestCase):
+    def test_namespaced_kind_without_namespace_is_namespaced(self):
+        self.assertEqual("namespaced", batch_of(ResourceId("v1", "ConfigMap", None, "environment-variables")))
+
+    def test_cluster_scoped_kind(self):
+        self.assertEqual("cluster-scoped", batch_of(ResourceId("rbac.authorization.k8s.io/v1", "ClusterRole", None,
+                                                               "ping-reader")))
+
+    def test_crds_and_namespaces_first(self):
+        self.assertEqual("crds", batch_of(ResourceId("apiextensions.k8s.io/v1", "CustomResourceDefinition", None,
+                                                     "issuers.cert-manager.io")))
+        self.assertEqual("namespaces", batch_of(ResourceId("v1", "Namespace", None, "ping-cloud")))
+
+
+class TestIncrementalApply(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.kubectl_path = os.path.join(self.work_dir.name, "kubectl")
+        with open(self.kubectl_path, "w") as kubectl_file:
+            kubectl_file.write(FAKE_KUBECTL.format(python=sys.executable))
+        os.chmod(self.kubectl_path, 0o755)
+        self.kubectl_log = os.path.join(self.work_dir.name, "kubectl.log")
+        os.environ["FAKE_KUBECTL_LOG"] = self.kubectl_log
+        self.state_path = state_file(os.path.join(self.work_dir.name, "state"), "test", "ping-cloud")
+
+    def tearDown(self):
+        os.environ.pop("FAKE_KUBECTL_LOG", None)
+        self.work_dir.cleanup()
+
+    def apply(self, documents: [str], prune: bool = False) -> [{}]:
+        """Apply a stream with the fake kubectl and return its calls"""
+        if os.path.exists(self.kubectl_log):
+            os.remove(self.kubectl_log)
+        stream_path = os.path.join(self.work_dir.name, "deploy.yaml")
+        with open(stream_path, "w") as stream:
+            stream.write("---\n".join(documents))
+        with ManifestIndex.from_file(stream_path) as index, redirect_stdout(io.StringIO()):
+            incremental = IncrementalApply(index, self.state_path, "test", "ping-cloud",
+                                           Kubectl(binary=self.kubectl_path, log=io.StringIO()))
+            self.assertTrue(incremental.run(incremental.plan(), prune=prune))
+        if not os.path.exists(self.kubectl_log):
+            return []
+        with open(self.kubectl_log) as log:
+            return [json.loads(line) for line in log]
+
+    def test_add_applies_every_batch_in_order(self):
+        calls = self.apply([config_map("environment-variables", "a"), CLUSTER_ISSUER, CLUSTER_ROLE, NAMESPACE, CRD])
+
+        applies = [call for call in calls if call["args"][0] == "apply"]
+        self.assertEqual(4, len(applies))
+        self.assertIn("kind: CustomResourceDefinition", applies[0]["input"])
+        self.assertIn("kind: Namespace", applies[1]["input"])
+        # The kind of the CRD is cluster-scoped, and the ConfigMap without a namespace is not
+        self.assertIn("kind: ClusterIssuer", applies[2]["input"])
+        self.assertIn("kind: ClusterRole", applies[2]["input"])
+        self.assertEqual(["kind: ConfigMap"], [line for line in applies[3]["input"].splitlines()
+                                               if line.startswith("kind:")])
+        self.assertIn("wait", [call["args"][0] for call in calls])
+
+    def test_unchanged_resources_are_skipped(self):
+        documents = [NAMESPACE, config_map("environment-variables", "a", "ping-cloud")]
+        self.apply(documents)
+        self.assertEqual([], self.apply(documents))
+
+    def test_only_changed_resources_are_applied(self):
+        self.apply([NAMESPACE, config_map("first", "a"), config_map("second", "a")])
+
+        calls = self.apply([NAMESPACE, config_map("first", "a"), config_map("second", "b")])
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual("apply", calls[0]["args"][0])
+        self.assertIn("name: second", calls[0]["input"])
+        self.assertNotIn("name: first", calls[0]["input"])
+
+    def test_removed_resources_are_pruned(self):
+        self.apply([NAMESPACE, config_map("first", "a", "ping-cloud"), config_map("second", "a", "ping-cloud")])
+
+        calls = self.apply([NAMESPACE, config_map("first", "a", "ping-cloud")], prune=True)
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(["delete", "--ignore-not-found", "-f", "-"], calls[0]["args"])
+        self.assertIn("name: \"second\"", calls[0]["input"])
+        self.assertEqual([], self.apply([NAMESPACE, config_map("first", "a", "ping-cloud")], prune=True))
+
+    def test_removed_resources_are_kept_without_prune(self):
+        self.apply([NAMESPACE, config_map("first", "a", "ping-cloud")])
+        self.assertEqual([], self.apply([NAMESPACE]))
+
+        # Still in the state, so a later run with prune deletes it
+        calls = self.apply([NAMESPACE], prune=True)
+        self.assertEqual("delete", calls[0]["args"][0])
+        self.assertIn("name: \"first\"", calls[0]["input"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from render_workspace import (  # noqa: E402
+    Linker, env_var_names, replace_file, rewrite_kustomizations, substitutable_files,
+)
+
+URL = "https://github.com/pingidentity/ping-cloud-base"
+
+# The templates of a region of the cluster state repo, as checked out by Argo CD
+TEMPLATES = {
+    "us-west-2/env_vars": "REGION=us-west-2\nSIZE=small\n# COMMENTED=1\n",
+    "us-west-2/kustomization.yaml": f"resources:\n- {URL}/k8s-configs/ping-cloud?ref=v1.18-release-branch\n",
+    "us-west-2/region.yaml": "region: ${REGION}\nsize: $SIZE\n",
+    "us-west-2/static.yaml": "kind: ConfigMap\n",
+}
+
+
+class WorkspaceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.checkout = os.path.join(self.work_dir.name, "checkout")
+        self.workspace = os.path.join(self.work_dir.name, "workspace")
+        for path, content in TEMPLATES.items():
+            os.makedirs(os.path.dirname(os.path.join(self.checkout, path)), exist_ok=True)
+            with open(os.path.join(self.checkout, path), "w") as file:
+                file.write(content)
+        os.symlink("region.yaml", os.path.join(self.checkout, "us-west-2", "region-link.yaml"))
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def mirror(self, mode: str) -> Linker:
+        linker = Linker(mode)
+        linker.mirror(os.path.join(self.checkout, "us-west-2"), os.path.join(self.workspace, "us-west-2"))
+        return linker
+
+    def workspace_file(self, path: str) -> str:
+        return os.path.join(self.workspace, path)
+
+    def assertCheckoutUnchanged(self):
+        for path, content in TEMPLATES.items():
+            with open(os.path.join(self.checkout, path)) as file:
+                self.assertEqual(content, file.read(), path)
+
+    def render(self):
+        """Change the workspace like git-ops-command.sh does: substitute the variables, then rewrite the URLs"""
+        region_dir = self.workspace_file("us-west-2")
+        names = env_var_names(os.path.join(region_dir, "env_vars"))
+        for path in substitutable_files([region_dir], names):
+            with open(path, "rb") as file:
+                content = file.read()
+            replace_file(path, content.replace(b"${REGION}", b"us-west-2").replace(b"$SIZE", b"small"))
+        rewrite_kustomizations(self.workspace, os.path.join(self.workspace, "v1.18-release-branch"), URL,
+                               "v1.18-release-branch")
+
+
+class TestLinker(WorkspaceTestCase):
+    def test_auto_mode_does_not_share_the_files_of_the_checkout(self):
+        linker = self.mirror("auto")
+
+        self.assertEqual(4, sum(linker.counts.values()))
+        self.assertLessEqual(set(linker.counts), {"reflink", "copy"})
+        for path in TEMPLATES:
+            self.assertFalse(os.path.samefile(os.path.join(self.checkout, path), self.workspace_file(path)), path)
+
+        # Even a write in place leaves the checkout alone
+        with open(self.workspace_file("us-west-2/static.yaml"), "a") as file:
+            file.write("data: {}\n")
+        self.assertCheckoutUnchanged()
+
+    def test_symlinks_are_kept(self):
+        self.mirror("auto")
+        self.assertEqual("region.yaml", os.readlink(self.workspace_file("us-west-2/region-link.yaml")))
+
+    def test_hardlink_mode_shares_the_files_of_the_checkout(self):
+        linker = self.mirror("hardlink")
+
+        self.assertEqual({"hardlink": 4}, linker.counts)
+        self.assertTrue(os.path.samefile(os.path.join(self.checkout, "us-west-2/static.yaml"),
+                                         self.workspace_file("us-west-2/static.yaml")))
+
+    def test_symlink_mode_copies_kustomization_files(self):
+        linker = self.mirror("symlink")
+
+        self.assertEqual({"symlink": 3, "copy": 1}, linker.counts)
+        self.assertFalse(os.path.islink(self.workspace_file("us-west-2/kustomization.yaml")))
+        self.assertTrue(os.path.islink(self.workspace_file("us-west-2/static.yaml")))
+
+
+class TestRender(WorkspaceTestCase):
+    def test_render_changes_the_workspace_only(self):
+        for mode in ("auto", "hardlink", "symlink", "copy"):
+            with self.subTest(mode):
+                self.workspace = os.path.join(self.work_dir.name, f"workspace-{mode}")
+                self.mirror(mode)
+                self.render()
+
+                with open(self.workspace_file("us-west-2/region.yaml")) as file:
+                    self.assertEqual("region: us-west-2\nsize: small\n", file.read())
+                with open(self.workspace_file("us-west-2/kustomization.yaml")) as file:
+                    self.assertEqual("resources:\n- ../v1.18-release-branch/k8s-configs/ping-cloud\n", file.read())
+                self.assertCheckoutUnchanged()
+
+    def test_only_files_with_variables_are_substitutable(self):
+        self.mirror("auto")
+        region_dir = self.workspace_file("us-west-2")
+
+        self.assertEqual(["REGION", "SIZE"], env_var_names(os.path.join(region_dir, "env_vars")))
+        self.assertEqual({os.path.join(region_dir, "region.yaml"), os.path.join(region_dir, "region-link.yaml")},
+                         set(substitutable_files([region_dir], ["REGION", "SIZE"])))
+
+    def test_replace_file_keeps_the_mode(self):
+        self.mirror("hardlink")
+        path = self.workspace_file("us-west-2/static.yaml")
+        os.chmod(os.path.join(self.checkout, "us-west-2/static.yaml"), 0o640)
+
+        replace_file(path, b"kind: Secret\n")
+
+        self.assertEqual(0o640, os.stat(path).st_mode & 0o777)
+        self.assertFalse(os.path.samefile(os.path.join(self.checkout, "us-west-2/static.yaml"), path))
+        self.assertCheckoutUnchanged()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from validate_cluster_state import (  # noqa: E402
+    ERROR, WARNING, ClusterStateValidator, ValidationCache, scan_shell_value, validate_env_vars,
+)
+
+
+def env_var_issues(content: str, sourced: bool = True) -> [(int, str, str)]:
+    return validate_env_vars(content.encode(), sourced)
+
+
+class TestScanShellValue(unittest.TestCase):
+    def test_single_word(self):
+        self.assertEqual((None, False), scan_shell_value("value"))
+        self.assertEqual((None, False), scan_shell_value("a#b"))
+
+    def test_quoted_blanks(self):
+        self.assertEqual((None, False), scan_shell_value("\"a b\""))
+        self.assertEqual((None, False), scan_shell_value("'a b'c"))
+        self.assertEqual((None, False), scan_shell_value("a\\ b"))
+
+    def test_comment_after_blank(self):
+        self.assertEqual((None, False), scan_shell_value("\"a b\" # note"))
+        self.assertEqual((None, False), scan_shell_value("value  #note 'unterminated"))
+
+    def test_unquoted_blank(self):
+        self.assertEqual((None, True), scan_shell_value("a b"))
+        self.assertEqual((None, True), scan_shell_value(" a"))
+
+    def test_open_quote(self):
+        self.assertEqual(("\"", False), scan_shell_value("\"a # b"))
+        # A backslash does not escape a single quote
+        self.assertEqual((None, False), scan_shell_value("'a \\'"))
+        self.assertEqual(("\"", False), scan_shell_value("\"a \\\""))
+        self.assertEqual((None, False), scan_shell_value("b\"", "\""))
+
+
+class TestValidateEnvVars(unittest.TestCase):
+    def test_valid_file(self):
+        self.assertEqual([], env_var_issues("# comment\n\nA=1\nexport B=\"x y\"\nC='z'\n"))
+
+    def test_quoted_value_with_comment(self):
+        self.assertEqual([(1, WARNING, "X is not substituted into the templates because its line has a '#'")],
+                         env_var_issues("X=\"a b\" # note\n"))
+
+    def test_multi_line_quoted_value(self):
+        content = "KNOWN_HOSTS=\"github.com ssh-rsa AAAA\ngitlab.com ssh-ed25519 BBBB\"\nNEXT=1\n"
+        self.assertEqual([], env_var_issues(content))
+        self.assertEqual([], env_var_issues(content, sourced=False))
+
+    def test_unquoted_whitespace_is_a_warning(self):
+        self.assertEqual([(1, WARNING, "the value of X has unquoted whitespace, which the shell runs as a command")],
+                         env_var_issues("X=a b\n"))
+        self.assertEqual([], env_var_issues("X=a b\n", sourced=False))
+
+    def test_unterminated_quote_is_a_warning(self):
+        self.assertEqual([(2, WARNING, "unterminated quote in the value of Y")], env_var_issues("X=1\nY=\"a\nb\n"))
+
+    def test_not_an_assignment_is_an_error(self):
+        self.assertEqual([(1, ERROR, "not a NAME=VALUE assignment: echo hello")], env_var_issues("echo hello\n"))
+
+    def test_duplicate(self):
+        self.assertEqual([(3, WARNING, "X is already set on line 1")], env_var_issues("X=1\nY=2\nX=3\n"))
+
+
+class TestCachedCount(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.work_dir.name, "repo")
+        self.cache_path = os.path.join(self.work_dir.name, "cache.json")
+        for region in ("us-west-2", "us-east-2"):
+            os.makedirs(os.path.join(self.root, region))
+            with open(os.path.join(self.root, region, "env_vars"), "w") as env_vars:
+                env_vars.write("REGION=same\n")
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def cached(self) -> [bool]:
+        results = ClusterStateValidator(self.root, ValidationCache(self.cache_path)).validate()
+        return [result.cached for result in results]
+
+    def test_identical_files_of_one_run_are_not_cached(self):
+        self.assertEqual([False, False], self.cached())
+
+    def test_files_saved_by_a_previous_run_are_cached(self):
+        self.cached()
+        self.assertEqual([True, True], self.cached())
+
+
+if __name__ == "__main__":
+    unittest.main()
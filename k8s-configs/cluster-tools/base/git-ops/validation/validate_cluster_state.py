@@ -0,0 +1,512 @@
+import argparse
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+
+from json_util import enforce_json_syntax
+from k8s_manifests import iter_documents, scan_header, secret_data_values, unquote
+from verify_descriptor_json import verify_json_schema
+
+
+def default_cache_file() -> str:
+    """The default --cache, resolved from the environment of each run rather than once at import"""
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                        "ping-cloud-base", "cluster-state-validation.json")
+
+
+# Entries not used by the most recent validations are dropped beyond this many
+MAX_CACHE_ENTRIES = 20000
+
+# Directories of the cluster state repo that hold no inputs of a render
+SKIPPED_DIRS = {"validation"}
+
+ERROR = "error"
+WARNING = "warning"
+
+# The kind of each validated file, by file name
+FILE_KINDS = {
+    "descriptor.json": "descriptor",
+    "env_vars": "env_vars",
+    "kustomization.yaml": "kustomization",
+    "kustomization.yml": "kustomization",
+    "secrets.yaml": "secrets",
+}
+
+# env_vars files are sourced by git-ops-command.sh and read by the kustomize env generators
+ENV_VAR_LINE_REGEX = re.compile(r"^(?:export[ \t]+)?([A-Za-z_][A-Za-z0-9_]*)=(.*)$")
+ENV_VAR_COMMENT_REGEX = re.compile(r"^[ \t]*(?:#.*)?$")
+
+# Kustomization fields that hold a list of local paths or remote targets
+PATH_LIST_FIELDS = {"resources", "bases", "components", "crds", "patchesStrategicMerge", "configurations",
+                    "transformers", "generators", "validators"}
+# Kustomization fields that hold a list of items with a path
+PATH_ITEM_FIELDS = {"patches": ["path"], "patchesJson6902": ["path"],
+                    "configMapGenerator": ["env", "envs", "files"], "secretGenerator": ["env", "envs", "files"]}
+KUSTOMIZATION_FILES = ["kustomization.yaml", "kustomization.yml", "Kustomization"]
+REMOTE_REFERENCE_REGEX = re.compile(r"^(?:[a-z][a-z0-9+.-]*://|git@|github\.com/|gitlab\.com/)|\?ref=")
+
+SECRET_SCHEMA = {
+    "apiVersion": {"required": True, "values": ["v1"]},
+    "kind": {"required": True, "values": ["Secret"]},
+}
+BASE64_REGEX = re.compile(r"^[A-Za-z0-9+/]*={0,2}$")
+
+
+def file_digest(paths: [str]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+# Cached results are only valid for the rules that produced them
+VALIDATOR_VERSION = file_digest([os.path.abspath(__file__)] + [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ["json_util.py", "verify_descriptor_json.py"]
+])
+
+
+@dataclass
+class Issue:
+    path: str
+    kind: str
+    severity: str
+    message: str
+    line: int = None
+
+    def __str__(self):
+        location = f"{self.path}:{self.line}" if self.line else self.path
+        return f"{self.severity}: {location}: {self.message}"
+
+
+@dataclass
+class FileResult:
+    path: str
+    kind: str
+    sha256: str
+    issues: [Issue] = field(default_factory=list)
+    cached: bool = False
+
+
+def validate_descriptor(content: bytes, multi_region: bool) -> [(int, str, str)]:
+    """Validate the syntax of descriptor.json like json_util.get_json, and its regions when multi-region"""
+    if not content.strip():
+        return [(None, ERROR, "exists but is empty")]
+    try:
+        # The template descriptor of a single-region cluster is an empty object
+        descriptor = json.loads(content, object_pairs_hook=lambda pairs: enforce_json_syntax(pairs)
+                                if pairs or multi_region else {})
+    except ValueError as e:
+        return [(getattr(e, "lineno", None), ERROR, str(e))]
+    if not isinstance(descriptor, dict):
+        return [(None, ERROR, "must be a JSON object of regions")]
+    if multi_region:
+        try:
+            verify_json_schema(descriptor)
+        except (ValueError, TypeError, AttributeError) as e:
+            return [(None, ERROR, str(e))]
+    return []
+
+
+def scan_shell_value(text: str, quote: str = None) -> (str, bool):
+    """
+    Scan the value of an assignment, or a line of it, the way the shell splits words: quotes and backslashes escape
+    blanks, and a '#' after an unquoted blank starts a comment.
+    :param quote: The quote left open by the previous lines of the value, if any
+    :return: The quote still open at the end of the text, if any, and whether the value is followed by another word
+    """
+    more_words = False
+    after_blank = False
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if quote:
+            if char == "\\" and quote == "\"":
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in " \t":
+            after_blank = True
+        elif char == "#" and after_blank:
+            break
+        else:
+            more_words = more_words or after_blank
+            if char == "\\":
+                index += 1
+            elif char in ("\"", "'"):
+                quote = char
+        index += 1
+    return quote, more_words
+
+
+def validate_env_vars(content: bytes, sourced: bool) -> [(int, str, str)]:
+    """
+    Validate each line of an env_vars file as a blank line, a comment or a NAME=VALUE assignment, where a quoted value
+    may span several lines. The base and region env_vars files are also sourced by the shell, so their values must be
+    a single word. The checks of the shell syntax only approximate it, so they are warnings.
+    """
+    issues = []
+    names = {}
+    lines = content.decode(errors="replace").splitlines()
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        number = index = index + 1
+        if ENV_VAR_COMMENT_REGEX.match(line):
+            continue
+        match = ENV_VAR_LINE_REGEX.match(line)
+        if not match:
+            issues.append((number, ERROR, f"not a NAME=VALUE assignment: {line.strip()[:80]}"))
+            continue
+        name, value = match.groups()
+        quote, more_words = scan_shell_value(value)
+        while quote and index < len(lines):
+            quote, continued_words = scan_shell_value("\n" + lines[index], quote)
+            more_words = more_words or continued_words
+            index += 1
+        if sourced:
+            if quote:
+                issues.append((number, WARNING, f"unterminated quote in the value of {name}"))
+            elif more_words:
+                issues.append((number, WARNING, f"the value of {name} has unquoted whitespace, which the shell runs "
+                                                "as a command"))
+            if "#" in line:
+                issues.append((number, WARNING, f"{name} is not substituted into the templates because its line has "
+                                                "a '#'"))
+        if name in names:
+            issues.append((number, WARNING, f"{name} is already set on line {names[name]}"))
+        names[name] = number
+    return issues
+
+
+def kustomization_references(content: bytes) -> [(int, str, str)]:
+    """
+    Find the local paths referenced by a kustomization file, without a YAML parser. Only the block-style fields that
+    hold paths are read; block scalars, e.g. inline patches, are skipped.
+    :return: A list of (line number, field, reference)
+    """
+    references = []
+    section = None
+    item_indent = None
+    key_column = None
+    list_field = None
+    block_indent = None
+
+    def key_value(number: int, item: str, column: int):
+        nonlocal list_field, block_indent
+        key, sep, value = item.partition(":")
+        key, value = key.strip(), value.strip()
+        list_field = None
+        if not sep:
+            return
+        if value.startswith(("|", ">")):
+            block_indent = column
+        elif key in PATH_ITEM_FIELDS[section]:
+            if not value:
+                list_field = key
+            elif key != "files":
+                references.append((number, f"{section}.{key}", unquote(value.split(" #", 1)[0])))
+
+    for number, raw in enumerate(content.decode(errors="replace").splitlines(), start=1):
+        stripped = raw.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(raw) - len(raw.lstrip(" "))
+        if block_indent is not None:
+            if indent > block_indent:
+                continue
+            block_indent = None
+
+        is_item = stripped == "-" or stripped.startswith("- ")
+        if indent == 0 and not is_item:
+            key, _, value = stripped.partition(":")
+            section = key.strip() if key.strip() in PATH_LIST_FIELDS or key.strip() in PATH_ITEM_FIELDS else None
+            item_indent = None
+            list_field = None
+            if value.strip().startswith(("|", ">")):
+                block_indent = 0
+            continue
+        if section is None:
+            continue
+
+        item = stripped[1:].strip() if is_item else stripped
+        if section in PATH_LIST_FIELDS:
+            if is_item and (item_indent is None or indent == item_indent):
+                item_indent = indent
+                if item.startswith(("|", ">")):
+                    block_indent = indent
+                elif item and not item.startswith(("{", "[")):
+                    references.append((number, section, unquote(item.split(" #", 1)[0])))
+        elif is_item and (item_indent is None or indent <= item_indent):
+            # A new item of the section, e.g. '- name: x' or '- path: patch.yaml'
+            item_indent = indent
+            key_column = indent + len(stripped) - len(item)
+            key_value(number, item, key_column)
+        elif is_item and list_field and indent >= key_column:
+            # An element of a list field of the item, e.g. the paths under 'envs:'
+            references.append((number, f"{section}.{list_field}",
+                               unquote(item.split(" #", 1)[0]).split("=", 1)[-1]))
+        elif indent == key_column and not is_item:
+            key_value(number, item, key_column)
+    return references
+
+
+def is_local_reference(reference: str) -> bool:
+    return bool(reference) and "${" not in reference and not REMOTE_REFERENCE_REGEX.search(reference)
+
+
+def check_references(kustomization_dir: str, references: [(int, str, str)]) -> [(int, str, str)]:
+    """Check that every local reference of a kustomization exists, and that resource directories are kustomizations"""
+    issues = []
+    for number, field_name, reference in references:
+        if not is_local_reference(reference):
+            continue
+        path = os.path.normpath(os.path.join(kustomization_dir, reference))
+        if not os.path.exists(path):
+            issues.append((number, ERROR, f"{field_name} references {reference}, which does not exist"))
+        elif os.path.isdir(path) and field_name in ("resources", "bases", "components") and \
+                not any(os.path.isfile(os.path.join(path, name)) for name in KUSTOMIZATION_FILES):
+            issues.append((number, ERROR, f"{field_name} references the directory {reference}, which has no "
+                                          "kustomization file"))
+    return issues
+
+
+def validate_secrets(content: bytes) -> [(int, str, str)]:
+    """Validate every document of secrets.yaml as a uniquely named v1 Secret whose data values are base64"""
+    issues = []
+    seen = {}
+    line_offsets = [0]
+    for match in re.finditer(rb"\n", content):
+        line_offsets.append(match.end())
+
+    def line_of(offset: int) -> int:
+        low, high = 0, len(line_offsets)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if line_offsets[middle] <= offset:
+                low = middle
+            else:
+                high = middle
+        return low + 1
+
+    for offset, document in iter_documents(io.BytesIO(content)):
+        first_line = line_of(offset + len(document) - len(document.lstrip()))
+        header = scan_header(document)
+        if header is None:
+            issues.append((first_line, ERROR, "not a block-style YAML mapping"))
+            continue
+        values = {"apiVersion": header.id.api_version, "kind": header.id.kind}
+        for key, rules in SECRET_SCHEMA.items():
+            if values[key] is None:
+                issues.append((first_line, ERROR, f"{key} is missing"))
+            elif values[key] not in rules["values"]:
+                issues.append((first_line, ERROR, f"{key} is {values[key]}, expected {' or '.join(rules['values'])}"))
+        if not header.id.name:
+            issues.append((first_line, ERROR, "metadata.name is missing"))
+            continue
+        identity = (header.id.namespace, header.id.name)
+        if identity in seen:
+            issues.append((first_line, ERROR, f"secret {header.id} is already defined on line {seen[identity]}"))
+        seen[identity] = first_line
+
+        document_line = line_of(offset) - 1
+        for number, key, value in secret_data_values(document):
+            if "${" in value or not value:
+                continue
+            if not BASE64_REGEX.match(value) or len(value) % 4:
+                issues.append((document_line + number, ERROR, f"data.{key} of secret {header.id} is not base64"))
+                continue
+            try:
+                base64.b64decode(value, validate=True)
+            except binascii.Error:
+                issues.append((document_line + number, ERROR, f"data.{key} of secret {header.id} is not base64"))
+    return issues
+
+
+class ValidationCache:
+    """
+    Results of previous validations keyed on the content hash of each file and the version of the validator, so that
+    unchanged files are not validated again. Kustomization entries keep the references of the file instead of its
+    result, because whether they exist depends on the rest of the repository.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self.used = set()
+        self.saved = set()
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as cache_file:
+                    cache = json.load(cache_file)
+                if cache.get("version") == VALIDATOR_VERSION:
+                    self.entries = cache.get("entries", {})
+                    self.saved = set(self.entries)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable validation cache {path}: {e}", file=sys.stderr)
+
+    def loaded(self, key: str) -> bool:
+        """Whether the entry was saved by a previous run, rather than put by this one"""
+        return key in self.saved
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.used.add(key)
+            entry["used"] = time.time()
+            return entry["value"]
+        return None
+
+    def put(self, key: str, value):
+        self.used.add(key)
+        self.entries[key] = {"used": time.time(), "value": value}
+
+    def save(self):
+        if not self.path:
+            return
+        entries = self.entries
+        if len(entries) > MAX_CACHE_ENTRIES:
+            keep = sorted(entries, key=lambda key: (key in self.used, entries[key]["used"]), reverse=True)
+            entries = {key: entries[key] for key in keep[:MAX_CACHE_ENTRIES]}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.path), delete=False) as cache_file:
+                json.dump({"version": VALIDATOR_VERSION, "entries": entries}, cache_file)
+            os.replace(cache_file.name, self.path)
+        except OSError as e:
+            print(f"Unable to save the validation cache {self.path}: {e}", file=sys.stderr)
+
+
+class ClusterStateValidator:
+    """
+    Validate the inputs of the renders of a cluster state repository in one pass: descriptor.json, every env_vars file,
+    the local references of every kustomization file and secrets.yaml
+    """
+
+    def __init__(self, root: str, cache: ValidationCache, multi_region: bool = False, workers: int = 8):
+        self.root = os.path.abspath(root)
+        self.cache = cache
+        self.multi_region = multi_region
+        self.workers = workers
+
+    def files(self) -> [(str, str)]:
+        """The validated files of the repository, as (path relative to the root, kind)"""
+        found = []
+        for directory, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and
+                             not (directory == self.root and d in SKIPPED_DIRS))
+            for name in sorted(files):
+                if name in FILE_KINDS:
+                    found.append((os.path.relpath(os.path.join(directory, name), self.root), FILE_KINDS[name]))
+        return found
+
+    def validate_file(self, path: str, kind: str) -> FileResult:
+        full_path = os.path.join(self.root, path)
+        try:
+            with open(full_path, "rb") as source:
+                content = source.read()
+        except OSError as e:
+            return FileResult(path, kind, "", [Issue(path, kind, ERROR, f"unreadable: {e}")])
+
+        # The base and region env_vars files, e.g. base/env_vars, are the ones sourced by git-ops-command.sh
+        sourced = kind == "env_vars" and path.count(os.sep) == 1
+        sha256 = hashlib.sha256(content).hexdigest()
+        variant = self.multi_region if kind == "descriptor" else sourced
+        key = f"{kind}:{sha256}:{variant}"
+        cached = self.cache.get(key)
+        result = FileResult(path, kind, sha256, cached=self.cache.loaded(key))
+
+        if kind == "kustomization":
+            if cached is None:
+                cached = kustomization_references(content)
+                self.cache.put(key, cached)
+            found = check_references(os.path.dirname(full_path), [tuple(reference) for reference in cached])
+        else:
+            if cached is None:
+                if kind == "descriptor":
+                    cached = validate_descriptor(content, self.multi_region)
+                elif kind == "env_vars":
+                    cached = validate_env_vars(content, sourced)
+                else:
+                    cached = validate_secrets(content)
+                self.cache.put(key, cached)
+            found = cached
+        result.issues = [Issue(path, kind, severity, message, line) for line, severity, message in found]
+        return result
+
+    def validate(self) -> [FileResult]:
+        files = self.files()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(lambda file: self.validate_file(*file), files))
+        self.cache.save()
+        return results
+
+
+def report(root: str, results: [FileResult], duration: float) -> {}:
+    issues = [issue for result in results for issue in result.issues]
+    kinds = {}
+    for result in results:
+        kinds[result.kind] = kinds.get(result.kind, 0) + 1
+    return {
+        "root": root,
+        "duration_seconds": round(duration, 3),
+        "files": len(results),
+        "cached": sum(1 for result in results if result.cached),
+        "kinds": kinds,
+        "errors": sum(1 for issue in issues if issue.severity == ERROR),
+        "warnings": sum(1 for issue in issues if issue.severity == WARNING),
+        "issues": [asdict(issue) for issue in issues],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate descriptor.json, the env_vars files, the local references of the kustomization files and "
+                    "secrets.yaml of a cluster state repository in one pass")
+    parser.add_argument("root", nargs="?", default=".", help="k8s-configs directory of the cluster state repository")
+    parser.add_argument("--multi-region", action="store_true",
+                        help="Also verify that descriptor.json describes at least two regions")
+    default_cache = default_cache_file()
+    parser.add_argument("--cache", default=default_cache, help=f"Result cache, defaults to {default_cache}")
+    parser.add_argument("--no-cache", action="store_true", help="Validate every file, without reading or saving the "
+                                                                "cache")
+    parser.add_argument("--workers", type=int, default=8, help="Number of files validated concurrently")
+    parser.add_argument("--json", help="Also write the report as JSON to this file, or '-' for stdout only")
+    parser.add_argument("--quiet", action="store_true", help="Only print errors, and the summary")
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    validator = ClusterStateValidator(args.root, ValidationCache(None if args.no_cache else args.cache),
+                                      args.multi_region, args.workers)
+    results = validator.validate()
+    summary = report(validator.root, results, time.monotonic() - start)
+
+    if args.json == "-":
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        for result in results:
+            for issue in result.issues:
+                if not args.quiet or issue.severity == ERROR:
+                    print(issue)
+        print(f"Validated {summary['files']} files ({summary['cached']} cached) under {summary['root']} in "
+              f"{summary['duration_seconds']}s: {summary['errors']} errors, {summary['warnings']} warnings")
+        if args.json:
+            with open(args.json, "w") as json_file:
+                json.dump(summary, json_file, indent=2)
+
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+import argparse
+import hashlib
+import heapq
+import http.server
+import os
+import queue
+import re as regex
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+# Constants
+DEFAULT_CONFIG_FILE = "/app/config.yaml"
+DEFAULT_PORT = 8000
+SELF_METRIC_PREFIX = "prometheus_job_exporter"
+METRIC_NAME_REGEX = regex.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+DURATION_REGEX = regex.compile(r"^(\d+(?:\.\d+)?)\s*([smh]?)$")
+DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+# A value is stale when its last run failed, or it has not been refreshed for this many of its intervals
+STALE_INTERVALS = 2
+
+
+@dataclass(frozen=True)
+class ExecTarget:
+    namespace: str
+    pod: str
+    container: str
+
+
+@dataclass
+class JobConfig:
+    name: str
+    command: str
+    interval: str
+    description: str = ""
+    pod_name: str = None
+    container_name: str = None
+    namespace: str = None
+    timeout: float = None
+
+    @property
+    def target(self):
+        return ExecTarget(self.namespace, self.pod_name, self.container_name)
+
+
+@dataclass
+class JobState:
+    """The cached result of a job, served until its next run completes"""
+    value: float = None
+    last_success: float = None
+    last_duration: float = None
+    last_error: str = None
+    runs: dict = field(default_factory=lambda: {"success": 0, "failure": 0, "timeout": 0})
+    coalesced: int = 0
+
+
+def unquote(value):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def parse_config(text):
+    """
+        Parse the config.yaml of the prometheus-job-exporter-config ConfigMap, i.e. a 'metrics' mapping of each metric
+        name to its command, interval, description, pod_name, container_name, namespace and optional timeout. Only this
+        schema is read, so PyYAML is not needed. The values are substituted into the ConfigMap unquoted, so a ' #' in
+        a value, e.g. in a command, is kept rather than read as a comment; only whole comment lines are skipped.
+
+        Return a dict of metric name to its JobConfig.
+    """
+    jobs = {}
+    current = None
+    in_metrics = False
+    for line in text.splitlines():
+        content = line.rstrip()
+        if not content.strip() or content.lstrip().startswith("#"):
+            continue
+        indent = len(content) - len(content.lstrip())
+        key, _, value = content.strip().partition(":")
+        if value.strip().startswith("#"):
+            # A key followed by a comment only, e.g. the name of a metric
+            value = ""
+        if indent == 0:
+            in_metrics = key == "metrics"
+            current = None
+        elif in_metrics and not value.strip():
+            current = {"name": key}
+            jobs[key] = current
+        elif in_metrics and current is not None:
+            current[key] = unquote(value)
+
+    configs = {}
+    for name, values in jobs.items():
+        if not METRIC_NAME_REGEX.match(name):
+            raise ValueError(f"{name} is not a valid Prometheus metric name")
+        for required in ["command", "interval"]:
+            if not values.get(required):
+                raise ValueError(f"Metric {name} has no {required}")
+        timeout = values.pop("timeout", None)
+        configs[name] = JobConfig(timeout=parse_duration(timeout) if timeout else None,
+                                  **{key: value for key, value in values.items()
+                                     if key in JobConfig.__dataclass_fields__})
+    return configs
+
+
+def parse_duration(value):
+    match = DURATION_REGEX.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid duration '{value}', expected e.g. 30, 30s, 5m or 1h")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class CronSchedule:
+    """
+        A five-field cron expression (minute, hour, day of month, month, day of week) with '*', ',', '-' and '/', or
+        a plain duration like 30s for a fixed interval. Like cron, when both the day of month and the day of week are
+        restricted, i.e. do not start with '*', a day matching either of them fires.
+    """
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.interval = None
+        self.fields = None
+        self.either_day = False
+        fields = expression.split()
+        if len(fields) == 1:
+            self.interval = parse_duration(expression)
+        elif len(fields) == 5:
+            self.fields = [self.parse_field(value, low, high) for value, (low, high) in zip(fields, self.FIELD_RANGES)]
+            # Sunday is both 0 and 7
+            if 7 in self.fields[4]:
+                self.fields[4].add(0)
+            self.either_day = not fields[2].startswith("*") and not fields[4].startswith("*")
+        else:
+            raise ValueError(f"Invalid interval '{expression}', expected a cron expression or a duration")
+
+    @staticmethod
+    def parse_field(value, low, high):
+        values = set()
+        for part in value.split(","):
+            spec, _, step = part.partition("/")
+            if spec == "*":
+                start, end = low, high
+            elif "-" in spec:
+                start, end = (int(bound) for bound in spec.split("-", 1))
+            else:
+                start = end = int(spec)
+                if step:
+                    end = high
+            values.update(range(start, end + 1, int(step) if step else 1))
+        if not values or min(values) < low or max(values) > high + (1 if high == 6 else 0):
+            raise ValueError(f"Invalid cron field '{value}'")
+        return values
+
+    def next_after(self, timestamp):
+        """Return the first run time strictly after the timestamp, in seconds since the epoch"""
+        if self.interval:
+            return timestamp + self.interval
+        minutes, hours, days, months, weekdays = self.fields
+        moment = (int(timestamp) // 60 + 1) * 60
+        # Every schedule fires at least once in any 4 years, by which time all combinations have been seen
+        for _ in range(4 * 366 * 24 * 60):
+            local = time.localtime(moment)
+            day_matches = [local.tm_mday in days, (local.tm_wday + 1) % 7 in weekdays]
+            if local.tm_mon not in months or not (any if self.either_day else all)(day_matches):
+                # Skip to the next local midnight
+                moment += (24 * 60 - local.tm_hour * 60 - local.tm_min) * 60
+                continue
+            if local.tm_hour not in hours:
+                moment += (60 - local.tm_min) * 60
+                continue
+            if local.tm_min in minutes:
+                return moment
+            moment += 60
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+    def period(self, timestamp):
+        """The time between the next two runs after the timestamp"""
+        first = self.next_after(timestamp)
+        return self.next_after(first) - first
+
+
+class LocalExecBackend:
+    """Run the commands of the jobs with the local shell instead of in their pods, for development and testing"""
+
+    def __init__(self):
+        self.execs = 0
+
+    def run(self, target, command, timeout):
+        self.execs += 1
+        completed = subprocess.run(["/bin/sh", "-c", command], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   timeout=timeout, text=True)
+        if completed.returncode:
+            raise RuntimeError(f"exited with {completed.returncode}: {completed.stdout.strip()[-200:]}")
+        return completed.stdout
+
+    def sessions(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class ExecSession:
+    """A long-lived shell in a container, so that each run of a job does not open a new exec connection"""
+
+    def __init__(self, core_client, target):
+        from kubernetes.stream import stream
+
+        self.target = target
+        self.client = stream(core_client.connect_get_namespaced_pod_exec, target.pod, target.namespace,
+                             container=target.container, command=["/bin/sh"], stdin=True, stdout=True, stderr=True,
+                             tty=False, _preload_content=False)
+
+    def run(self, command, timeout):
+        marker = f"__job_exporter_{uuid.uuid4().hex}__"
+        # The command must not read the stdin of the shell, which carries the following commands
+        self.client.write_stdin(f"{{ {command}\n}} </dev/null 2>&1; echo \"{marker} $?\"\n")
+        output = ""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(command, timeout)
+            if not self.client.is_open():
+                raise ConnectionError(f"Exec connection to {self.target.pod} closed")
+            self.client.update(timeout=min(remaining, 1))
+            if self.client.peek_stdout():
+                output += self.client.read_stdout()
+            if self.client.peek_stderr():
+                self.client.read_stderr()
+            if marker in output:
+                output, _, status = output.partition(marker)
+                status = status.split()[0] if status.split() else "1"
+                if status != "0":
+                    raise RuntimeError(f"exited with {status}: {output.strip()[-200:]}")
+                return output
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class KubernetesExecBackend:
+    """
+        Run the commands of the jobs in their containers through a pool of ExecSessions per container. A session whose
+        command fails to complete, e.g. on a timeout, is closed rather than reused.
+    """
+
+    def __init__(self, max_sessions=2):
+        import kubernetes as k8s
+
+        try:
+            k8s.config.load_incluster_config()
+        except k8s.config.ConfigException:
+            k8s.config.load_kube_config()
+        self.core_client = k8s.client.CoreV1Api()
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.open = {}
+        self.slots = {}
+        self.execs = 0
+
+    def acquire(self, target, timeout):
+        with self.lock:
+            slots = self.slots.setdefault(target, threading.BoundedSemaphore(self.max_sessions))
+        if not slots.acquire(timeout=timeout):
+            raise subprocess.TimeoutExpired(f"exec session for {target.pod}", timeout)
+        try:
+            return self.idle.setdefault(target, queue.SimpleQueue()).get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            session = ExecSession(self.core_client, target)
+        except Exception:
+            slots.release()
+            raise
+        with self.lock:
+            self.open[target] = self.open.get(target, 0) + 1
+        return session
+
+    def release(self, session, healthy):
+        if healthy:
+            self.idle[session.target].put(session)
+        else:
+            session.close()
+            with self.lock:
+                self.open[session.target] -= 1
+        self.slots[session.target].release()
+
+    def run(self, target, command, timeout):
+        start = time.monotonic()
+        session = self.acquire(target, timeout)
+        healthy = False
+        try:
+            self.execs += 1
+            output = session.run(command, max(timeout - (time.monotonic() - start), 0.1))
+            healthy = True
+            return output
+        except RuntimeError:
+            # The command failed, but the shell completed it and can run the next one
+            healthy = True
+            raise
+        finally:
+            self.release(session, healthy)
+
+    def sessions(self):
+        with self.lock:
+            return sum(self.open.values())
+
+    def close(self):
+        for sessions in self.idle.values():
+            while True:
+                try:
+                    sessions.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+def jitter_offset(key, max_jitter):
+    """
+        A stable offset of up to max_jitter seconds per command, so that different commands on the same schedule do not
+        run together, while jobs with the same command still run together and share an exec.
+    """
+    if not max_jitter:
+        return 0
+    digest = int(hashlib.sha256(repr(key).encode()).hexdigest()[:8], 16)
+    return (digest % int(max_jitter * 1000)) / 1000
+
+
+class JobExporter:
+    """
+        Run the jobs of the exporter config concurrently, each on its own schedule, and keep the last value of each.
+        Jobs that are due at the same time with the same command in the same container share one exec.
+    """
+
+    def __init__(self, jobs, backend, workers=4, default_timeout=30, max_jitter=15):
+        self.jobs = jobs
+        self.backend = backend
+        self.default_timeout = default_timeout
+        self.max_jitter = max_jitter
+        self.schedules = {name: CronSchedule(job.interval) for name, job in jobs.items()}
+        self.states = {name: JobState() for name in jobs}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.stopped = threading.Event()
+
+    def timeout(self, name):
+        job = self.jobs[name]
+        # A run never overlaps the next one of the same job
+        return min(job.timeout or self.default_timeout, self.schedules[name].period(time.time()))
+
+    def next_run(self, name, after):
+        schedule = self.schedules[name]
+        job = self.jobs[name]
+        offset = min(jitter_offset((job.target, job.command), self.max_jitter), schedule.period(after) / 4)
+        return schedule.next_after(after - offset) + offset
+
+    def submit(self, name):
+        """Run a job now, or attach it to the identical command already running"""
+        job = self.jobs[name]
+        key = (job.target, job.command)
+        with self.lock:
+            if key in self.in_flight:
+                self.in_flight[key].append(name)
+                self.states[name].coalesced += 1
+                return
+            self.in_flight[key] = [name]
+        self.executor.submit(self.execute, key, self.timeout(name))
+
+    def execute(self, key, timeout):
+        target, command = key
+        start = time.monotonic()
+        value, error, result = None, None, "success"
+        try:
+            output = self.backend.run(target, command, timeout)
+            lines = [line for line in output.splitlines() if line.strip()]
+            value = float(lines[-1].strip()) if lines else None
+            if value is None:
+                raise ValueError("no output")
+        except subprocess.TimeoutExpired:
+            error, result = f"timed out after {timeout}s", "timeout"
+        except Exception as e:
+            error, result = str(e) or type(e).__name__, "failure"
+        duration = time.monotonic() - start
+
+        with self.lock:
+            names = self.in_flight.pop(key)
+            for name in names:
+                state = self.states[name]
+                state.runs[result] += 1
+                state.last_duration = duration
+                state.last_error = error
+                if error is None:
+                    state.value = value
+                    state.last_success = time.time()
+        if error:
+            print(f"{', '.join(names)}: {error}", file=sys.stderr)
+
+    def run_once(self):
+        """Run every job once and wait for all of them"""
+        for name in self.jobs:
+            self.submit(name)
+        while True:
+            with self.lock:
+                if not self.in_flight:
+                    return
+            time.sleep(0.01)
+
+    def run(self):
+        """Run the jobs on their schedules until stop is called"""
+        now = time.time()
+        due = [(self.next_run(name, now), name) for name in self.jobs]
+        heapq.heapify(due)
+        while due and not self.stopped.is_set():
+            run_at, name = due[0]
+            if self.stopped.wait(max(run_at - time.time(), 0)):
+                break
+            heapq.heapreplace(due, (self.next_run(name, run_at), name))
+            self.submit(name)
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
+        self.backend.close()
+
+    def is_stale(self, name, now):
+        state = self.states[name]
+        if state.last_success is None or state.last_error:
+            return True
+        return now - state.last_success > STALE_INTERVALS * self.schedules[name].period(state.last_success)
+
+    def exposition(self):
+        """
+            Render the values of the jobs and the metrics of the exporter in the Prometheus text exposition format. The
+            labels are prefixed so that they do not collide with the job, namespace, pod and container target labels
+            that Prometheus attaches to every sample it scrapes from the exporter.
+        """
+        now = time.time()
+        lines = []
+        with self.lock:
+            for name, job in self.jobs.items():
+                state = self.states[name]
+                if state.value is None:
+                    continue
+                labels = format_labels(target_namespace=job.namespace, target_pod=job.pod_name,
+                                       target_container=job.container_name)
+                lines += [f"# HELP {name} {escape_help(job.description or name)}", f"# TYPE {name} gauge",
+                          f"{name}{labels} {format_value(state.value)}"]
+
+            self_metrics = [
+                ("job_duration_seconds", "gauge", "Runtime of the last run of the job",
+                 lambda state: [({}, state.last_duration)] if state.last_duration is not None else []),
+                ("job_runs_total", "counter", "Runs of the job by result",
+                 lambda state: [({"result": result}, count) for result, count in state.runs.items()]),
+                ("job_coalesced_total", "counter", "Runs of the job that shared the exec of an identical command",
+                 lambda state: [({}, state.coalesced)]),
+                ("job_last_success_timestamp_seconds", "gauge", "Time of the last successful run of the job",
+                 lambda state: [({}, state.last_success)] if state.last_success else []),
+            ]
+            for suffix, metric_type, help_text, samples in self_metrics:
+                metric = f"{SELF_METRIC_PREFIX}_{suffix}"
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+                for name, state in self.states.items():
+                    for labels, value in samples(state):
+                        lines.append(f"{metric}{format_labels(job_name=name, **labels)} {format_value(value)}")
+
+            metric = f"{SELF_METRIC_PREFIX}_job_stale"
+            lines += [f"# HELP {metric} Whether the served value of the job is from a failed or overdue run",
+                      f"# TYPE {metric} gauge"]
+            lines += [f"{metric}{format_labels(job_name=name)} {int(self.is_stale(name, now))}" for name in self.jobs]
+
+        for suffix, metric_type, help_text, value in [
+            ("execs_total", "counter", "Commands run in the containers", self.backend.execs),
+            ("exec_sessions", "gauge", "Open exec connections", self.backend.sessions()),
+        ]:
+            metric = f"{SELF_METRIC_PREFIX}_{suffix}"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def escape_help(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def format_labels(**labels):
+    pairs = [f'{key}="{escape_label(str(value))}"' for key, value in labels.items() if value is not None]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_value(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def serve(exporter, port):
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = exporter.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, message_format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("", port), MetricsHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the jobs of the prometheus-job-exporter config concurrently and serve their last values as "
+                    "Prometheus metrics")
+    parser.add_argument("--config", default=os.environ.get("JOB_EXPORTER_CONFIG", DEFAULT_CONFIG_FILE),
+                        help=f"Exporter config, defaults to {DEFAULT_CONFIG_FILE}")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Metrics port, defaults to {DEFAULT_PORT}")
+    parser.add_argument("--workers", type=int, default=4, help="Number of jobs run concurrently")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="Timeout in seconds of a job without a timeout in the config")
+    parser.add_argument("--jitter", type=float, default=15,
+                        help="Maximum delay in seconds added to the schedule of each job to spread the jobs out")
+    parser.add_argument("--max-sessions", type=int, default=2, help="Exec connections kept open per container")
+    parser.add_argument("--local", action="store_true",
+                        help="Run the commands with the local shell instead of in the pods, e.g. for testing")
+    parser.add_argument("--once", action="store_true", help="Run every job once, print the metrics and exit")
+    args = parser.parse_args()
+
+    with open(args.config) as config_file:
+        jobs = parse_config(config_file.read())
+    backend = LocalExecBackend() if args.local else KubernetesExecBackend(args.max_sessions)
+    exporter = JobExporter(jobs, backend, args.workers, args.timeout, args.jitter)
+
+    if args.once:
+        exporter.run_once()
+        sys.stdout.write(exporter.exposition())
+        exporter.stop()
+        return
+
+    threading.Thread(target=exporter.run, name="scheduler", daemon=True).start()
+    print(f"Serving {len(jobs)} jobs on port {args.port}")
+    try:
+        serve(exporter, args.port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import calendar
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from prometheus_job_exporter import (  # noqa: E402
+    CronSchedule, ExecTarget, JobExporter, jitter_offset, parse_config, parse_duration,
+)
+
+CONFIG = """# Rendered from the prometheus-job-exporter-config ConfigMap
+metrics:
+  users_count: # all users
+    command: ldapsearch -b o=data '(objectClass=person)' dn | grep -c '^dn: #'
+    interval: '*/5 * * * *'
+    description: Count of users
+    pod_name: pingdirectory-0
+    container_name: pingdirectory
+    namespace: 'ping-cloud'
+    timeout: 1m
+  groups_count:
+    command: echo 3
+    interval: 30s
+"""
+
+
+def utc(year: int, month: int, day: int, hour: int = 0, minute: int = 0) -> int:
+    return calendar.timegm((year, month, day, hour, minute, 0))
+
+
+def job(name: str, command: str, interval: str = "30s", timeout: str = "") -> str:
+    lines = [f"  {name}:", f"    command: {command}", f"    interval: {interval}", "    pod_name: pingdirectory-0",
+             "    container_name: pingdirectory", "    namespace: ping-cloud"]
+    if timeout:
+        lines.append(f"    timeout: {timeout}")
+    return "\n".join(lines) + "\n"
+
+
+class FakeBackend:
+    """
+    Returns the output of each command, or raises it if it is an exception. Commands in blocked wait until release is
+    called, so that identical commands can be submitted while one is running.
+    """
+
+    def __init__(self, outputs: {}, blocked: [str] = ()):
+        self.outputs = outputs
+        self.blocked = set(blocked)
+        self.released = threading.Event()
+        self.runs = []
+        self.execs = 0
+        self.closed = False
+
+    def run(self, target: ExecTarget, command: str, timeout: float) -> str:
+        self.execs += 1
+        self.runs.append((target, command, timeout))
+        if command in self.blocked:
+            self.released.wait(5)
+        output = self.outputs[command]
+        if isinstance(output, Exception):
+            raise output
+        return output
+
+    def release(self):
+        self.released.set()
+
+    def sessions(self) -> int:
+        return 1
+
+    def close(self):
+        self.closed = True
+
+
+class UtcTestCase(unittest.TestCase):
+    """Runs with local time in UTC, so that cron expressions fire at known timestamps"""
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {"TZ": "UTC"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(time.tzset)
+        time.tzset()
+
+
+class TestParseConfig(unittest.TestCase):
+    def test_jobs(self):
+        jobs = parse_config(CONFIG)
+
+        self.assertEqual(["users_count", "groups_count"], list(jobs))
+        users = jobs["users_count"]
+        self.assertEqual("ldapsearch -b o=data '(objectClass=person)' dn | grep -c '^dn: #'", users.command)
+        self.assertEqual("*/5 * * * *", users.interval)
+        self.assertEqual(ExecTarget("ping-cloud", "pingdirectory-0", "pingdirectory"), users.target)
+        self.assertEqual(60, users.timeout)
+        self.assertIsNone(jobs["groups_count"].timeout)
+
+    def test_invalid_configs(self):
+        invalid = {
+            "an invalid metric name": "metrics:\n  users-count:\n    command: echo 1\n    interval: 30s\n",
+            "a job without a command": "metrics:\n  users_count:\n    interval: 30s\n",
+            "a job without an interval": "metrics:\n  users_count:\n    command: echo 1\n",
+            "an invalid timeout": "metrics:\n  users_count:\n    command: echo 1\n    interval: 30s\n    timeout: 1d\n",
+        }
+        for description, config in invalid.items():
+            with self.subTest(description), self.assertRaises(ValueError):
+                parse_config(config)
+
+    def test_durations(self):
+        self.assertEqual([30, 30, 300, 5400, 1.5], [parse_duration(value) for value in ["30", "30s", "5m", "1.5h",
+                                                                                        "1.5"]])
+
+
+class TestCronSchedule(UtcTestCase):
+    def test_interval(self):
+        schedule = CronSchedule("30s")
+        self.assertEqual(130, schedule.next_after(100))
+        self.assertEqual(30, schedule.period(100))
+
+    def test_steps_and_ranges(self):
+        schedule = CronSchedule("*/15 9-17 * * *")
+        self.assertEqual(utc(2024, 3, 4, 9, 0), schedule.next_after(utc(2024, 3, 4, 8, 59)))
+        self.assertEqual(utc(2024, 3, 4, 9, 15), schedule.next_after(utc(2024, 3, 4, 9, 0)))
+        self.assertEqual(utc(2024, 3, 5, 9, 0), schedule.next_after(utc(2024, 3, 4, 17, 45)))
+        self.assertEqual(15 * 60, schedule.period(utc(2024, 3, 4, 10, 0)))
+
+    def test_day_of_month_or_day_of_week(self):
+        # 2024-03-04 is a Monday: the 1st of the month or any Monday fires
+        schedule = CronSchedule("0 0 1 * 1")
+        self.assertEqual(utc(2024, 3, 4), schedule.next_after(utc(2024, 3, 2)))
+        self.assertEqual(utc(2024, 3, 11), schedule.next_after(utc(2024, 3, 4)))
+        self.assertEqual(utc(2024, 4, 1), schedule.next_after(utc(2024, 3, 25)))
+        self.assertEqual(utc(2024, 5, 1), schedule.next_after(utc(2024, 4, 29)))
+
+    def test_unrestricted_day_fields_are_both_required(self):
+        # Only the day of week is restricted
+        self.assertEqual(utc(2024, 3, 11), CronSchedule("0 0 * * 1").next_after(utc(2024, 3, 4)))
+        # A day of month starting with '*' still restricts, but only Mondays on odd days fire
+        self.assertEqual(utc(2024, 3, 11), CronSchedule("0 0 */2 * 1").next_after(utc(2024, 3, 4)))
+        self.assertEqual(utc(2024, 3, 25), CronSchedule("0 0 */2 * 1").next_after(utc(2024, 3, 11)))
+
+    def test_sunday_is_0_and_7(self):
+        self.assertEqual(utc(2024, 3, 10), CronSchedule("0 0 * * 7").next_after(utc(2024, 3, 4)))
+        self.assertEqual(utc(2024, 3, 10), CronSchedule("0 0 * * 0").next_after(utc(2024, 3, 4)))
+
+    def test_invalid_expressions(self):
+        for expression in ["* * * *", "60 * * * *", "* * 0 * *", "every minute"]:
+            with self.subTest(expression), self.assertRaises(ValueError):
+                CronSchedule(expression)
+
+
+class TestJitterOffset(unittest.TestCase):
+    def test_stable_and_bounded(self):
+        key = (ExecTarget("ping-cloud", "pingdirectory-0", "pingdirectory"), "echo 1")
+        self.assertEqual(jitter_offset(key, 15), jitter_offset(key, 15))
+        self.assertTrue(0 <= jitter_offset(key, 15) < 15)
+        self.assertEqual(0, jitter_offset(key, 0))
+
+
+class TestJobExporter(unittest.TestCase):
+    def exporter(self, config: str, outputs: {}, blocked: [str] = ()) -> JobExporter:
+        self.backend = FakeBackend(outputs, blocked)
+        exporter = JobExporter(parse_config("metrics:\n" + config), self.backend, workers=4, default_timeout=10,
+                               max_jitter=0)
+        self.addCleanup(exporter.stop)
+        return exporter
+
+    @staticmethod
+    def wait(exporter: JobExporter):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with exporter.lock:
+                if not exporter.in_flight:
+                    return
+            time.sleep(0.01)
+        raise AssertionError("jobs still running")
+
+    @staticmethod
+    def samples(exporter: JobExporter) -> {}:
+        return dict(line.rsplit(" ", 1) for line in exporter.exposition().splitlines() if not line.startswith("#"))
+
+    def test_values_are_the_last_line_of_the_output(self):
+        exporter = self.exporter(job("users_count", "count users") + job("groups_count", "count groups"),
+                                 {"count users": "searching\n42\n\n", "count groups": "2.5"})
+
+        exporter.run_once()
+
+        self.assertEqual(42, exporter.states["users_count"].value)
+        self.assertEqual(2.5, exporter.states["groups_count"].value)
+        self.assertEqual({"success": 1, "failure": 0, "timeout": 0}, exporter.states["users_count"].runs)
+
+    def test_identical_commands_share_one_exec(self):
+        exporter = self.exporter(job("users_count_1", "count users") + job("users_count_2", "count users"),
+                                 {"count users": "42"}, blocked=["count users"])
+
+        exporter.submit("users_count_1")
+        exporter.submit("users_count_2")
+        self.backend.release()
+        self.wait(exporter)
+
+        self.assertEqual(1, self.backend.execs)
+        self.assertEqual(42, exporter.states["users_count_2"].value)
+        self.assertEqual(1, exporter.states["users_count_2"].coalesced)
+
+    def test_timeout_is_capped_by_the_interval(self):
+        exporter = self.exporter(job("fast", "echo 1", interval="5s", timeout="1m") +
+                                 job("slow", "echo 2", interval="1h", timeout="20s") + job("default", "echo 3"),
+                                 {"echo 1": "1", "echo 2": "2", "echo 3": "3"})
+
+        self.assertEqual([5, 20, 10], [exporter.timeout(name) for name in ["fast", "slow", "default"]])
+
+    def test_failures_keep_the_last_value_and_are_stale(self):
+        exporter = self.exporter(job("users_count", "count users") + job("groups_count", "count groups"),
+                                 {"count users": "42", "count groups": "none"})
+        exporter.run_once()
+        self.backend.outputs["count users"] = subprocess.TimeoutExpired("count users", 10)
+
+        exporter.run_once()
+
+        users = exporter.states["users_count"]
+        self.assertEqual((42, "timed out after 10s"), (users.value, users.last_error))
+        self.assertEqual({"success": 1, "failure": 0, "timeout": 1}, users.runs)
+        self.assertIsNone(exporter.states["groups_count"].value)
+        self.assertEqual(2, exporter.states["groups_count"].runs["failure"])
+        self.assertTrue(exporter.is_stale("users_count", time.time()))
+
+    def test_values_are_stale_after_two_intervals(self):
+        exporter = self.exporter(job("users_count", "count users"), {"count users": "42"})
+        exporter.run_once()
+        last_success = exporter.states["users_count"].last_success
+
+        self.assertFalse(exporter.is_stale("users_count", last_success + 60))
+        self.assertTrue(exporter.is_stale("users_count", last_success + 61))
+
+    def test_exposition_labels_do_not_collide_with_target_labels(self):
+        exporter = self.exporter(job("users_count", "count users"), {"count users": "42"})
+        exporter.run_once()
+
+        samples = self.samples(exporter)
+
+        self.assertEqual("42", samples['users_count{target_namespace="ping-cloud",target_pod="pingdirectory-0",'
+                                        'target_container="pingdirectory"}'])
+        self.assertEqual("1", samples['prometheus_job_exporter_job_runs_total{job_name="users_count",'
+                                      'result="success"}'])
+        self.assertEqual("0", samples['prometheus_job_exporter_job_stale{job_name="users_count"}'])
+        self.assertEqual("1", samples["prometheus_job_exporter_execs_total"])
+        for series in samples:
+            labels = series.partition("{")[2]
+            for label in ["job", "namespace", "pod", "container"]:
+                self.assertNotRegex(labels, f"(^|,){label}=", series)
+
+    def test_values_without_a_successful_run_are_not_exported(self):
+        exporter = self.exporter(job("users_count", "count users"), {"count users": RuntimeError("exited with 1")})
+        exporter.run_once()
+
+        samples = self.samples(exporter)
+
+        self.assertNotIn("users_count", [series.partition("{")[0] for series in samples])
+        self.assertEqual("1", samples['prometheus_job_exporter_job_stale{job_name="users_count"}'])
+
+    def test_scheduled_runs(self):
+        exporter = self.exporter(job("users_count", "count users", interval="0.05s"), {"count users": "42"})
+        scheduler = threading.Thread(target=exporter.run)
+        scheduler.start()
+        time.sleep(0.3)
+        exporter.stopped.set()
+        scheduler.join(5)
+
+        self.assertFalse(scheduler.is_alive())
+        self.assertGreaterEqual(exporter.states["users_count"].runs["success"], 2)
+
+    def test_stop_closes_the_backend(self):
+        exporter = self.exporter(job("users_count", "count users"), {"count users": "42"})
+        exporter.stop()
+        self.assertTrue(self.backend.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()